@@ -20,10 +20,9 @@ from dash_extensions.enrich import BlockingCallbackTransform, DashProxy
 from loguru import logger
 from matplotlib import pyplot as plt
 from pytorch3d.vis.plotly_vis import get_camera_wireframe
-from torch_geometric.nn.pool.voxel_grid import voxel_grid
 
 from home_robot.core.interfaces import Observations
-from home_robot.mapping.voxel.voxel import SparseVoxelMap
+from home_robot.mapping.voxel import SparseVoxelMap, VoxelMapReplica
 from home_robot.utils.point_cloud_torch import get_bounds
 
 from .directory_watcher import DirectoryWatcher, get_most_recent_viz_directory
@@ -80,6 +79,8 @@ class SparseVoxelMapDirectoryWatcher:
         sparse_voxel_map_kwargs: Dict = {},
     ):
         self.svm = SparseVoxelMap(**sparse_voxel_map_kwargs)
+        # Copy of the map as sent to the frontend, kept current with svm.get_delta
+        self.replica = VoxelMapReplica()
         # self.svm.step_and_return_update = step_and_return_update
         self.obs_watcher = DirectoryWatcher(
             watch_dir,
@@ -197,44 +198,32 @@ class SparseVoxelMapDirectoryWatcher:
         else:
             logger.warning("No obstacles in obs")
 
-        # Add only new points
-        old_points = self.svm.voxel_pcd._points
-        old_rgb = self.svm.voxel_pcd._rgb
         if obs["rgb"].max() > 1.0:  # added nomalization
             obs["rgb"] = obs["rgb"] / 255.0
         svm_watcher.svm.add(**obs)
 
-        # Only send _new_ points to the frontend
-        keep = (app_config.pcl_min_height < self.svm.voxel_pcd._points[:, 2]) & (
-            self.svm.voxel_pcd._points[:, 2] < app_config.pcl_max_height
-        )
-        self.svm.voxel_pcd._points = self.svm.voxel_pcd._points[keep]
-        self.svm.voxel_pcd._rgb = self.svm.voxel_pcd._rgb[keep]
-        self.svm.voxel_pcd._weights = self.svm.voxel_pcd._weights[keep]
-
-        new_points = self.svm.voxel_pcd._points
-        new_bounds = get_bounds(new_points).cpu()
-        new_rgb = self.svm.voxel_pcd._rgb
-        total_points = len(new_points)
-        if old_points is not None:
-            # Add new points
-            voxel_size = self.svm.voxel_pcd.voxel_size
-            mins, maxes = get_bounds(new_points).unbind(dim=-1)
-            voxel_idx_old = voxel_grid(
-                pos=old_points, size=voxel_size, start=mins, end=maxes
-            )
-            voxel_idx_new = voxel_grid(
-                pos=new_points, size=voxel_size, start=mins, end=maxes
+        # Drop points outside the height range from the map
+        points = self.svm.voxel_pcd.get_pointcloud()[0]
+        if points is not None:
+            self.svm.voxel_pcd.filter(
+                (app_config.pcl_min_height < points[:, 2])
+                & (points[:, 2] < app_config.pcl_max_height)
             )
-            novel_idxs = torch.isin(voxel_idx_new, voxel_idx_old, invert=True)
-
-            new_rgb = new_rgb[novel_idxs]
-
-            new_points = new_points[novel_idxs]
 
-            logger.debug(
-                f"At obs {len(self.points)} PTC now has {total_points} points ({len(old_points)} old, {len(new_points)} new, sending {float(len(new_points)) / total_points * 100:0.2f}%)"
-            )
+        # Only send _new_ voxels to the frontend; the replica holds what was sent
+        delta = self.svm.get_delta(self.replica.version)
+        num_old = len(self.replica)
+        novel_idxs = torch.isin(
+            delta.voxels.keys.cpu(), self.replica.get_keys(), invert=True
+        )
+        new_points = delta.voxels.points.cpu()[novel_idxs]
+        new_rgb = delta.voxels.rgb.cpu()[novel_idxs]
+        self.replica.apply(delta)
+        total_points = len(self.replica)
+        new_bounds = get_bounds(self.replica.get_pointcloud()[0]).cpu()
+        logger.debug(
+            f"At obs {len(self.points)} PTC now has {total_points} points ({num_old} old, {len(new_points)} new, sending {float(len(new_points)) / max(total_points, 1) * 100:0.2f}%)"
+        )
 
         self.points.append(new_points.cpu())
         self.rgb.append(new_rgb.cpu())
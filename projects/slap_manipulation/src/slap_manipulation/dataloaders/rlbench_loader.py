@@ -4,7 +4,7 @@
 # LICENSE file in the root directory of this source tree.
 
 
-from typing import Any, Dict, List, Tuple, Type
+from typing import Any, Dict, List, Tuple, Type, Union
 
 import h5py
 import numpy as np
@@ -34,21 +34,28 @@ class RLBHighLevelTrial(Trial):
         name: str,
         h5_filename: str,
         dataset: Type[DatasetBase],
-        group: h5py.Group,
+        info: Union[h5py.Group, Dict[str, Any]],
     ):
         """
-        Use group for initialization
+        Initialize from the trial's dataset index entry, as returned by read_info, or from its h5py group
         """
-        super().__init__(name, h5_filename, dataset, group)
+        super().__init__(name, h5_filename, dataset, info)
         self.factor = 1
         self.dr_factor = 10
-        num_samples = len(self["keypoints"]) if not dataset.multi_step else 1
+        num_samples = self.info["num_keypoints"] if not dataset.multi_step else 1
         self.length = (
             self.factor
             * num_samples
             * (self.dr_factor if dataset.data_augmentation else 1)
         )
 
+    @staticmethod
+    def read_info(group: h5py.Group) -> Dict[str, Any]:
+        """Trial.read_info, plus the number of keypoints"""
+        info = Trial.read_info(group)
+        info["num_keypoints"] = len(group["keypoints"])
+        return info
+
 
 class RLBenchDataset(DatasetBase):
     """train on a dataset from RLBench"""
@@ -9,6 +9,7 @@ import math
 from typing import Any, Dict, List, Optional, Sequence, Tuple, TypeVar, Union
 
 import click
+import h5py
 import numpy as np
 import open3d as o3d
 import torch
@@ -62,16 +63,14 @@ class RPHighLevelTrial(Trial):
         name: str,
         h5_filename: str,
         dataset: DatasetBase,
-        group,
+        info: Union[h5py.Group, Dict[str, Any]],
         factor: int = DATA_FACTOR,
     ):
         """
-        Use group for initialization
+        Initialize from the trial's dataset index entry, as returned by read_info, or from its h5py group
         """
-        super().__init__(name, h5_filename, dataset, group)
-        keypoint_array = self["user_keyframe"][()].squeeze()
-        idx = np.arange(keypoint_array.shape[0])
-        idx = idx[keypoint_array == 1]
+        super().__init__(name, h5_filename, dataset, info)
+        idx = np.array(self.info["keypoints"], dtype=int)
         keypoint_len = len(idx)
         # extra samples for metrics - used to coer for randomness in ptnet ops?
         self.factor = factor
@@ -85,6 +84,14 @@ class RPHighLevelTrial(Trial):
         self.num_keypoints = keypoint_len
         self.keypoints = idx
 
+    @staticmethod
+    def read_info(group: h5py.Group) -> Dict[str, Any]:
+        """Trial.read_info, plus the indices of the user keyframes"""
+        info = Trial.read_info(group)
+        keyframes = group["user_keyframe"][()].squeeze()
+        info["keypoints"] = np.flatnonzero(keyframes == 1).tolist()
+        return info
+
 
 class RobotDataset(RLBenchDataset):
     """train on a dataset from robot dataset"""
@@ -120,6 +127,7 @@ class RobotDataset(RLBenchDataset):
         skill_to_action_file: str = None,
         query_radius: float = 0.1,
         drop_frames: bool = False,
+        num_decode_threads: int = 0,
         # visualization parameters
         show_voxelized_input_and_reference: bool = False,
         show_raw_input_and_reference: bool = False,
@@ -150,6 +158,7 @@ class RobotDataset(RLBenchDataset):
         crop_radius:            whether to crop the input point cloud to a sphere of radius crop_radius_range
         robot:                  name of robot (stretch/franka)
         per_action_cmd:         use different language per waypoint
+        num_decode_threads:     threads decoding input images in the background
         """
         if yaml_file is not None:
             self.annotations = load_annotations_dict(yaml_file)
@@ -195,6 +204,7 @@ class RobotDataset(RLBenchDataset):
             verbose,
             trial_list=trial_list,
             TrialType=RPHighLevelTrial,
+            num_decode_threads=num_decode_threads,
         )
         self._voxel_size = 0.001
         self._voxel_size_2 = 0.01
@@ -574,8 +584,17 @@ class RobotDataset(RLBenchDataset):
             target_gripper_state = gripper_state[current_keypoint_idx]
 
         # get point-cloud in base-frame from the cameras
+        views = ["head"]
+        # Decode all input images at once instead of one after the other
+        trial.prefetch_imgs(
+            [view + suffix for view in views for suffix in ["_rgb", "_depth"]],
+            [
+                image_index if image_index is not None else input_idx
+                for image_index in input_keyframes
+            ],
+        )
         rgbs, xyzs, feats, depths = [], [], [], []
-        for view in ["head"]:
+        for view in views:
             for image_index in input_keyframes:
                 v_rgb, v_xyz, v_feat, v_depth = self.process_images_from_view(
                     trial,
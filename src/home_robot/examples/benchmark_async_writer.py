@@ -0,0 +1,97 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+#
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+import os
+import tempfile
+import time
+import timeit
+
+import click
+import cv2
+import numpy as np
+import skimage.data
+
+from home_robot.utils.data_tools.async_writer import (
+    BACKPRESSURE_POLICIES,
+    AsyncFrameWriter,
+)
+from home_robot.utils.data_tools.writer import DataWriter
+
+
+def make_frame(width: int, height: int, rng: np.random.Generator):
+    """Images and per-frame data like Recorder.save_frame collects"""
+    rgb = cv2.resize(skimage.data.astronaut(), (width, height))
+    depth = rng.uniform(0.5, 4.0, (height, width))
+    images = dict(head_rgb=rgb, head_depth=(depth * 10000).astype(np.uint16))
+    data = dict(
+        q=rng.random(11),
+        ee_pose=rng.random(7),
+        base_pose=rng.random(3),
+        camera_pose=rng.random((4, 4)),
+        head_xyz=rng.random((height, width, 3)).astype(np.float32),
+    )
+    return images, data
+
+
+def run(add, num_frames: int, rate: float, images, data):
+    """Call add once per control step; returns ms each call took"""
+    times = []
+    period = 1.0 / rate
+    next_step = timeit.default_timer()
+    for _ in range(num_frames):
+        t0 = timeit.default_timer()
+        add({k: v.copy() for k, v in images.items()}, data)
+        times.append(timeit.default_timer() - t0)
+        next_step += period
+        time.sleep(max(0.0, next_step - timeit.default_timer()))
+    return 1000 * np.array(times)
+
+
+@click.command()
+@click.option("--width", default=640)
+@click.option("--height", default=480)
+@click.option("--num-frames", default=50)
+@click.option("--rate", default=10.0, help="Control loop frequency in Hz")
+@click.option("--num-workers", default=2)
+@click.option("--queue-size", default=16)
+def main(width, height, num_frames, rate, num_workers, queue_size):
+    """Time spent on the control thread per recorded frame, writing synchronously with DataWriter versus through AsyncFrameWriter with each backpressure policy."""
+    rng = np.random.default_rng(0)
+    images, data = make_frame(width, height, rng)
+    print(f"{width}x{height} at {rate} Hz, {num_frames} frames")
+    print(
+        f"{'writer':>12} {'p50 ms':>8} {'p99 ms':>8} {'max ms':>8} {'written':>8} {'dropped':>8} {'late':>5} {'latency ms':>11}"
+    )
+    with tempfile.TemporaryDirectory() as tmpdir:
+        writer = DataWriter(os.path.join(tmpdir, "sync.h5"))
+
+        def add_sync(images, data):
+            writer.add_img_frame(**images)
+            writer.add_frame(**data)
+
+        times = run(add_sync, num_frames, rate, images, data)
+        writer.write_trial("trial")
+        print(
+            f"{'sync':>12} {np.median(times):8.2f} {np.percentile(times, 99):8.2f} {times.max():8.2f} {num_frames:8d}"
+        )
+
+        for policy in BACKPRESSURE_POLICIES:
+            writer = DataWriter(os.path.join(tmpdir, policy + ".h5"))
+            async_writer = AsyncFrameWriter(
+                writer,
+                num_workers=num_workers,
+                queue_size=queue_size,
+                backpressure=policy,
+            )
+            times = run(async_writer.add_frame, num_frames, rate, images, data)
+            async_writer.write_trial("trial")
+            async_writer.close()
+            stats = async_writer.get_stats()
+            print(
+                f"{policy:>12} {np.median(times):8.2f} {np.percentile(times, 99):8.2f} {times.max():8.2f} {stats['written']:8d} {stats['dropped']:8d} {stats['late']:5d} {stats['mean_latency_ms']:11.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
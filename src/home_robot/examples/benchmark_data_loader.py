@@ -0,0 +1,93 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+#
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+import os
+import tempfile
+import timeit
+
+import click
+import numpy as np
+import torch
+
+from home_robot.utils.data_tools.loader import DatasetBase
+from home_robot.utils.data_tools.writer import DataWriter
+
+
+class ImageDataset(DatasetBase):
+    def get_datum(self, trial, idx):
+        return {
+            "pos": trial["pos"][idx],
+            "rgb": trial.get_img("rgb", idx, rgb=True),
+            "depth": trial.get_img("depth", idx, depth=True),
+        }
+
+
+def write_files(dirname: str, num_files: int, num_trials: int, num_frames: int):
+    """Files of trials with smooth rgb and depth images and a few temporal keys"""
+    rng = np.random.default_rng(0)
+    ys, xs = np.mgrid[:120, :160]
+    for i in range(num_files):
+        writer = DataWriter(f"data_{i}.h5", dirname)
+        for _ in range(num_trials):
+            for t in range(num_frames):
+                rgb = np.stack([(xs + t) % 256, ys, (xs + ys) % 256], axis=-1)
+                rgb = rgb + rng.integers(0, 8, rgb.shape)
+                depth = 1000 + 5 * xs + rng.integers(0, 20, xs.shape)
+                writer.add_frame(pos=rng.random(3), vel=rng.random(3))
+                writer.add_img_frame(
+                    rgb=rgb.astype(np.uint8), depth=depth.astype(np.uint16)
+                )
+            writer.write_trial()
+
+
+@click.command()
+@click.option("--num-files", default=20, help="Number of h5 files")
+@click.option("--num-trials", default=10, help="Trials per file")
+@click.option("--num-frames", default=20, help="Frames per trial")
+@click.option("--num-workers", default=2, help="DataLoader workers")
+def main(num_files: int, num_trials: int, num_frames: int, num_workers: int):
+    """Compare dataset start-up with and without the on-disk index, and iterating with and without background decoding, in the main process and in forked DataLoader workers."""
+    dirname = tempfile.mkdtemp()
+    write_files(dirname, num_files, num_trials, num_frames)
+    print(f"{num_files} files x {num_trials} trials x {num_frames} frames")
+
+    t = timeit.timeit(lambda: ImageDataset(dirname, use_index=False), number=1)
+    print(f"start-up, no index:    {t * 1000:8.1f} ms")
+    t = timeit.timeit(lambda: ImageDataset(dirname), number=1)
+    print(f"start-up, index built: {t * 1000:8.1f} ms")
+    t = timeit.timeit(lambda: ImageDataset(dirname), number=1)
+    print(f"start-up, index read:  {t * 1000:8.1f} ms")
+
+    for num_decode_threads in [0, 2]:
+        dataset = ImageDataset(dirname, num_decode_threads=num_decode_threads)
+        expected = ImageDataset(dirname, use_index=False)
+        for i in [0, len(dataset) // 2, len(dataset) - 1]:
+            assert np.array_equal(dataset[i]["rgb"], expected[i]["rgb"])
+
+        def read_all():
+            for i in range(len(dataset)):
+                dataset[i]
+
+        t = timeit.timeit(read_all, number=1)
+        print(
+            f"sequential, {num_decode_threads} decode threads: {t / len(dataset) * 1000:6.2f} ms/item"
+        )
+        # Workers are forked after the parent has opened the files
+        loader = torch.utils.data.DataLoader(
+            dataset, batch_size=16, num_workers=num_workers
+        )
+
+        def load_all():
+            for batch in loader:
+                pass
+
+        t = timeit.timeit(load_all, number=1)
+        print(
+            f"DataLoader, {num_workers} workers, {num_decode_threads} decode threads: {t / len(dataset) * 1000:6.2f} ms/item"
+        )
+        dataset.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+#
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+import os
+import tempfile
+import timeit
+
+import click
+import numpy as np
+
+import home_robot.utils.data_tools.image as image
+from home_robot.utils.data_tools.loader import DatasetBase
+from home_robot.utils.data_tools.migrate_images import migrate_file
+from home_robot.utils.data_tools.writer import DataWriter
+
+
+class ImageDataset(DatasetBase):
+    def get_datum(self, trial, idx):
+        return trial.get_img("rgb", idx), trial.get_img("depth", idx)
+
+
+def make_frames(num_frames: int, height: int, width: int):
+    """Smooth, slowly moving rgb and depth images with some sensor noise"""
+    rng = np.random.default_rng(0)
+    ys, xs = np.mgrid[:height, :width]
+    for t in range(num_frames):
+        shift = 2 * t
+        rgb = np.stack(
+            [(xs + shift) % 256, (ys + shift) % 256, (xs + ys) % 256], axis=-1
+        ) + rng.integers(0, 8, (height, width, 3))
+        depth = 1000 + 5 * ((xs + shift) % 400) + rng.integers(0, 20, (height, width))
+        yield rgb.astype(np.uint8), depth.astype(np.uint16)
+
+
+@click.command()
+@click.option("--num-frames", default=300, help="Frames in the trial")
+@click.option("--height", default=240, help="Image height")
+@click.option("--width", default=320, help="Image width")
+@click.option("--num-random", default=200, help="Random frame reads to time")
+def main(num_frames: int, height: int, width: int, num_random: int):
+    """Write one trial of rgb and depth in each image layout, then compare file size, write time, sequential and random reads through Trial.get_img, and migrating the png file."""
+    tmpdir = tempfile.mkdtemp()
+    frames = list(make_frames(num_frames, height, width))
+    order = np.random.default_rng(1).integers(0, num_frames, num_random)
+    print(f"{num_frames} frames of {height}x{width} rgb + depth")
+    print(
+        f"{'layout':>10} {'size (MB)':>10} {'write (s)':>10} {'seq (ms/frame)':>15} {'random (ms/frame)':>18}"
+    )
+    for layout, compression in [
+        (image.PNG_LAYOUT, None),
+        (image.ARRAY_LAYOUT, "gzip"),
+        (image.ARRAY_LAYOUT, "lzf"),
+        (image.ENCODED_LAYOUT, None),
+    ]:
+        name = layout if compression is None else f"{layout}/{compression}"
+        dirname = os.path.join(tmpdir, name.replace("/", "_"))
+        writer = DataWriter(
+            "data.h5",
+            dirname,
+            image_layout=layout,
+            image_compression=compression,
+        )
+
+        def write():
+            for rgb, depth in frames:
+                writer.add_frame(t=0)
+                writer.add_img_frame(rgb=rgb, depth=depth)
+            writer.write_trial()
+
+        write_time = timeit.timeit(write, number=1)
+        size = os.path.getsize(writer.filename) / 2**20
+        dataset = ImageDataset(dirname)
+        trial = dataset.trials[0]
+        for i in [0, num_frames - 1]:
+            assert np.array_equal(trial.get_img("rgb", i), frames[i][0])
+            assert np.array_equal(trial.get_img("depth", i), frames[i][1])
+        seq_time = timeit.timeit(
+            lambda: [dataset[i] for i in range(len(dataset))], number=1
+        )
+        random_time = timeit.timeit(lambda: [dataset[i] for i in order], number=1)
+        print(
+            f"{name:>10} {size:>10.1f} {write_time:>10.2f} {seq_time / num_frames * 1000:>15.2f} {random_time / num_random * 1000:>18.2f}"
+        )
+
+    src = os.path.join(tmpdir, image.PNG_LAYOUT, "data.h5")
+    for layout in [image.ARRAY_LAYOUT, image.ENCODED_LAYOUT]:
+        dst = os.path.join(tmpdir, f"migrated_{layout}.h5")
+        migrate_time = timeit.timeit(lambda: migrate_file(src, dst, layout), number=1)
+        print(f"migrate png -> {layout}: {migrate_time:.2f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+#
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+import timeit
+
+import click
+import numpy as np
+import skimage.morphology
+import torch
+
+from home_robot.utils.morphology import binary_dilation, dilate_mask
+
+
+@click.command()
+@click.option("--size", default=500, help="Width and height of the 2d map in cells")
+@click.option("--density", default=0.01, help="Fraction of cells that are set")
+@click.option("--repeat", default=10, help="Number of runs to average over")
+def main(size: int = 500, density: float = 0.01, repeat: int = 10):
+    """Compare disk dilation with the conv-based binary_dilation, the cached-kernel conv and the distance transform, on a full map and on a region of interest."""
+    rng = np.random.default_rng(0)
+    mask = torch.from_numpy(rng.random((size, size)) < density)
+    roi = (size // 4, size // 2, size // 4, size // 2)
+    print(f"map {size}x{size}, density {density}, roi {roi}")
+    print(f"{'radius':>6} {'reference':>10} {'conv':>10} {'edt':>10} {'roi':>10}  (ms)")
+    for radius in [1, 2, 4, 8, 12, 24]:
+
+        def reference():
+            kernel = (
+                torch.from_numpy(skimage.morphology.disk(radius))
+                .unsqueeze(0)
+                .unsqueeze(0)
+                .float()
+            )
+            return binary_dilation(mask.float().unsqueeze(0).unsqueeze(0), kernel)[
+                0, 0
+            ].bool()
+
+        expected = reference()
+        assert torch.equal(dilate_mask(mask, radius, method="conv"), expected)
+        assert torch.equal(dilate_mask(mask, radius, method="edt"), expected)
+        times = [
+            timeit.timeit(fn, number=repeat) / repeat * 1000
+            for fn in [
+                reference,
+                lambda: dilate_mask(mask, radius, method="conv"),
+                lambda: dilate_mask(mask, radius, method="edt"),
+                lambda: dilate_mask(mask, radius, roi=roi),
+            ]
+        ]
+        print(f"{radius:>6} " + " ".join(f"{t:>10.2f}" for t in times))
+
+
+if __name__ == "__main__":
+    main()
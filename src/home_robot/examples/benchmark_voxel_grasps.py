@@ -0,0 +1,94 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+#
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+import timeit
+
+import click
+import numpy as np
+
+from home_robot.manipulation.voxel_grasps import (
+    GRASP_INNER_RAD,
+    GRASP_OUTER_RAD,
+    MIN_INNER_POINTS,
+    VoxelGraspGenerator,
+    _compute_grasp_scores,
+)
+
+
+def reference_grasp_scores(occ_map: np.ndarray):
+    """Per-cell slice sums, as voxel grasp scoring used to be done"""
+    outer_area = 2 * (GRASP_OUTER_RAD - GRASP_INNER_RAD) ** 2
+    xmax, ymax = occ_map.shape
+    x_score_map = np.zeros_like(occ_map)
+    y_score_map = np.zeros_like(occ_map)
+    for i, j in zip(*np.nonzero(occ_map)):
+        x_outer_lo = max(i - GRASP_OUTER_RAD, 0)
+        x_inner_lo = max(i - GRASP_INNER_RAD, 0)
+        x_inner_hi = min(i + GRASP_INNER_RAD + 1, xmax)
+        x_outer_hi = min(i + GRASP_OUTER_RAD + 1, xmax)
+        y_outer_lo = max(j - GRASP_OUTER_RAD, 0)
+        y_inner_lo = max(j - GRASP_INNER_RAD, 0)
+        y_inner_hi = min(j + GRASP_INNER_RAD + 1, ymax)
+        y_outer_hi = min(j + GRASP_OUTER_RAD + 1, ymax)
+        area_mid = np.sum(occ_map[x_inner_lo:x_inner_hi, y_inner_lo:y_inner_hi])
+        area_x = np.sum(occ_map[x_outer_lo:x_inner_lo, y_inner_lo:y_inner_hi]) + np.sum(
+            occ_map[x_inner_hi:x_outer_hi, y_inner_lo:y_inner_hi]
+        )
+        area_y = np.sum(occ_map[x_inner_lo:x_inner_hi, y_outer_lo:y_inner_lo]) + np.sum(
+            occ_map[x_inner_lo:x_inner_hi, y_inner_hi:y_outer_hi]
+        )
+        mid_pop_score = max(1.0, area_mid / MIN_INNER_POINTS)
+        x_score_map[i, j] = mid_pop_score - area_x / outer_area
+        y_score_map[i, j] = mid_pop_score - area_y / outer_area
+    return x_score_map, y_score_map
+
+
+def make_box_cloud(size: float, num_points: int, rng: np.random.Generator):
+    """Points on the top and sides of a size x size x size/2 box sitting 0.5m above the ground"""
+    xyz = rng.random((num_points, 3)) * [size, size, size / 2]
+    # Snap a third of the points to the top face, the rest to the four sides
+    face = rng.integers(0, 3, num_points)
+    xyz[face == 0, 2] = size / 2
+    xyz[face == 1, 0] = np.round(xyz[face == 1, 0] / size) * size
+    xyz[face == 2, 1] = np.round(xyz[face == 2, 1] / size) * size
+    xyz[:, 2] += 0.5
+    return xyz
+
+
+@click.command()
+@click.option("--num-points", default=50000, help="Points per synthetic object")
+@click.option("--repeat", default=5, help="Number of runs to average over")
+def main(num_points: int = 50000, repeat: int = 5):
+    """Time voxel grasp scoring against the per-cell reference, and full grasp generation, on synthetic box-shaped objects of increasing size. tests/home_robot/manipulation/test_voxel_grasps.py checks that both give the same scores."""
+    rng = np.random.default_rng(0)
+    generator = VoxelGraspGenerator(in_base_frame=True, verbose=False)
+    print(f"{num_points} points per object")
+    print(
+        f"{'size (m)':>8} {'cells':>8} {'reference':>10} {'scores':>10} {'get_grasps':>11}  (ms)"
+    )
+    for size in [0.05, 0.1, 0.2, 0.4]:
+        xyz = make_box_cloud(size, num_points, rng)
+        rgb = np.full_like(xyz, 128)
+        segmap = np.ones(num_points)
+        camera_pose = np.eye(4)
+
+        # Scoring alone, on a top-down occupancy map of the object
+        cells = ((xyz[:, :2] - xyz[:, :2].min(axis=0)) / 0.01).astype(int)
+        occ_map = np.zeros(cells.max(axis=0) + 1)
+        occ_map[cells[:, 0], cells[:, 1]] = 1
+        times = [
+            timeit.timeit(fn, number=repeat) / repeat * 1000
+            for fn in [
+                lambda: reference_grasp_scores(occ_map),
+                lambda: _compute_grasp_scores(occ_map),
+                lambda: generator.get_grasps(xyz, rgb, segmap, camera_pose),
+            ]
+        ]
+        print(
+            f"{size:>8.2f} {occ_map.size:>8} {times[0]:>10.2f} {times[1]:>10.2f} {times[2]:>11.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
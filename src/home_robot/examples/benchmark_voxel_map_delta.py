@@ -0,0 +1,90 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+#
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+import pickle
+import timeit
+
+import click
+import numpy as np
+import torch
+
+from home_robot.mapping.voxel import SparseVoxelMap, VoxelMapReplica
+
+
+def make_room(size: float, height: float, num_points: int, rng: np.random.Generator):
+    """Points on the floor and walls of a square room"""
+    floor = rng.random((num_points // 2, 3)) * [size, size, 0]
+    walls = []
+    for axis in [0, 1]:
+        for side in [0.0, size]:
+            wall = rng.random((num_points // 8, 3)) * [size, size, height]
+            wall[:, axis] = side
+            walls.append(wall)
+    return np.concatenate([floor] + walls).astype(np.float32)
+
+
+def observe(room, xy, heading, points_per_frame, rng, max_range: float = 3.0):
+    """Noisy points of the room within max_range in a 90 degree cone in front of the robot"""
+    offset = room[:, :2] - xy
+    distance = np.linalg.norm(offset, axis=-1)
+    angle = np.arctan2(offset[:, 1], offset[:, 0]) - heading
+    angle = (angle + np.pi) % (2 * np.pi) - np.pi
+    visible = np.flatnonzero((distance < max_range) & (np.abs(angle) < np.pi / 4))
+    idx = rng.choice(visible, min(points_per_frame, len(visible)), replace=False)
+    xyz = room[idx] + rng.normal(0, 0.005, (len(idx), 3)).astype(np.float32)
+    return torch.from_numpy(xyz), torch.from_numpy(rng.random((len(idx), 3))).float()
+
+
+@click.command()
+@click.option("--num-frames", default=60)
+@click.option("--points-per-frame", default=20000)
+@click.option("--resolution", default=0.05, help="Voxel size in meters")
+@click.option("--room-size", default=12.0, help="Room width in meters")
+def main(num_frames: int, points_per_frame: int, resolution: float, room_size: float):
+    """Bytes sent per frame to keep a remote copy of a SparseVoxelMap current, sending the whole map every time versus sending deltas, for a robot driving around a room. Also times get_delta and VoxelMapReplica.apply, and checks that the replica ends up matching the map."""
+    rng = np.random.default_rng(0)
+    room = make_room(room_size, 2.5, 2000000, rng)
+    voxel_map = SparseVoxelMap(resolution=resolution, use_instance_memory=False)
+    replica = VoxelMapReplica()
+    print(
+        f"{'frame':>5} {'voxels':>8} {'full KB':>9} {'delta KB':>9} {'delta ms':>9} {'apply ms':>9}"
+    )
+    totals = np.zeros(4)
+    for i in range(num_frames):
+        # Drive around a circle, looking along it
+        angle = 2 * np.pi * i / num_frames
+        xy = room_size / 2 + room_size / 4 * np.array([np.cos(angle), np.sin(angle)])
+        xyz, rgb = observe(room, xy, angle + np.pi / 2, points_per_frame, rng)
+        pose = torch.eye(4)
+        pose[:2, 3] = torch.from_numpy(xy)
+        voxel_map.add(camera_pose=pose, rgb=rgb, xyz=xyz, xyz_frame="world")
+
+        full_size = len(pickle.dumps(voxel_map.get_delta(0)))
+        t0 = timeit.default_timer()
+        delta = voxel_map.get_delta(replica.version)
+        t1 = timeit.default_timer()
+        data = pickle.dumps(delta)
+        t2 = timeit.default_timer()
+        replica.apply(pickle.loads(data))
+        t3 = timeit.default_timer()
+        row = np.array([full_size, len(data), t1 - t0, t3 - t2])
+        totals += row
+        if i % 10 == 9 or i == num_frames - 1:
+            print(
+                f"{i:5d} {len(replica):8d} {row[0] / 1024:9.1f} {row[1] / 1024:9.1f} {row[2] * 1000:9.2f} {row[3] * 1000:9.2f}"
+            )
+
+    keys, order = torch.sort(replica.get_keys())
+    points, _, weights, _ = voxel_map.voxel_pcd.get_pointcloud()
+    assert torch.equal(keys, voxel_map.voxel_pcd._keys)
+    assert torch.allclose(replica.get_pointcloud()[0][order], points)
+    assert torch.allclose(replica.get_pointcloud()[2][order], weights)
+    totals /= num_frames
+    print(
+        f"mean: full {totals[0] / 1024:.1f} KB, delta {totals[1] / 1024:.1f} KB ({totals[0] / totals[1]:.1f}x less), get_delta {totals[2] * 1000:.2f} ms, apply {totals[3] * 1000:.2f} ms"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -16,10 +16,24 @@ from home_robot.mapping import SparseVoxelMap, SparseVoxelMapNavigationSpace
     "--input-path",
     type=click.Path(),
     default="output.pkl",
-    help="Input path with default value 'output.npy'",
+    help="Input path with default value 'output.npy'; a directory is read as a snapshot",
+)
+@click.option(
+    "--output-snapshot",
+    type=click.Path(),
+    default="",
+    help="If set, also write the map as a snapshot directory here",
+)
+@click.option(
+    "--stage",
+    type=click.Choice([""] + SparseVoxelMap.REBUILD_STAGES),
+    default="",
+    help="Rebuild the map from frames only up to this stage instead of adding every frame; for snapshots, replays frames instead of loading the stored map",
 )
 def main(
     input_path,
+    output_snapshot: str = "",
+    stage: str = "",
     voxel_size: float = 0.01,
     show_maps: bool = True,
 ):
@@ -27,7 +41,18 @@ def main(
     input_path = Path(input_path)
     print("Loading:", input_path)
     voxel_map = SparseVoxelMap(resolution=voxel_size)
-    voxel_map.read_from_pickle(input_path)
+    stage = stage if stage else None
+    if input_path.is_dir():
+        timings = voxel_map.read_snapshot(
+            input_path, replay=stage is not None, stage=stage
+        )
+    else:
+        timings = voxel_map.read_from_pickle(input_path, stage=stage)
+    if timings is not None:
+        print("Rebuild timings:", timings)
+    if output_snapshot:
+        print("Writing snapshot:", output_snapshot)
+        voxel_map.write_snapshot(output_snapshot)
     voxel_map.show(instances=True)
     voxel_map.get_2d_map(debug=show_maps)
 
@@ -20,6 +20,7 @@ from home_robot.agent.multitask import Parameters
 from home_robot.core.robot import GraspClient, RobotClient
 from home_robot.mapping.instance import Instance
 from home_robot.mapping.voxel import (
+    PlanCache,
     SparseVoxelMap,
     SparseVoxelMapNavigationSpace,
     plan_to_frontier,
@@ -166,7 +167,8 @@ class RobotAgent:
 
         # Dictionary storing attempts to visit each object
         self._object_attempts = {}
-        self._cached_plans = {}
+        # Successful plans to instances, reused until the map changes along them
+        self._plan_cache = PlanCache(self.voxel_map)
 
         # Create a simple motion planner
         self.planner = Shortcut(RRTConnect(self.space, self.space.is_valid))
@@ -444,13 +446,17 @@ class RobotAgent:
         start: np.ndarray,
         verbose: bool = True,
         instance_id: int = -1,
+        max_goals: int = 20,
+        num_sectors: int = 8,
     ) -> PlanResult:
         """Move to a specific instance. Goes until a motion plan is found.
 
         Args:
             instance(Instance): an object in the world
             verbose(bool): extra info is printed
-            instance_ind(int): if >= 0 we will try to use this to retrieve stored plans"""
+            instance_id(int): if >= 0 we will try to use this to retrieve stored plans
+            max_goals(int): plan to at most this many of the best ranked goals before giving up
+            num_sectors(int): spread the goals tried over this many directions around the instance"""
 
         res = None
         if verbose:
@@ -461,29 +467,34 @@ class RobotAgent:
         if not start_is_valid:
             return PlanResult(success=False, reason="invalid start state")
 
+        if instance_id >= 0:
+            res = self._plan_cache.get(instance_id, start)
+            if res is not None:
+                if verbose:
+                    print(f"- retrieving cached plan for {instance_id}")
+                return res
+
+        # Score all candidate goals around the instance in one pass. They are
+        # interleaved across sides, so one blocked side does not use up max_goals
         mask = self.voxel_map.mask_from_bounds(instance.bounds)
-        for goal in self.space.sample_near_mask(mask, radius_m=0.7):
+        goals = self.space.get_ranked_goals_near_mask(
+            mask, radius_m=0.7, num_sectors=num_sectors
+        )
+        if goals is None:
+            return PlanResult(success=False, reason="no valid goals near instance")
+        for goal in goals[:max_goals]:
             goal = goal.cpu().numpy()
-            print("       Start:", start)
-            print("Sampled Goal:", goal)
-            show_goal = np.zeros(3)
-            show_goal[:2] = goal[:2]
-            goal_is_valid = self.space.is_valid(goal)
-            print("Start is valid:", start_is_valid)
-            print(" Goal is valid:", goal_is_valid)
-            if not goal_is_valid:
-                print(" -> resample goal.")
-                continue
+            if verbose:
+                print("       Start:", start)
+                print("Sampled Goal:", goal)
 
             # plan to the sampled goal
-            if instance_id >= 0 and instance_id in self._cached_plans:
-                if verbose:
-                    print(f"- retrieving cached plan for {instance_id}")
-                res = self._cached_plans[instance_id]
-            else:
-                res = self.planner.plan(start, goal)
-            print("Found plan:", res.success)
+            res = self.planner.plan(start, goal)
+            if verbose:
+                print("Found plan:", res.success)
             if res.success:
+                if instance_id >= 0:
+                    self._plan_cache.put(instance_id, start, res)
                 break
         if res is None:
             return PlanResult(success=False, reason="no valid plans found")
@@ -620,18 +631,22 @@ class RobotAgent:
             goal=goal, threshold=threshold, debug=debug
         )
         reachable_matches = []
-        self._cached_plans = {}
         start = self.robot.get_base_pose()
-        for i, instance in matches:
-            # compute its mask
+        if self.guarantee_instance_is_reachable:
+            # One geodesic distance field answers reachability for every instance.
+            # It ignores the robot footprint, so this only rules out instances
+            # that are certainly unreachable; planning to the rest can still fail.
+            reachable = self.space.reachability.get_reachable(
+                [instance.bounds for _, instance in matches], start, radius_m=0.7
+            )
+        else:
+            reachable = [True] * len(matches)
+        for (i, instance), is_reachable in zip(matches, reachable):
             # see if this mask's area is explored and reachable from the current robot
-            if self.guarantee_instance_is_reachable:
-                res = self.plan_to_instance(instance, start, instance_id=i)
-                self._cached_plans[i] = res
-                if res.success:
-                    reachable_matches.append(instance)
-            else:
+            if is_reachable:
                 reachable_matches.append(instance)
+            elif debug:
+                print(f"- instance {i} is not reachable from {start}")
         return reachable_matches
 
     def filter_matches(
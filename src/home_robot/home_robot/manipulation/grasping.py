@@ -9,14 +9,20 @@ from typing import List, Optional, Tuple
 import numpy as np
 
 from home_robot.motion.stretch import HelloStretchIdx, HelloStretchKinematics
+from home_robot.motion.stretch_reachability import StretchReachabilityMap
 
 
 class SimpleGraspMotionPlanner(object):
     """Simple top-down grasp motion planner for the Stretch."""
 
-    def __init__(self, robot: HelloStretchKinematics, pregrasp_height=1.2):
+    def __init__(
+        self,
+        robot: HelloStretchKinematics,
+        pregrasp_height=1.2,
+        reachability_map: Optional[StretchReachabilityMap] = None,
+    ):
         """
-        Solve IK
+        Solve IK. If a reachability map is provided, grasps outside of it are rejected before solving.
         """
         if not isinstance(robot, HelloStretchKinematics):
             raise RuntimeError(
@@ -24,6 +30,7 @@ class SimpleGraspMotionPlanner(object):
             )
         self.robot = robot
         self.pregrasp_height = pregrasp_height
+        self.reachability_map = reachability_map
 
     def plan_to_grasp(
         self,
@@ -40,6 +47,14 @@ class SimpleGraspMotionPlanner(object):
         assert len(grasp_pose) == 2
         grasp_pos, grasp_quat = grasp_pose
 
+        # Cheap lookup before spending time on IK
+        if (
+            self.reachability_map is not None
+            and not self.reachability_map.is_reachable(grasp_pos)[0]
+        ):
+            print("-> grasp is outside of the reachable workspace")
+            return None
+
         # Save initial waypoint to return to
         # TODO: remove this if we decide we do not need it
         # initial_pt = ("initial", initial_cfg, False)
@@ -18,6 +18,7 @@ from home_robot.core.interfaces import (
     Observations,
 )
 from home_robot.motion.stretch import STRETCH_STANDOFF_DISTANCE
+from home_robot.motion.stretch_reachability import StretchReachabilityMap
 from home_robot.utils.image import smooth_mask
 from home_robot.utils.rotation import get_angle_to_pos
 
@@ -42,6 +43,7 @@ class HeuristicPlacePolicy(nn.Module):
         placement_drop_distance: float = 0.4,
         debug_visualize_xyz: bool = False,
         verbose: bool = False,
+        reachability_map: Optional[StretchReachabilityMap] = None,
     ):
         """
         Parameters:
@@ -50,6 +52,7 @@ class HeuristicPlacePolicy(nn.Module):
             placement_drop_distance: distance from placement point that we add as a margin
             debug_visualize_xyz: whether to display point clouds for debugging
             verbose: whether to print debug statements
+            reachability_map: precomputed arm reachability, used for the height limits of the reachability check
         """
         super().__init__()
         self.timestep = 0
@@ -59,6 +62,7 @@ class HeuristicPlacePolicy(nn.Module):
         self.erosion_kernel = np.ones((5, 5), np.uint8)
         self.placement_drop_distance = placement_drop_distance
         self.verbose = verbose
+        self.reachability_map = reachability_map
 
     def reset(self):
         self.timestep = 0
@@ -113,7 +117,16 @@ class HeuristicPlacePolicy(nn.Module):
         # Whether or not I can extend the robot's arm in order to reach each point
         if arm_reachability_check:
             # filtering out unreachable points based on Y and Z coordinates of voxels (Z is up)
-            height_reachable_mask = (pcd_base_coords[0, :, :, 2] < agent_height).to(int)
+            if self.reachability_map is not None:
+                min_height, max_height = self.reachability_map.get_height_range()
+                height = pcd_base_coords[0, :, :, 2]
+                height_reachable_mask = (
+                    (height >= min_height) & (height <= max_height)
+                ).to(int)
+            else:
+                height_reachable_mask = (pcd_base_coords[0, :, :, 2] < agent_height).to(
+                    int
+                )
             height_reachable_mask = torch.stack([height_reachable_mask] * 3, axis=-1)
             pcd_base_coords = pcd_base_coords * height_reachable_mask
 
@@ -8,11 +8,11 @@ from typing import Dict, Iterable, List, Optional, Tuple
 
 import click
 import numpy as np
-import rospy
+import torch
 from scipy.spatial.transform import Rotation as R
 
-from home_robot.mapping.voxel import SparseVoxelMap
-from home_robot_hw.ros.grasp_helper import GraspServer
+from home_robot.motion.stretch_reachability import StretchReachabilityMap
+from home_robot.utils.voxel import VoxelDownsampler
 
 VERTICAL_GRIPPER_QUAT = [
     0.70988,
@@ -65,48 +65,68 @@ def _visualize_grasps(
     show_point_cloud(xyz, rgb_colored, orig=np.zeros(3), grasps=grasps)
 
 
-def _compute_grasp_scores(
-    xy: Iterable[float], occ_map: np.ndarray
-) -> Tuple[float, float]:
-    """Computes grasp scores given an occupancy map and a center point.
+def _box_sums(
+    integral: np.ndarray,
+    x_lo: np.ndarray,
+    x_hi: np.ndarray,
+    y_lo: np.ndarray,
+    y_hi: np.ndarray,
+) -> np.ndarray:
+    """Sums of occ_map[x_lo:x_hi, y_lo:y_hi] for arrays of box bounds, from a zero-padded integral image of occ_map"""
+    return (
+        integral[x_hi, y_hi]
+        - integral[x_lo, y_hi]
+        - integral[x_hi, y_lo]
+        + integral[x_lo, y_lo]
+    )
+
+
+def _compute_grasp_scores(occ_map: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Computes grasp score maps for every occupied cell of an occupancy map at once.
 
     Args:
-        xy (Tuple[float, float]): The center point coordinates as a tuple of two float values.
         occ_map (np.ndarray): The occupancy map as a 2D NumPy array.
 
     Returns:
-        Tuple[float, float]: A tuple of two float values representing the grasp scores for
-        the X and Y directions, respectively.
+        Tuple[np.ndarray, np.ndarray]: Two maps the shape of occ_map holding the grasp
+        scores for the X and Y directions, respectively. Unoccupied cells score 0.
 
-    Computes two grasp scores, for grasps along the X and Y directions.
+    Computes two grasp scores per cell, for grasps along the X and Y directions.
     Scores are determined by two factors:
      - How populated the center region is.
      - How empty the surrounding regions are.
+    All region sums are box sums over an integral image, so the cost is linear in the
+    map size regardless of the grasp radii.
     """
     outer_area = 2 * (GRASP_OUTER_RAD - GRASP_INNER_RAD) ** 2
 
-    xmax = occ_map.shape[0]
-    ymax = occ_map.shape[1]
-    x_outer_lo = max(xy[0] - GRASP_OUTER_RAD, 0)
-    x_inner_lo = max(xy[0] - GRASP_INNER_RAD, 0)
-    x_inner_hi = min(xy[0] + GRASP_INNER_RAD + 1, xmax)
-    x_outer_hi = min(xy[0] + GRASP_OUTER_RAD + 1, xmax)
-    y_outer_lo = max(xy[1] - GRASP_OUTER_RAD, 0)
-    y_inner_lo = max(xy[1] - GRASP_INNER_RAD, 0)
-    y_inner_hi = min(xy[1] + GRASP_INNER_RAD + 1, ymax)
-    y_outer_hi = min(xy[1] + GRASP_OUTER_RAD + 1, ymax)
+    xmax, ymax = occ_map.shape
+    integral = np.zeros((xmax + 1, ymax + 1))
+    integral[1:, 1:] = occ_map.cumsum(axis=0).cumsum(axis=1)
+
+    x, y = np.nonzero(occ_map)
+    x_outer_lo = np.maximum(x - GRASP_OUTER_RAD, 0)
+    x_inner_lo = np.maximum(x - GRASP_INNER_RAD, 0)
+    x_inner_hi = np.minimum(x + GRASP_INNER_RAD + 1, xmax)
+    x_outer_hi = np.minimum(x + GRASP_OUTER_RAD + 1, xmax)
+    y_outer_lo = np.maximum(y - GRASP_OUTER_RAD, 0)
+    y_inner_lo = np.maximum(y - GRASP_INNER_RAD, 0)
+    y_inner_hi = np.minimum(y + GRASP_INNER_RAD + 1, ymax)
+    y_outer_hi = np.minimum(y + GRASP_OUTER_RAD + 1, ymax)
 
-    area_mid = np.sum(occ_map[x_inner_lo:x_inner_hi, y_inner_lo:y_inner_hi])
-    area_x_lo = np.sum(occ_map[x_outer_lo:x_inner_lo, y_inner_lo:y_inner_hi])
-    area_x_hi = np.sum(occ_map[x_inner_hi:x_outer_hi, y_inner_lo:y_inner_hi])
-    area_y_lo = np.sum(occ_map[x_inner_lo:x_inner_hi, y_outer_lo:y_inner_lo])
-    area_y_hi = np.sum(occ_map[x_inner_lo:x_inner_hi, y_inner_hi:y_outer_hi])
+    area_mid = _box_sums(integral, x_inner_lo, x_inner_hi, y_inner_lo, y_inner_hi)
+    area_x_lo = _box_sums(integral, x_outer_lo, x_inner_lo, y_inner_lo, y_inner_hi)
+    area_x_hi = _box_sums(integral, x_inner_hi, x_outer_hi, y_inner_lo, y_inner_hi)
+    area_y_lo = _box_sums(integral, x_inner_lo, x_inner_hi, y_outer_lo, y_inner_lo)
+    area_y_hi = _box_sums(integral, x_inner_lo, x_inner_hi, y_inner_hi, y_outer_hi)
 
-    mid_pop_score = max(1.0, area_mid / MIN_INNER_POINTS)
-    x_grasp_score = mid_pop_score - (area_x_lo + area_x_hi) / outer_area
-    y_grasp_score = mid_pop_score - (area_y_lo + area_y_hi) / outer_area
+    mid_pop_score = np.maximum(1.0, area_mid / MIN_INNER_POINTS)
+    x_score_map = np.zeros_like(occ_map, dtype=float)
+    y_score_map = np.zeros_like(occ_map, dtype=float)
+    x_score_map[x, y] = mid_pop_score - (area_x_lo + area_x_hi) / outer_area
+    y_score_map[x, y] = mid_pop_score - (area_y_lo + area_y_hi) / outer_area
 
-    return x_grasp_score, y_grasp_score
+    return x_score_map, y_score_map
 
 
 def _filter_grasps(score_map: np.ndarray, grasp_direction: int) -> np.ndarray:
@@ -148,28 +168,56 @@ def _filter_grasps(score_map: np.ndarray, grasp_direction: int) -> np.ndarray:
     return score_map
 
 
-def _generate_grasp(xyz: np.ndarray, rz: float) -> np.ndarray:
-    """Generate a vertical grasp pose given grasp location and z orientation.
+def _generate_grasps(xyz: np.ndarray, rz: np.ndarray) -> np.ndarray:
+    """Generate vertical grasp poses given grasp locations and z orientations.
 
     Args:
-        xyz (numpy.ndarray): A 3D numpy array representing the (x, y, z) position of the grasp location.
-        rz (float): A float representing the z orientation of the grasp.
+        xyz (numpy.ndarray): An (N, 3) numpy array of (x, y, z) grasp locations.
+        rz (numpy.ndarray): An (N,) numpy array of z orientations of the grasps.
 
     Returns:
-        numpy.ndarray: A 4x4 numpy array representing the vertical grasp pose.
+        numpy.ndarray: An (N, 4, 4) numpy array of vertical grasp poses.
 
     Description:
-    Given the grasp location and the z orientation, this function generates a vertical grasp pose by calculating the
-    rotation matrix based on the z orientation and then setting the translation vector as the grasp location. The
-    function returns the 4x4 homogeneous transformation matrix representing the vertical grasp pose.
+    Given the grasp locations and the z orientations, this function generates vertical grasp poses by calculating the
+    rotation matrices based on the z orientations and then setting the translation vectors as the grasp locations. The
+    function returns the 4x4 homogeneous transformation matrices representing the vertical grasp poses.
     """
-    grasp = np.zeros([4, 4])
-    grasp[:3, :3] = (
-        R.from_quat(np.array(VERTICAL_GRIPPER_QUAT)) * R.from_rotvec([0, 0, rz])
+    rz = np.asarray(rz, dtype=float).reshape(-1)
+    rotvecs = np.zeros((len(rz), 3))
+    rotvecs[:, 2] = rz
+    grasps = np.zeros([len(rz), 4, 4])
+    grasps[:, :3, :3] = (
+        R.from_quat(np.array(VERTICAL_GRIPPER_QUAT)) * R.from_rotvec(rotvecs)
     ).as_matrix()
-    grasp[:3, 3] = xyz
+    grasps[:, :3, 3] = xyz
 
-    return grasp
+    return grasps
+
+
+def _extract_grasps(
+    x_score_map: np.ndarray, y_score_map: np.ndarray, orig: np.ndarray, z: float
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Grasps at every cell with a positive filtered score.
+
+    Args:
+        x_score_map: filtered scores of grasps closing along X
+        y_score_map: filtered scores of grasps closing along Y
+        orig: world xy of cell (0, 0)
+        z: height of all grasps
+
+    Returns:
+        (N, 4, 4) grasp poses and (N,) scores. Cells are visited in row-major order, and
+        each yields its x-direction grasp before its y-direction grasp.
+    """
+    score_pairs = np.stack([x_score_map, y_score_map], axis=-1)
+    (valid,) = np.nonzero(score_pairs.reshape(-1) > 0.0)
+    cell_i, cell_j = np.unravel_index(valid // 2, x_score_map.shape)
+    grasp_pos = np.zeros((len(valid), 3))
+    grasp_pos[:, :2] = np.stack([cell_i, cell_j], axis=-1) * VOXEL_RES + orig
+    grasp_pos[:, 2] = z
+    grasp_rz = np.where(valid % 2 == 0, np.pi / 2, 0.0)
+    return _generate_grasps(grasp_pos, grasp_rz), score_pairs.reshape(-1)[valid]
 
 
 class VoxelGraspGenerator(object):
@@ -179,6 +227,7 @@ class VoxelGraspGenerator(object):
     Args:
         in_base_frame (bool): Flag indicating whether the output grasps are in the base frame.
         debug (bool): Flag indicating whether to enable debug mode.
+        reachability_map (StretchReachabilityMap): Optional precomputed arm workspace; grasps outside of it are dropped. Only used when grasps are in the base frame.
 
     Attributes:
         in_base_frame (bool): Flag indicating whether the output grasps are in the base frame.
@@ -186,9 +235,17 @@ class VoxelGraspGenerator(object):
     """
 
     def __init__(
-        self, in_base_frame=True, debug=False, verbose=True, always_generate_grasp=True
+        self,
+        in_base_frame=True,
+        debug=False,
+        verbose=True,
+        always_generate_grasp=True,
+        reachability_map: Optional[StretchReachabilityMap] = None,
     ):
         self.in_base_frame = in_base_frame
+        self.reachability_map = reachability_map
+        # Reused across calls to avoid reallocating scratch buffers
+        self._downsampler = VoxelDownsampler(VOXEL_RES)
         self.debug = debug
         self._verbose = verbose
         self._always_grasp = always_generate_grasp
@@ -236,19 +293,12 @@ class VoxelGraspGenerator(object):
         pc_segment = pc_full[seg_idcs]
         pc_color_segment = pc_colors[seg_idcs]
 
-        # Build voxel map (in abs frame)
-        voxel_map = SparseVoxelMap(
-            resolution=VOXEL_RES, feature_dim=3, use_instance_memory=False
+        # Voxelize the object (in abs frame)
+        xyz, rgb, _ = self._downsampler(
+            torch.from_numpy(pc_segment).float(),
+            rgb=torch.from_numpy(pc_color_segment).float(),
+            camera_pose=torch.from_numpy(camera_pose).float(),
         )
-        voxel_map.add(
-            camera_pose=camera_pose,
-            xyz=pc_segment,
-            rgb=pc_color_segment,
-            xyz_frame="camera",
-        )
-
-        # Extract highest points
-        xyz, rgb = voxel_map.get_xyz_rgb()
         xyz, rgb = xyz.cpu().numpy(), rgb.cpu().numpy()
         if xyz.shape[0] < 1:
             return {}, {}, self.in_base_frame
@@ -266,49 +316,22 @@ class VoxelGraspGenerator(object):
         orig = np.min(xyz_top[:, :2], axis=0)
         far_corner = np.max(xyz_top[:, :2], axis=0)
         occ_map = np.zeros(((far_corner - orig) / VOXEL_RES).astype(int) + 1)
-        for point in xyz_top:
-            i, j = ((point[:2] - orig) / VOXEL_RES).astype(int)
-            occ_map[i, j] = 1
+        cells = ((xyz_top[:, :2] - orig) / VOXEL_RES).astype(int)
+        occ_map[cells[:, 0], cells[:, 1]] = 1
 
         # Compute x-direction and y-direction grasps on the occupancy map
-        x_score_map = np.zeros_like(occ_map)
-        y_score_map = np.zeros_like(occ_map)
-
-        for i in range(occ_map.shape[0]):
-            for j in range(occ_map.shape[1]):
-                if occ_map[i, j] == 0.0:
-                    continue
-
-                x_score, y_score = _compute_grasp_scores((i, j), occ_map)
-                x_score_map[i, j] = x_score
-                y_score_map[i, j] = y_score
-                if self._verbose:
-                    print("[VOXEL GRASPS]", i, j, x_score, y_score)
+        x_score_map, y_score_map = _compute_grasp_scores(occ_map)
+        if self._verbose:
+            print("[VOXEL GRASPS] Num occupied cells =", int(occ_map.sum()))
 
         # Filter grasps
         x_score_map_filtered = _filter_grasps(x_score_map, grasp_direction=0)
         y_score_map_filtered = _filter_grasps(y_score_map, grasp_direction=1)
 
-        scores_raw = []
-        grasps_raw = []
-
         # Extract grasps
-        for i in range(occ_map.shape[0]):
-            for j in range(occ_map.shape[1]):
-                x, y = np.array((i, j)) * VOXEL_RES + orig
-                grasp_pos = np.array([x, y, z_grasp])
-
-                x_score = x_score_map_filtered[i, j]
-                if x_score > 0.0:
-                    grasp = _generate_grasp(grasp_pos, np.pi / 2)
-                    grasps_raw.append(grasp)
-                    scores_raw.append(x_score)
-
-                y_score = y_score_map_filtered[i, j]
-                if y_score > 0.0:
-                    grasp = _generate_grasp(grasp_pos, 0.0)
-                    grasps_raw.append(grasp)
-                    scores_raw.append(y_score)
+        grasps_raw, scores_raw = _extract_grasps(
+            x_score_map_filtered, y_score_map_filtered, orig, z_grasp
+        )
 
         # Add an emergency grasp generator - just try to grab the top or something
         # This will work best on squishy objects
@@ -318,10 +341,20 @@ class VoxelGraspGenerator(object):
             # TODO: mean or median?
             # avg_top_xyz = np.mean(xyz_top, axis=0)
             avg_top_xyz = np.median(xyz_top, axis=0)
-            grasp0 = _generate_grasp(avg_top_xyz, np.pi / 2)
-            grasp1 = _generate_grasp(avg_top_xyz, 0)
-            grasps_raw = [grasp0, grasp1]
-            scores_raw = [0.5, 0.5]
+            grasps_raw = _generate_grasps(
+                np.stack([avg_top_xyz, avg_top_xyz]), np.array([np.pi / 2, 0.0])
+            )
+            scores_raw = np.array([0.5, 0.5])
+
+        # Drop grasps the arm cannot reach, all in one lookup
+        if self.reachability_map is not None and self.in_base_frame:
+            reachable = self.reachability_map.is_reachable(grasps_raw[:, :3, 3])
+            grasps_raw = grasps_raw[reachable]
+            scores_raw = scores_raw[reachable]
+            if len(grasps_raw) == 0:
+                if self._verbose:
+                    print("[VOXEL GRASPS] No reachable grasps")
+                return {}, {}, self.in_base_frame
 
         # Debug and visualization
         if self.debug:
@@ -330,7 +363,7 @@ class VoxelGraspGenerator(object):
 
         # Postprocess grasps into dictionaries
         # (this grasp generator only generates grasps for one object)
-        grasps = {0: np.array(grasps_raw)}
-        scores = {0: np.array(scores_raw)}
+        grasps = {0: grasps_raw}
+        scores = {0: scores_raw}
 
         return grasps, scores, self.in_base_frame
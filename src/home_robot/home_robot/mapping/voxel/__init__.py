@@ -2,6 +2,9 @@
 #
 # This source code is licensed under the MIT license found in the
 # LICENSE file in the root directory of this source tree.
+from .delta import VoxelMapDelta, VoxelMapReplica
+from .plan_cache import PlanCache
 from .planners import plan_to_frontier
+from .reachability import GeodesicReachability
 from .voxel import SparseVoxelMap
 from .voxel_map import SparseVoxelMapNavigationSpace
@@ -0,0 +1,153 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+#
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+"""Incremental updates of a SparseVoxelMap, for keeping remote copies of it current.
+
+SparseVoxelMap.get_delta(since) returns a VoxelMapDelta with the voxels and instances that changed after version since, and VoxelMapReplica applies deltas on the receiving side. Deltas are plain dataclasses of tensors, so they can be pickled and sent as they are.
+"""
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple, Union
+
+import torch
+from torch import Tensor
+
+from home_robot.mapping.instance import Instance
+from home_robot.utils.voxel import VoxelDelta
+
+
+@dataclass
+class InstanceSummary:
+    """What a remote view needs to show an instance, without its views and point cloud"""
+
+    id: int
+    category_id: Optional[int]
+    score: Optional[float]
+    bounds: Optional[Tensor]
+    """3 x 2 mins and maxes"""
+    num_views: int
+
+    @classmethod
+    def from_instance(cls, instance_id: int, instance: Instance) -> "InstanceSummary":
+        category_id, score, bounds = instance.category_id, instance.score, None
+        if instance.bounds is not None:
+            bounds = instance.bounds.detach().cpu().clone()
+        return cls(
+            id=int(instance_id),
+            category_id=None if category_id is None else int(category_id),
+            score=None if score is None else float(score),
+            bounds=bounds,
+            num_views=len(instance.instance_views),
+        )
+
+    def same_as(self, other: "InstanceSummary") -> bool:
+        if (self.id, self.category_id, self.score, self.num_views) != (
+            other.id,
+            other.category_id,
+            other.score,
+            other.num_views,
+        ):
+            return False
+        if self.bounds is None or other.bounds is None:
+            return self.bounds is None and other.bounds is None
+        return torch.equal(self.bounds, other.bounds)
+
+
+@dataclass
+class VoxelMapDelta:
+    """Changes to a SparseVoxelMap between two versions, as returned by SparseVoxelMap.get_delta"""
+
+    since: int
+    """version the delta starts from"""
+    version: int
+    """version the delta brings a replica to"""
+    reset: bool
+    """the map was cleared after since; drop everything before applying"""
+    voxels: VoxelDelta
+    instances: List[InstanceSummary]
+    """added or changed instances"""
+    removed_instance_ids: List[int]
+
+
+class VoxelMapReplica(object):
+    """Copy of a SparseVoxelMap's voxels and instance summaries, kept current by applying deltas from get_delta. Applying a delta costs time in proportion to the size of the delta plus one pass over the voxel keys."""
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        # Version of the last applied delta; 0 asks get_delta for everything
+        self.version = 0
+        self._keys = torch.zeros(0, dtype=torch.long)
+        self._points = torch.zeros(0, 3)
+        self._features = None
+        self._weights = torch.zeros(0)
+        self._rgb = None
+        self.instances: Dict[int, InstanceSummary] = {}
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def apply(self, delta: Union[VoxelMapDelta, VoxelDelta]):
+        """Apply a delta from SparseVoxelMap.get_delta(self.version), or from VoxelizedPointcloud.get_delta for voxels only. Deltas from earlier versions than self.version can be applied too, since they hold current values."""
+        if delta.reset:
+            self.reset()
+        elif delta.since > self.version:
+            raise ValueError(
+                f"delta from version {delta.since} cannot be applied to a replica at version {self.version}; changes in between would be lost"
+            )
+        voxels = delta.voxels if isinstance(delta, VoxelMapDelta) else delta
+        self._apply_voxels(voxels)
+        if isinstance(delta, VoxelMapDelta):
+            for instance_id in delta.removed_instance_ids:
+                self.instances.pop(instance_id, None)
+            for summary in delta.instances:
+                self.instances[summary.id] = summary
+        self.version = delta.version
+
+    def _apply_voxels(self, delta: VoxelDelta):
+        if len(self._keys) == 0:
+            # Nothing to remove or replace, e.g. the first delta after a reset
+            self._keys, self._points, self._weights = (
+                delta.keys.cpu(),
+                delta.points.cpu(),
+                delta.weights.cpu(),
+            )
+            self._features = None if delta.features is None else delta.features.cpu()
+            self._rgb = None if delta.rgb is None else delta.rgb.cpu()
+            return
+        replaced = torch.cat([delta.keys.cpu(), delta.removed_keys.cpu()])
+        keep = ~torch.isin(self._keys, replaced)
+
+        def merge(
+            name: str, old: Optional[Tensor], new: Optional[Tensor]
+        ) -> Optional[Tensor]:
+            if len(delta.keys) == 0:
+                # Only removals; a delta without changed voxels carries no values
+                return None if old is None else old[keep]
+            if (old is None) != (new is None):
+                raise ValueError(
+                    f"delta {'has' if old is None else 'lacks'} {name} that the replica {'lacks' if old is None else 'has'}; the pointcloud was likely replaced without a reset"
+                )
+            if old is None:
+                return None
+            return torch.cat([old[keep], new.cpu()])
+
+        # Check optional fields before changing anything
+        features = merge("features", self._features, delta.features)
+        rgb = merge("rgb", self._rgb, delta.rgb)
+        self._keys = merge("keys", self._keys, delta.keys)
+        self._points = merge("points", self._points, delta.points)
+        self._weights = merge("weights", self._weights, delta.weights)
+        self._features, self._rgb = features, rgb
+
+    def get_pointcloud(self) -> Tuple[Tensor, ...]:
+        """points, features, weights and rgb of all voxels, like VoxelizedPointcloud.get_pointcloud, but in no particular order"""
+        return self._points, self._features, self._weights, self._rgb
+
+    def get_keys(self) -> Tensor:
+        """Voxel keys, in the same order as get_pointcloud"""
+        return self._keys
+
+    def get_instances(self) -> List[InstanceSummary]:
+        return [self.instances[i] for i in sorted(self.instances)]
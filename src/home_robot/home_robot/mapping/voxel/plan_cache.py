@@ -0,0 +1,133 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+#
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+from collections import OrderedDict
+from typing import Hashable, Optional, Tuple
+
+import numpy as np
+import torch
+
+from home_robot.mapping.voxel.voxel import SparseVoxelMap
+from home_robot.motion.base import PlanResult
+from home_robot.utils.morphology import dilate_mask, get_bounds_of_mask
+
+
+class PlanCache:
+    """LRU cache of successful navigation plans, keyed by (instance id, start cell).
+
+    The cache is kept in sync with SparseVoxelMap.version. When the SparseVoxelMap changes, entries are not dropped wholesale: only plans whose trajectory passes within margin_m of newly observed obstacles, or through space that is no longer explored (e.g. after a map reset), are evicted. All other plans are carried over to the new map version.
+    """
+
+    def __init__(
+        self, voxel_map: SparseVoxelMap, max_size: int = 32, margin_m: float = 0.3
+    ):
+        """
+        Args:
+            voxel_map(SparseVoxelMap): map the cached plans were computed on
+            max_size(int): maximum number of plans kept; least recently used are dropped first
+            margin_m(float): how close a new obstacle has to be to a trajectory to invalidate it
+        """
+        self.voxel_map = voxel_map
+        self.max_size = max_size
+        self.margin = int(np.ceil(margin_m / voxel_map.grid_resolution))
+        self.clear()
+
+    def clear(self):
+        """Drop all cached plans"""
+        # (instance id, start cell) -> (plan, grid cells swept by the plan)
+        self._plans = OrderedDict()
+        self._version = None
+        self._obstacles = None
+        self._explored = None
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._plans)
+
+    def _get_cell(self, xy: np.ndarray) -> Optional[Tuple[int, int]]:
+        """Grid cell of a world position, or None if it is outside the map"""
+        grid_xy = self.voxel_map.xy_to_grid_coords(
+            torch.as_tensor(np.asarray(xy)[:2]).float()
+        )
+        if grid_xy is None:
+            return None
+        return int(grid_xy[0]), int(grid_xy[1])
+
+    def _get_trajectory_cells(self, res: PlanResult) -> Optional[np.ndarray]:
+        """Grid cells swept by the xy path of a trajectory, with waypoints interpolated at one-cell spacing"""
+        xy = np.stack([np.asarray(pt.state)[:2] for pt in res.trajectory]).astype(
+            np.float32
+        )
+        grid_xy = self.voxel_map.xy_to_grid_coords(torch.from_numpy(xy))
+        if grid_xy is None:
+            return None
+        grid_xy = grid_xy.cpu().numpy()
+        cells = [grid_xy[:1]]
+        for a, b in zip(grid_xy[:-1], grid_xy[1:]):
+            steps = max(int(np.ceil(np.abs(b - a).max())), 1)
+            t = np.linspace(0, 1, steps + 1)[1:, None]
+            cells.append(a + t * (b - a))
+        return np.unique(np.concatenate(cells).astype(np.int64), axis=0)
+
+    def _sync(self):
+        """Bring the cache up to the current map version, evicting plans whose region changed"""
+        version = self.voxel_map.version
+        if version == self._version:
+            return
+        obstacles, explored = self.voxel_map.get_2d_map()
+        obstacles, explored = obstacles.bool(), explored.bool()
+        if len(self._plans) > 0:
+            if self._obstacles is None or self._obstacles.shape != obstacles.shape:
+                self._plans.clear()
+            else:
+                self._evict_changed(obstacles, explored)
+        self._version = version
+        self._obstacles = obstacles.clone()
+        self._explored = explored.clone()
+
+    def _evict_changed(self, obstacles: torch.Tensor, explored: torch.Tensor):
+        """Drop plans that pass near new obstacles or through cells that are no longer explored"""
+        new_obstacles = obstacles & ~self._obstacles
+        lost = self._explored & ~explored
+        if not new_obstacles.any() and not lost.any():
+            return
+        blocked = lost.clone()
+        # Only dilate around the area that actually changed
+        bounds = get_bounds_of_mask(new_obstacles, margin=self.margin)
+        if bounds is not None:
+            x0, x1, y0, y1 = bounds
+            blocked[x0:x1, y0:y1] |= dilate_mask(new_obstacles, self.margin, roi=bounds)
+        blocked = blocked.cpu().numpy()
+        for key in list(self._plans.keys()):
+            _, cells = self._plans[key]
+            if blocked[cells[:, 0], cells[:, 1]].any():
+                del self._plans[key]
+
+    def get(self, instance_id: Hashable, start: np.ndarray) -> Optional[PlanResult]:
+        """Return a cached plan to instance_id from the cell containing start, if it is still valid on the current map"""
+        self._sync()
+        cell = self._get_cell(start)
+        key = (instance_id, cell)
+        if cell is None or key not in self._plans:
+            self.misses += 1
+            return None
+        self._plans.move_to_end(key)
+        self.hits += 1
+        return self._plans[key][0]
+
+    def put(self, instance_id: Hashable, start: np.ndarray, res: PlanResult):
+        """Store a successful plan to instance_id from start. Failed plans are not cached."""
+        if res is None or not res.success or len(res.trajectory) == 0:
+            return
+        self._sync()
+        cell = self._get_cell(start)
+        cells = self._get_trajectory_cells(res)
+        if cell is None or cells is None:
+            return
+        key = (instance_id, cell)
+        self._plans[key] = (res, cells)
+        self._plans.move_to_end(key)
+        while len(self._plans) > self.max_size:
+            self._plans.popitem(last=False)
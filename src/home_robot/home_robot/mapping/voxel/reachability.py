@@ -0,0 +1,144 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+#
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+import torch
+
+from home_robot.mapping.voxel.voxel import SparseVoxelMap
+from home_robot.navigation_planner.frontier import FrontierTracker
+
+
+class GeodesicReachability:
+    """Answer reachability queries against a SparseVoxelMap with one geodesic distance field per map version.
+
+    The distance field is an FMM solve rooted at the robot's grid cell over traversible space (explored and away from padded obstacles, as maintained by a FrontierTracker). It is recomputed only when the map version or the robot cell changes, so any number of instance and frontier queries in between cost only a lookup over the cells of the query region.
+
+    Traversible space is only padded by the tracker's dilate_obstacle_size, not by the robot footprint, so a passage narrower than the robot can still count as reachable. Queries are an optimistic pre-filter for motion planning: they rule out instances that are cut off from the robot, but a footprint-checked plan to one they accept can still fail.
+    """
+
+    def __init__(self, voxel_map: SparseVoxelMap, frontier_tracker: FrontierTracker):
+        self.voxel_map = voxel_map
+        self.frontier_tracker = frontier_tracker
+        self.reset()
+
+    def reset(self):
+        """Drop the cached distance field"""
+        self._key = None
+        self._distance_field = None
+        # Number of FMM solves performed; useful for checking cache efficiency
+        self.num_solves = 0
+
+    def _get_start_cell(self, start: np.ndarray) -> Tuple[int, int]:
+        """Grid cell of a world [x, y, (theta)] position"""
+        if isinstance(start, np.ndarray):
+            start = torch.from_numpy(start).float()
+        grid_xy = self.voxel_map.xy_to_grid_coords(start[:2])
+        if grid_xy is None:
+            raise ValueError(f"start {start} is outside of the map")
+        return int(grid_xy[0]), int(grid_xy[1])
+
+    def get_distance_field(self, start: np.ndarray) -> np.ndarray:
+        """Geodesic distance in cells from start to every cell of the 2d map; unreachable cells are inf.
+
+        Args:
+            start(np.ndarray): [x, y] or [x, y, theta] of the robot in world coordinates
+        """
+        start_cell = self._get_start_cell(start)
+        key = (self.voxel_map.version, start_cell)
+        if self._key == key:
+            return self._distance_field
+        obstacles, explored = self.voxel_map.get_2d_map()
+        self.frontier_tracker.update(obstacles, explored)
+        self._distance_field = self.frontier_tracker.get_distance_field(start_cell)
+        self._key = key
+        self.num_solves += 1
+        return self._distance_field
+
+    def _get_cells_near_bounds(
+        self, bounds: torch.Tensor, radius_m: float
+    ) -> Optional[Tuple[int, int, int, int]]:
+        """Grid bounds (x0, x1, y0, y1) of a 3d box grown by radius_m, clipped to the map"""
+        radius = radius_m / self.voxel_map.grid_resolution
+        origin = self.voxel_map.grid_origin[:2].cpu().numpy()
+        bounds = bounds.cpu().numpy() if isinstance(bounds, torch.Tensor) else bounds
+        mins = np.floor(
+            bounds[:2, 0] / self.voxel_map.grid_resolution + origin - radius
+        )
+        maxs = np.ceil(bounds[:2, 1] / self.voxel_map.grid_resolution + origin + radius)
+        size = self.voxel_map.grid_size
+        x0, y0 = max(int(mins[0]), 0), max(int(mins[1]), 0)
+        x1, y1 = min(int(maxs[0]) + 1, size[0]), min(int(maxs[1]) + 1, size[1])
+        if x0 >= x1 or y0 >= y1:
+            return None
+        return x0, x1, y0, y1
+
+    def distance_to_bounds(
+        self, bounds: torch.Tensor, start: np.ndarray, radius_m: float = 0.7
+    ) -> float:
+        """Geodesic distance in meters from start to the closest traversible cell within radius_m of an instance's 3d bounds. Costs O(area of the box).
+
+        Args:
+            bounds(Tensor): [3, 2] xyz mins and maxes, as in Instance.bounds
+            start(np.ndarray): robot position in world coordinates
+            radius_m(float): how close to the box the robot has to get
+
+        Returns:
+            distance(float): inf if no cell near the box is reachable
+        """
+        distance_field = self.get_distance_field(start)
+        cells = self._get_cells_near_bounds(bounds, radius_m)
+        if cells is None:
+            return float("inf")
+        x0, x1, y0, y1 = cells
+        distance = distance_field[x0:x1, y0:y1].min()
+        return float(distance) * self.voxel_map.grid_resolution
+
+    def distance_to_mask(self, mask: torch.Tensor, start: np.ndarray) -> float:
+        """Geodesic distance in meters from start to the closest cell of a 2d mask. Costs O(number of cells in the mask) once the field is cached.
+
+        Args:
+            mask(Tensor): [H, W] bool mask in 2d map coordinates
+            start(np.ndarray): robot position in world coordinates
+        """
+        distance_field = self.get_distance_field(start)
+        idx = torch.nonzero(mask, as_tuple=False).cpu().numpy()
+        if idx.shape[0] == 0:
+            return float("inf")
+        distance = distance_field[idx[:, 0], idx[:, 1]].min()
+        return float(distance) * self.voxel_map.grid_resolution
+
+    def distances_to_instances(
+        self,
+        bounds: Sequence[torch.Tensor],
+        start: np.ndarray,
+        radius_m: float = 0.7,
+    ) -> np.ndarray:
+        """Geodesic distances in meters to many instances, all answered from a single distance field"""
+        return np.array([self.distance_to_bounds(b, start, radius_m) for b in bounds])
+
+    def is_reachable(
+        self,
+        bounds: torch.Tensor,
+        start: np.ndarray,
+        radius_m: float = 0.7,
+        max_distance_m: float = float("inf"),
+    ) -> bool:
+        """Check whether the robot can get within radius_m of an instance's 3d bounds, ignoring the robot footprint (see class docstring)"""
+        distance = self.distance_to_bounds(bounds, start, radius_m)
+        return bool(np.isfinite(distance) and distance <= max_distance_m)
+
+    def get_reachable(
+        self,
+        bounds: Sequence[torch.Tensor],
+        start: np.ndarray,
+        radius_m: float = 0.7,
+        max_distance_m: float = float("inf"),
+    ) -> List[bool]:
+        """Check reachability for many instances at once. Optimistic like is_reachable: the robot footprint is not checked."""
+        distances = self.distances_to_instances(bounds, start, radius_m)
+        return [
+            bool(np.isfinite(d) and d <= max_distance_m) for d in distances.tolist()
+        ]
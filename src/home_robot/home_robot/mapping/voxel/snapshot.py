@@ -0,0 +1,266 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+#
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+"""Columnar on-disk snapshots of a SparseVoxelMap.
+
+A snapshot is a directory:
+
+    meta.json           format version, map parameters, frame count, per-frame xyz_frame, stored frame and map fields
+    frames/<field>.npy  every frame's value of one field, flattened and concatenated
+    frames/<field>_offsets.npy  [num_frames + 1] start of each frame in <field>.npy
+    frames/<field>_shapes.npy   [num_frames, ndim] shape of each frame; -1 where a frame has no value
+    map/<name>.npy      final voxel map state: points, features, weights, rgb, mins, maxs, visited, occupancy_keys
+    info.pkl            per-frame extra keyword arguments given to add(), if any were
+
+Arrays are plain .npy files, so frames can be read lazily through memory maps without loading the rest of the session.
+"""
+import json
+import os
+import pickle
+import shutil
+from collections.abc import Sequence
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+import numpy as np
+import torch
+
+SNAPSHOT_FORMAT = "sparse_voxel_map_snapshot"
+SNAPSHOT_VERSION = 1
+
+# Frame fields stored per frame, in the order of the Frame tuple of SparseVoxelMap
+FRAME_FIELDS = [
+    "camera_pose",
+    "camera_K",
+    "xyz",
+    "rgb",
+    "feats",
+    "depth",
+    "instance",
+    "instance_classes",
+    "instance_scores",
+    "base_pose",
+    "full_world_xyz",
+]
+
+# Final voxel map state
+MAP_FIELDS = [
+    "points",
+    "features",
+    "weights",
+    "rgb",
+    "mins",
+    "maxs",
+    "visited",
+    "occupancy_keys",
+]
+
+
+def _to_numpy(value) -> Optional[np.ndarray]:
+    if value is None:
+        return None
+    if isinstance(value, torch.Tensor):
+        return value.detach().cpu().numpy()
+    return np.asarray(value)
+
+
+def write_snapshot(
+    path: str,
+    frames: Sequence,
+    map_state: Dict[str, Any],
+    params: Dict[str, Any],
+):
+    """Write a snapshot directory.
+
+    Args:
+        path: directory to create; a snapshot already in it is replaced
+        frames: sequence of SparseVoxelMap Frame tuples
+        map_state: arrays or tensors for MAP_FIELDS; None values are skipped
+        params: map parameters to record in meta.json
+    """
+    # Invalidate any snapshot already here before touching its files, and drop its
+    # arrays so fields that are now None do not come back when it is read
+    meta_filename = os.path.join(path, "meta.json")
+    if os.path.exists(meta_filename):
+        os.remove(meta_filename)
+    for name in ["frames", "map"]:
+        shutil.rmtree(os.path.join(path, name), ignore_errors=True)
+        os.makedirs(os.path.join(path, name))
+    info_filename = os.path.join(path, "info.pkl")
+    if os.path.exists(info_filename):
+        os.remove(info_filename)
+    num_frames = len(frames)
+    fields = {}
+    for field in FRAME_FIELDS:
+        # Shapes first, so each field is written straight into a preallocated memory map
+        values = [_to_numpy(getattr(frame, field)) for frame in frames]
+        present = [v for v in values if v is not None]
+        if len(present) == 0:
+            continue
+        ndim = present[0].ndim
+        dtype = np.result_type(*[v.dtype for v in present])
+        shapes = np.full((num_frames, ndim), -1, dtype=np.int64)
+        offsets = np.zeros(num_frames + 1, dtype=np.int64)
+        for i, v in enumerate(values):
+            size = 0
+            if v is not None:
+                assert v.ndim == ndim, f"{field} changes dimensions between frames"
+                shapes[i] = v.shape
+                size = v.size
+            offsets[i + 1] = offsets[i] + size
+        data = np.lib.format.open_memmap(
+            os.path.join(path, "frames", field + ".npy"),
+            mode="w+",
+            dtype=dtype,
+            shape=(int(offsets[-1]),),
+        )
+        for i, v in enumerate(values):
+            if v is not None:
+                data[offsets[i] : offsets[i + 1]] = v.reshape(-1)
+        data.flush()
+        del data
+        np.save(os.path.join(path, "frames", field + "_offsets.npy"), offsets)
+        np.save(os.path.join(path, "frames", field + "_shapes.npy"), shapes)
+        fields[field] = {"dtype": dtype.str, "ndim": ndim}
+
+    map_fields = []
+    for name in MAP_FIELDS:
+        value = _to_numpy(map_state.get(name))
+        if value is not None:
+            np.save(os.path.join(path, "map", name + ".npy"), value)
+            map_fields.append(name)
+
+    info = [frame.info for frame in frames]
+    has_info = any(len(frame_info) > 0 for frame_info in info)
+    if has_info:
+        with open(os.path.join(path, "info.pkl"), "wb") as f:
+            pickle.dump(info, f)
+
+    meta = {
+        "format": SNAPSHOT_FORMAT,
+        "version": SNAPSHOT_VERSION,
+        "num_frames": num_frames,
+        "params": params,
+        "frame_fields": fields,
+        "map_fields": map_fields,
+        "xyz_frame": [frame.xyz_frame for frame in frames],
+        "has_info": has_info,
+    }
+    # Written last, and removed above before anything else, so that a snapshot with
+    # meta.json is complete
+    with open(meta_filename, "w") as f:
+        json.dump(meta, f, indent=2)
+
+
+class VoxelMapSnapshot(object):
+    """Read access to a snapshot directory. Frame fields are memory mapped, so opening a snapshot is cheap however many frames it holds, and each frame is only read from disk when it is asked for."""
+
+    def __init__(self, path: str, mmap: bool = True):
+        """
+        Args:
+            path: snapshot directory written by write_snapshot
+            mmap: memory map frame fields; otherwise load them into memory up front
+        """
+        self.path = path
+        meta_filename = os.path.join(path, "meta.json")
+        if not os.path.exists(meta_filename):
+            raise FileNotFoundError(f"No snapshot found at {path}")
+        with open(meta_filename, "r") as f:
+            self.meta = json.load(f)
+        if self.meta.get("format") != SNAPSHOT_FORMAT:
+            raise ValueError(f"{path} is not a SparseVoxelMap snapshot")
+        if self.meta["version"] > SNAPSHOT_VERSION:
+            raise ValueError(
+                f"snapshot version {self.meta['version']} is newer than supported version {SNAPSHOT_VERSION}"
+            )
+        self.params = self.meta["params"]
+        mmap_mode = "r" if mmap else None
+        self._data, self._offsets, self._shapes = {}, {}, {}
+        for field in self.meta["frame_fields"]:
+            prefix = os.path.join(path, "frames", field)
+            self._data[field] = np.load(prefix + ".npy", mmap_mode=mmap_mode)
+            self._offsets[field] = np.load(prefix + "_offsets.npy")
+            self._shapes[field] = np.load(prefix + "_shapes.npy")
+        self._info = None
+
+    def __len__(self) -> int:
+        return self.meta["num_frames"]
+
+    def get_field(self, field: str, idx: int) -> Optional[torch.Tensor]:
+        """One field of frame idx, or None if the frame has no value for it"""
+        if field not in self._data:
+            return None
+        shape = self._shapes[field][idx]
+        if shape[0] < 0:
+            return None
+        start, end = self._offsets[field][idx : idx + 2]
+        # Copy out of the memory map, so the tensor is writable and the file can be closed
+        return torch.from_numpy(np.array(self._data[field][start:end]).reshape(shape))
+
+    def get_info(self, idx: int) -> Dict[str, Any]:
+        """Extra keyword arguments frame idx was added with"""
+        if not self.meta["has_info"]:
+            return {}
+        if self._info is None:
+            with open(os.path.join(self.path, "info.pkl"), "rb") as f:
+                self._info = pickle.load(f)
+        return self._info[idx]
+
+    def get_frame(self, idx: int) -> Dict[str, Any]:
+        """All stored fields of frame idx, plus info and xyz_frame"""
+        if idx < 0:
+            idx += len(self)
+        if idx < 0 or idx >= len(self):
+            raise IndexError(f"frame {idx} out of range for {len(self)} frames")
+        frame = {field: self.get_field(field, idx) for field in FRAME_FIELDS}
+        frame["info"] = self.get_info(idx)
+        frame["xyz_frame"] = self.meta["xyz_frame"][idx]
+        return frame
+
+    def iter_frames(self, start: int = 0, end: Optional[int] = None) -> Iterator:
+        """Frames start to end, as from get_frame"""
+        end = len(self) if end is None else min(end, len(self))
+        for idx in range(start, end):
+            yield self.get_frame(idx)
+
+    def get_map_state(self) -> Dict[str, Optional[torch.Tensor]]:
+        """Final voxel map arrays, as tensors; None for those that were not stored"""
+        stored = self.meta["map_fields"]
+        state = {}
+        for name in MAP_FIELDS:
+            filename = os.path.join(self.path, "map", name + ".npy")
+            state[name] = (
+                torch.from_numpy(np.load(filename)) if name in stored else None
+            )
+        return state
+
+
+class LazyFrameList(Sequence):
+    """List of frames backed by a snapshot, built on access; frames appended later are kept in memory."""
+
+    def __init__(self, snapshot: VoxelMapSnapshot, make_frame: Callable):
+        """
+        Args:
+            snapshot: where the first len(snapshot) frames come from
+            make_frame: turns a get_frame dict into a frame object
+        """
+        self.snapshot = snapshot
+        self.make_frame = make_frame
+        self.appended: List[Any] = []
+
+    def __len__(self) -> int:
+        return len(self.snapshot) + len(self.appended)
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            return [self[i] for i in range(*idx.indices(len(self)))]
+        if idx < 0:
+            idx += len(self)
+        if idx < 0 or idx >= len(self):
+            raise IndexError(f"frame {idx} out of range for {len(self)} frames")
+        if idx >= len(self.snapshot):
+            return self.appended[idx - len(self.snapshot)]
+        return self.make_frame(self.snapshot.get_frame(idx))
+
+    def append(self, frame):
+        self.appended.append(frame)
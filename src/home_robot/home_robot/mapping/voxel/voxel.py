@@ -5,13 +5,13 @@
 import copy
 import logging
 import pickle
+import timeit
 from collections import namedtuple
 from pathlib import Path
 from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
 
 import numpy as np
 import open3d as open3d
-import skimage
 import torch
 import trimesh
 from pytorch3d.structures import Pointclouds
@@ -19,11 +19,17 @@ from torch import Tensor
 
 from home_robot.core.interfaces import Observations
 from home_robot.mapping.instance import Instance, InstanceMemory, InstanceView
+from home_robot.mapping.voxel.delta import InstanceSummary, VoxelMapDelta
+from home_robot.mapping.voxel.snapshot import (
+    LazyFrameList,
+    VoxelMapSnapshot,
+    write_snapshot,
+)
 from home_robot.motion import PlanResult, RobotModel
 from home_robot.perception.encoders import ClipEncoder
 from home_robot.utils.bboxes_3d import BBoxes3D
 from home_robot.utils.data_tools.dict import update
-from home_robot.utils.morphology import binary_dilation, binary_erosion
+from home_robot.utils.morphology import close_mask, dilate_mask
 from home_robot.utils.point_cloud import (
     create_visualization_geometries,
     numpy_to_pcd,
@@ -32,7 +38,7 @@ from home_robot.utils.point_cloud import (
 )
 from home_robot.utils.point_cloud_torch import unproject_masked_depth_to_xyz_coordinates
 from home_robot.utils.visualization import create_disk
-from home_robot.utils.voxel import VoxelizedPointcloud, scatter3d
+from home_robot.utils.voxel import VoxelizedPointcloud, VoxelOccupancyIndex, scatter3d
 
 Frame = namedtuple(
     "Frame",
@@ -96,6 +102,9 @@ class SparseVoxelMap(object):
         use_instance_memory (bool): Whether to create object-centric instance memory.
     """
 
+    # Stages of rebuild(), each including the ones before it
+    REBUILD_STAGES = ["geometry", "maps", "instances"]
+
     DEFAULT_INSTANCE_MAP_KWARGS = dict(
         du_scale=1,
         instance_association="bbox_iou",
@@ -138,16 +147,6 @@ class SparseVoxelMap(object):
         self.obs_max_height = obs_max_height
         self.obs_min_density = obs_min_density
         self.smooth_kernel_size = smooth_kernel_size
-        if self.smooth_kernel_size > 0:
-            self.smooth_kernel = torch.nn.Parameter(
-                torch.from_numpy(skimage.morphology.disk(smooth_kernel_size))
-                .unsqueeze(0)
-                .unsqueeze(0)
-                .float(),
-                requires_grad=False,
-            )
-        else:
-            self.smooth_kernel = None
         self.grid_resolution = grid_resolution
         self.voxel_resolution = resolution
         self.min_depth = min_depth
@@ -162,17 +161,6 @@ class SparseVoxelMap(object):
         self.encoder = encoder
         self.map_2d_device = map_2d_device
 
-        if self.pad_obstacles > 0:
-            self.dilate_obstacles_kernel = torch.nn.Parameter(
-                torch.from_numpy(skimage.morphology.disk(self.pad_obstacles))
-                .unsqueeze(0)
-                .unsqueeze(0)
-                .float(),
-                requires_grad=False,
-            )
-        else:
-            self.dilate_obstacles_kernel = None
-
         # Add points with local_radius to the voxel map at (0,0,0) unless we receive lidar points
         self.add_local_radius_points = add_local_radius_points
         self.local_radius = local_radius
@@ -196,6 +184,9 @@ class SparseVoxelMap(object):
         # Used for tensorized bounds checks
         self._grid_size_t = Tensor(self.grid_size, device=map_2d_device)
 
+        # Changes whenever map contents change; never goes back to an old value
+        self._version = 0
+
         # Init variables
         self.reset()
 
@@ -215,6 +206,10 @@ class SparseVoxelMap(object):
             feature_pool_method="mean",
             **self.voxel_kwargs,
         )
+        # Voxels are stamped with map versions, see get_delta
+        self.voxel_pcd.version = self._version
+        # Occupied voxels for collision checks, updated along with voxel_pcd
+        self.occupancy = VoxelOccupancyIndex(resolution=self.voxel_resolution)
 
         self._seq = 0
         self._2d_last_updated = -1
@@ -230,10 +225,78 @@ class SparseVoxelMap(object):
         self.instances.reset()
 
         self.voxel_pcd.reset()
+        self.occupancy.reset()
+
+        # Last summary of each instance, and the version it last changed at, for get_delta
+        self._instance_summaries: Dict[int, InstanceSummary] = {}
+        self._instance_versions: Dict[int, int] = {}
+        self._removed_instance_versions: Dict[int, int] = {}
 
         # Store 2d map information
         # This is computed from our various point clouds
         self._map2d = None
+        self._increment_version()
+
+    @property
+    def version(self) -> int:
+        """Counter that changes every time the map changes. Anything derived from the map (2d maps, distance fields, plans) can be keyed on it to know when it is stale."""
+        return self._version
+
+    def _increment_version(self):
+        """Move to a new version, past the versions voxel_pcd stamped its changes with"""
+        self._version = max(self._version, self.voxel_pcd.version) + 1
+        self.voxel_pcd.version = self._version
+
+    def _update_instance_versions(self):
+        """Stamp instances that changed since the last call with the current version. Every change to instance memory comes with a new version, so doing this only when a delta is requested still stamps each change with a version after the one it was made in."""
+        summaries = {
+            instance_id: InstanceSummary.from_instance(instance_id, instance)
+            for instance_id, instance in self.instances.instances[0].items()
+        }
+        for instance_id, summary in summaries.items():
+            old = self._instance_summaries.get(instance_id)
+            if old is None or not old.same_as(summary):
+                self._instance_versions[instance_id] = self._version
+                self._removed_instance_versions.pop(instance_id, None)
+        for instance_id in self._instance_summaries.keys() - summaries.keys():
+            self._removed_instance_versions[instance_id] = self._version
+            del self._instance_versions[instance_id]
+        self._instance_summaries = summaries
+
+    def get_delta(self, since: int = 0) -> VoxelMapDelta:
+        """Voxels and instances that were added, changed or removed after version since, for keeping a remote VoxelMapReplica current while sending only what changed.
+
+        Args:
+            since: version of the last delta the receiver applied; 0 for the whole map
+
+        Returns:
+            delta: changes to apply with VoxelMapReplica.apply; delta.version is the since to ask for next time
+        """
+        if self.voxel_pcd.version > self._version:
+            # voxel_pcd was changed directly, e.g. with VoxelizedPointcloud.filter
+            self._increment_version()
+        self._update_instance_versions()
+        voxels = self.voxel_pcd.get_delta(since)
+        instances = [
+            summary
+            for instance_id, summary in self._instance_summaries.items()
+            if voxels.reset or self._instance_versions[instance_id] > since
+        ]
+        removed_instance_ids = []
+        if not voxels.reset:
+            removed_instance_ids = [
+                instance_id
+                for instance_id, version in self._removed_instance_versions.items()
+                if version > since
+            ]
+        return VoxelMapDelta(
+            since,
+            self._version,
+            voxels.reset,
+            voxels,
+            instances,
+            removed_instance_ids,
+        )
 
     def get_instances(self) -> List[Instance]:
         """Return a list of all viewable instances"""
@@ -415,39 +478,21 @@ class SparseVoxelMap(object):
             )
         )
 
-        # filter depth
-        valid_depth = torch.full_like(rgb[:, 0], fill_value=True, dtype=torch.bool)
-        if depth is not None:
-            valid_depth = (depth > self.min_depth) & (depth < self.max_depth)
+        valid_depth = self._get_valid_depth(rgb, depth)
 
         # Add instance views to memory
         if self.use_instance_memory:
-            instance = instance_image.clone()
-
-            self.instances.process_instances_for_env(
-                env_id=0,
-                instance_seg=instance,
-                point_cloud=full_world_xyz.reshape(H, W, 3),
-                image=rgb.permute(2, 0, 1),
-                cam_to_world=camera_pose,
-                instance_classes=instance_classes,
-                instance_scores=instance_scores,
-                background_instance_labels=[self.background_instance_label],
-                valid_points=valid_depth,
-                pose=base_pose,
-                encoder=self.encoder,
-            )
-            self.instances.associate_instances_to_memory()
+            self._add_instance_views(self.observations[-1], valid_depth)
 
         # Add to voxel grid
-        if feats is not None:
-            feats = feats[valid_depth].reshape(-1, feats.shape[-1])
-        rgb = rgb[valid_depth].reshape(-1, 3)
-        world_xyz = full_world_xyz.view(-1, 3)[valid_depth.flatten()]
+        world_xyz, feats, rgb = self._get_valid_points(
+            full_world_xyz, rgb, feats, valid_depth
+        )
 
         # TODO: weights could also be confidence, inv distance from camera, etc
         if world_xyz.nelement() > 0:
             self.voxel_pcd.add(world_xyz, features=feats, rgb=rgb, weights=None)
+            self._add_obstacles(world_xyz)
 
         # TODO: just get this from camera_pose?
         self._update_visited(camera_pose[:3, 3].to(self.map_2d_device))
@@ -456,6 +501,153 @@ class SparseVoxelMap(object):
 
         # Increment sequence counter
         self._seq += 1
+        self._increment_version()
+
+    def _add_obstacles(self, world_xyz: Tensor):
+        """Add points above obs_min_height to the occupancy index, so the floor does not count as an obstacle"""
+        self.occupancy.add(world_xyz[world_xyz[:, 2] > self.obs_min_height])
+
+    def _get_valid_depth(self, rgb: Tensor, depth: Optional[Tensor]) -> Tensor:
+        """Mask of points with usable depth"""
+        valid_depth = torch.full_like(rgb[:, 0], fill_value=True, dtype=torch.bool)
+        if depth is not None:
+            valid_depth = (depth > self.min_depth) & (depth < self.max_depth)
+        return valid_depth
+
+    def _get_valid_points(
+        self,
+        full_world_xyz: Tensor,
+        rgb: Tensor,
+        feats: Optional[Tensor],
+        valid_depth: Tensor,
+    ) -> Tuple[Tensor, Optional[Tensor], Tensor]:
+        """World points, features and colors of a frame that go into the voxel grid"""
+        if feats is not None:
+            feats = feats[valid_depth].reshape(-1, feats.shape[-1])
+        rgb = rgb[valid_depth].reshape(-1, 3)
+        world_xyz = full_world_xyz.view(-1, 3)[valid_depth.flatten()]
+        return world_xyz, feats, rgb
+
+    def _add_instance_views(self, frame: Frame, valid_depth: Tensor):
+        """Extract instance views from a frame and associate them with instance memory"""
+        H, W, _ = frame.rgb.shape
+        self.instances.process_instances_for_env(
+            env_id=0,
+            instance_seg=frame.instance.clone(),
+            point_cloud=frame.full_world_xyz.reshape(H, W, 3),
+            image=frame.rgb.permute(2, 0, 1),
+            cam_to_world=frame.camera_pose,
+            instance_classes=frame.instance_classes,
+            instance_scores=frame.instance_scores,
+            background_instance_labels=[self.background_instance_label],
+            valid_points=valid_depth,
+            pose=frame.base_pose,
+            encoder=self.encoder,
+        )
+        self.instances.associate_instances_to_memory()
+
+    def rebuild(
+        self,
+        stage: str = "maps",
+        batch_size: int = 32,
+        device: Optional[Union[str, torch.device]] = None,
+    ) -> Dict[str, float]:
+        """Rebuild the map from the stored observations, doing only as much work as stage needs. Unlike calling add() for every frame, points from batch_size frames at a time are voxelized together, and instance extraction only runs for the "instances" stage.
+
+        Stages, each including the ones before it:
+            geometry: voxel pointcloud and occupancy index; the visited area is kept as it was
+            maps: also the visited area and the cached 2d obstacle and explored maps
+            instances: also instance memory, one frame at a time; needs instance images
+
+        Voxels are cells of a fixed grid, so batching gives the same voxels as adding frames one at a time; only the order in which points are summed differs.
+
+        Args:
+            stage: one of REBUILD_STAGES
+            batch_size: frames voxelized together
+            device: where to voxelize points; defaults to where they are stored. The rebuilt pointcloud is moved back to where the points are stored.
+
+        Returns:
+            seconds spent in each stage that ran, and in total
+        """
+        if stage not in self.REBUILD_STAGES:
+            raise ValueError(
+                f"unknown rebuild stage {stage}; should be one of {self.REBUILD_STAGES}"
+            )
+        stages = self.REBUILD_STAGES[: self.REBUILD_STAGES.index(stage) + 1]
+        if "instances" in stages and not self.use_instance_memory:
+            raise ValueError("cannot rebuild instances without instance memory")
+        frames = self.observations
+        # Frame poses do not change, so the visited area only needs rebuilding with the maps
+        visited = self._visited
+        self.reset_cache()
+        if "maps" not in stages:
+            self._visited = visited
+        timings = {}
+        storage_device = None
+
+        t0 = timeit.default_timer()
+        for start in range(0, len(frames), batch_size):
+            batch = [
+                frames[i] for i in range(start, min(start + batch_size, len(frames)))
+            ]
+            points, features, colors = [], [], []
+            for frame in batch:
+                valid_depth = self._get_valid_depth(frame.rgb, frame.depth)
+                world_xyz, feats, rgb = self._get_valid_points(
+                    frame.full_world_xyz, frame.rgb, frame.feats, valid_depth
+                )
+                if world_xyz.nelement() > 0:
+                    points.append(world_xyz)
+                    features.append(feats)
+                    colors.append(rgb)
+            if len(points) == 0:
+                continue
+            points = torch.cat(points)
+            colors = torch.cat(colors)
+            features = None if features[0] is None else torch.cat(features)
+            storage_device = points.device
+            if device is not None:
+                points, colors = points.to(device), colors.to(device)
+                if features is not None:
+                    features = features.to(device)
+            self.voxel_pcd.add(points, features=features, rgb=colors, weights=None)
+            self._add_obstacles(points)
+        if device is not None and storage_device is not None:
+            for name in self.voxel_pcd._INTERNAL_TENSORS:
+                value = getattr(self.voxel_pcd, name)
+                if torch.is_tensor(value):
+                    setattr(self.voxel_pcd, name, value.to(storage_device))
+        self._seq += 1
+        timings["geometry"] = timeit.default_timer() - t0
+
+        if "maps" in stages:
+            t0 = timeit.default_timer()
+            for frame in frames:
+                self._update_visited(frame.camera_pose[:3, 3].to(self.map_2d_device))
+                if frame.base_pose is not None:
+                    self._update_visited(frame.base_pose.to(self.map_2d_device))
+            self.get_2d_map()
+            timings["maps"] = timeit.default_timer() - t0
+
+        if "instances" in stages:
+            t0 = timeit.default_timer()
+            for frame in frames:
+                assert (
+                    frame.instance is not None
+                ), "instance images are needed to rebuild instances"
+                valid_depth = self._get_valid_depth(frame.rgb, frame.depth)
+                self._add_instance_views(frame, valid_depth)
+            timings["instances"] = timeit.default_timer() - t0
+
+        self.observations = frames
+        self._increment_version()
+        timings["total"] = sum(timings.values())
+        logger.info(
+            "Rebuilt map from %d frames: %s",
+            len(frames),
+            ", ".join(f"{k} {v:.3f}s" for k, v in timings.items()),
+        )
+        return timings
 
     def mask_from_bounds(self, bounds: np.ndarray, debug: bool = False):
         """create mask from a set of 3d object bounds"""
@@ -558,6 +750,130 @@ class SparseVoxelMap(object):
         with open(filename, "wb") as f:
             pickle.dump(data, f)
 
+    def write_snapshot(self, path: str):
+        """Write all frames and the current voxel map to a snapshot directory (see home_robot.mapping.voxel.snapshot). Frames are stored as flat per-field arrays that can be memory mapped, and the final voxel map is stored as well, so read_snapshot does not need to replay every frame."""
+        points, features, weights, rgb = self.voxel_pcd.get_pointcloud()
+        map_state = dict(
+            points=points,
+            features=features,
+            weights=weights,
+            rgb=rgb,
+            mins=self.voxel_pcd._mins,
+            maxs=self.voxel_pcd._maxs,
+            visited=self._visited,
+            occupancy_keys=self.occupancy.get_keys(),
+        )
+        params = dict(
+            resolution=self.voxel_resolution,
+            feature_dim=self.feature_dim,
+            grid_size=list(self.grid_size),
+            grid_resolution=self.grid_resolution,
+        )
+        write_snapshot(path, self.observations, map_state, params)
+
+    def _frame_from_snapshot(self, frame: Dict[str, Any]) -> Frame:
+        return Frame(
+            frame["camera_pose"],
+            frame["camera_K"],
+            frame["xyz"],
+            frame["rgb"],
+            frame["feats"],
+            frame["depth"],
+            frame["instance"],
+            frame["instance_classes"],
+            frame["instance_scores"],
+            frame["base_pose"],
+            frame["info"],
+            None,
+            frame["full_world_xyz"],
+            xyz_frame=frame["xyz_frame"],
+        )
+
+    def read_snapshot(
+        self,
+        path: str,
+        replay: bool = False,
+        start: int = 0,
+        end: Optional[int] = None,
+        mmap: bool = True,
+        stage: Optional[str] = None,
+        batch_size: int = 32,
+    ) -> Optional[Dict[str, float]]:
+        """Read a snapshot written by write_snapshot. Will clear all currently stored data first.
+
+        By default the voxel map is loaded as it was written, without replaying any frames, and self.observations reads frames from disk only when they are indexed. Instance memory is not part of the snapshot, so it stays empty. With replay=True, frames start to end are added again one at a time, rebuilding everything including instances, like read_from_pickle does; if stage is also given, they are rebuilt with rebuild(stage, batch_size) instead, and its timings are returned.
+
+        Args:
+            path: snapshot directory
+            replay: add frames again instead of loading the stored voxel map
+            start, end: range of frames to replay; only with replay=True
+            mmap: memory map frame data instead of loading it all into memory
+            stage: rebuild stage to replay frames with, see rebuild(); only with replay=True
+            batch_size: frames voxelized together when replaying with a stage
+        """
+        if not replay and (start != 0 or end is not None or stage is not None):
+            raise ValueError(
+                "start, end and stage only apply when replaying frames; pass replay=True, or leave them out to load the stored voxel map"
+            )
+        snapshot = VoxelMapSnapshot(path, mmap=mmap)
+        self.reset_cache()
+        if replay and stage is not None:
+            end = len(snapshot) if end is None else min(end, len(snapshot))
+            self.observations = [
+                self._frame_from_snapshot(snapshot.get_frame(i))
+                for i in range(start, end)
+            ]
+            return self.rebuild(stage, batch_size=batch_size)
+        if replay:
+            self.observations = []
+            for frame in snapshot.iter_frames(start, end):
+                self.add(
+                    camera_pose=frame["camera_pose"],
+                    rgb=frame["rgb"],
+                    xyz=frame["xyz"],
+                    camera_K=frame["camera_K"],
+                    feats=frame["feats"],
+                    depth=frame["depth"],
+                    base_pose=frame["base_pose"],
+                    instance_image=frame["instance"],
+                    instance_classes=frame["instance_classes"],
+                    instance_scores=frame["instance_scores"],
+                    xyz_frame=frame["xyz_frame"],
+                    **frame["info"],
+                )
+            return
+
+        params = snapshot.params
+        if (
+            params["resolution"] != self.voxel_resolution
+            or params["grid_resolution"] != self.grid_resolution
+            or list(params["grid_size"]) != list(self.grid_size)
+        ):
+            raise ValueError(
+                f"snapshot at {path} was written with resolution {params['resolution']}, grid resolution {params['grid_resolution']} and grid size {params['grid_size']}; use replay=True to rebuild it with different ones"
+            )
+        if self.use_instance_memory and len(snapshot) > 0:
+            logger.warning(
+                "Instance memory is not stored in snapshots; use replay=True to rebuild instances"
+            )
+        state = snapshot.get_map_state()
+        if state["points"] is not None:
+            self.voxel_pcd.set_pointcloud(
+                state["points"],
+                state["features"],
+                state["weights"],
+                state["rgb"],
+                state["mins"],
+                state["maxs"],
+            )
+        if state["occupancy_keys"] is not None:
+            self.occupancy.set_keys(state["occupancy_keys"].numpy())
+        if state["visited"] is not None:
+            self._visited = state["visited"].to(self.map_2d_device)
+        self.observations = LazyFrameList(snapshot, self._frame_from_snapshot)
+        self._seq += 1
+        self._increment_version()
+
     def fix_data_type(self, tensor) -> torch.Tensor:
         """make sure tensors are in the right format for this model"""
         # If its empty just hope we're handling that somewhere else
@@ -572,14 +888,21 @@ class SparseVoxelMap(object):
         else:
             raise NotImplementedError("unsupported data type for tensor:", tensor)
 
-    def read_from_pickle(self, filename: str):
-        """Read from a pickle file as above. Will clear all currently stored data first."""
+    def read_from_pickle(
+        self, filename: str, stage: Optional[str] = None, batch_size: int = 32
+    ) -> Optional[Dict[str, float]]:
+        """Read from a pickle file as above. Will clear all currently stored data first.
+
+        By default every frame is added again with add(). If stage is given, frames are loaded first and the map is built with rebuild(stage, batch_size), whose timings are returned.
+        """
         self.reset_cache()
         if isinstance(filename, str):
             filename = Path(filename)
         assert filename.exists(), f"No file found at {filename}"
         with filename.open("rb") as f:
             data = pickle.load(f)
+        if stage is not None:
+            self.observations = []
         for camera_pose, xyz, rgb, feats, depth, base_pose, obs, K, world_xyz in zip(
             data["camera_poses"],
             data["xyz"],
@@ -598,6 +921,30 @@ class SparseVoxelMap(object):
             if feats is not None:
                 feats = self.fix_data_type(feats)
             base_pose = self.fix_data_type(base_pose)
+            if stage is not None:
+                # Only keep the frame; rebuild() processes all of them below
+                instance = None
+                if obs is not None and obs.instance is not None:
+                    instance = self.fix_data_type(obs.instance)
+                self.observations.append(
+                    Frame(
+                        camera_pose,
+                        K,
+                        xyz,
+                        rgb,
+                        feats,
+                        depth,
+                        instance,
+                        None,
+                        None,
+                        base_pose,
+                        {},
+                        obs,
+                        self.fix_data_type(world_xyz),
+                        xyz_frame="camera",
+                    )
+                )
+                continue
             instance = self.fix_data_type(obs.instance)
             self.add(
                 camera_pose=camera_pose,
@@ -610,26 +957,18 @@ class SparseVoxelMap(object):
                 obs=obs,
                 camera_K=K,
             )
+        if stage is not None:
+            return self.rebuild(stage, batch_size=batch_size)
 
-    def recompute_map(self):
+    def recompute_map(
+        self, stage: Optional[str] = None, batch_size: int = 32
+    ) -> Dict[str, float]:
         """Recompute the entire map from scratch instead of doing incremental updates.
-        This is a helper function which recomputes everything from the beginning.
-
-        Currently this will be slightly inefficient since it recreates all the objects incrementally.
+        This is a helper function which recomputes everything from the beginning, using rebuild(). By default this rebuilds instances too if instance memory is used, and otherwise stops at the 2d maps.
         """
-        old_observations = self.observations
-        self.reset_cache()
-        for frame in old_observations:
-            self.add(
-                frame.camera_pose,
-                frame.xyz,
-                frame.rgb,
-                frame.feats,
-                frame.depth,
-                frame.base_pose,
-                frame.obs,
-                **frame.info,
-            )
+        if stage is None:
+            stage = "instances" if self.use_instance_memory else "maps"
+        return self.rebuild(stage, batch_size=batch_size)
 
     def get_2d_map(
         self, debug: bool = False
@@ -671,11 +1010,8 @@ class SparseVoxelMap(object):
         obstacle_voxels = voxels[:, :, min_height:]
         obstacles_soft = torch.sum(obstacle_voxels, dim=-1)
         obstacles = obstacles_soft > self.obs_min_density
-        if self.dilate_obstacles_kernel is not None:
-            obstacles = binary_dilation(
-                obstacles.float().unsqueeze(0).unsqueeze(0),
-                self.dilate_obstacles_kernel,
-            )[0, 0].bool()
+        if self.pad_obstacles > 0:
+            obstacles = dilate_mask(obstacles, self.pad_obstacles)
 
         # Explored area = only floor mass
         # floor_voxels = voxels[:, :, :min_height]
@@ -687,24 +1023,10 @@ class SparseVoxelMap(object):
         explored = explored_soft > 0
 
         if self.smooth_kernel_size > 0:
-            explored = binary_erosion(
-                binary_dilation(
-                    explored.float().unsqueeze(0).unsqueeze(0), self.smooth_kernel
-                ),
-                self.smooth_kernel,
-            )[0, 0].bool()
-            explored = binary_erosion(
-                binary_dilation(
-                    explored.float().unsqueeze(0).unsqueeze(0), self.smooth_kernel
-                ),
-                self.smooth_kernel,
-            )[0, 0].bool()
-            obstacles = binary_erosion(
-                binary_dilation(
-                    obstacles.float().unsqueeze(0).unsqueeze(0), self.smooth_kernel
-                ),
-                self.smooth_kernel,
-            )[0, 0].bool()
+            # Close twice to fill small holes in what we have seen
+            explored = close_mask(explored, self.smooth_kernel_size)
+            explored = close_mask(explored, self.smooth_kernel_size)
+            obstacles = close_mask(obstacles, self.smooth_kernel_size)
 
         if debug:
             import matplotlib.pyplot as plt
@@ -784,11 +1106,25 @@ class SparseVoxelMap(object):
             Octree has K levels, each cube in level k corresponds to a  regular grid of "supervoxels"
             Occupancy can be done for each level in parallel.
         Hard part is converting to KDTreeFlann (or modifying the collision check to run on gpu)
+
+        This builds a new tree on every call; for repeated collision checks use points_in_collision or min_distance, which are answered from the persistent occupancy index.
         """
         points, _, _, rgb = self.voxel_pcd.get_pointcloud()
         pcd = numpy_to_pcd(points.detach().cpu().numpy(), rgb.detach().cpu().numpy())
         return open3d.geometry.KDTreeFlann(pcd)
 
+    def points_in_collision(
+        self, xyz: Union[np.ndarray, Tensor], radius: Union[float, np.ndarray]
+    ) -> np.ndarray:
+        """Check which of [N, 3] world frame points have an occupied voxel within radius (one value or [N,]); returns [N,] bool. Only points above obs_min_height are obstacles."""
+        return self.occupancy.points_in_collision(xyz, radius)
+
+    def min_distance(
+        self, xyz: Union[np.ndarray, Tensor], max_distance: float = np.inf
+    ) -> np.ndarray:
+        """Distance from each of [N, 3] world frame points to the closest occupied voxel; inf where nothing is within max_distance"""
+        return self.occupancy.min_distance(xyz, max_distance)
+
     def show(
         self, instances: bool = True, backend: str = "open3d", **backend_kwargs
     ) -> Tuple[np.ndarray, np.ndarray]:
@@ -914,6 +1250,7 @@ class SparseVoxelMap(object):
 
     def postprocess_instances(self):
         self.instances.global_box_compression_and_nms(env_id=0)
+        self._increment_version()
 
     def _show_open3d(
         self,
@@ -7,19 +7,19 @@ from typing import Optional
 
 import matplotlib.pyplot as plt
 import numpy as np
-import skfmm
-import skimage
-import skimage.morphology
+import scipy.ndimage
 import torch
 
 from home_robot.mapping.voxel import SparseVoxelMap
+from home_robot.mapping.voxel.reachability import GeodesicReachability
 from home_robot.motion import XYT, RobotModel
-from home_robot.utils.geometry import angle_difference, interpolate_angles
+from home_robot.navigation_planner.frontier import FrontierTracker
+from home_robot.utils.geometry import interpolate_angles_array
 from home_robot.utils.morphology import (
-    binary_dilation,
-    binary_erosion,
-    expand_mask,
+    dilate_mask,
+    erode_mask,
     find_closest_point_on_mask,
+    get_bounds_of_mask,
     get_edges,
 )
 
@@ -56,20 +56,16 @@ class SparseVoxelMapNavigationSpace(XYT):
         else:
             self.dof = 2
 
-        self.dilate_explored_kernel = torch.nn.Parameter(
-            torch.from_numpy(skimage.morphology.disk(dilate_frontier_size))
-            .unsqueeze(0)
-            .unsqueeze(0)
-            .float(),
-            requires_grad=False,
-        )
-        self.dilate_obstacles_kernel = torch.nn.Parameter(
-            torch.from_numpy(skimage.morphology.disk(dilate_obstacle_size))
-            .unsqueeze(0)
-            .unsqueeze(0)
-            .float(),
-            requires_grad=False,
+        self.dilate_frontier_size = dilate_frontier_size
+        self.dilate_obstacle_size = dilate_obstacle_size
+
+        # Incrementally updated frontier, shared by all frontier samplers
+        self.frontier_tracker = FrontierTracker(
+            dilate_frontier_size=dilate_frontier_size,
+            dilate_obstacle_size=dilate_obstacle_size,
         )
+        # Robot-rooted geodesic distances, recomputed once per map version
+        self.reachability = GeodesicReachability(self.voxel_map, self.frontier_tracker)
 
     def draw_state_on_grid(
         self, img: np.ndarray, state: np.ndarray, weight: int = 10
@@ -111,6 +107,8 @@ class SparseVoxelMapNavigationSpace(XYT):
             self._oriented_masks.append(mask)
         if show_all:
             plt.show()
+        # Stacked copy of the masks for batched collision checks
+        self._oriented_masks_tensor = torch.stack(self._oriented_masks)
 
     def distance(self, q0: np.ndarray, q1: np.ndarray) -> float:
         """Return distance between q0 and q1."""
@@ -123,25 +121,42 @@ class SparseVoxelMapNavigationSpace(XYT):
             # Measure only to the final goal x/y position
             return np.linalg.norm(q0[:2] - q1[:2])
 
+    def distance_batch(self, qs: np.ndarray, q1: np.ndarray) -> np.ndarray:
+        """distance for each of [N, 3] configurations to q1"""
+        qs = np.asarray(qs)
+        if len(q1) == 3:
+            return np.linalg.norm(qs - q1, axis=-1)
+        else:
+            return np.linalg.norm(qs[:, :2] - q1[:2], axis=-1)
+
     def extend(self, q0: np.ndarray, q1: np.ndarray) -> np.ndarray:
         """extend towards another configuration in this space. Will be either separate or joint depending on if the robot can "strafe":
-        separate: move then rotate
+        separate: rotate towards the goal, move, then rotate to the goal angle; a 2d goal keeps the heading the robot arrives with
         joint: move and rotate all at once."""
         assert len(q0) == 3, f"initial configuration must be 3d, was {q0}"
         assert (
             len(q1) == 3 or len(q1) == 2
         ), f"final configuration can be 2d or 3d, was {q1}"
         if self.extend_mode == "separate":
-            return self._extend_separate(q0, q1)
+            return iter(self._extend_separate_array(q0, q1))
         elif self.extend_mode == "joint":
             # Just default to linear interpolation, does not use rotation_step_size
             return super().extend(q0, q1)
         else:
             raise NotImplementedError(f"not supported: {self.extend_mode=}")
 
-    def _extend_separate(self, q0: np.ndarray, q1: np.ndarray) -> np.ndarray:
-        """extend towards another configuration in this space.
-        TODO: we can set the classes here, right now assuming still np.ndarray"""
+    def extend_array(self, q0: np.ndarray, q1: np.ndarray) -> np.ndarray:
+        """Same as extend, but returns all the intermediate states as one [T, 3] array."""
+        if self.extend_mode == "separate":
+            return self._extend_separate_array(q0, q1)
+        return super().extend_array(q0, q1)
+
+    def _extend_separate_array(self, q0: np.ndarray, q1: np.ndarray) -> np.ndarray:
+        """States of extend in separate mode, computed in one pass: rotate towards the goal, drive in a straight line, rotate to the goal angle. A 2d goal keeps the final heading.
+
+        Returns:
+            states: [T, 3] array of (x, y, theta)
+        """
         assert len(q0) == 3, f"initial configuration must be 3d, was {q0}"
         assert (
             len(q1) == 3 or len(q1) == 2
@@ -149,46 +164,38 @@ class SparseVoxelMapNavigationSpace(XYT):
         dxy = q1[:2] - q0[:2]
         step = dxy / np.linalg.norm(dxy + self.tolerance) * self.step_size
         xy = q0[:2]
-        if np.linalg.norm(q1[:2] - q0[:2]) > self.step_size:
-            # Compute theta looking at new goal point
+        segments = []
+        if np.linalg.norm(dxy) > self.step_size:
+            # Rotate in place to face the goal
             new_theta = math.atan2(dxy[1], dxy[0])
             if new_theta < 0:
                 new_theta += 2 * np.pi
-
-            # TODO: oreint towards the new theta
-            cur_theta = q0[-1]
-            angle_diff = angle_difference(new_theta, cur_theta)
-            while angle_diff > self.rotation_step_size:
-                # Interpolate
-                cur_theta = interpolate_angles(
-                    cur_theta, new_theta, self.rotation_step_size
-                )
-                yield np.array([xy[0], xy[1], cur_theta])
-                angle_diff = angle_difference(new_theta, cur_theta)
-
-            xy = q0[:2] + step
-            # First, turn in the right direction
-            yield np.array([xy[0], xy[1], new_theta])
-            # Now take steps towards the right goal
-            while np.linalg.norm(xy - q1[:2]) > self.step_size:
-                xy = xy + step
-                yield np.array([xy[0], xy[1], new_theta])
-
-            # Update current angle
+            thetas = interpolate_angles_array(
+                q0[-1], new_theta, self.rotation_step_size
+            )
+            segments.append(np.column_stack([np.tile(xy, (len(thetas), 1)), thetas]))
+            # Take the first step, then keep going until within a step of the goal
+            max_steps = int(np.ceil(np.linalg.norm(dxy) / self.step_size)) + 1
+            xys = q0[:2] + np.arange(1, max_steps + 1)[:, None] * step
+            far = np.linalg.norm(xys - q1[:2], axis=-1) > self.step_size
+            num_steps = int(np.argmin(far)) + 1 if not far.all() else max_steps
+            xys = xys[:num_steps]
+            segments.append(np.column_stack([xys, np.full(num_steps, new_theta)]))
+            xy = xys[-1]
             cur_theta = new_theta
         else:
             cur_theta = q0[-1]
 
         # now interpolate to goal angle
-        angle_diff = angle_difference(q1[-1], cur_theta)
-        while angle_diff > self.rotation_step_size:
-            # Interpolate
-            cur_theta = interpolate_angles(cur_theta, q1[-1], self.rotation_step_size)
-            yield np.array([xy[0], xy[1], cur_theta])
-            angle_diff = angle_difference(q1[-1], cur_theta)
+        goal_theta = q1[-1] if len(q1) == 3 else cur_theta
+        thetas = interpolate_angles_array(
+            cur_theta, goal_theta, self.rotation_step_size
+        )
+        segments.append(np.column_stack([np.tile(xy, (len(thetas), 1)), thetas]))
 
         # At the end, rotate into the correct orientation
-        yield q1
+        segments.append(np.array([[q1[0], q1[1], goal_theta]]))
+        return np.concatenate(segments).astype(float)
 
     def _get_theta_index(self, theta: float) -> int:
         """gets the index associated with theta here"""
@@ -204,10 +211,98 @@ class SparseVoxelMapNavigationSpace(XYT):
             theta_idx = 0
         return int(theta_idx)
 
+    def _get_theta_indices(self, theta: torch.Tensor) -> torch.Tensor:
+        """Vectorized version of _get_theta_index for a tensor of angles"""
+        theta = torch.remainder(theta, 2 * np.pi)
+        theta_idx = torch.round(
+            (theta / (2 * np.pi) * self._orientation_resolution) - 0.5
+        ).long()
+        theta_idx[theta_idx >= self._orientation_resolution] = 0
+        theta_idx[theta_idx < 0] = 0
+        return theta_idx
+
     def get_oriented_mask(self, theta: float) -> torch.Tensor:
         theta_idx = self._get_theta_index(theta)
         return self._oriented_masks[theta_idx]
 
+    def _check_footprints(
+        self,
+        grid_xy: torch.Tensor,
+        theta_idx: torch.Tensor,
+        is_safe_threshold: float = 0.95,
+        chunk_size: int = 1024,
+    ) -> torch.Tensor:
+        """Check the oriented robot footprint at many grid cells at once. Same test as is_valid: no obstacles under the footprint, and enough of it explored.
+
+        Args:
+            grid_xy(Tensor): [N, 2] integer grid coordinates of the footprint centers
+            theta_idx(Tensor): [N] orientation bin of each footprint
+
+        Returns:
+            valid(Tensor): [N] bool
+        """
+        obstacles, explored = self.voxel_map.get_2d_map()
+        device = obstacles.device
+        masks = self._oriented_masks_tensor.to(device)
+        dim = masks.shape[-1]
+        half_dim = dim // 2
+
+        # Pad the maps so footprints hanging off the edge count as unsafe
+        height, width = obstacles.shape
+        padded_obstacles = torch.ones(
+            (height + 2 * dim, width + 2 * dim), dtype=torch.bool, device=device
+        )
+        padded_obstacles[dim:-dim, dim:-dim] = obstacles
+        padded_explored = torch.zeros_like(padded_obstacles)
+        padded_explored[dim:-dim, dim:-dim] = explored
+
+        grid_xy = grid_xy.long().to(device) + dim
+        theta_idx = theta_idx.to(device)
+        offsets = torch.arange(dim, device=device) - half_dim
+        valid = torch.zeros(grid_xy.shape[0], dtype=torch.bool, device=device)
+        for start in range(0, grid_xy.shape[0], chunk_size):
+            end = start + chunk_size
+            xs = grid_xy[start:end, 0, None, None] + offsets[None, :, None]
+            ys = grid_xy[start:end, 1, None, None] + offsets[None, None, :]
+            crop_obs = padded_obstacles[xs, ys]
+            crop_exp = padded_explored[xs, ys]
+            mask = masks[theta_idx[start:end]]
+            collision = torch.any((crop_obs & mask).flatten(1), dim=-1)
+            p_is_safe = torch.sum(((crop_exp & mask) | ~mask).flatten(1), dim=-1) / (
+                dim * dim
+            )
+            valid[start:end] = ~collision & (p_is_safe > is_safe_threshold)
+        return valid
+
+    def is_valid_batch(
+        self,
+        states: torch.Tensor,
+        is_safe_threshold: float = 0.95,
+    ) -> torch.Tensor:
+        """Check many [x, y, theta] states for collisions at once.
+
+        Args:
+            states(Tensor): [N, 3] states in world coordinates
+
+        Returns:
+            valid(Tensor): [N] bool, matching is_valid() for every state
+        """
+        if isinstance(states, np.ndarray):
+            states = torch.from_numpy(states)
+        states = states.float().reshape(-1, 3)
+        # Same conversion as xy_to_grid_coords, but for all states at once
+        grid_xy = (states[:, :2] / self.voxel_map.grid_resolution) + (
+            self.voxel_map.grid_origin[:2]
+        )
+        in_bounds = torch.all(
+            (grid_xy >= 0) & (grid_xy < self.voxel_map._grid_size_t), dim=-1
+        )
+        max_xy = self.voxel_map._grid_size_t.long() - 1
+        grid_xy = torch.minimum(grid_xy.long().clamp(min=0), max_xy)
+        theta_idx = self._get_theta_indices(states[:, 2])
+        valid = self._check_footprints(grid_xy, theta_idx, is_safe_threshold)
+        return valid.cpu() & in_bounds.cpu()
+
     def is_valid(
         self,
         state: torch.Tensor,
@@ -278,38 +373,84 @@ class SparseVoxelMapNavigationSpace(XYT):
 
         return valid
 
-    def sample_near_mask(
+    def get_ranked_goals_near_mask(
         self,
         mask: torch.Tensor,
         radius_m: float = 0.7,
-        max_tries: int = 1000,
-        verbose: bool = True,
-        debug: bool = False,
         look_at_any_point: bool = False,
-    ) -> Optional[np.ndarray]:
-        """Sample a position near the mask and return.
+        clearance_weight: float = 1.0,
+        max_clearance_m: float = 0.5,
+        is_safe_threshold: float = 0.95,
+        num_sectors: int = 0,
+        debug: bool = False,
+    ) -> Optional[torch.Tensor]:
+        """Score every candidate position near a mask in one pass and return the valid ones, best first.
+
+        Candidates are all explored, obstacle-free cells within radius_m of the mask, each oriented towards the mask. They are checked against the oriented robot footprint, then ranked by distance to the mask minus clearance_weight times the (capped) distance to the closest obstacle.
+
+        The best goals usually sit next to each other on one side of the target. With num_sectors set, candidates are binned by their angle around the mask center and the ranking takes the best goal of every sector, then the second best of every sector, and so on, so that any prefix of it approaches the target from all sides.
 
         Args:
+            mask(Tensor): [H, W] bool mask of the target in the 2d map
+            radius_m(float): how far from the mask goals may be
             look_at_any_point(bool): robot should look at the closest point on target mask instead of average pt
-        """
+            clearance_weight(float): how much to prefer goals away from obstacles
+            max_clearance_m(float): clearance beyond this distance is not rewarded
+            num_sectors(int): if > 0, interleave the ranking across this many angular sectors around the mask
 
+        Returns:
+            goals(Tensor): [K, 3] valid xyt goals in world coordinates, ranked best first; or None if there are none
+        """
         obstacles, explored = self.voxel_map.get_2d_map()
 
-        # Extract edges from our explored mask
-
-        # TODO: we might still need this, but should set it separately when not exploring
-        # less_explored = binary_erosion(
-        #     explored.float().unsqueeze(0).unsqueeze(0), self.dilate_explored_kernel
-        # )[0, 0]
-
         # Radius computed from voxel map measurements
-        radius = np.ceil(radius_m / self.voxel_map.grid_resolution)
-        expanded_mask = expand_mask(mask, radius)
-
-        # TODO: was this:
-        # expanded_mask = expanded_mask & less_explored & ~obstacles
+        radius = int(np.ceil(radius_m / self.voxel_map.grid_resolution))
+        # Only dilate around the mask itself
+        expanded_mask = torch.zeros_like(explored, dtype=torch.bool)
+        bounds = get_bounds_of_mask(mask, margin=radius)
+        if bounds is not None:
+            x0, x1, y0, y1 = bounds
+            expanded_mask[x0:x1, y0:y1] = dilate_mask(mask, radius, roi=bounds)
         expanded_mask = expanded_mask & explored & ~obstacles
 
+        mask_indices = torch.nonzero(mask, as_tuple=False)
+        valid_indices = torch.nonzero(expanded_mask, as_tuple=False)
+        if valid_indices.size(0) == 0 or mask_indices.size(0) == 0:
+            print("[VOXEL MAP: sampling] No valid goals near mask!")
+            return None
+
+        # Distance from every candidate to the target, and the point to look at
+        points = valid_indices.float()
+        mask_points = mask_indices.float()
+        closest_dists = torch.zeros(points.shape[0])
+        closest_points = torch.zeros_like(points)
+        for start in range(0, points.shape[0], 1024):
+            dists = torch.cdist(points[start : start + 1024], mask_points)
+            closest_dists[start : start + 1024], idx = dists.min(dim=-1)
+            closest_points[start : start + 1024] = mask_points[idx]
+        if look_at_any_point:
+            outside_points = closest_points
+        else:
+            outside_points = mask_points.mean(dim=0, keepdim=True)
+        delta = outside_points - points
+        theta = torch.remainder(torch.atan2(delta[:, 1], delta[:, 0]), 2 * np.pi)
+
+        # Clearance from obstacles, computed only around the candidates
+        clearance_cells = int(np.ceil(max_clearance_m / self.voxel_map.grid_resolution))
+        x0, x1, y0, y1 = get_bounds_of_mask(expanded_mask, margin=clearance_cells)
+        free = ~obstacles[x0:x1, y0:y1].cpu().numpy()
+        clearance = scipy.ndimage.distance_transform_edt(free)
+        clearance = torch.from_numpy(
+            clearance[valid_indices[:, 0] - x0, valid_indices[:, 1] - y0]
+        ).float()
+        clearance = torch.clamp(clearance, max=clearance_cells)
+
+        # Convert back to world coordinates and check the full footprint
+        xyt = torch.zeros(points.shape[0], 3)
+        xyt[:, :2] = self.voxel_map.grid_coords_to_xy(points)
+        xyt[:, 2] = theta
+        valid = self.is_valid_batch(xyt, is_safe_threshold=is_safe_threshold)
+
         if debug:
             import matplotlib.pyplot as plt
 
@@ -321,57 +462,48 @@ class SparseVoxelMapNavigationSpace(XYT):
             )
             plt.show()
 
-        # Where can the robot go?
-        valid_indices = torch.nonzero(expanded_mask, as_tuple=False)
-        if valid_indices.size(0) == 0:
-            print("[VOXEL MAP: sampling] No valid goals near mask!")
+        if not torch.any(valid):
+            print("[VOXEL MAP: sampling] No collision-free goals near mask!")
             return None
-        if not look_at_any_point:
-            mask_indices = torch.nonzero(mask, as_tuple=False)
-            outside_point = mask_indices.float().mean(dim=0)
-
-        # maximum number of tries
-        for i in range(max_tries):
-            random_index = torch.randint(valid_indices.size(0), (1,))
-            point_grid_coords = valid_indices[random_index]
-
-            if look_at_any_point:
-                outside_point = find_closest_point_on_mask(
-                    mask, point_grid_coords.float()
-                )
-
-            # convert back
-            point = self.voxel_map.grid_coords_to_xy(point_grid_coords)
-            if point is None:
-                print("[VOXEL MAP: sampling] ERR:", point, point_grid_coords)
-                continue
-            if outside_point is None:
-                print(
-                    "[VOXEL MAP: sampling] ERR finding closest pt:",
-                    point,
-                    point_grid_coords,
-                    "closest =",
-                    outside_point,
-                )
-                continue
-            theta = math.atan2(
-                outside_point[1] - point_grid_coords[0, 1],
-                outside_point[0] - point_grid_coords[0, 0],
+        score = (
+            closest_dists[valid] - clearance_weight * clearance[valid]
+        ) * self.voxel_map.grid_resolution
+        order = torch.argsort(score)
+        if num_sectors > 0:
+            # Rank within each sector, then sort by that rank with score breaking ties
+            around = points[valid][order] - mask_points.mean(dim=0)
+            angle = torch.remainder(torch.atan2(around[:, 1], around[:, 0]), 2 * np.pi)
+            sector = (
+                (angle / (2 * np.pi) * num_sectors).long().clamp(max=num_sectors - 1)
             )
+            one_hot = torch.nn.functional.one_hot(sector, num_sectors)
+            rank = (one_hot.cumsum(dim=0) * one_hot).sum(dim=-1) - 1
+            order = order[torch.argsort(rank * len(order) + torch.arange(len(order)))]
+        return xyt[valid][order]
 
-            # Ensure angle is in 0 to 2 * PI
-            if theta < 0:
-                theta += 2 * np.pi
-
-            xyt = torch.zeros(3)
-            xyt[:2] = point
-            xyt[2] = theta
+    def sample_near_mask(
+        self,
+        mask: torch.Tensor,
+        radius_m: float = 0.7,
+        max_tries: int = 1000,
+        verbose: bool = True,
+        debug: bool = False,
+        look_at_any_point: bool = False,
+    ) -> Optional[np.ndarray]:
+        """Sample a position near the mask and return. Yields valid goals in order of preference, as ranked by get_ranked_goals_near_mask.
 
-            # Check to see if this point is valid
+        Args:
+            look_at_any_point(bool): robot should look at the closest point on target mask instead of average pt
+        """
+        goals = self.get_ranked_goals_near_mask(
+            mask, radius_m=radius_m, look_at_any_point=look_at_any_point, debug=debug
+        )
+        if goals is None:
+            return None
+        for i, xyt in enumerate(goals[:max_tries]):
             if verbose:
-                print("[VOXEL MAP: sampling]", radius, i, "sampled", xyt)
-            if self.is_valid(xyt, verbose=verbose):
-                yield xyt
+                print("[VOXEL MAP: sampling]", i, "sampled", xyt)
+            yield xyt
 
         # We failed to find anything useful
         return None
@@ -385,14 +517,19 @@ class SparseVoxelMapNavigationSpace(XYT):
         verbose: bool = False,
         step_dist: float = 0.5,
         min_dist: float = 0.5,
+        candidates_per_segment: int = 10,
     ) -> Optional[torch.Tensor]:
         """Sample a valid location on the current frontier using FMM planner to compute geodesic distance. Returns points in order until it finds one that's valid.
 
+        Frontier cells are maintained incrementally by the FrontierTracker and grouped into segments; segments are ranked with a single geodesic solve from the robot and candidate viewpoints for all of them are computed in one batch.
+
         Args:
             xyt(np.ndrray): [x, y, theta] of the agent; must be of size 2 or 3.
             max_tries(int): number of attempts to make for rejection sampling
             debug(bool): show visualizations of frontiers
-            step_dist(float): how far apart in geo dist these points should be
+            step_dist(float): within one frontier segment, skip candidates less than this much farther from the robot than the last one tried, in geodesic distance in grid cells; candidates on different segments are never skipped
+            min_dist(float): ignore frontier cells closer than this to the robot, in grid cells
+            candidates_per_segment(int): how many viewpoints to try on each frontier segment
         """
 
         assert (
@@ -400,123 +537,61 @@ class SparseVoxelMapNavigationSpace(XYT):
         ), f"xyt must be of size 2 or 3 instead of {len(xyt)}"
 
         obstacles, explored = self.voxel_map.get_2d_map()
-        # Extract edges from our explored mask
-        obstacles = binary_dilation(
-            obstacles.float().unsqueeze(0).unsqueeze(0), self.dilate_obstacles_kernel
-        )[0, 0].bool()
-        # Get the masks from our 3d map
-        edges = get_edges(explored)
+        self.frontier_tracker.update(obstacles, explored)
 
-        # Do not explore obstacles any more
-        traversible = explored & ~obstacles
-        frontier_edges = edges & ~obstacles
-        expanded_frontier = binary_dilation(
-            frontier_edges.float().unsqueeze(0).unsqueeze(0),
-            self.dilate_explored_kernel,
-        )[0, 0].bool()
-        outside_frontier = expanded_frontier & ~explored
-        frontier = expanded_frontier & ~obstacles & explored
+        start_x, start_y = self.voxel_map.xy_to_grid_coords(xyt[:2]).int().cpu().numpy()
+        if debug:
+            print("--- Coordinates ---")
+            print(f"{xyt=}")
+            print(f"{start_x=}, {start_y=}")
+
+        distance_map = self.reachability.get_distance_field(xyt)
+        grid_xyt, distances, segment_ids = self.frontier_tracker.get_viewpoints(
+            (start_x, start_y),
+            candidates_per_segment=candidates_per_segment,
+            min_dist=min_dist,
+            distance_field=distance_map,
+        )
 
         if debug:
             import matplotlib.pyplot as plt
 
             plt.subplot(221)
-            print("obstacles")
             plt.imshow(obstacles.cpu().numpy())
+            plt.title("obstacles")
             plt.subplot(222)
             plt.imshow(explored.bool().cpu().numpy())
             plt.title("explored")
             plt.subplot(223)
-            plt.imshow((traversible + frontier).cpu().numpy())
-            plt.title("traversible + frontier")
+            plt.imshow(self.frontier_tracker.labels)
+            plt.title("frontier segments")
             plt.subplot(224)
-            plt.imshow((frontier_edges).cpu().numpy())
-            plt.title("just frontiers")
-            plt.show()
-
-        # from scipy.ndimage.morphology import distance_transform_edt
-        m = np.ones_like(traversible)
-        start_x, start_y = self.voxel_map.xy_to_grid_coords(xyt[:2]).int().cpu().numpy()
-        if debug:
-            print("--- Coordinates ---")
-            print(f"{xyt=}")
-            print(f"{start_x=}, {start_y=}")
-
-        m[start_x, start_y] = 0
-        m = np.ma.masked_array(m, ~traversible)
-        distance_map = skfmm.distance(m, dx=1)
-        frontier_map = distance_map.copy()
-        # Masks are the areas we are ignoring - ignore everything but the frontiers
-        frontier_map.mask = np.bitwise_or(frontier_map.mask, ~frontier.cpu().numpy())
-
-        # Get distances of frontier points
-        distances = frontier_map.compressed()
-        xs, ys = np.where(~frontier_map.mask)
-
-        if debug:
-            plt.subplot(121)
-            plt.imshow(distance_map, interpolation="nearest")
+            plt.imshow(np.where(np.isfinite(distance_map), distance_map, 0))
             plt.title("Distance to start")
-            plt.axis("off")
-
-            plt.subplot(122)
-            plt.imshow(frontier_map, interpolation="nearest")
-            plt.title("Distance to start (edges only)")
-            plt.axis("off")
             plt.show()
 
-            print(f"-> found {len(distances)} items")
+            print(f"-> found {len(distances)} candidates")
+
+        # Convert all candidates back to world coordinates at once
+        xyts = torch.zeros(grid_xyt.shape[0], 3)
+        xyts[:, :2] = self.voxel_map.grid_coords_to_xy(grid_xyt[:, :2])
+        xyts[:, 2] = grid_xyt[:, 2]
 
-        assert len(xs) == len(ys) and len(xs) == len(distances)
         tries = 1
+        prev_segment = None
         prev_dist = -1 * float("Inf")
-        for x, y, dist in sorted(zip(xs, ys, distances), key=lambda x: x[2]):
-            if dist < min_dist:
-                continue
-
-            # Don't explore too close to where we are
-            if dist < prev_dist + step_dist:
+        for xyt, dist, segment_id in zip(
+            xyts, distances.tolist(), segment_ids.tolist()
+        ):
+            # Don't explore too close to the last point on the same frontier
+            if segment_id == prev_segment and dist < prev_dist + step_dist:
                 continue
+            prev_segment = segment_id
             prev_dist = dist
 
-            point_grid_coords = torch.FloatTensor([[x, y]])
-            outside_point = find_closest_point_on_mask(
-                outside_frontier, point_grid_coords
-            )
-
-            if outside_point is None:
-                print(
-                    "[VOXEL MAP: sampling] ERR finding closest pt:",
-                    point_grid_coords,
-                    "closest =",
-                    outside_point,
-                )
-                continue
-
-            # convert back to real-world coordinates
-            point = self.voxel_map.grid_coords_to_xy(point_grid_coords)
-            if point is None:
-                print("[VOXEL MAP: sampling] ERR:", point, point_grid_coords)
-                continue
-
-            theta = math.atan2(
-                outside_point[1] - point_grid_coords[0, 1],
-                outside_point[0] - point_grid_coords[0, 0],
-            )
-            if debug:
-                print(f"{dist=}, {x=}, {y=}, {theta=}")
-
-            # Ensure angle is in 0 to 2 * PI
-            if theta < 0:
-                theta += 2 * np.pi
-
-            xyt = torch.zeros(3)
-            xyt[:2] = point
-            xyt[2] = theta
-
             # Check to see if this point is valid
             if verbose:
-                print("[VOXEL MAP: sampling] sampled", xyt)
+                print("[VOXEL MAP: sampling] sampled", xyt, f"{dist=}")
             if self.is_valid(xyt, debug=debug):
                 yield xyt
 
@@ -546,9 +621,7 @@ class SparseVoxelMapNavigationSpace(XYT):
         obstacles, explored = self.voxel_map.get_2d_map()
 
         # Extract edges from our explored mask
-        less_explored = binary_erosion(
-            explored.float().unsqueeze(0).unsqueeze(0), self.dilate_explored_kernel
-        )[0, 0]
+        less_explored = erode_mask(explored, self.dilate_frontier_size)
         edges = get_edges(less_explored)
 
         # Do not explore obstacles any more
@@ -561,7 +634,7 @@ class SparseVoxelMapNavigationSpace(XYT):
             # Now we apply this filter and try to sample a goal position
             if verbose:
                 print("[VOXEL MAP: sampling] sampling margin of size", radius)
-            expanded_frontier = expand_mask(frontier_edges, radius)
+            expanded_frontier = dilate_mask(frontier_edges, radius)
             # TODO: should we do this or not?
             # Make sure not to sample things that will just be in obstacles
             # expanded_obstacles = expand_mask(obstacles, radius)
@@ -581,7 +654,7 @@ class SparseVoxelMapNavigationSpace(XYT):
                 plt.imshow(outside_frontier.cpu().numpy())
                 plt.title("outside frontier")
                 plt.subplot(224)
-                plt.imshow((less_explored + explored).cpu().numpy())
+                plt.imshow((less_explored.float() + explored.float()).cpu().numpy())
                 plt.title("explored")
                 plt.show()
 
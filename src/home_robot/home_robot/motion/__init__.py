@@ -3,6 +3,7 @@
 # This source code is licensed under the MIT license found in the
 # LICENSE file in the root directory of this source tree.
 from .base import Planner, PlanResult
+from .batched_rrt_connect import BatchedRRTConnect
 from .robot import RobotModel
 from .rrt import RRT
 from .rrt_connect import RRTConnect
@@ -0,0 +1,216 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+#
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+import time
+from random import random
+from typing import Callable, List, Optional, Tuple
+
+import numpy as np
+
+from home_robot.motion.base import Planner, PlanResult
+from home_robot.motion.rrt import TreeNode
+from home_robot.motion.space import ConfigurationSpace
+
+
+class ArrayTree(object):
+    """Search tree stored as a states array and a parents array, so that nearest neighbour lookups are a single vectorized distance computation over the whole tree."""
+
+    def __init__(self, root: np.ndarray, capacity: int = 256):
+        root = np.asarray(root, dtype=float)
+        self.states = np.zeros((capacity, len(root)))
+        self.parents = np.full(capacity, -1, dtype=np.int64)
+        self.states[0] = root
+        self.size = 1
+
+    def __len__(self) -> int:
+        return self.size
+
+    def add(self, state: np.ndarray, parent: int) -> int:
+        """Add a state as a child of node parent; returns the index of the new node"""
+        if self.size == len(self.states):
+            self.states = np.concatenate([self.states, np.zeros_like(self.states)])
+            self.parents = np.concatenate(
+                [self.parents, np.full(len(self.parents), -1, dtype=np.int64)]
+            )
+        self.states[self.size] = state
+        self.parents[self.size] = parent
+        self.size += 1
+        return self.size - 1
+
+    def nearest(self, state: np.ndarray, space: ConfigurationSpace) -> int:
+        """Index of the node closest to state under the space's distance"""
+        return int(np.argmin(space.distance_batch(self.states[: self.size], state)))
+
+    def backup(self, idx: int) -> np.ndarray:
+        """[T, dof] states from the root to node idx"""
+        path = []
+        while idx >= 0:
+            path.append(idx)
+            idx = self.parents[idx]
+        return self.states[path[::-1]].copy()
+
+
+class BatchedRRTConnect(Planner):
+    """RRT-Connect over array-backed trees, with every edge collision checked as one batch.
+
+    Unlike RRTConnect, which validates each interpolated state separately, this planner takes a batched validity function mapping [N, dof] states to an [N,] bool array, and only adds the last valid state of each extension to the tree. The space needs distance_batch and extend_array, which ConfigurationSpace provides.
+    """
+
+    def __init__(
+        self,
+        space: ConfigurationSpace,
+        validate_batch_fn: Optional[Callable] = None,
+        p_sample_goal: float = 0.1,
+        max_iter: int = 500,
+        min_batch_size: int = 4,
+        max_batch_size: int = 64,
+        shortcut_iter: int = 50,
+    ):
+        """
+        Args:
+            space: configuration space to plan in
+            validate_batch_fn: [N, dof] -> [N,] bool; defaults to space.is_valid_batch
+            p_sample_goal: probability of extending straight towards the other tree's root
+            max_iter: number of extend/connect rounds before giving up
+            min_batch_size, max_batch_size: states per validity call; batches along an edge double in size until one contains an invalid state
+            shortcut_iter: maximum number of shortcut edges checked on a successful path
+        """
+        if validate_batch_fn is None:
+            validate_batch_fn = space.is_valid_batch
+        self.validate_batch = validate_batch_fn
+        super(BatchedRRTConnect, self).__init__(
+            space, lambda q: bool(self.validate_batch(np.asarray(q)[None])[0])
+        )
+        self.p_sample_goal = p_sample_goal
+        self.max_iter = max_iter
+        self.min_batch_size = min_batch_size
+        self.max_batch_size = max_batch_size
+        self.shortcut_iter = shortcut_iter
+        self.reset()
+
+    def reset(self):
+        self.start_time = None
+        self.tree_fwd = None
+        self.tree_rev = None
+
+    def _check_edge(self, q0: np.ndarray, q1: np.ndarray) -> Tuple[int, np.ndarray]:
+        """Interpolate from q0 to q1 and count how many leading states are valid.
+
+        Returns:
+            num_valid: number of valid states before the first invalid one
+            qs: [T, dof] interpolated states, not including q0
+        """
+        qs = self.space.extend_array(q0, q1)
+        # Collisions are usually found close to q0, so start with small batches
+        i, batch_size = 0, self.min_batch_size
+        while i < len(qs):
+            valid = self.validate_batch(qs[i : i + batch_size])
+            if not np.all(valid):
+                return i + int(np.argmin(valid)), qs
+            i += batch_size
+            batch_size = min(2 * batch_size, self.max_batch_size)
+        return len(qs), qs
+
+    def _extend(
+        self, tree: ArrayTree, idx: int, target: np.ndarray
+    ) -> Tuple[Optional[int], bool]:
+        """Extend tree from node idx towards target as far as the path stays valid.
+
+        Returns:
+            new_idx: index of the added node, or None if no progress was made
+            reached: whether the new node is target
+        """
+        num_valid, qs = self._check_edge(tree.states[idx], target)
+        if num_valid == 0:
+            return None, False
+        new_idx = tree.add(qs[num_valid - 1], idx)
+        return new_idx, num_valid == len(qs)
+
+    def shortcut(self, path: np.ndarray) -> np.ndarray:
+        """Greedily connect each vertex of a [T, dof] path to the farthest later vertex it has a straight valid edge to"""
+        path = list(path)
+        num_checks = 0
+        i = 0
+        while i < len(path) - 2 and num_checks < self.shortcut_iter:
+            for j in range(len(path) - 1, i + 1, -1):
+                num_checks += 1
+                num_valid, qs = self._check_edge(path[i], path[j])
+                if num_valid == len(qs):
+                    path = path[: i + 1] + path[j:]
+                    break
+                if num_checks >= self.shortcut_iter:
+                    break
+            i += 1
+        return np.stack(path)
+
+    def plan(self, start, goal, verbose: bool = False) -> PlanResult:
+        """Plan from start to goal, growing one tree from each.
+
+        Returns:
+            PlanResult whose trajectory is a list of TreeNodes, one per vertex of the path; use space.extend_array between them for a dense path.
+        """
+        start = np.asarray(start, dtype=float)
+        goal = np.asarray(goal, dtype=float)
+        assert len(start) == self.space.dof, "invalid start dimensions"
+        assert len(goal) == self.space.dof, "invalid goal dimensions"
+        self.start_time = time.time()
+        valid = self.validate_batch(np.stack([start, goal]))
+        if not valid[0]:
+            return PlanResult(False, reason="invalid start")
+        if not valid[1]:
+            return PlanResult(False, reason="invalid goal")
+        self.tree_fwd = ArrayTree(start)
+        self.tree_rev = ArrayTree(goal)
+
+        # Always try to go straight to the goal first
+        path = None
+        idx, reached = self._extend(self.tree_fwd, 0, goal)
+        if reached:
+            path = self.tree_fwd.backup(idx)
+
+        for i in range(self.max_iter):
+            if path is not None:
+                break
+            swap = i % 2 == 1
+            tree_a, tree_b = (
+                (self.tree_rev, self.tree_fwd)
+                if swap
+                else (self.tree_fwd, self.tree_rev)
+            )
+            if random() < self.p_sample_goal:
+                target = tree_b.states[0]
+            else:
+                target = self.space.sample()
+            idx_a, _ = self._extend(tree_a, tree_a.nearest(target, self.space), target)
+            if idx_a is None:
+                continue
+            # Try to connect the other tree to the new node
+            q_new = tree_a.states[idx_a]
+            idx_b, reached = self._extend(
+                tree_b, tree_b.nearest(q_new, self.space), q_new
+            )
+            if reached:
+                path_a = tree_a.backup(idx_a)
+                path_b = tree_b.backup(idx_b)[::-1][1:]
+                path = np.concatenate([path_a, path_b])
+                if swap:
+                    path = path[::-1]
+
+        if path is None:
+            if verbose:
+                print(
+                    f"[Planner] failed after {self.max_iter} iterations, {time.time() - self.start_time:.3f}s"
+                )
+            return PlanResult(False, reason="max iterations")
+        path = self.shortcut(path)
+        if verbose:
+            print(
+                f"[Planner] found {len(path)} waypoint path in {time.time() - self.start_time:.3f}s"
+            )
+        trajectory: List[TreeNode] = []
+        parent = None
+        for state in path:
+            parent = TreeNode(state, parent)
+            trajectory.append(parent)
+        return PlanResult(True, trajectory)
@@ -0,0 +1,180 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+#
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+from collections import OrderedDict
+from typing import Dict, Optional, Set, Tuple
+
+import numpy as np
+from scipy.spatial.transform import Rotation as R
+
+
+class IKCache(object):
+    """Bounded LRU table of inverse kinematics solutions, indexed by quantized end-effector pose. At most max_size solutions are kept.
+
+    Poses are quantized into cells of pos_resolution meters and rot_resolution radians. A lookup is an exact hit if a solution stored in the same cell was solved for a pose within hit_tolerance of the query. Otherwise, the closest stored solution within warm_start_radius meters can be used as the initial configuration for the solver. Solutions are stored in the format of the IK solver that produced them.
+    """
+
+    def __init__(
+        self,
+        max_size: int = 1000,
+        pos_resolution: float = 0.01,
+        rot_resolution: float = 0.05,
+        hit_tolerance: float = 1e-4,
+        warm_start_radius: float = 0.1,
+    ):
+        self.max_size = max_size
+        self.pos_resolution = pos_resolution
+        self.rot_resolution = rot_resolution
+        self.hit_tolerance = hit_tolerance
+        self.warm_start_radius = warm_start_radius
+        self.clear()
+
+    def clear(self):
+        """Drop all stored solutions and reset statistics"""
+        # key -> list of (pos, rotvec, q, iterations, debug_info)
+        self._entries: "OrderedDict[Tuple, list]" = OrderedDict()
+        self._num_solutions = 0
+        # coarse position cell -> keys, for nearest neighbour warm starts
+        self._cells: Dict[Tuple[int, int, int], Set[Tuple]] = {}
+        self.reset_stats()
+
+    def reset_stats(self):
+        """Reset hit and miss counters, e.g. at the start of a pick session"""
+        self.hits = 0
+        self.misses = 0
+        self.warm_starts = 0
+        self.iterations_saved = 0
+        self._cold_iterations = []
+
+    def __len__(self) -> int:
+        """Number of stored solutions"""
+        return self._num_solutions
+
+    def _get_key(self, pos: np.ndarray, rotvec: np.ndarray) -> Tuple:
+        return tuple(np.floor(pos / self.pos_resolution).astype(int)) + tuple(
+            np.floor(rotvec / self.rot_resolution).astype(int)
+        )
+
+    def _get_cell(self, pos: np.ndarray) -> Tuple[int, int, int]:
+        return tuple(np.floor(pos / self.warm_start_radius).astype(int))
+
+    def _distance(
+        self, pos: np.ndarray, rotvec: np.ndarray, other_pos, other_rotvec
+    ) -> Tuple[float, float]:
+        """Position distance in meters and rotation distance in radians"""
+        rot_dist = (
+            R.from_rotvec(rotvec) * R.from_rotvec(other_rotvec).inv()
+        ).magnitude()
+        return np.linalg.norm(pos - other_pos), rot_dist
+
+    def lookup(
+        self, pos: np.ndarray, quat: np.ndarray
+    ) -> Optional[Tuple[np.ndarray, dict]]:
+        """Return a stored solution for this exact pose and the debug info of the solve that produced it, or None. The debug info has "cache_hit" set, and "iter" set to 0 if the solver reports iterations."""
+        pos = np.asarray(pos, dtype=float)
+        rotvec = R.from_quat(quat).as_rotvec()
+        key = self._get_key(pos, rotvec)
+        for entry_pos, entry_rotvec, q, iters, info in self._entries.get(key, []):
+            pos_dist, rot_dist = self._distance(pos, rotvec, entry_pos, entry_rotvec)
+            if pos_dist <= self.hit_tolerance and rot_dist <= self.hit_tolerance:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                if iters is not None:
+                    self.iterations_saved += iters
+                info = dict(info)
+                if "iter" in info:
+                    info["iter"] = 0
+                info["cache_hit"] = True
+                return q.copy(), info
+        self.misses += 1
+        return None
+
+    def get_warm_start(self, pos: np.ndarray, quat: np.ndarray) -> Optional[np.ndarray]:
+        """Return the stored solution closest to this pose within warm_start_radius, to seed the solver with"""
+        pos = np.asarray(pos, dtype=float)
+        rotvec = R.from_quat(quat).as_rotvec()
+        cx, cy, cz = self._get_cell(pos)
+        best, best_dist = None, float("inf")
+        for dx in (-1, 0, 1):
+            for dy in (-1, 0, 1):
+                for dz in (-1, 0, 1):
+                    for key in self._cells.get((cx + dx, cy + dy, cz + dz), ()):
+                        for entry_pos, entry_rotvec, q, _, _ in self._entries[key]:
+                            pos_dist, rot_dist = self._distance(
+                                pos, rotvec, entry_pos, entry_rotvec
+                            )
+                            # Treat a radian of rotation like a meter of translation
+                            dist = pos_dist + rot_dist
+                            if pos_dist <= self.warm_start_radius and dist < best_dist:
+                                best, best_dist = q, dist
+        if best is None:
+            return None
+        self.warm_starts += 1
+        return best.copy()
+
+    def record_warm_start(self, iterations: Optional[int]):
+        """Count the iterations a warm-started solve took, compared to the average cold solve"""
+        if iterations is not None and len(self._cold_iterations) > 0:
+            self.iterations_saved += max(
+                int(np.mean(self._cold_iterations)) - int(iterations), 0
+            )
+
+    def insert(
+        self,
+        pos: np.ndarray,
+        quat: np.ndarray,
+        q: np.ndarray,
+        iterations: Optional[int] = None,
+        cold: bool = True,
+        debug_info: Optional[dict] = None,
+    ):
+        """Store a successful solution. Once more than max_size solutions are stored, the least recently used poses are dropped.
+
+        Args:
+            pos, quat: end-effector pose that was solved for
+            q: solution in the IK solver's format
+            iterations: solver iterations it took, if the solver reports them
+            cold: whether the solve started from the default configuration
+            debug_info: what the solver returned with q, returned again by lookup
+        """
+        pos = np.asarray(pos, dtype=float)
+        rotvec = R.from_quat(quat).as_rotvec()
+        key = self._get_key(pos, rotvec)
+        if key not in self._entries:
+            self._entries[key] = []
+            self._cells.setdefault(self._get_cell(pos), set()).add(key)
+        info = {} if debug_info is None else dict(debug_info)
+        self._entries[key].append(
+            (pos, rotvec, np.array(q, dtype=float), iterations, info)
+        )
+        self._entries.move_to_end(key)
+        self._num_solutions += 1
+        if cold and iterations is not None:
+            self._cold_iterations.append(iterations)
+        while self._num_solutions > self.max_size:
+            old_key = next(iter(self._entries))
+            old_entries = self._entries[old_key]
+            if len(self._entries) == 1:
+                # Only one pose left, holding too many solutions; drop its oldest
+                old_entries.pop(0)
+                self._num_solutions -= 1
+                continue
+            del self._entries[old_key]
+            self._num_solutions -= len(old_entries)
+            cell = self._get_cell(old_entries[0][0])
+            self._cells[cell].discard(old_key)
+            if len(self._cells[cell]) == 0:
+                del self._cells[cell]
+
+    def get_stats(self) -> Dict[str, float]:
+        """Hit rate and estimated solver iterations saved since the last reset_stats"""
+        queries = self.hits + self.misses
+        return {
+            "queries": queries,
+            "hits": self.hits,
+            "hit_rate": self.hits / queries if queries > 0 else 0.0,
+            "warm_starts": self.warm_starts,
+            "iterations_saved": self.iterations_saved,
+            "size": self._num_solutions,
+        }
@@ -14,6 +14,9 @@ class IKSolverBase(object):
     Base class for all IK solvers.
     """
 
+    # Whether compute_ik starts from q_init when given one; solvers that ignore it cannot be warm-started
+    uses_q_init: bool = True
+
     def get_dof(self) -> int:
         """returns dof for the manipulation chain"""
         raise NotImplementedError()
@@ -26,6 +29,15 @@ class IKSolverBase(object):
         """given joint values return end-effector position and quaternion associated with it"""
         raise NotImplementedError()
 
+    def compute_fk_batch(self, q: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """forward kinematics for [N, dof] joint values; returns [N, 3] positions and [N, 4] quaternions"""
+        poses = [
+            self.compute_fk(qi) for qi in np.asarray(q).reshape(-1, self.get_dof())
+        ]
+        pos = np.array([np.asarray(p) for p, _ in poses]).reshape(-1, 3)
+        quat = np.array([np.asarray(o) for _, o in poses]).reshape(-1, 4)
+        return pos, quat
+
     def compute_ik(
         self,
         pos_desired: np.ndarray,
@@ -5,7 +5,8 @@
 import numpy as np
 
 from home_robot.motion.base import Planner
-from home_robot.motion.robot import STRETCH_STANDOFF_WITH_MARGIN, HelloStretchIdx
+from home_robot.motion.batched_rrt_connect import BatchedRRTConnect
+from home_robot.motion.stretch import STRETCH_STANDOFF_WITH_MARGIN, HelloStretchIdx
 
 
 class LinearPlanner(Planner):
@@ -24,13 +25,13 @@ class LinearPlanner(Planner):
         t = 0
         traj.append(q0)
         ts.append(0.0)
-        for q in self.robot.interpolate(q0, qg):
-            if self.robot.validate(q):
-                traj.append(q)
-                t = t + 0.1
-                ts.append(t)
-            else:
-                return None
+        qs, _ = self.robot.interpolate_array(q0, qg)
+        if not np.all(self.robot.validate_batch(qs)):
+            return None
+        for q in qs:
+            traj.append(q)
+            t = t + 0.1
+            ts.append(t)
         return traj, ts
 
 
@@ -60,13 +61,13 @@ class StretchLinearWithOffsetPlanner(Planner):
         traj, ts = [], []
         traj.append(q0)
         ts.append(t)
-        for q in self.robot.interpolate(q0, q1):
-            if self.robot.validate(q, ignored=ignored):
-                traj.append(q)
-                t += 0.1
-                ts.append(t)
-            else:
-                return None
+        qs, _ = self.robot.interpolate_array(q0, q1)
+        if not np.all(self.robot.validate_batch(qs, ignored=ignored)):
+            return None
+        for q in qs:
+            traj.append(q)
+            t += 0.1
+            ts.append(t)
         return traj, ts
 
     def plan(self, q0, poses, tries=100, grasp=False, ignored=[]):
@@ -150,28 +151,55 @@ class StretchLinearIKPlanner(Planner):
             STRETCH_STANDOFF_WITH_MARGIN,
             STRETCH_STANDOFF_WITH_MARGIN + 0.2,
         ],
+        arm_space=None,
         *args,
         **kwargs
     ):
-        """save the standoff distance so we can randomly sample one that works"""
-        super(StretchLinearWithOffsetPlanner, self).__init__(robot, *args, **kwargs)
+        """save the standoff distance so we can randomly sample one that works
+
+        arm_space: optional StretchArmSpace; if set, a grasp approach that fails as a straight line is planned with BatchedRRTConnect in it instead
+        """
+        super(StretchLinearIKPlanner, self).__init__(robot, *args, **kwargs)
         self.step_size = step_size
         self.standoff_range = standoff_range
         self.standoff_min = self.standoff_range[0]
         self.standoff_rng = self.standoff_range[1] - self.standoff_range[0]
+        self.arm_space = arm_space
 
     def _interpolate(self, q0, q1, ignored=[]):
         t = 0
         traj, ts = [], []
         traj.append(q0)
         ts.append(t)
-        for q in self.robot.interpolate(q0, q1):
-            if self.robot.validate(q, ignored=ignored):
-                traj.append(q)
-                t += 0.1
-                ts.append(t)
-            else:
-                return None
+        qs, _ = self.robot.interpolate_array(q0, q1)
+        if not np.all(self.robot.validate_batch(qs, ignored=ignored)):
+            return None
+        for q in qs:
+            traj.append(q)
+            t += 0.1
+            ts.append(t)
+        return traj, ts
+
+    def _plan_arm(self, q0, q1):
+        """Plan between two configurations with the same base pose by moving only the lift, arm and wrist. Edges are checked against the arm space's obstacle points, not the bullet scene."""
+        if self.arm_space is None:
+            return None
+        self.arm_space.set_base_config(q0)
+        planner = BatchedRRTConnect(self.arm_space)
+        res = planner.plan(
+            self.arm_space.from_config(q0), self.arm_space.from_config(q1)
+        )
+        if not res.success:
+            return None
+        path = [node.state for node in res.trajectory]
+        qs = np.concatenate(
+            [self.arm_space.extend_array(a, b) for a, b in zip(path[:-1], path[1:])]
+        )
+        traj, ts = [q0], [0.0]
+        for q in self.arm_space.to_full_config(qs):
+            traj.append(q)
+            ts.append(ts[-1] + 0.1)
+        traj[-1] = q1.copy()
         return traj, ts
 
     def plan(self, q0, poses, tries=100, grasp=False, ignored=[]):
@@ -227,6 +255,9 @@ class StretchLinearIKPlanner(Planner):
             # Move to grasp - extend the arm
             # grasp = self._interpolate(q_standoff, q_grasp, ignored=ignored)
             grasp = self._interpolate(q_standoff, q_grasp)
+            if grasp is None:
+                # Try to go around obstacles with the arm instead
+                grasp = self._plan_arm(q_standoff, q_grasp)
             if grasp is not None:
                 sequences.append(standoff)
                 sequences.append(grasp)
@@ -2,6 +2,9 @@
 #
 # This source code is licensed under the MIT license found in the
 # LICENSE file in the root directory of this source tree.
+import multiprocessing
+import weakref
+from multiprocessing import shared_memory
 from typing import Callable, Dict, List, Optional, Tuple, Union
 
 import numpy as np
@@ -35,11 +38,18 @@ class PinocchioIKSolver(IKSolverBase):
         ee_link_name: name of the end-effector link
         controlled_joints: list of joint names to control
         """
+        # Kept so that worker processes can build their own copy of the solver
+        self.urdf_path = urdf_path
+        self.ee_link_name = ee_link_name
+        self.controlled_joint_names = list(controlled_joints)
+
         self.model = pinocchio.buildModelFromUrdf(urdf_path)
         self.data = self.model.createData()
         self.q_neutral = pinocchio.neutral(self.model)
 
         self.ee_frame_idx = [f.name for f in self.model.frames].index(ee_link_name)
+        # Frame name -> index, filled in as frames are queried
+        self._frame_ids = {ee_link_name: self.ee_frame_idx}
         self.controlled_joints = [
             self.model.idx_qs[self.model.getJointId(j)] if j != "ignore" else -1
             for j in controlled_joints
@@ -80,6 +90,84 @@ class PinocchioIKSolver(IKSolverBase):
 
         return pos.copy(), quat.copy()
 
+    def get_frame_id(self, frame_name: str) -> int:
+        """index of a frame in the model; looked up once per name"""
+        if frame_name not in self._frame_ids:
+            self._frame_ids[frame_name] = self.model.getFrameId(frame_name)
+        return self._frame_ids[frame_name]
+
+    def _qmap_control2model_batch(self, q_input: np.ndarray) -> np.ndarray:
+        """_qmap_control2model for [N, dof] joint values"""
+        q_out = np.tile(self.q_neutral, (q_input.shape[0], 1))
+        for i, joint_idx in enumerate(self.controlled_joints):
+            q_out[:, joint_idx] = q_input[:, i]
+        return q_out
+
+    def compute_fk_batch(
+        self, q: np.ndarray, frame_name: Optional[str] = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Forward kinematics for many configurations in one call.
+
+        Args:
+            q: [N, dof] joint values of the controlled joints
+            frame_name: frame to compute the pose of; defaults to the end effector
+
+        Returns:
+            pos: [N, 3] positions
+            quat: [N, 4] quaternions
+        """
+        frame_idx = (
+            self.ee_frame_idx if frame_name is None else self.get_frame_id(frame_name)
+        )
+        q_model = self._qmap_control2model_batch(
+            np.asarray(q).reshape(-1, self.get_dof())
+        )
+        pos = np.zeros((q_model.shape[0], 3))
+        rot = np.zeros((q_model.shape[0], 3, 3))
+        for i, qi in enumerate(q_model):
+            pinocchio.forwardKinematics(self.model, self.data, qi)
+            pinocchio.updateFramePlacement(self.model, self.data, frame_idx)
+            placement = self.data.oMf[frame_idx]
+            pos[i] = placement.translation
+            rot[i] = placement.rotation
+        return pos, R.from_matrix(rot).as_quat().reshape(-1, 4)
+
+    def compute_frame_positions_batch(
+        self, q: np.ndarray, frame_names: List[str]
+    ) -> np.ndarray:
+        """Positions of several frames for many configurations, with one forward kinematics pass per configuration.
+
+        Args:
+            q: [N, dof] joint values of the controlled joints
+            frame_names: F frames to compute the positions of
+
+        Returns:
+            pos: [N, F, 3] positions
+        """
+        frame_ids = [self.get_frame_id(name) for name in frame_names]
+        q_model = self._qmap_control2model_batch(
+            np.asarray(q).reshape(-1, self.get_dof())
+        )
+        pos = np.zeros((q_model.shape[0], len(frame_ids), 3))
+        for i, qi in enumerate(q_model):
+            pinocchio.forwardKinematics(self.model, self.data, qi)
+            for j, frame_idx in enumerate(frame_ids):
+                pinocchio.updateFramePlacement(self.model, self.data, frame_idx)
+                pos[i, j] = self.data.oMf[frame_idx].translation
+        return pos
+
+    def _sample_seeds(self, num_seeds: int) -> np.ndarray:
+        """Sample random initial configurations for the controlled joints, uniformly within joint limits. Unbounded joints are sampled in [-pi, pi]."""
+        lower = np.clip(self.model.lowerPositionLimit, -np.pi, np.pi)
+        upper = np.clip(self.model.upperPositionLimit, -np.pi, np.pi)
+        seeds = np.zeros((num_seeds, self.get_dof()))
+        for i, joint_idx in enumerate(self.controlled_joints):
+            if joint_idx >= 0:
+                seeds[:, i] = np.random.uniform(
+                    lower[joint_idx], upper[joint_idx], num_seeds
+                )
+        return seeds
+
     def compute_ik(
         self,
         pos_desired: np.ndarray,
@@ -91,59 +179,291 @@ class PinocchioIKSolver(IKSolverBase):
     ) -> Tuple[np.ndarray, bool, dict]:
         """given end-effector position and quaternion, return joint values.
 
-        Two parameters are currently unused and might be implemented in the future:
-            q_init: initial configuration for the optimization to start in; especially useful for
-                    arms with redundant degrees of freedom
-            num_attempts: start from multiple initial configs; included for compatibility with pb
-            max iterations: time budget in number of steps; included for compatibility with pb
+        q_init: initial configuration for the optimization to start in; especially useful for
+                arms with redundant degrees of freedom
+        num_attempts: if no q_init is given, start from the neutral config plus num_attempts - 1 random
+                configs, all solved in one batch; the first successful solution is returned
+        max iterations: time budget in number of steps
         """
-        i = 0
-
         if q_init is None:
-            q = self.q_neutral.copy()
+            q_init = self._qmap_model2control(self.q_neutral)
             if num_attempts > 1:
-                raise NotImplementedError(
-                    "Sampling multiple initial configs not yet supported by Pinocchio solver."
+                q_init = np.concatenate(
+                    [q_init[None], self._sample_seeds(num_attempts - 1)]
                 )
+            else:
+                q_init = q_init[None]
         else:
-            q = self._qmap_control2model(q_init)
             # Override the number of attempts
-            num_attempts = 1
+            q_init = np.asarray(q_init)[None]
 
-        desired_ee_pose = pinocchio.SE3(
-            R.from_quat(quat_desired).as_matrix(), pos_desired
+        num_seeds = q_init.shape[0]
+        q, success, debug_info = self.compute_ik_batch(
+            np.tile(pos_desired, (num_seeds, 1)),
+            np.tile(quat_desired, (num_seeds, 1)),
+            q_init,
+            max_iterations=max_iterations,
+            verbose=verbose,
+            stop_on_first_success=True,
         )
-        while True:
-            pinocchio.forwardKinematics(self.model, self.data, q)
-            pinocchio.updateFramePlacement(self.model, self.data, self.ee_frame_idx)
+        if np.any(success):
+            best = int(np.argmax(success))
+        else:
+            best = int(np.argmin(np.linalg.norm(debug_info["final_error"], axis=-1)))
+        debug_info = {
+            "iter": int(debug_info["iter"][best]),
+            "final_error": debug_info["final_error"][best],
+        }
+        return q[best], bool(success[best]), debug_info
+
+    def compute_ik_batch(
+        self,
+        pos_desired: np.ndarray,
+        quat_desired: np.ndarray,
+        q_init: Optional[np.ndarray] = None,
+        max_iterations: int = 100,
+        verbose: bool = False,
+        stop_on_first_success: bool = False,
+    ) -> Tuple[np.ndarray, np.ndarray, dict]:
+        """Solve many (target, seed) pairs at once. The damped least-squares step is computed for all unconverged rows in one batched solve, and rows drop out of the loop as soon as they converge.
+
+        Args:
+            pos_desired: [B, 3] end-effector positions
+            quat_desired: [B, 4] end-effector quaternions
+            q_init: [B, dof] initial configurations of the controlled joints; neutral if None
+            max_iterations: time budget in number of steps
+            stop_on_first_success: stop all rows as soon as any one of them converges
+
+        Returns:
+            q: [B, dof] joint values
+            success: [B,] whether each row converged
+            debug_info: "iter" [B,] steps taken, "final_error" [B, 6], and the final end-effector pose of every row as "ee_pos" [B, 3] and "ee_quat" [B, 4]
+        """
+        pos_desired = np.asarray(pos_desired).reshape(-1, 3)
+        quat_desired = np.asarray(quat_desired).reshape(-1, 4)
+        batch_size = pos_desired.shape[0]
+        if q_init is None:
+            qs = [self.q_neutral.copy() for _ in range(batch_size)]
+        else:
+            qs = [self._qmap_control2model(q) for q in q_init]
+        rotations = R.from_quat(quat_desired).as_matrix()
+        desired_ee_poses = [
+            pinocchio.SE3(rotations[b], pos_desired[b]) for b in range(batch_size)
+        ]
 
-            dMi = desired_ee_pose.actInv(self.data.oMf[self.ee_frame_idx])
-            err = pinocchio.log(dMi).vector
+        active = np.ones(batch_size, dtype=bool)
+        success = np.zeros(batch_size, dtype=bool)
+        iters = np.zeros(batch_size, dtype=int)
+        errs = np.zeros((batch_size, 6))
+        ee_pos = np.zeros((batch_size, 3))
+        ee_rot = np.zeros((batch_size, 3, 3))
+        eye = self.DAMP * np.eye(6)
+        for i in range(max_iterations + 1):
+            rows = np.nonzero(active)[0]
+            J = np.zeros((batch_size, 6, self.model.nv))
+            for b in rows:
+                # Joint jacobians come with forward kinematics, so one pass gives both
+                pinocchio.computeJointJacobians(self.model, self.data, qs[b])
+                pinocchio.updateFramePlacement(self.model, self.data, self.ee_frame_idx)
+                ee_pose = self.data.oMf[self.ee_frame_idx]
+                ee_pos[b] = ee_pose.translation
+                ee_rot[b] = ee_pose.rotation
+                errs[b] = pinocchio.log(desired_ee_poses[b].actInv(ee_pose)).vector
+                J[b] = pinocchio.getFrameJacobian(
+                    self.model,
+                    self.data,
+                    self.ee_frame_idx,
+                    pinocchio.ReferenceFrame.LOCAL,
+                )
             if verbose:
-                print(f"[pinocchio_ik_solver] iter={i}; error={err}")
-            if np.linalg.norm(err) < self.EPS:
-                success = True
+                print(f"[pinocchio_ik_solver] iter={i}; error={errs[rows]}")
+            converged = np.linalg.norm(errs[rows], axis=-1) < self.EPS
+            success[rows[converged]] = True
+            active[rows[converged]] = False
+            if i >= max_iterations or (stop_on_first_success and np.any(success)):
                 break
-            if i >= max_iterations:
-                success = False
+            rows = rows[~converged]
+            if len(rows) == 0:
                 break
-            J = pinocchio.computeFrameJacobian(
-                self.model,
-                self.data,
-                q,
-                self.ee_frame_idx,
-                pinocchio.ReferenceFrame.LOCAL,
-            )
-            v = -J.T.dot(np.linalg.solve(J.dot(J.T) + self.DAMP * np.eye(6), err))
-            q = pinocchio.integrate(self.model, q, v * self.DT)
-            i += 1
 
-        q_control = self._qmap_model2control(q.flatten())
-        debug_info = {"iter": i, "final_error": err}
+            J = J[rows]
+            Jt = np.transpose(J, (0, 2, 1))
+            v = -np.einsum(
+                "bij,bj->bi",
+                Jt,
+                np.linalg.solve(J @ Jt + eye, errs[rows][..., None])[..., 0],
+            )
+            for b, v_b in zip(rows, v):
+                qs[b] = pinocchio.integrate(self.model, qs[b], v_b * self.DT)
+            iters[rows] += 1
 
+        q_control = np.stack([self._qmap_model2control(q.flatten()) for q in qs])
+        debug_info = {
+            "iter": iters,
+            "final_error": errs,
+            "ee_pos": ee_pos,
+            "ee_quat": R.from_matrix(ee_rot).as_quat(),
+        }
         return q_control, success, debug_info
 
 
+def _compute_ik_costs(
+    ik_solver: PinocchioIKSolver,
+    dr_arr: np.ndarray,
+    pos_desired: np.ndarray,
+    quat_desired: np.ndarray,
+    pos_wt: float,
+    ori_wt: float,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Solve IK for the desired orientation perturbed by each rotation vector in dr_arr; return [N,] costs and [N, dof] solutions"""
+    quats = (R.from_rotvec(dr_arr) * R.from_quat(quat_desired)).as_quat()
+    pos = np.tile(pos_desired, (len(dr_arr), 1))
+    q_arr, _, subsolver_debug_info = ik_solver.compute_ik_batch(pos, quats)
+    pos_out = subsolver_debug_info["ee_pos"]
+    rot_out = subsolver_debug_info["ee_quat"]
+
+    cost_pos = np.linalg.norm(pos - pos_out, axis=-1)
+    cost_rot = 1 - (rot_out * quat_desired).sum(axis=-1) ** 2
+
+    cost = pos_wt * cost_pos + ori_wt * cost_rot
+    return cost, q_arr
+
+
+# State of each IK cost worker process
+_worker_solver: Optional[PinocchioIKSolver] = None
+_worker_shm: Optional[shared_memory.SharedMemory] = None
+_worker_shape: Optional[Tuple[int, int]] = None
+
+
+def _get_shared_arrays(
+    buf, num_samples: int, dof: int
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Views of the samples [N, 3], costs [N] and solutions [N, dof] in a shared memory buffer"""
+    samples = np.ndarray((num_samples, 3), dtype=np.float64, buffer=buf)
+    costs = np.ndarray(
+        (num_samples,), dtype=np.float64, buffer=buf, offset=samples.nbytes
+    )
+    qs = np.ndarray(
+        (num_samples, dof),
+        dtype=np.float64,
+        buffer=buf,
+        offset=samples.nbytes + costs.nbytes,
+    )
+    return samples, costs, qs
+
+
+def _init_ik_cost_worker(
+    urdf_path: str,
+    ee_link_name: str,
+    controlled_joints: List[str],
+    shm_name: str,
+    num_samples: int,
+):
+    global _worker_solver, _worker_shm, _worker_shape
+    _worker_solver = PinocchioIKSolver(urdf_path, ee_link_name, controlled_joints)
+    _worker_shm = shared_memory.SharedMemory(name=shm_name)
+    _worker_shape = (num_samples, _worker_solver.get_dof())
+
+
+def _evaluate_ik_cost_chunk(args):
+    """Evaluate samples [start, end) of the shared sample array in place"""
+    start, end, pos_desired, quat_desired, pos_wt, ori_wt = args
+    samples, costs, qs = _get_shared_arrays(_worker_shm.buf, *_worker_shape)
+    costs[start:end], qs[start:end] = _compute_ik_costs(
+        _worker_solver,
+        samples[start:end],
+        pos_desired,
+        quat_desired,
+        pos_wt,
+        ori_wt,
+    )
+
+
+class IKCostWorkerPool:
+    """Persistent worker processes that evaluate CEM samples for PositionIKOptimizer in parallel.
+
+    Each worker builds its own PinocchioIKSolver (model and data) once. Samples are written to a shared memory block, each worker solves a contiguous chunk of them, and costs and solutions are written back in place, so only chunk bounds and the target pose are pickled per call. Evaluating a sample is deterministic, so results do not depend on which worker picks up which chunk; all randomness is in the CEM sampling, which stays in the calling process.
+    """
+
+    def __init__(
+        self,
+        ik_solver: PinocchioIKSolver,
+        num_samples: int,
+        num_workers: Optional[int] = None,
+        start_method: str = "spawn",
+    ):
+        """
+        ik_solver: solver to replicate in each worker
+        num_samples: maximum number of samples evaluated per call
+        num_workers: number of processes; defaults to the number of CPUs
+        start_method: multiprocessing start method. The default, spawn, keeps workers from inheriting threads or bullet clients from the parent; fork starts faster.
+        """
+        self.num_samples = num_samples
+        self.num_workers = num_workers or multiprocessing.cpu_count()
+        self.dof = ik_solver.get_dof()
+
+        self._shm = shared_memory.SharedMemory(
+            create=True, size=num_samples * (4 + self.dof) * 8
+        )
+        self._samples, self._costs, self._qs = _get_shared_arrays(
+            self._shm.buf, num_samples, self.dof
+        )
+        self._pool = multiprocessing.get_context(start_method).Pool(
+            self.num_workers,
+            initializer=_init_ik_cost_worker,
+            initargs=(
+                ik_solver.urdf_path,
+                ik_solver.ee_link_name,
+                ik_solver.controlled_joint_names,
+                self._shm.name,
+                num_samples,
+            ),
+        )
+        self._finalizer = weakref.finalize(
+            self, IKCostWorkerPool._shutdown, self._pool, self._shm
+        )
+
+    @staticmethod
+    def _shutdown(pool, shm: shared_memory.SharedMemory):
+        pool.terminate()
+        pool.join()
+        shm.close()
+        shm.unlink()
+
+    def close(self):
+        """Stop the workers and free the shared memory"""
+        self._samples = self._costs = self._qs = None
+        self._finalizer()
+
+    def evaluate(
+        self,
+        dr_arr: np.ndarray,
+        pos_desired: np.ndarray,
+        quat_desired: np.ndarray,
+        pos_wt: float,
+        ori_wt: float,
+    ) -> Tuple[np.ndarray, List[np.ndarray]]:
+        """Costs [N,] and IK solutions for [N, 3] orientation perturbations, as used by CEM.optimize in batched mode"""
+        num = len(dr_arr)
+        assert num <= self.num_samples, f"at most {self.num_samples} samples per call"
+        self._samples[:num] = dr_arr
+        chunks = np.array_split(np.arange(num), min(self.num_workers, num))
+        tasks = [
+            (
+                chunk[0],
+                chunk[-1] + 1,
+                pos_desired,
+                quat_desired,
+                pos_wt,
+                ori_wt,
+            )
+            for chunk in chunks
+            if len(chunk) > 0
+        ]
+        self._pool.map(_evaluate_ik_cost_chunk, tasks)
+        return self._costs[:num].copy(), list(self._qs[:num].copy())
+
+
 class PositionIKOptimizer(IKSolverBase):
     """
     Solver that jointly optimizes IK and best orientation to achieve desired position.
@@ -151,6 +471,9 @@ class PositionIKOptimizer(IKSolverBase):
     Additionally, it implements IKSolverBase so this optimizer-based version can be readily dropped-in.
     """
 
+    # compute_ik always solves from the subsolver's default configuration
+    uses_q_init: bool = False
+
     max_iterations: int = 30  # Max num of iterations for CEM
     num_samples: int = 100  # Total candidate samples for each CEM iteration
     num_top: int = 10  # Top N candidates for each CEM iteration
@@ -189,6 +512,15 @@ class PositionIKOptimizer(IKSolverBase):
             else self.num_samples
         )
         num_top = cem_params["num_top"] if "num_top" in cem_params else self.num_top
+        seed = cem_params["seed"] if "seed" in cem_params else None
+        # Evaluate samples in this many worker processes; 0 to evaluate in-process
+        self.num_workers = (
+            cem_params["num_workers"] if "num_workers" in cem_params else 0
+        )
+        self._start_method = (
+            cem_params["start_method"] if "start_method" in cem_params else "spawn"
+        )
+        self._worker_pool = None
 
         self.opt = CEM(
             max_iterations=max_iterations,
@@ -196,8 +528,26 @@ class PositionIKOptimizer(IKSolverBase):
             num_top=num_top,
             tol=self.pos_error_tol,
             sigma0=self.ori_error_range / 2,
+            seed=seed,
         )
 
+    def _get_worker_pool(self) -> IKCostWorkerPool:
+        """Start the worker processes on first use"""
+        if self._worker_pool is None:
+            self._worker_pool = IKCostWorkerPool(
+                self.ik_solver,
+                self.opt.num_samples,
+                num_workers=self.num_workers,
+                start_method=self._start_method,
+            )
+        return self._worker_pool
+
+    def close(self):
+        """Stop the worker processes, if any"""
+        if self._worker_pool is not None:
+            self._worker_pool.close()
+            self._worker_pool = None
+
     def get_dof(self) -> int:
         return self.ik_solver.get_dof()
 
@@ -230,10 +580,37 @@ class PositionIKOptimizer(IKSolverBase):
 
             return cost, q
 
+        # Batched version: solve IK for every CEM sample in a single call
+        def solve_ik_batch(dr_arr):
+            cost, q_arr = _compute_ik_costs(
+                self.ik_solver,
+                dr_arr,
+                pos_desired,
+                quat_desired,
+                self.pos_wt,
+                self.ori_wt,
+            )
+            return cost, list(q_arr)
+
+        # Parallel version: split the samples across worker processes
+        def solve_ik_parallel(dr_arr):
+            return self._get_worker_pool().evaluate(
+                dr_arr, pos_desired, quat_desired, self.pos_wt, self.ori_wt
+            )
+
         # Optimize for IK and best orientation (x=0 -> use original desired orientation)
-        cost_opt, q_result, max_iter, opt_sigma, success = self.opt.optimize(
-            solve_ik, x0=np.zeros(3)
-        )
+        if self.num_workers and isinstance(self.ik_solver, PinocchioIKSolver):
+            cost_opt, q_result, max_iter, opt_sigma, success = self.opt.optimize(
+                solve_ik_parallel, x0=np.zeros(3), batched=True
+            )
+        elif hasattr(self.ik_solver, "compute_ik_batch"):
+            cost_opt, q_result, max_iter, opt_sigma, success = self.opt.optimize(
+                solve_ik_batch, x0=np.zeros(3), batched=True
+            )
+        else:
+            cost_opt, q_result, max_iter, opt_sigma, success = self.opt.optimize(
+                solve_ik, x0=np.zeros(3)
+            )
         pos_out, quat_out = self.ik_solver.compute_fk(q_result)
         print(
             f"After ik optimization, cost: {cost_opt}, result: {pos_out, quat_out} vs desired: {pos_desired, quat_desired}"
@@ -250,6 +627,14 @@ class PositionIKOptimizer(IKSolverBase):
     def compute_fk(self, q):
         return self.ik_solver.compute_fk(q)
 
+    def compute_fk_batch(self, q: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        return self.ik_solver.compute_fk_batch(q)
+
+    def compute_frame_positions_batch(
+        self, q: np.ndarray, frame_names: List[str]
+    ) -> np.ndarray:
+        return self.ik_solver.compute_frame_positions_batch(q, frame_names)
+
 
 class CEM:
     """class implementing generic CEM solver for optimization"""
@@ -261,21 +646,27 @@ class CEM:
         num_top: int,
         tol: float,
         sigma0: np.ndarray,
+        seed: Optional[int] = None,
     ):
         """
         max_iterations: max number of iterations
         num_samples: number of samples per iteration
         num_top: number of top samples to use for next iteration
         tol: tolerance for stopping criterion
+        seed: if set, every call to optimize draws the same sequence of samples
         """
         self.max_iterations = max_iterations
         self.num_samples = num_samples
         self.num_top = num_top
         self.cost_tol = tol
         self.sigma0 = sigma0
+        self.seed = seed
 
-    def optimize(self, func: Callable, x0: np.ndarray):
-        """optimize function func with initial guess mu=x0 and initial std=sigma0"""
+    def optimize(self, func: Callable, x0: np.ndarray, batched: bool = False):
+        """optimize function func with initial guess mu=x0 and initial std=sigma0
+
+        If batched is True, func takes all samples of an iteration as an [N, dim] array and returns an [N,] array of costs and a list of N auxiliary outputs.
+        """
         assert (
             x0.shape == self.sigma0.shape
         ), f"x0 and sigma0 must have same shape, got {x0.shape} and {self.sigma0.shape}"
@@ -283,16 +674,20 @@ class CEM:
         i = 0
         mu = x0
         sigma = self.sigma0
+        rng = np.random if self.seed is None else np.random.RandomState(self.seed)
 
         while True:
             # Sample x
-            x_arr = mu + sigma * np.random.randn(self.num_samples, x0.shape[0])
+            x_arr = mu + sigma * rng.randn(self.num_samples, x0.shape[0])
 
             # Compute costs
-            cost_arr = np.zeros(self.num_samples)
-            aux_outputs = [None for _ in range(self.num_samples)]
-            for j, x in enumerate(x_arr):
-                cost_arr[j], aux_outputs[j] = func(x)
+            if batched:
+                cost_arr, aux_outputs = func(x_arr)
+            else:
+                cost_arr = np.zeros(self.num_samples)
+                aux_outputs = [None for _ in range(self.num_samples)]
+                for j, x in enumerate(x_arr):
+                    cost_arr[j], aux_outputs[j] = func(x)
 
             # Sort costs
             idx_sorted_arr = np.argsort(cost_arr)
@@ -38,6 +38,10 @@ class ConfigurationSpace(ABC):
         """Return distance between q0 and q1."""
         return np.linalg.norm(q0 - q1)
 
+    def distance_batch(self, qs: np.ndarray, q1: np.ndarray) -> np.ndarray:
+        """Distances from each of [N, dof] configurations to q1"""
+        return np.linalg.norm(np.asarray(qs) - q1, axis=-1)
+
     def extend(self, q0, q1):
         """extend towards another configuration in this space"""
         dq = q1 - q0
@@ -49,6 +53,10 @@ class ConfigurationSpace(ABC):
                 yield qi
         yield q1
 
+    def extend_array(self, q0, q1) -> np.ndarray:
+        """Same states as extend, as one [T, dof] array"""
+        return np.stack(list(self.extend(q0, q1)))
+
     def closest_node_to_state(self, state, nodes: List[Node]):
         """returns closest node to a given state"""
         min_dist = float("Inf")
@@ -12,6 +12,7 @@ import pybullet as pb
 import home_robot.utils.bullet as hrb
 from home_robot.core.interfaces import ContinuousFullBodyAction
 from home_robot.motion.bullet import BulletRobotModel, PybulletIKSolver
+from home_robot.motion.ik_cache import IKCache
 from home_robot.motion.pinocchio_ik_solver import PinocchioIKSolver, PositionIKOptimizer
 from home_robot.motion.robot import Footprint
 from home_robot.utils.pose import to_matrix
@@ -375,6 +376,9 @@ class HelloStretchKinematics(BulletRobotModel):
 
         self._create_ik_solvers(ik_type=ik_type, visualize=visualize)
 
+        # Solutions of manip_ik, reused across retries of similar grasps
+        self.ik_cache = IKCache()
+
     def get_dof(self) -> int:
         """return degrees of freedom of the robot"""
         return self.dof
@@ -619,6 +623,63 @@ class HelloStretchKinematics(BulletRobotModel):
         ee_pos, ee_quat = self.manip_ik_solver.compute_fk(q)
         return ee_pos.copy(), ee_quat.copy()
 
+    def manip_fk_batch(self, q: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """manip_fk for [N, dof] configurations at once; returns [N, 3] positions and [N, 4] quaternions"""
+        q = np.asarray(q).reshape(-1, self.dof)
+        if "pinocchio" in self._ik_type:
+            q = self._ros_pose_to_pinocchio(q)
+        return self.manip_ik_solver.compute_fk_batch(q)
+
+    def _get_bullet_joint_map(self) -> Tuple[List[int], np.ndarray]:
+        """bullet joint indices set by set_config, and which entry of q each one takes"""
+        if getattr(self, "_bullet_joint_map", None) is None:
+            indices = [0, 1, 2]
+            columns = [
+                HelloStretchIdx.BASE_X,
+                HelloStretchIdx.BASE_Y,
+                HelloStretchIdx.BASE_THETA,
+            ]
+            for i, idx in enumerate(self.joint_idx):
+                if idx >= 0:
+                    indices.append(idx)
+                    columns.append(i)
+            indices += self.arm_idx + self.gripper_idx
+            columns += [HelloStretchIdx.ARM] * len(self.arm_idx)
+            columns += [HelloStretchIdx.GRIPPER] * len(self.gripper_idx)
+            self._bullet_joint_map = (indices, np.array(columns))
+        return self._bullet_joint_map
+
+    def _get_bullet_joint_values(self, q: np.ndarray) -> np.ndarray:
+        """[N, J] values for the joints from _get_bullet_joint_map, same as set_config would write"""
+        _, columns = self._get_bullet_joint_map()
+        values = q[:, columns]
+        values[:, columns == HelloStretchIdx.ARM] /= 4.0
+        return values
+
+    def fk_batch(
+        self, q: np.ndarray, link_name: Optional[str] = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Full-body forward kinematics for [N, dof] configurations in the bullet backend.
+
+        All joints of a configuration are written in one call and the robot base is only placed once, instead of resetting every joint separately as set_config does.
+
+        Returns:
+            pos: [N, 3] link positions
+            quat: [N, 4] link quaternions
+        """
+        q = np.asarray(q, dtype=float).reshape(-1, self.dof)
+        if link_name is None:
+            link_name = self._ee_link_name
+        indices, _ = self._get_bullet_joint_map()
+        values = self._get_bullet_joint_values(q)
+        self.ref.set_pose((0, 0, self.base_height), [0, 0, 0, 1])
+        pos = np.zeros((q.shape[0], 3))
+        quat = np.zeros((q.shape[0], 4))
+        for i, row in enumerate(values):
+            self.ref.set_joint_positions_by_index(indices, row)
+            pos[i], quat[i] = self.ref.get_link_pose(link_name)
+        return pos, quat
+
     def fk(self, q=None, as_matrix=False) -> Tuple[np.ndarray, np.ndarray]:
         """forward kinematics"""
         pose = self.get_link_pose(self.ee_link_name, q)
@@ -729,16 +790,17 @@ class HelloStretchKinematics(BulletRobotModel):
         raise NotImplementedError
 
     def _ros_pose_to_pinocchio(self, joint_angles):
-        """utility to convert Stretch joint angle output to pinocchio joint pose format"""
-        pin_compatible_joints = np.zeros(9)
-        pin_compatible_joints[0] = joint_angles[HelloStretchIdx.BASE_X]
-        pin_compatible_joints[1] = joint_angles[HelloStretchIdx.LIFT]
-        pin_compatible_joints[2] = pin_compatible_joints[3] = pin_compatible_joints[
-            4
-        ] = pin_compatible_joints[5] = (joint_angles[HelloStretchIdx.ARM] / 4)
-        pin_compatible_joints[6] = joint_angles[HelloStretchIdx.WRIST_YAW]
-        pin_compatible_joints[7] = joint_angles[HelloStretchIdx.WRIST_PITCH]
-        pin_compatible_joints[8] = joint_angles[HelloStretchIdx.WRIST_ROLL]
+        """utility to convert Stretch joint angle output to pinocchio joint pose format; also works on [N, dof] arrays"""
+        joint_angles = np.asarray(joint_angles)
+        pin_compatible_joints = np.zeros(joint_angles.shape[:-1] + (9,))
+        pin_compatible_joints[..., 0] = joint_angles[..., HelloStretchIdx.BASE_X]
+        pin_compatible_joints[..., 1] = joint_angles[..., HelloStretchIdx.LIFT]
+        pin_compatible_joints[..., 2:6] = (
+            joint_angles[..., HelloStretchIdx.ARM, None] / 4
+        )
+        pin_compatible_joints[..., 6] = joint_angles[..., HelloStretchIdx.WRIST_YAW]
+        pin_compatible_joints[..., 7] = joint_angles[..., HelloStretchIdx.WRIST_PITCH]
+        pin_compatible_joints[..., 8] = joint_angles[..., HelloStretchIdx.WRIST_ROLL]
         return pin_compatible_joints
 
     def ik(self, pose, q0):
@@ -762,11 +824,14 @@ class HelloStretchKinematics(BulletRobotModel):
         update_pb: bool = True,
         num_attempts: int = 1,
         verbose: bool = False,
+        use_cache: bool = True,
     ):
         """IK in manipulation mode. Takes in a 4x4 pose_query matrix in se(3) and initial
         configuration of the robot.
 
         By default move relative. easier that way.
+
+        If no q0 is given and use_cache is set, solutions are looked up in and stored to self.ik_cache; cache misses are warm-started from the closest stored solution if the IK solver starts from q_init.
         """
 
         if q0 is not None:
@@ -785,9 +850,14 @@ class HelloStretchKinematics(BulletRobotModel):
             # This logic currently in local hello robot client
             raise NotImplementedError()
 
-        q, success, debug_info = self.manip_ik_solver.compute_ik(
-            pos, quat, q0, num_attempts=num_attempts, verbose=verbose
-        )
+        if q0 is None and use_cache:
+            q, success, debug_info = self._cached_manip_ik(
+                pos, quat, num_attempts=num_attempts, verbose=verbose
+            )
+        else:
+            q, success, debug_info = self.manip_ik_solver.compute_ik(
+                pos, quat, q0, num_attempts=num_attempts, verbose=verbose
+            )
 
         if q is not None and success:
             q = self._from_manip_format(q, default_q)
@@ -795,6 +865,43 @@ class HelloStretchKinematics(BulletRobotModel):
 
         return q, success, debug_info
 
+    def _cached_manip_ik(
+        self, pos, quat, num_attempts: int = 1, verbose: bool = False
+    ) -> Tuple[np.ndarray, bool, dict]:
+        """Solve manipulation-mode IK from the default configuration, going through the IK cache. Returns the solution in solver format. Misses are only warm-started if the solver starts from q_init."""
+        hit = self.ik_cache.lookup(pos, quat)
+        if hit is not None:
+            if verbose:
+                print("[manip ik] cache hit")
+            q, debug_info = hit
+            return q, True, debug_info
+
+        q_init = None
+        if self.manip_ik_solver.uses_q_init:
+            q_init = self.ik_cache.get_warm_start(pos, quat)
+        if q_init is not None:
+            q, success, debug_info = self.manip_ik_solver.compute_ik(
+                pos, quat, q_init, verbose=verbose
+            )
+            if q is not None and success:
+                iterations = debug_info.get("iter", None)
+                self.ik_cache.record_warm_start(iterations)
+                self.ik_cache.insert(
+                    pos, quat, q, iterations, cold=False, debug_info=debug_info
+                )
+                return q, success, debug_info
+            elif verbose:
+                print("[manip ik] warm start failed; solving from scratch")
+
+        q, success, debug_info = self.manip_ik_solver.compute_ik(
+            pos, quat, None, num_attempts=num_attempts, verbose=verbose
+        )
+        if q is not None and success:
+            self.ik_cache.insert(
+                pos, quat, q, debug_info.get("iter", None), debug_info=debug_info
+            )
+        return q, success, debug_info
+
     def get_ee_pose(self, q=None):
         if q is not None:
             self.set_config(q)
@@ -867,6 +974,135 @@ class HelloStretchKinematics(BulletRobotModel):
             qi = self.update_head(qi, self.look_at_ee)
             yield qi, ai
 
+    def _get_steps(self, dist: float, step: float) -> np.ndarray:
+        """Cumulative distances covered by steps of size step up to dist; the last one may be shorter"""
+        if dist <= 0:
+            return np.zeros(0)
+        num_steps = max(int(np.ceil(dist / step - 1e-9)), 1)
+        return np.minimum(np.arange(1, num_steps + 1) * step, dist)
+
+    def interpolate_xy_array(
+        self, qi: np.ndarray, xy0: np.ndarray, dist: float, step: float = 0.1
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Same as interpolate_xy, but returns the whole segment at once.
+
+        Returns:
+            qs: [T, dof] configurations
+            actions: [T, dof] actions
+        """
+        covered = self._get_steps(dist, step)
+        theta = qi[HelloStretchIdx.BASE_THETA]
+        qs = np.tile(self.update_head(qi.copy(), self.look_front), (len(covered), 1))
+        qs[:, HelloStretchIdx.BASE_X] = xy0[0] + np.cos(theta) * covered
+        qs[:, HelloStretchIdx.BASE_Y] = xy0[1] + np.sin(theta) * covered
+        actions = np.zeros((len(covered), self.dof))
+        actions[:, 0] = np.diff(covered, prepend=0.0)
+        return qs, actions
+
+    def interpolate_angle_array(
+        self, qi: np.ndarray, theta0: float, thetag: float, step: float = 0.1
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Same as interpolate_angle, but returns the whole segment at once.
+
+        Returns:
+            qs: [T, dof] configurations
+            actions: [T, dof] actions
+        """
+        thetag2 = thetag + 2 * np.pi if theta0 > thetag else thetag - 2 * np.pi
+        if np.abs(thetag2 - theta0) < np.abs(thetag - theta0):
+            thetag = thetag2
+        dirn = 1.0 if thetag > theta0 else -1.0
+        covered = self._get_steps(np.abs(thetag - theta0), step)
+        qs = np.tile(qi, (len(covered), 1))
+        qs[:, HelloStretchIdx.BASE_THETA] += dirn * covered
+        actions = np.zeros((len(covered), self.dof))
+        actions[:, 2] = dirn * np.diff(covered, prepend=0.0)
+        return qs, actions
+
+    def interpolate_arm_array(
+        self, q0: np.ndarray, qg: np.ndarray, step: Optional[np.ndarray] = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Same as interpolate_arm, but returns the whole segment at once: every joint moves towards qg by at most step per waypoint, with the head looking at the end effector.
+
+        Returns:
+            qs: [T, dof] configurations
+            actions: [T, dof] actions
+        """
+        if step is None:
+            step = self.default_step
+        head = [HelloStretchIdx.HEAD_PAN, HelloStretchIdx.HEAD_TILT]
+        dq = qg - q0
+        # Number of waypoints until every joint is within tolerance
+        num_steps = np.ceil((np.abs(dq) - self.default_tols) / step - 1e-9)
+        num_steps[head] = 0
+        num_steps = int(max(num_steps.max(), 0))
+        covered = np.arange(1, num_steps + 1)[:, None] * step[None]
+        qs = np.where(
+            covered >= np.abs(dq)[None],
+            qg[None],
+            q0[None] + np.sign(dq)[None] * covered,
+        )
+        qs[:, head] = self.look_at_ee
+        # Each action is the configuration before the step, with the base not moving
+        actions = np.concatenate([q0[None], qs[:-1]], axis=0)
+        actions[:, :3] = 0
+        return qs, actions
+
+    def interpolate_array(
+        self,
+        q0: np.ndarray,
+        qg: np.ndarray,
+        step: Optional[np.ndarray] = None,
+        xy_tol: float = 0.05,
+        theta_tol: float = 0.01,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Same as interpolate, but computes all four stages as arrays instead of yielding one waypoint at a time.
+
+        Returns:
+            qs: [T, dof] configurations
+            actions: [T, dof] actions
+        """
+        if step is None:
+            step = self.default_step
+        qi = q0.copy()
+        theta0 = q0[HelloStretchIdx.BASE_THETA]
+        thetag = qg[HelloStretchIdx.BASE_THETA]
+        xy0 = q0[[HelloStretchIdx.BASE_X, HelloStretchIdx.BASE_Y]]
+        xyg = qg[[HelloStretchIdx.BASE_X, HelloStretchIdx.BASE_Y]]
+        dist = np.linalg.norm(xy0 - xyg)
+        segments = []
+
+        def add_segment(segment: Tuple[np.ndarray, np.ndarray]) -> np.ndarray:
+            """Keep a segment and return the configuration the next one starts from"""
+            segments.append(segment)
+            return segment[0][-1] if len(segment[0]) > 0 else qi
+
+        if dist > xy_tol:
+            dx, dy = xyg - xy0
+            theta = np.arctan2(dy, dx)
+            qi = add_segment(
+                self.interpolate_angle_array(
+                    qi, theta0, theta, step[HelloStretchIdx.BASE_THETA]
+                )
+            )
+            qi = add_segment(
+                self.interpolate_xy_array(qi, xy0, dist, step[HelloStretchIdx.BASE_X])
+            )
+        else:
+            theta = theta0
+        # update angle
+        if np.abs(thetag - theta) > theta_tol:
+            qi = add_segment(
+                self.interpolate_angle_array(
+                    qi, theta, thetag, step[HelloStretchIdx.BASE_THETA]
+                )
+            )
+        # Finally interpolate the whole joint space
+        add_segment(self.interpolate_arm_array(qi, qg, step))
+        qs = np.concatenate([segment[0] for segment in segments])
+        actions = np.concatenate([segment[1] for segment in segments])
+        return qs, actions
+
     def is_colliding(self, other):
         return self.ref.is_colliding(other)
 
@@ -911,6 +1147,30 @@ class HelloStretchKinematics(BulletRobotModel):
                 return False
         return True
 
+    def validate_batch(
+        self, q: np.ndarray, ignored=[], distance: float = 0.0
+    ) -> np.ndarray:
+        """Same check as validate for [N, dof] configurations, returned as an [N,] bool array.
+
+        The height limit is checked for all configurations up front, and only the remaining ones are posed in the bullet backend and checked against the obstacles.
+        """
+        q = np.asarray(q, dtype=float).reshape(-1, self.dof)
+        valid = q[:, HelloStretchIdx.LIFT] < 1.0
+        obstacles = [
+            obj
+            for obj in self.backend.objects.values()
+            if obj.id != self.ref.id and obj.id not in ignored
+        ]
+        if len(obstacles) == 0 or not np.any(valid):
+            return valid
+        indices, _ = self._get_bullet_joint_map()
+        values = self._get_bullet_joint_values(q)
+        self.ref.set_pose((0, 0, self.base_height), [0, 0, 0, 1])
+        for i in np.nonzero(valid)[0]:
+            self.ref.set_joint_positions_by_index(indices, values[i])
+            valid[i] = not self.ref.is_colliding_with_any(obstacles, distance)
+        return valid
+
     def create_action_from_config(self, q: np.ndarray) -> ContinuousFullBodyAction:
         """Create a default interface action from this"""
         xyt = np.zeros(3)
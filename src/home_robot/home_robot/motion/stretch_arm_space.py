@@ -0,0 +1,209 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+#
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+from typing import List, Optional, Tuple
+
+import numpy as np
+import torch
+from scipy.spatial import cKDTree
+
+from home_robot.motion.space import ConfigurationSpace
+from home_robot.motion.stretch import HelloStretchIdx, HelloStretchKinematics
+
+# Joints planned over by StretchArmSpace, in order
+STRETCH_ARM_JOINTS = [
+    HelloStretchIdx.LIFT,
+    HelloStretchIdx.ARM,
+    HelloStretchIdx.WRIST_ROLL,
+    HelloStretchIdx.WRIST_PITCH,
+    HelloStretchIdx.WRIST_YAW,
+]
+
+# Capsules between two frames of the manipulation mode model, as (frame, frame, radius, number of spheres)
+STRETCH_ARM_COLLISION_LINKS = [
+    ("link_lift", "link_arm_l4", 0.06, 5),
+    ("link_arm_l4", "link_arm_l0", 0.04, 20),
+    ("link_arm_l0", "link_wrist_yaw", 0.04, 3),
+    ("link_wrist_yaw", "link_straight_gripper", 0.04, 3),
+    ("link_straight_gripper", "link_gripper_fingertip_left", 0.025, 6),
+    ("link_straight_gripper", "link_gripper_fingertip_right", 0.025, 6),
+]
+
+
+class StretchArmSpace(ConfigurationSpace):
+    """Configuration space over the Stretch lift, arm extension and wrist, with the base and head held fixed.
+
+    Distances are weighted per joint, so that a radian of wrist motion can count for less than a meter of lift. Configurations are checked against an obstacle point cloud (e.g. from a SparseVoxelMap) by approximating the moving links with spheres along capsules between frames of the manipulation mode model; all spheres of a batch of configurations are looked up in one KD-tree query.
+    """
+
+    def __init__(
+        self,
+        robot: HelloStretchKinematics,
+        q_base: np.ndarray,
+        obstacles: Optional[np.ndarray] = None,
+        weights: Optional[np.ndarray] = None,
+        step_size: float = 0.02,
+        margin: float = 0.0,
+        collision_links: Optional[List[Tuple[str, str, float, int]]] = None,
+    ):
+        """
+        Args:
+            robot: Stretch kinematics created with a pinocchio ik_type
+            q_base: full [dof] robot configuration whose base and head stay fixed
+            obstacles: [N, 3] obstacle points in world coordinates
+            weights: per joint distance weights for (lift, arm, roll, pitch, yaw)
+            step_size: weighted distance between interpolated states
+            margin: extra clearance in meters around each sphere
+            collision_links: capsules approximating the moving links
+        """
+        self.robot = robot
+        self.joints = np.array(STRETCH_ARM_JOINTS)
+        super(StretchArmSpace, self).__init__(
+            len(self.joints),
+            robot.range[self.joints, 0].copy(),
+            robot.range[self.joints, 1].copy(),
+            step_size=step_size,
+        )
+        if weights is None:
+            weights = np.array([1.0, 1.0, 0.2, 0.2, 0.2])
+        self.weights = np.asarray(weights, dtype=float)
+        self.margin = margin
+        self._setup_collision_spheres(
+            STRETCH_ARM_COLLISION_LINKS if collision_links is None else collision_links
+        )
+        self.set_base_config(q_base)
+        self.set_obstacles(obstacles)
+
+    def _setup_collision_spheres(self, collision_links):
+        """Flatten capsules into sphere centers interpolated between pairs of frames"""
+        self._frame_names = []
+        idx_a, idx_b, ts, radii = [], [], [], []
+        for frame_a, frame_b, radius, num_spheres in collision_links:
+            for name in (frame_a, frame_b):
+                if name not in self._frame_names:
+                    self._frame_names.append(name)
+            t = np.linspace(0, 1, num_spheres)
+            idx_a += [self._frame_names.index(frame_a)] * num_spheres
+            idx_b += [self._frame_names.index(frame_b)] * num_spheres
+            ts.append(t)
+            radii += [radius] * num_spheres
+        self._sphere_a = np.array(idx_a)
+        self._sphere_b = np.array(idx_b)
+        self._sphere_t = np.concatenate(ts)[None, :, None]
+        self._sphere_radius = np.array(radii)
+
+    def set_base_config(self, q_base: np.ndarray):
+        """Set the full robot configuration that arm configurations are planned around"""
+        self.q_base = np.array(q_base, dtype=float)
+        x, y, theta = self.q_base[
+            [HelloStretchIdx.BASE_X, HelloStretchIdx.BASE_Y, HelloStretchIdx.BASE_THETA]
+        ]
+        c, s = np.cos(theta), np.sin(theta)
+        self._base_rotation = np.array([[c, -s, 0.0], [s, c, 0.0], [0.0, 0.0, 1.0]])
+        self._base_translation = np.array([x, y, 0.0])
+
+    def set_obstacles(
+        self,
+        points: Optional[np.ndarray],
+        ignore_near: Optional[np.ndarray] = None,
+        ignore_radius: float = 0.1,
+    ):
+        """Set obstacle points in world coordinates.
+
+        Args:
+            points: [N, 3] points, or None to clear
+            ignore_near: [3,] drop points within ignore_radius of this position, e.g. the object being grasped
+        """
+        self._tree = None
+        self._occupancy = None
+        if points is None:
+            return
+        if isinstance(points, torch.Tensor):
+            points = points.detach().cpu().numpy()
+        points = np.asarray(points, dtype=float).reshape(-1, 3)
+        if ignore_near is not None:
+            keep = np.linalg.norm(points - np.asarray(ignore_near), axis=-1)
+            points = points[keep > ignore_radius]
+        if len(points) > 0:
+            self._tree = cKDTree(points)
+
+    def set_obstacles_from_voxel_map(self, voxel_map, **kwargs):
+        """Use the points of a SparseVoxelMap above its minimum obstacle height, so the floor is not an obstacle"""
+        xyz, _ = voxel_map.get_xyz_rgb()
+        if isinstance(xyz, torch.Tensor):
+            xyz = xyz.detach().cpu().numpy()
+        self.set_obstacles(xyz[xyz[:, 2] > voxel_map.obs_min_height], **kwargs)
+
+    def set_occupancy(self, occupancy):
+        """Check against a persistent VoxelOccupancyIndex, e.g. SparseVoxelMap.occupancy, instead of a fixed set of points. The index is queried as it is, so later map updates are picked up without calling this again. SparseVoxelMap only puts points above obs_min_height in its index, like set_obstacles_from_voxel_map."""
+        self._tree = None
+        self._occupancy = occupancy
+
+    def from_config(self, q: np.ndarray) -> np.ndarray:
+        """Arm joints of [dof] or [N, dof] full robot configurations"""
+        return np.asarray(q)[..., self.joints].copy()
+
+    def to_full_config(self, qs: np.ndarray) -> np.ndarray:
+        """[N, dof] full robot configurations for [N, 5] arm configurations, with the rest taken from q_base"""
+        qs = np.asarray(qs, dtype=float).reshape(-1, self.dof)
+        q_full = np.tile(self.q_base, (qs.shape[0], 1))
+        q_full[:, self.joints] = qs
+        return q_full
+
+    def distance(self, q0, q1) -> float:
+        """Weighted joint-space distance"""
+        return np.linalg.norm(self.weights * (q1 - q0))
+
+    def distance_batch(self, qs: np.ndarray, q1: np.ndarray) -> np.ndarray:
+        """Weighted joint-space distance from each of [N, 5] configurations to q1"""
+        return np.linalg.norm(self.weights * (q1 - np.asarray(qs)), axis=-1)
+
+    def extend_array(self, q0, q1) -> np.ndarray:
+        """[T, 5] evenly spaced states from q0 to q1, at most step_size apart; excludes q0 and ends at q1"""
+        steps = max(int(np.ceil(self.distance(q0, q1) / self.step_size)), 1)
+        t = np.arange(1, steps + 1)[:, None] / steps
+        return q0 + t * (q1 - q0)
+
+    def extend(self, q0, q1):
+        """extend towards another configuration in this space"""
+        for q in self.extend_array(q0, q1):
+            yield q
+
+    def get_collision_spheres(self, qs: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """World frame sphere centers [N, S, 3] and radii [S,] covering the arm for [N, 5] configurations"""
+        q_full = self.to_full_config(qs)
+        # Manipulation mode kinematics are relative to the base
+        q_full[:, HelloStretchIdx.BASE_X] = 0
+        frames = self.robot.manip_ik_solver.compute_frame_positions_batch(
+            self.robot._ros_pose_to_pinocchio(q_full), self._frame_names
+        )
+        pos_a = frames[:, self._sphere_a]
+        pos_b = frames[:, self._sphere_b]
+        centers = pos_a + self._sphere_t * (pos_b - pos_a)
+        centers = centers @ self._base_rotation.T + self._base_translation
+        return centers, self._sphere_radius
+
+    def is_valid(self, q: np.ndarray) -> bool:
+        """Check a single [5,] configuration"""
+        return bool(self.is_valid_batch(np.asarray(q)[None])[0])
+
+    def is_valid_batch(self, qs: np.ndarray) -> np.ndarray:
+        """Check [N, 5] configurations against joint limits and the obstacle points at once; returns [N,] bool"""
+        qs = np.asarray(qs, dtype=float).reshape(-1, self.dof)
+        valid = np.all((qs >= self.mins) & (qs <= self.maxs), axis=-1)
+        if (self._tree is None and self._occupancy is None) or not np.any(valid):
+            return valid
+        centers, radii = self.get_collision_spheres(qs[valid])
+        radii = radii + self.margin
+        if self._occupancy is not None:
+            colliding = self._occupancy.points_in_collision(
+                centers.reshape(-1, 3), np.tile(radii, centers.shape[0])
+            ).reshape(centers.shape[:2])
+        else:
+            dists, _ = self._tree.query(
+                centers.reshape(-1, 3), distance_upper_bound=radii.max()
+            )
+            colliding = dists.reshape(centers.shape[:2]) <= radii
+        valid[valid] = ~np.any(colliding, axis=-1)
+        return valid
@@ -0,0 +1,218 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+#
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+"""Precomputed reachability of the Stretch end effector in base coordinates.
+
+Build once offline with:
+
+    python -m home_robot.motion.stretch_reachability --output stretch_reachability.npz
+"""
+import multiprocessing
+import os
+from typing import Optional, Tuple
+
+import click
+import numpy as np
+import scipy.ndimage
+
+from home_robot.motion.stretch import HelloStretchIdx, HelloStretchKinematics
+from home_robot.utils.path import REPO_ROOT_PATH
+
+DEFAULT_URDF_PATH = os.path.join(REPO_ROOT_PATH, "assets/hab_stretch/urdf/")
+
+# Kinematics model for each worker process
+_worker_robot = None
+
+
+def _init_worker(urdf_path: str):
+    global _worker_robot
+    _worker_robot = HelloStretchKinematics(urdf_path=urdf_path, ik_type="pinocchio")
+
+
+def _compute_fk_chunk(args) -> np.ndarray:
+    """End-effector positions for every (lift, arm, yaw) combination with one lift value"""
+    lift, arms, yaws, pitch, roll = args
+    q = np.zeros(_worker_robot.dof)
+    q[HelloStretchIdx.LIFT] = lift
+    q[HelloStretchIdx.WRIST_PITCH] = pitch
+    q[HelloStretchIdx.WRIST_ROLL] = roll
+    positions = np.zeros((len(arms), len(yaws), 3))
+    for i, arm in enumerate(arms):
+        q[HelloStretchIdx.ARM] = arm
+        for j, yaw in enumerate(yaws):
+            q[HelloStretchIdx.WRIST_YAW] = yaw
+            positions[i, j], _ = _worker_robot.manip_fk(q)
+    return positions
+
+
+class StretchReachabilityMap(object):
+    """Voxel grid over the robot base frame marking end-effector positions the Stretch arm can reach with a fixed wrist pitch and roll (top-down grasps by default).
+
+    The grid is built by sweeping lift x arm extension x wrist yaw through forward kinematics, with base x at zero. Since the base can drive along its x axis in manipulation mode, lookups can optionally ignore x. Every reachable cell also stores a (lift, arm, yaw) configuration that reaches it, which makes a good IK seed.
+    """
+
+    def __init__(
+        self,
+        reachable: np.ndarray,
+        configs: np.ndarray,
+        origin: np.ndarray,
+        resolution: float,
+        pitch: float,
+        roll: float,
+    ):
+        """
+        Args:
+            reachable: [X, Y, Z] bool grid
+            configs: [X, Y, Z, 3] float (lift, arm, yaw) reaching each cell; nan where unreachable
+            origin: [3,] base frame position of the corner of cell (0, 0, 0)
+            resolution: cell size in meters
+            pitch, roll: wrist angles the grid was built with
+        """
+        self.reachable = reachable.astype(bool)
+        self.configs = configs
+        self.origin = np.asarray(origin, dtype=float)
+        self.resolution = float(resolution)
+        self.pitch = float(pitch)
+        self.roll = float(roll)
+        # Reachable (y, z) for any base x
+        self.reachable_yz = self.reachable.any(axis=0)
+
+    @classmethod
+    def build(
+        cls,
+        urdf_path: str = DEFAULT_URDF_PATH,
+        resolution: float = 0.02,
+        yaw_step: float = 0.1,
+        pitch: float = -np.pi / 2,
+        roll: float = 0.0,
+        num_workers: Optional[int] = None,
+    ) -> "StretchReachabilityMap":
+        """Sweep the arm joints through forward kinematics in a process pool and voxelize the end effector positions."""
+        robot = HelloStretchKinematics(urdf_path=urdf_path, ik_type="pinocchio")
+        lift_range = robot.range[HelloStretchIdx.LIFT]
+        arm_range = robot.range[HelloStretchIdx.ARM]
+        yaw_range = robot.range[HelloStretchIdx.WRIST_YAW]
+        # Sample joints finer than the grid so that no cells are skipped
+        lifts = np.arange(lift_range[0], lift_range[1], resolution / 2)
+        arms = np.arange(arm_range[0], arm_range[1], resolution / 2)
+        yaws = np.arange(yaw_range[0], yaw_range[1], yaw_step)
+
+        tasks = [(lift, arms, yaws, pitch, roll) for lift in lifts]
+        with multiprocessing.Pool(
+            num_workers, initializer=_init_worker, initargs=(urdf_path,)
+        ) as pool:
+            positions = np.stack(pool.map(_compute_fk_chunk, tasks))
+
+        configs = np.stack(
+            np.meshgrid(lifts, arms, yaws, indexing="ij"), axis=-1
+        ).reshape(-1, 3)
+        positions = positions.reshape(-1, 3)
+        origin = positions.min(axis=0) - resolution
+        idx = np.floor((positions - origin) / resolution).astype(int)
+        shape = idx.max(axis=0) + 2
+        reachable = np.zeros(shape, dtype=bool)
+        reachable[idx[:, 0], idx[:, 1], idx[:, 2]] = True
+        grid_configs = np.full(tuple(shape) + (3,), np.nan, dtype=np.float32)
+        grid_configs[idx[:, 0], idx[:, 1], idx[:, 2]] = configs
+
+        # Fill single-cell gaps left by the sampling
+        reachable |= scipy.ndimage.binary_closing(
+            reachable, structure=np.ones((3, 3, 3))
+        )
+        return cls(reachable, grid_configs, origin, resolution, pitch, roll)
+
+    def save(self, path: str):
+        """Write the map to an npz file"""
+        np.savez_compressed(
+            path,
+            reachable=self.reachable,
+            configs=self.configs,
+            origin=self.origin,
+            resolution=self.resolution,
+            pitch=self.pitch,
+            roll=self.roll,
+        )
+
+    @classmethod
+    def load(cls, path: str) -> "StretchReachabilityMap":
+        """Read a map written by save()"""
+        data = np.load(path)
+        return cls(
+            data["reachable"],
+            data["configs"],
+            data["origin"],
+            float(data["resolution"]),
+            float(data["pitch"]),
+            float(data["roll"]),
+        )
+
+    def _get_indices(self, points: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Grid indices of [N, 3] points and a mask of which ones fall inside the grid"""
+        idx = np.floor((points - self.origin) / self.resolution).astype(int)
+        inside = np.all((idx >= 0) & (idx < self.reachable.shape), axis=-1)
+        return idx, inside
+
+    def is_reachable(
+        self, points: np.ndarray, allow_base_motion: bool = True
+    ) -> np.ndarray:
+        """Check many base frame points at once.
+
+        Args:
+            points: [N, 3] or [3,] positions of the end effector in base coordinates
+            allow_base_motion: the base may drive along x, so only y and z matter
+
+        Returns:
+            reachable: [N,] bool
+        """
+        points = np.asarray(points, dtype=float).reshape(-1, 3)
+        idx, inside = self._get_indices(points)
+        result = np.zeros(len(points), dtype=bool)
+        if allow_base_motion:
+            inside = np.all(
+                (idx[:, 1:] >= 0) & (idx[:, 1:] < self.reachable.shape[1:]), axis=-1
+            )
+            result[inside] = self.reachable_yz[idx[inside, 1], idx[inside, 2]]
+        else:
+            result[inside] = self.reachable[
+                idx[inside, 0], idx[inside, 1], idx[inside, 2]
+            ]
+        return result
+
+    def get_height_range(self) -> Tuple[float, float]:
+        """Lowest and highest reachable end effector heights"""
+        z = np.nonzero(self.reachable_yz.any(axis=0))[0]
+        return (
+            self.origin[2] + z[0] * self.resolution,
+            self.origin[2] + (z[-1] + 1) * self.resolution,
+        )
+
+    def get_seed(self, point: np.ndarray) -> Optional[np.ndarray]:
+        """A (lift, arm, yaw) configuration that puts the end effector in the same cell as point (with base x at 0), or None"""
+        idx, inside = self._get_indices(np.asarray(point, dtype=float).reshape(1, 3))
+        if not inside[0]:
+            return None
+        config = self.configs[idx[0, 0], idx[0, 1], idx[0, 2]]
+        if np.any(np.isnan(config)):
+            return None
+        return config.astype(float)
+
+
+@click.command()
+@click.option("--output", default="stretch_reachability.npz", help="Output npz file")
+@click.option("--urdf-path", default=DEFAULT_URDF_PATH, help="Stretch urdf directory")
+@click.option("--resolution", default=0.02, help="Grid cell size in meters")
+@click.option("--num-workers", default=None, type=int, help="Processes to use")
+def main(output: str, urdf_path: str, resolution: float, num_workers: int):
+    """Build the reachability map and write it to disk."""
+    reachability = StretchReachabilityMap.build(
+        urdf_path=urdf_path, resolution=resolution, num_workers=num_workers
+    )
+    reachability.save(output)
+    print(
+        f"Wrote {output}: {reachability.reachable.shape} grid, {reachability.reachable.sum()} reachable cells"
+    )
+
+
+if __name__ == "__main__":
+    main()
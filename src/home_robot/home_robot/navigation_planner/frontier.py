@@ -0,0 +1,259 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+#
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+
+import numpy as np
+import scipy.ndimage
+import skfmm
+import torch
+from torch import Tensor
+
+from home_robot.utils.morphology import (
+    dilate_mask,
+    get_bounds_of_mask,
+    get_edges,
+    pad_bounds,
+)
+
+
+@dataclass
+class FrontierSegment:
+    """A connected piece of the frontier, in grid coordinates."""
+
+    segment_id: int
+    """label of this segment in FrontierTracker.labels"""
+    size: int
+    """number of frontier cells in this segment"""
+    centroid: Tensor
+    """[2,] mean grid coordinates of the frontier cells"""
+    distance: float = float("inf")
+    """geodesic distance from the last ranking start, in cells"""
+
+
+class FrontierTracker:
+    """Maintain frontier cells of a 2d explored map incrementally.
+
+    The frontier is defined exactly as in SparseVoxelMapNavigationSpace: cells within dilate_frontier_size of an explored/unexplored edge that are explored and not near obstacles. A change to a cell can only affect the frontier within `margin` cells of it, so on every update we only recompute the bounding box of the cells that changed since the previous map (plus context), which is much cheaper than full-map dilations once most of the map is stable.
+    """
+
+    def __init__(
+        self,
+        dilate_frontier_size: int = 12,
+        dilate_obstacle_size: int = 2,
+        min_segment_size: int = 1,
+    ):
+        """
+        Args:
+            dilate_frontier_size(int): radius in cells of the band around explored edges
+            dilate_obstacle_size(int): radius in cells that obstacles are padded by
+            min_segment_size(int): smaller frontier segments are ignored when ranking
+        """
+        self.dilate_frontier_size = dilate_frontier_size
+        self.dilate_obstacle_size = dilate_obstacle_size
+        self.min_segment_size = min_segment_size
+        # How far the effect of a single changed cell can spread
+        self.margin = 1 + dilate_obstacle_size + dilate_frontier_size
+        self.reset()
+
+    def reset(self):
+        """Forget the previous map; the next update will recompute everything."""
+        self._obstacles = None
+        self._explored = None
+        self.traversible = None
+        self.frontier = None
+        self.outside_frontier = None
+        # Incremented every time the frontier changes
+        self.version = 0
+        self._labels = None
+        self._segments = None
+        self._segments_version = -1
+
+    def _compute(
+        self, obstacles: Tensor, explored: Tensor
+    ) -> Tuple[Tensor, Tensor, Tensor]:
+        """Compute traversible, frontier and outside frontier masks for a map or a crop of one."""
+        obstacles = dilate_mask(obstacles, self.dilate_obstacle_size)
+        edges = get_edges(explored)
+
+        # Do not explore obstacles any more
+        traversible = explored & ~obstacles
+        frontier_edges = edges & ~obstacles
+        expanded_frontier = dilate_mask(frontier_edges, self.dilate_frontier_size)
+        outside_frontier = expanded_frontier & ~explored
+        frontier = expanded_frontier & ~obstacles & explored
+        return traversible, frontier, outside_frontier
+
+    def update(self, obstacles: Tensor, explored: Tensor) -> Tensor:
+        """Update the frontier from a new pair of 2d maps and return the frontier mask.
+
+        Args:
+            obstacles(Tensor): [H, W] bool obstacle map
+            explored(Tensor): [H, W] bool explored map
+        """
+        obstacles = obstacles.bool()
+        explored = explored.bool()
+        if self._explored is None or self._explored.shape != explored.shape:
+            (
+                self.traversible,
+                self.frontier,
+                self.outside_frontier,
+            ) = self._compute(obstacles, explored)
+        else:
+            changed = (explored ^ self._explored) | (obstacles ^ self._obstacles)
+            bounds = get_bounds_of_mask(changed, margin=self.margin)
+            if bounds is None:
+                # Nothing changed since the last update
+                return self.frontier
+            # Compute on a crop with enough context that the cells we write back
+            # are not affected by the crop boundary
+            x0, x1, y0, y1 = bounds
+            cx0, cx1, cy0, cy1 = pad_bounds(bounds, self.margin, explored.shape)
+            traversible, frontier, outside_frontier = self._compute(
+                obstacles[cx0:cx1, cy0:cy1], explored[cx0:cx1, cy0:cy1]
+            )
+            ix0, ix1, iy0, iy1 = x0 - cx0, x1 - cx0, y0 - cy0, y1 - cy0
+            self.traversible[x0:x1, y0:y1] = traversible[ix0:ix1, iy0:iy1]
+            self.frontier[x0:x1, y0:y1] = frontier[ix0:ix1, iy0:iy1]
+            self.outside_frontier[x0:x1, y0:y1] = outside_frontier[ix0:ix1, iy0:iy1]
+
+        self._obstacles = obstacles.clone()
+        self._explored = explored.clone()
+        self.version += 1
+        return self.frontier
+
+    def get_segments(self) -> List[FrontierSegment]:
+        """Cluster frontier cells into 8-connected segments. Results are cached until the frontier changes."""
+        assert self.frontier is not None, "call update() before querying segments"
+        if self._segments_version == self.version:
+            return self._segments
+        frontier = self.frontier.cpu().numpy()
+        labels, num_segments = scipy.ndimage.label(frontier, structure=np.ones((3, 3)))
+        segments = []
+        if num_segments > 0:
+            ids = np.arange(1, num_segments + 1)
+            sizes = np.bincount(labels.ravel(), minlength=num_segments + 1)[1:]
+            centroids = scipy.ndimage.center_of_mass(frontier, labels, ids)
+            for i, size, centroid in zip(ids, sizes, centroids):
+                if size < self.min_segment_size:
+                    continue
+                segments.append(
+                    FrontierSegment(int(i), int(size), torch.tensor(centroid))
+                )
+        self._labels = labels
+        self._segments = segments
+        self._segments_version = self.version
+        return segments
+
+    @property
+    def labels(self) -> np.ndarray:
+        """[H, W] segment label of every frontier cell; 0 is not frontier."""
+        self.get_segments()
+        return self._labels
+
+    def get_distance_field(self, start: Tuple[int, int]) -> np.ndarray:
+        """Geodesic distance in cells from start over traversible space; unreachable cells are inf."""
+        assert self.traversible is not None, "call update() before computing distances"
+        traversible = self.traversible.cpu().numpy().copy()
+        start_x, start_y = int(start[0]), int(start[1])
+        # The robot may be slightly inside a padded obstacle; plan out from there anyway
+        traversible[start_x, start_y] = True
+        m = np.ones(traversible.shape)
+        m[start_x, start_y] = 0
+        m = np.ma.masked_array(m, ~traversible)
+        distance = skfmm.distance(m, dx=1)
+        return np.ma.filled(distance.astype(float), np.inf)
+
+    def rank_segments(
+        self, start: Tuple[int, int], distance_field: Optional[np.ndarray] = None
+    ) -> List[FrontierSegment]:
+        """Return reachable segments, sorted by the geodesic distance from start to their closest cell. Uses a single FMM solve for all segments."""
+        segments = self.get_segments()
+        if len(segments) == 0:
+            return []
+        if distance_field is None:
+            distance_field = self.get_distance_field(start)
+        ids = [s.segment_id for s in segments]
+        distances = scipy.ndimage.minimum(distance_field, self._labels, ids)
+        for segment, distance in zip(segments, distances):
+            segment.distance = float(distance)
+        return sorted(
+            [s for s in segments if np.isfinite(s.distance)], key=lambda s: s.distance
+        )
+
+    def get_viewpoints(
+        self,
+        start: Tuple[int, int],
+        candidates_per_segment: int = 1,
+        min_dist: float = 0.0,
+        distance_field: Optional[np.ndarray] = None,
+    ) -> Tuple[Tensor, Tensor, Tensor]:
+        """Compute candidate viewpoints for every reachable frontier segment in one batch.
+
+        Candidates are the frontier cells of each segment closest to start, oriented towards the closest unexplored cell just beyond the frontier. They are ordered by segment (closest segment first) and then by distance within the segment.
+
+        Args:
+            start: grid coordinates of the robot
+            candidates_per_segment(int): how many cells to return for every segment
+            min_dist(float): ignore cells closer than this to start, in cells
+            distance_field: precomputed output of get_distance_field(start)
+
+        Returns:
+            grid_xyt(Tensor): [K, 3] grid x, grid y and orientation of each viewpoint
+            distances(Tensor): [K,] geodesic distance to each viewpoint in cells
+            segment_ids(Tensor): [K,] segment label of each viewpoint
+        """
+        if distance_field is None:
+            distance_field = self.get_distance_field(start)
+        segments = self.rank_segments(start, distance_field)
+        empty = (torch.zeros(0, 3), torch.zeros(0), torch.zeros(0, dtype=torch.long))
+        if len(segments) == 0:
+            return empty
+
+        # Order of each segment by geodesic distance
+        segment_rank = np.full(int(self._labels.max()) + 1, -1)
+        for rank, segment in enumerate(segments):
+            segment_rank[segment.segment_id] = rank
+
+        xs, ys = np.nonzero(self._labels)
+        labels = self._labels[xs, ys]
+        distances = distance_field[xs, ys]
+        keep = (
+            (segment_rank[labels] >= 0)
+            & np.isfinite(distances)
+            & (distances >= min_dist)
+        )
+        xs, ys, labels, distances = xs[keep], ys[keep], labels[keep], distances[keep]
+        if len(xs) == 0:
+            return empty
+
+        # Sort by segment rank then distance, and keep the first few of each segment
+        order = np.lexsort((distances, segment_rank[labels]))
+        xs, ys, labels, distances = (
+            xs[order],
+            ys[order],
+            labels[order],
+            distances[order],
+        )
+        _, first, inverse = np.unique(labels, return_index=True, return_inverse=True)
+        keep = (np.arange(len(labels)) - first[inverse]) < candidates_per_segment
+        xs, ys, labels, distances = xs[keep], ys[keep], labels[keep], distances[keep]
+
+        # Look towards the closest unexplored cell
+        grid_xy = torch.from_numpy(np.stack([xs, ys], axis=-1)).float()
+        outside = torch.nonzero(self.outside_frontier.cpu(), as_tuple=False).float()
+        grid_xyt = torch.zeros(len(xs), 3)
+        grid_xyt[:, :2] = grid_xy
+        if outside.size(0) > 0:
+            closest = outside[torch.cdist(grid_xy, outside).argmin(dim=1)]
+            delta = closest - grid_xy
+            theta = torch.atan2(delta[:, 1], delta[:, 0])
+            # Ensure angle is in 0 to 2 * PI
+            grid_xyt[:, 2] = torch.remainder(theta, 2 * np.pi)
+        return (
+            grid_xyt,
+            torch.from_numpy(distances).float(),
+            torch.from_numpy(labels).long(),
+        )
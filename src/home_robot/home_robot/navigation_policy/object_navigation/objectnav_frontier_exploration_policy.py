@@ -10,7 +10,12 @@ import torch.nn as nn
 from sklearn.cluster import DBSCAN
 
 from home_robot.mapping.semantic.constants import MapConstants as MC
-from home_robot.utils.morphology import binary_dilation, binary_erosion
+from home_robot.utils.morphology import (
+    binary_dilation,
+    binary_erosion,
+    get_bounds_of_mask,
+    pad_bounds,
+)
 
 
 class ObjectNavFrontierExplorationPolicy(nn.Module):
@@ -46,6 +51,12 @@ class ObjectNavFrontierExplorationPolicy(nn.Module):
         )
         self.num_sem_categories = num_sem_categories
 
+        # Cache of the last unexplored map and its frontier so that we only have
+        # to recompute the frontier around cells that changed since then
+        self._frontier_margin = explored_area_dilation_radius + 1
+        self._prev_unexplored = None
+        self._prev_frontier_map = None
+
     @property
     def goal_update_steps(self):
         return 1
@@ -240,15 +251,8 @@ class ObjectNavFrontierExplorationPolicy(nn.Module):
                     found_goal_current[e] = True
         return goal_map, found_goal_current
 
-    def get_frontier_map(self, map_features):
-        # Select unexplored area
-        if self.exploration_strategy == "seen_frontier":
-            frontier_map = (map_features[:, [MC.EXPLORED_MAP], :, :] == 0).float()
-        elif self.exploration_strategy == "been_close_to_frontier":
-            frontier_map = (map_features[:, [MC.BEEN_CLOSE_MAP], :, :] == 0).float()
-        else:
-            raise Exception("not implemented")
-
+    def _compute_frontier_map(self, frontier_map):
+        """Compute the frontier from a (batch_size, 1, M, M) map of unexplored cells, or from a crop of one."""
         # Dilate explored area
         frontier_map = 1 - binary_dilation(
             1 - frontier_map, self.dilate_explored_kernel
@@ -261,6 +265,45 @@ class ObjectNavFrontierExplorationPolicy(nn.Module):
 
         return frontier_map
 
+    def get_frontier_map(self, map_features):
+        # Select unexplored area
+        if self.exploration_strategy == "seen_frontier":
+            unexplored = (map_features[:, [MC.EXPLORED_MAP], :, :] == 0).float()
+        elif self.exploration_strategy == "been_close_to_frontier":
+            unexplored = (map_features[:, [MC.BEEN_CLOSE_MAP], :, :] == 0).float()
+        else:
+            raise Exception("not implemented")
+
+        if (
+            self._prev_unexplored is None
+            or self._prev_unexplored.shape != unexplored.shape
+            or self._prev_unexplored.device != unexplored.device
+        ):
+            frontier_map = self._compute_frontier_map(unexplored)
+        else:
+            # Only recompute the region around cells that changed, with enough
+            # context around it that the crop boundary has no effect
+            frontier_map = self._prev_frontier_map.clone()
+            margin = self._frontier_margin
+            shape = unexplored.shape[-2:]
+            for e in range(unexplored.shape[0]):
+                changed = unexplored[e, 0] != self._prev_unexplored[e, 0]
+                bounds = get_bounds_of_mask(changed, margin=margin)
+                if bounds is None:
+                    continue
+                x0, x1, y0, y1 = bounds
+                cx0, cx1, cy0, cy1 = pad_bounds(bounds, margin, shape)
+                crop = self._compute_frontier_map(
+                    unexplored[e : e + 1, :, cx0:cx1, cy0:cy1]
+                )
+                frontier_map[e, :, x0:x1, y0:y1] = crop[
+                    0, :, x0 - cx0 : x1 - cx0, y0 - cy0 : y1 - cy0
+                ]
+
+        self._prev_unexplored = unexplored
+        self._prev_frontier_map = frontier_map
+        return frontier_map.clone()
+
     def explore_otherwise(self, map_features, goal_map, found_goal):
         """Explore closest unexplored region otherwise."""
         frontier_map = self.get_frontier_map(map_features)
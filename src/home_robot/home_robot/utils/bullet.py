@@ -96,9 +96,15 @@ class PbObject(object):
         return np.array(pos), np.array(orn)
 
     def is_colliding(self, other, distance=0.001):
-        res = pb.getClosestPoints(self.id, other.id, distance)
+        res = pb.getClosestPoints(
+            self.id, other.id, distance, physicsClientId=self.client
+        )
         return len(res) > 0
 
+    def is_colliding_with_any(self, others, distance=0.001) -> bool:
+        """check against a list of objects, stopping at the first collision"""
+        return any(self.is_colliding(other, distance) for other in others)
+
 
 class PbArticulatedObject(PbObject):
     def __init__(
@@ -186,6 +192,18 @@ class PbArticulatedObject(PbObject):
         for i, q in zip(self.controllable_joint_infos, positions):
             self.set_joint_position(i.index, q)
 
+    def set_joint_positions_by_index(self, indices, positions):
+        """reset many joints, given by bullet joint index, in a single call"""
+        pb.resetJointStatesMultiDof(
+            self.id,
+            jointIndices=list(indices),
+            targetValues=[[q] for q in positions],
+            physicsClientId=self.client,
+        )
+
+    def get_link_index(self, name) -> int:
+        return self._link_idx[name]
+
     def get_joint_positions(self):
         return pb.getJointState(
             self.id,
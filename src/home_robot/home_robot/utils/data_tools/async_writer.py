@@ -0,0 +1,220 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+#
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+import threading
+import timeit
+from collections import deque
+from typing import Any, Callable, Dict, NamedTuple, Optional
+
+import numpy as np
+
+import home_robot.utils.data_tools.image as image
+from home_robot.utils.data_tools.writer import DataWriter
+
+# What to do with a new frame when the queue is full
+DROP_OLDEST = "drop_oldest"
+BLOCK = "block"
+BACKPRESSURE_POLICIES = [DROP_OLDEST, BLOCK]
+
+
+class QueuedFrame(NamedTuple):
+    index: int
+    timestamp: float
+    images: Dict[str, np.ndarray]
+    data: Dict[str, Any]
+
+
+class AsyncFrameWriter(object):
+    """Records frames to a DataWriter from background threads, so that the thread producing frames (e.g. a control loop) never waits for image encoding or disk.
+
+    add_frame puts a frame on a deque, which needs no lock to append to or pop from. Worker threads take frames off it, encode their images, and hand them to the writer in the order they were added. When queue_size frames are waiting, backpressure decides what happens: with DROP_OLDEST the oldest waiting frame is dropped and add_frame returns at once; with BLOCK add_frame waits for a free slot, so no frame is lost. Dropped frames, and frames written more than max_latency seconds after they were added, are counted in get_stats().
+
+    Calls that touch the trial as a whole (add_config, write_trial) first wait for all queued frames to be written. Frames cannot be added after close().
+    """
+
+    def __init__(
+        self,
+        writer: DataWriter,
+        num_workers: int = 2,
+        queue_size: int = 8,
+        backpressure: str = DROP_OLDEST,
+        max_latency: Optional[float] = 0.5,
+        encode_fn: Callable[[np.ndarray], bytes] = image.img_to_bytes,
+    ):
+        """
+        Args:
+            writer: where frames go; only used from this object's threads until close()
+            num_workers: image encoding threads
+            queue_size: frames that can wait for a worker
+            backpressure: one of BACKPRESSURE_POLICIES
+            max_latency: seconds from add_frame to written after which a frame counts as late; None to not count
+            encode_fn: turns an image into bytes for the writer. Images are passed through as they are if the writer stores raw arrays.
+        """
+        if backpressure not in BACKPRESSURE_POLICIES:
+            raise ValueError(
+                f"unknown backpressure policy {backpressure}; use one of {BACKPRESSURE_POLICIES}"
+            )
+        self.writer = writer
+        self.queue_size = queue_size
+        self.backpressure = backpressure
+        self.max_latency = max_latency
+        self.encode_fn = encode_fn
+        if writer.image_layout == image.ARRAY_LAYOUT:
+            self.encode_fn = None
+
+        self._pending = deque()
+        # One release per frame on the deque, so workers can sleep until there is one
+        self._num_pending = threading.Semaphore(0)
+        # Free places on the deque, for BLOCK
+        self._free_slots = threading.Semaphore(queue_size)
+        # Encoded frames by index, waiting for the frames before them; None for dropped ones
+        self._done: Dict[int, Optional[tuple]] = {}
+        self._written = threading.Condition()
+        self._next_index = 0
+        self._num_added = 0
+        self._error = None
+        self._closed = False
+
+        self.num_dropped = 0
+        self.num_late = 0
+        self.num_written = 0
+        self._total_latency = 0.0
+        self._max_latency_seen = 0.0
+
+        self._workers = [
+            threading.Thread(target=self._work, daemon=True) for _ in range(num_workers)
+        ]
+        for worker in self._workers:
+            worker.start()
+
+    def _check_error(self):
+        if self._error is not None:
+            raise RuntimeError(
+                f"async writer for {self.writer.filename} failed"
+            ) from self._error
+
+    def add_frame(
+        self,
+        images: Dict[str, np.ndarray],
+        data: Dict[str, Any],
+        timestamp: Optional[float] = None,
+    ) -> bool:
+        """Queue a frame: images go to writer.add_img_frame after encoding, data to writer.add_frame. The arrays must not change after this call; pass copies of buffers that get reused.
+
+        Args:
+            timestamp: when the frame was captured, in timeit.default_timer() seconds; defaults to now
+
+        Returns:
+            dropped: whether an older frame was dropped to make room
+        """
+        if self._closed:
+            raise RuntimeError(f"async writer for {self.writer.filename} is closed")
+        self._check_error()
+        if timestamp is None:
+            timestamp = timeit.default_timer()
+        frame = QueuedFrame(self._num_added, timestamp, images, data)
+        self._num_added += 1
+        if self.backpressure == BLOCK:
+            self._free_slots.acquire()
+        elif len(self._pending) >= self.queue_size:
+            try:
+                oldest = self._pending.popleft()
+            except IndexError:
+                # A worker took it first
+                pass
+            else:
+                # Its place in the deque, and its count in _num_pending, go to the new frame
+                self._pending.append(frame)
+                self.num_dropped += 1
+                self._done[oldest.index] = None
+                return True
+        self._pending.append(frame)
+        self._num_pending.release()
+        return False
+
+    def _work(self):
+        """Worker thread: encode frames and write the ones that are next in order"""
+        while True:
+            self._num_pending.acquire()
+            frame = self._pending.popleft()
+            if frame is None:
+                break
+            if self.backpressure == BLOCK:
+                self._free_slots.release()
+            try:
+                images = frame.images
+                if self.encode_fn is not None:
+                    images = {k: self.encode_fn(v) for k, v in images.items()}
+                self._done[frame.index] = (frame, images)
+                self._write_ready()
+            except Exception as e:
+                self._error = e
+                # Keep later frames from waiting for this one forever
+                self._done[frame.index] = None
+                self._write_ready()
+
+    def _write_ready(self):
+        """Write encoded frames that are next in order"""
+        with self._written:
+            while self._next_index in self._done:
+                done = self._done.pop(self._next_index)
+                self._next_index += 1
+                if done is None:
+                    continue
+                frame, images = done
+                try:
+                    if len(images) > 0:
+                        self.writer.add_img_frame(**images)
+                    self.writer.add_frame(**frame.data)
+                except Exception as e:
+                    self._error = e
+                    continue
+                latency = timeit.default_timer() - frame.timestamp
+                self.num_written += 1
+                self._total_latency += latency
+                self._max_latency_seen = max(self._max_latency_seen, latency)
+                if self.max_latency is not None and latency > self.max_latency:
+                    self.num_late += 1
+            self._written.notify_all()
+
+    def flush(self):
+        """Block until every frame added so far is written or dropped"""
+        with self._written:
+            self._written.wait_for(lambda: self._next_index >= self._num_added)
+        self._check_error()
+
+    def add_config(self, **data):
+        self.flush()
+        self.writer.add_config(**data)
+
+    def write_trial(self, trial_id=None):
+        """Write out the frames added so far as a trial; see DataWriter.write_trial"""
+        self.flush()
+        return self.writer.write_trial(trial_id)
+
+    def get_stats(self) -> Dict[str, float]:
+        """Frame counts, and mean and max milliseconds from add_frame to written"""
+        with self._written:
+            return {
+                "added": self._num_added,
+                "written": self.num_written,
+                "dropped": self.num_dropped,
+                "late": self.num_late,
+                "queued": len(self._pending),
+                "mean_latency_ms": 1000
+                * self._total_latency
+                / max(self.num_written, 1),
+                "max_latency_ms": 1000 * self._max_latency_seen,
+            }
+
+    def close(self):
+        """Write out queued frames and stop the workers. Does not close the writer."""
+        self._closed = True
+        self.flush()
+        for _ in self._workers:
+            self._pending.append(None)
+            self._num_pending.release()
+        for worker in self._workers:
+            worker.join()
+        self._workers = []
@@ -13,15 +13,14 @@ from geometry_msgs.msg import TransformStamped
 from matplotlib import pyplot as plt
 from tf2_ros import tf2_ros
 
-from home_robot.utils.data_tools.image import img_from_bytes
+from home_robot.utils.data_tools.image import get_num_imgs, read_img
 
 
 def view_keyframe_imgs(file_object: h5py.File, trial_name: str):
     """utility to view keyframe images for named trial from h5 file"""
-    num_keyframes = len(file_object[f"{trial_name}/head_rgb"].keys())
-    for i in range(num_keyframes):
-        _key = f"{trial_name}/head_rgb/{i}"
-        img = img_from_bytes(file_object[_key][()])
+    img_stream = file_object[f"{trial_name}/head_rgb"]
+    for i in range(get_num_imgs(img_stream)):
+        img = read_img(img_stream, i)
         plt.imshow(img)
         plt.show()
 
@@ -3,6 +3,7 @@
 # This source code is licensed under the MIT license found in the
 # LICENSE file in the root directory of this source tree.
 import io
+from typing import Iterator, List, Union
 
 import cv2
 import h5py
@@ -44,6 +45,165 @@ def torch_to_bytes(img: np.ndarray) -> bytes:
     return img_to_bytes(img)
 
 
+# Attribute of an image stream's group or dataset saying how its frames are stored
+IMAGE_LAYOUT_ATTR = "layout"
+# A group with one np.void dataset of png bytes per frame, named by frame index
+PNG_LAYOUT = "png"
+# One chunked (T, H, W[, C]) dataset of raw pixels with a lossless compression filter
+ARRAY_LAYOUT = "array"
+# A group with the encoded bytes of all frames in one "data" dataset, and a (T + 1,) "offsets" table into it
+ENCODED_LAYOUT = "encoded"
+IMAGE_LAYOUTS = [PNG_LAYOUT, ARRAY_LAYOUT, ENCODED_LAYOUT]
+
+
+def append_imgs(
+    group: h5py.Group,
+    key: str,
+    imgs: List[Union[np.ndarray, bytes]],
+    layout: str = PNG_LAYOUT,
+    compression: str = "gzip",
+):
+    """Append frames to the image stream group[key], creating it on first use.
+
+    imgs are arrays, or already encoded bytes for the png and encoded layouts. For the array layout every frame gets its own chunk, so one frame can be read without decompressing its neighbours; compression is an HDF5 filter ("gzip" or "lzf"), which is lossless, so depth comes back exactly.
+    """
+    if layout not in IMAGE_LAYOUTS:
+        raise ValueError(f"unknown image layout {layout}; use one of {IMAGE_LAYOUTS}")
+    if len(imgs) == 0:
+        return
+    if layout == ARRAY_LAYOUT:
+        arr = np.stack([np.asarray(img) for img in imgs])
+        if key not in group:
+            dataset = group.create_dataset(
+                key,
+                shape=(0,) + arr.shape[1:],
+                maxshape=(None,) + arr.shape[1:],
+                chunks=(1,) + arr.shape[1:],
+                dtype=arr.dtype,
+                compression=compression,
+                # Byte shuffling helps compress 16 bit depth
+                shuffle=arr.dtype.itemsize > 1,
+            )
+            dataset.attrs[IMAGE_LAYOUT_ATTR] = ARRAY_LAYOUT
+        dataset = group[key]
+        start = dataset.shape[0]
+        dataset.resize(start + arr.shape[0], axis=0)
+        dataset[start:] = arr
+        return
+
+    encoded = [img if isinstance(img, bytes) else img_to_bytes(img) for img in imgs]
+    if layout == PNG_LAYOUT:
+        stream = group.require_group(key)
+        start = len(stream)
+        for i, bindata in enumerate(encoded):
+            stream[str(start + i)] = np.void(bindata)
+        return
+
+    if key not in group:
+        stream = group.create_group(key)
+        stream.attrs[IMAGE_LAYOUT_ATTR] = ENCODED_LAYOUT
+        stream.create_dataset(
+            "data", shape=(0,), maxshape=(None,), chunks=(2**16,), dtype=np.uint8
+        )
+        stream.create_dataset(
+            "offsets",
+            data=np.zeros(1, dtype=np.int64),
+            maxshape=(None,),
+            chunks=(1024,),
+        )
+    data, offsets = group[key]["data"], group[key]["offsets"]
+    num_frames = offsets.shape[0]
+    start = int(offsets[num_frames - 1])
+    ends = start + np.cumsum([len(bindata) for bindata in encoded])
+    data.resize(ends[-1], axis=0)
+    data[start:] = np.frombuffer(b"".join(encoded), dtype=np.uint8)
+    offsets.resize(num_frames + len(encoded), axis=0)
+    offsets[num_frames:] = ends
+
+
+def get_img_layout(stream: Union[h5py.Group, h5py.Dataset]) -> str:
+    """Layout of an image stream; groups without the attribute were written as png"""
+    default = ARRAY_LAYOUT if isinstance(stream, h5py.Dataset) else PNG_LAYOUT
+    return stream.attrs.get(IMAGE_LAYOUT_ATTR, default)
+
+
+class ImageStream(object):
+    """Random and sequential access to the frames of an image stream of any layout.
+
+    The datasets and the offsets table are looked up once, so keep one around (as Trial does) when reading many frames.
+    """
+
+    def __init__(self, stream: Union[h5py.Group, h5py.Dataset]):
+        self.stream = stream
+        self.layout = get_img_layout(stream)
+        if self.layout == ENCODED_LAYOUT:
+            self.data = stream["data"]
+            self.offsets = stream["offsets"][()]
+
+    def __len__(self) -> int:
+        if self.layout == ARRAY_LAYOUT:
+            return self.stream.shape[0]
+        elif self.layout == ENCODED_LAYOUT:
+            return len(self.offsets) - 1
+        return len(self.stream)
+
+    def get_bytes(self, idx: int) -> bytes:
+        """Encoded bytes of frame idx of a png or encoded layout stream"""
+        if self.layout == ENCODED_LAYOUT:
+            return self.data[self.offsets[idx] : self.offsets[idx + 1]].tobytes()
+        elif self.layout == PNG_LAYOUT:
+            return self.stream[str(idx)][()].tobytes()
+        raise ValueError("array layout streams hold raw pixels, not encoded bytes")
+
+    def read(self, idx: int, height=None, width=None) -> np.ndarray:
+        """Read frame idx"""
+        if self.layout == ARRAY_LAYOUT:
+            return _resize(self.stream[idx], height, width)
+        return img_from_bytes(self.get_bytes(idx), height, width)
+
+    def __getitem__(self, idx: int) -> np.ndarray:
+        return self.read(idx)
+
+    def iter(self, height=None, width=None) -> Iterator[np.ndarray]:
+        """Read every frame in order"""
+        if self.layout == ARRAY_LAYOUT:
+            # Read a few chunks per call instead of one frame at a time
+            for start in range(0, len(self), 16):
+                for img in self.stream[start : start + 16]:
+                    yield _resize(img, height, width)
+        else:
+            for idx in range(len(self)):
+                yield self.read(idx, height, width)
+
+    def __iter__(self) -> Iterator[np.ndarray]:
+        return self.iter()
+
+
+def _resize(img: np.ndarray, height=None, width=None) -> np.ndarray:
+    if height and width:
+        return np.asarray(Image.fromarray(img).resize([width, height]))
+    return img
+
+
+def get_num_imgs(stream: Union[h5py.Group, h5py.Dataset]) -> int:
+    """Number of frames in an image stream of any layout"""
+    return len(ImageStream(stream))
+
+
+def read_img(
+    stream: Union[h5py.Group, h5py.Dataset], idx: int, height=None, width=None
+) -> np.ndarray:
+    """Read frame idx of an image stream of any layout"""
+    return ImageStream(stream).read(idx, height, width)
+
+
+def iter_imgs(
+    stream: Union[h5py.Group, h5py.Dataset], height=None, width=None
+) -> Iterator[np.ndarray]:
+    """Read every frame of an image stream of any layout in order"""
+    return ImageStream(stream).iter(height, width)
+
+
 def png_to_gif(
     group: h5py.Group, key: str, name: str, save=True, height=None, width=None
 ):
@@ -53,13 +213,9 @@ def png_to_gif(
     gif = []
     print("Writing gif to file:", name)
     img_stream = group[key]
-    # for i,aimg in enumerate(tqdm(group[key], ncols=50)):
-    for ki, k in tqdm(
-        sorted([(int(j), j) for j in img_stream.keys()], key=lambda pair: pair[0]),
-        ncols=50,
+    for img in tqdm(
+        iter_imgs(img_stream, height, width), total=get_num_imgs(img_stream), ncols=50
     ):
-        bindata = img_stream[k][()]
-        img = img_from_bytes(bindata, height, width)
         gif.append(img)
     if save:
         imageio.mimsave(name, gif)
@@ -112,14 +268,7 @@ def png_to_mp4(group: h5py.Group, key: str, name: str, fps=10):
     img_stream = group[key]
     writer = None
 
-    # for i,aimg in enumerate(tqdm(group[key], ncols=50)):
-    for ki, k in tqdm(
-        sorted([(int(j), j) for j in img_stream.keys()], key=lambda pair: pair[0]),
-        ncols=50,
-    ):
-
-        bindata = img_stream[k][()]
-        _img = img_from_bytes(bindata)
+    for _img in tqdm(iter_imgs(img_stream), total=get_num_imgs(img_stream), ncols=50):
         w, h = _img.shape[:2]
         img = np.zeros_like(_img)
         img[:, :, 0] = _img[:, :, 2]
@@ -3,7 +3,11 @@
 # This source code is licensed under the MIT license found in the
 # LICENSE file in the root directory of this source tree.
 import glob
+import json
 import os
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterable, List, Optional, Union
 
 import h5py
 import numpy as np
@@ -14,41 +18,66 @@ import home_robot.utils.data_tools.image as image
 
 
 class Trial(object):
-    def __init__(self, name, h5_filename, dataset, group):
+    def __init__(
+        self, name, h5_filename, dataset, info: Union[h5py.Group, Dict[str, Any]]
+    ):
         """
-        Use group for initialization
+        Initialize from the trial's entry in the dataset index, as returned by read_info, or from its h5py group. The entry is kept as self.info.
         """
         self.dataset = dataset
         self.name = name
         self.h5_filename = h5_filename
         self.group = None
+        # File the cached group and image streams were opened from
+        self._h5 = None
+        # image.ImageStream per image key, opened on first read
+        self.img_streams = {}
 
-        temporal_keys = group[base.TEMPORAL_KEYS][()]
-        config_keys = group[base.CONFIG_KEYS][()]
-        image_keys = group[base.IMAGE_KEYS][()]
-        temporal_keys = (
-            str(temporal_keys, "utf-8")
-            if type(temporal_keys) == bytes
-            else temporal_keys
-        )
-        config_keys = (
-            str(config_keys, "utf-8") if type(config_keys) == bytes else config_keys
-        )
-        image_keys = (
-            str(image_keys, "utf-8") if type(image_keys) == bytes else image_keys
-        )
-        self.temporal_keys = temporal_keys.split(",")
-        self.config_keys = config_keys.split(",")
-        self.image_keys = image_keys.split(",")
-        if len(self.temporal_keys) > 0:
-            self.length = group[self.temporal_keys[0]].shape[0]
+        if not isinstance(info, dict):
+            info = self.read_info(info)
+        self.info = info
+        self.temporal_keys = info["temporal_keys"].split(",")
+        self.config_keys = info["config_keys"].split(",")
+        self.image_keys = info["image_keys"].split(",")
+        self.length = info["length"]
+
+    @staticmethod
+    def read_info(group: h5py.Group) -> Dict[str, Any]:
+        """Keys, length and demo status of a trial; this is what the dataset index stores. Subclasses that need more from the file at start-up add it here, as JSON-serializable values."""
+        info = {}
+        for name, key in [
+            ("temporal_keys", base.TEMPORAL_KEYS),
+            ("config_keys", base.CONFIG_KEYS),
+            ("image_keys", base.IMAGE_KEYS),
+        ]:
+            keys = group[key][()]
+            info[name] = str(keys, "utf-8") if type(keys) == bytes else keys
+        temporal_keys = info["temporal_keys"].split(",")
+        if len(temporal_keys) > 0:
+            info["length"] = int(group[temporal_keys[0]].shape[0])
+        else:
+            info["length"] = 0
+        if "demo_status" in group.keys():
+            info["demo_status"] = int(group["demo_status"][()])
         else:
-            self.length = 0
+            info["demo_status"] = None
+        return info
+
+    def __getstate__(self):
+        # h5py objects cannot be pickled, e.g. for spawned DataLoader workers
+        state = self.__dict__.copy()
+        state["group"] = None
+        state["_h5"] = None
+        state["img_streams"] = {}
+        return state
 
     def __getitem__(self, key):
-        if self.group is None:
-            h5 = self.dataset.get_h5_file(self.h5_filename)
+        h5 = self.dataset.get_h5_file(self.h5_filename)
+        if self.group is None or self._h5 is not h5:
+            # First access, or the dataset reopened its files in a new process
             self.group = h5[self.name]
+            self._h5 = h5
+            self.img_streams = {}
         return self.group[key]
 
     def get_conf(self, key):
@@ -64,10 +93,35 @@ class Trial(object):
             conf[k] = group[k][()]
         return conf
 
+    def get_img_stream(self, key) -> image.ImageStream:
+        """Reader for the frames of an image key"""
+        group = self[key]
+        if key not in self.img_streams:
+            self.img_streams[key] = image.ImageStream(group)
+        return self.img_streams[key]
+
+    def prefetch_imgs(self, keys: Iterable[str], idxs: Iterable[int]):
+        """Start decoding frames idxs of each image key in the background, so that get_img finds them ready. Does nothing unless the dataset has decode threads."""
+        prefetcher = self.dataset.get_prefetcher()
+        if prefetcher is None:
+            return
+        for key in keys:
+            for idx in idxs:
+                prefetcher.submit(self, key, idx)
+
     def get_img(self, key, idx, depth=False, rgb=False, depth_factor=10000):
         assert key in self.image_keys
-        group = self[key]
-        arr = image.img_from_bytes(group[str(idx)][()])
+        prefetcher = self.dataset.get_prefetcher()
+        if prefetcher is None:
+            arr = self.get_img_stream(key).read(idx)
+        else:
+            arr = prefetcher.get(self, key, idx)
+            # Decode ahead, for datasets that read frames in order
+            num_frames = len(self.get_img_stream(key))
+            for next_idx in range(
+                idx + 1, min(idx + 1 + self.dataset.decode_ahead, num_frames)
+            ):
+                prefetcher.submit(self, key, next_idx)
         if depth:
             return arr / depth_factor
         elif rgb:
@@ -76,9 +130,61 @@ class Trial(object):
             return arr
 
 
+class ImagePrefetcher(object):
+    """Decodes image frames on a thread pool before they are asked for.
+
+    PIL releases the GIL while decoding, so frames decode alongside each other and alongside the rest of get_datum. Image streams are opened on the calling thread; the pool only reads and decodes. At most max_size pending or decoded frames are kept, dropping the oldest first.
+    """
+
+    def __init__(self, num_threads: int = 2, max_size: int = 64):
+        self.pool = ThreadPoolExecutor(num_threads)
+        self.max_size = max_size
+        self.pending = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def _get_key(self, trial: Trial, key: str, idx: int):
+        return (trial.h5_filename, trial.name, key, int(idx))
+
+    def submit(self, trial: Trial, key: str, idx: int):
+        """Start decoding a frame, unless it already is"""
+        item = self._get_key(trial, key, idx)
+        if item in self.pending:
+            return
+        self.pending[item] = self.pool.submit(trial.get_img_stream(key).read, idx)
+        while len(self.pending) > self.max_size:
+            _, future = self.pending.popitem(last=False)
+            future.cancel()
+
+    def get(self, trial: Trial, key: str, idx: int) -> np.ndarray:
+        """Frame from the background decode if one was started, else decoded now"""
+        future = self.pending.pop(self._get_key(trial, key, idx), None)
+        if future is None:
+            self.misses += 1
+            return trial.get_img_stream(key).read(idx)
+        self.hits += 1
+        return future.result()
+
+    def shutdown(self):
+        for future in self.pending.values():
+            future.cancel()
+        self.pending.clear()
+        self.pool.shutdown(wait=True)
+
+
 class DatasetBase(torch.utils.data.Dataset):
     """Access hdf5 file(s) and creates data slices that we can use for training neural
-    net models."""
+    net models.
+
+    Open files are tracked per process: a DataLoader worker forked from a process that already read from the files opens its own handles instead of sharing the parent's, which HDF5 does not support.
+
+    With use_index, the keys, length and demo status of every trial are cached in INDEX_FILENAME in dirname, so that start-up only opens files that were added or changed since the last run. If the directory is read only, the index is silently not written.
+
+    With num_decode_threads > 0, Trial.get_img decodes the next decode_ahead frames of a key in the background after each read, and Trial.prefetch_imgs can start decoding frames that get_datum is about to read.
+    """
+
+    INDEX_FILENAME = ".data_tools_index.json"
+    INDEX_VERSION = 2
 
     def __init__(
         self,
@@ -87,6 +193,9 @@ class DatasetBase(torch.utils.data.Dataset):
         verbose=False,
         trial_list: list = None,
         TrialType=None,
+        use_index: bool = True,
+        num_decode_threads: int = 0,
+        decode_ahead: int = 2,
     ):
         """
         Take all files in directory
@@ -99,11 +208,32 @@ class DatasetBase(torch.utils.data.Dataset):
         self.template = template
         self.verbose = verbose
         self.trial_list = trial_list
+        self.use_index = use_index
+        self.num_decode_threads = num_decode_threads
+        self.decode_ahead = decode_ahead
+        self._pid = os.getpid()
+        self._prefetcher = None
         template = os.path.join(self.dirname, self.template)
         files = sorted(glob.glob(template))
         self.process_files(files)
 
+    def __getstate__(self):
+        # Open files and threads are per process
+        state = self.__dict__.copy()
+        state["h5s"] = {}
+        state["_prefetcher"] = None
+        state["_pid"] = None
+        return state
+
+    def _check_process(self):
+        """Drop file handles and decode threads inherited from another process"""
+        if self._pid != os.getpid():
+            self.h5s = {}
+            self._prefetcher = None
+            self._pid = os.getpid()
+
     def get_h5_file(self, filename):
+        self._check_process()
         if filename in self.h5s:
             return self.h5s[filename]
         else:
@@ -111,6 +241,73 @@ class DatasetBase(torch.utils.data.Dataset):
             self.h5s[filename] = h5
             return h5
 
+    def get_prefetcher(self) -> Optional[ImagePrefetcher]:
+        """Background image decoder for this process, or None if decode threads are off"""
+        if self.num_decode_threads <= 0:
+            return None
+        self._check_process()
+        if self._prefetcher is None:
+            self._prefetcher = ImagePrefetcher(self.num_decode_threads)
+        return self._prefetcher
+
+    def close(self):
+        """Close open files and stop decode threads; they are reopened if the dataset is used again"""
+        self._check_process()
+        if self._prefetcher is not None:
+            self._prefetcher.shutdown()
+            self._prefetcher = None
+        for h5 in self.h5s.values():
+            h5.close()
+        self.h5s = {}
+
+    def _get_index_filename(self) -> str:
+        return os.path.join(self.dirname, self.INDEX_FILENAME)
+
+    def _get_trial_type(self) -> str:
+        """Which Trial.read_info built the index entries"""
+        return f"{self.Trial.__module__}.{self.Trial.__qualname__}"
+
+    def _read_index(self) -> Dict[str, Any]:
+        """Cached trial info per file, relative to dirname; empty if missing, from another version or from another Trial type"""
+        try:
+            with open(self._get_index_filename(), "r") as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        if index.get("version") != self.INDEX_VERSION:
+            return {}
+        if index.get("trial_type") != self._get_trial_type():
+            return {}
+        return index.get("files", {})
+
+    def _write_index(self, files: Dict[str, Any]):
+        filename = self._get_index_filename()
+        tmp_filename = f"{filename}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_filename, "w") as f:
+                json.dump(
+                    {
+                        "version": self.INDEX_VERSION,
+                        "trial_type": self._get_trial_type(),
+                        "files": files,
+                    },
+                    f,
+                )
+            os.replace(tmp_filename, filename)
+        except OSError as e:
+            if self.verbose:
+                print("Could not write dataset index:", e)
+
+    def read_file_info(self, filename) -> List[Dict[str, Any]]:
+        """Trial.read_info for every trial in a file"""
+        infos = []
+        with h5py.File(filename, "r") as h5:
+            for key, h5_trial in h5.items():
+                info = self.Trial.read_info(h5_trial)
+                info["name"] = key
+                infos.append(info)
+        return infos
+
     def process_files(self, files):
         """Read through the set of files and track unique files and everything else."""
         if self.verbose:
@@ -118,29 +315,47 @@ class DatasetBase(torch.utils.data.Dataset):
         self.trials = []
         self.h5s = {}
         lens = []
+        index = self._read_index() if self.use_index else {}
+        index_changed = False
         for filename in files:
-            # Check each file to see how many entires it has
-            with h5py.File(filename, "r") as h5:
-                for key, h5_trial in h5.items():
-                    if not self.trial_list or (
-                        self.trial_list and key in self.trial_list
-                    ):
-                        # check if key demo_status exists, if it does it communicates
-                        # whether the trial is a success or failure. Do not include
-                        # failures in the dataset. If key does not exist, Trial
-                        # is assumed success and included.
-                        if (
-                            "demo_status" in h5_trial.keys()
-                            and h5_trial["demo_status"][()] == 1
-                        ) or "demo_status" not in h5_trial.keys():
-                            # Open the trial and extract metadata
-                            trial = self.Trial(key, filename, self, h5_trial)
-                            if self.verbose:
-                                print("trial =", key, trial.length)
-                            lens.append(trial.length)
-                            # Bookkeeping for all the trials
-                            self.trials.append(trial)
+            # Check each file to see how many entires it has, unless the index is up to date
+            relpath = os.path.relpath(filename, self.dirname)
+            stat = os.stat(filename)
+            entry = index.get(relpath)
+            if (
+                entry is None
+                or entry["mtime"] != stat.st_mtime
+                or entry["size"] != stat.st_size
+            ):
+                entry = {
+                    "mtime": stat.st_mtime,
+                    "size": stat.st_size,
+                    "trials": self.read_file_info(filename),
+                }
+                index[relpath] = entry
+                index_changed = True
+            for info in entry["trials"]:
+                key = info["name"]
+                if not self.trial_list or (self.trial_list and key in self.trial_list):
+                    # check if key demo_status exists, if it does it communicates
+                    # whether the trial is a success or failure. Do not include
+                    # failures in the dataset. If key does not exist, Trial
+                    # is assumed success and included.
+                    if info["demo_status"] is None or info["demo_status"] == 1:
+                        # Create the trial from its metadata
+                        trial = self.Trial(key, filename, self, info)
+                        if self.verbose:
+                            print("trial =", key, trial.length)
+                        lens.append(trial.length)
+                        # Bookkeeping for all the trials
+                        self.trials.append(trial)
 
+        for relpath in list(index.keys()):
+            if not os.path.exists(os.path.join(self.dirname, relpath)):
+                del index[relpath]
+                index_changed = True
+        if self.use_index and index_changed:
+            self._write_index(index)
         self.trial_lengths = np.cumsum(lens)
         self.max_idx = self.trial_lengths[-1]
 
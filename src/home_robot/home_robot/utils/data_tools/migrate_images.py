@@ -0,0 +1,105 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+#
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+"""Rewrite the image streams of existing DataWriter files in another layout.
+
+    python -m home_robot.utils.data_tools.migrate_images old.h5 new.h5 --layout array
+
+Everything else in each trial is copied unchanged.
+"""
+from typing import List
+
+import click
+import h5py
+
+import home_robot.utils.data_tools.base as base
+import home_robot.utils.data_tools.image as image
+
+
+def _get_image_keys(trial: h5py.Group) -> List[str]:
+    keys = trial[base.IMAGE_KEYS][()]
+    keys = str(keys, "utf-8") if type(keys) == bytes else keys
+    return [k for k in keys.split(",") if len(k) > 0]
+
+
+def _copy_group(
+    src: h5py.Group,
+    dst: h5py.Group,
+    prefix: str,
+    image_keys: List[str],
+    layout: str,
+    compression: str,
+):
+    """Copy src into dst, converting the image streams it contains"""
+    for name, item in src.items():
+        key = name if prefix == "" else prefix + "/" + name
+        if key in image_keys:
+            # Encoded layouts keep the png bytes as they are; only the array layout decodes
+            if (
+                layout != image.ARRAY_LAYOUT
+                and image.get_img_layout(item) != image.ARRAY_LAYOUT
+            ):
+                stream = image.ImageStream(item)
+                imgs = [stream.get_bytes(i) for i in range(len(stream))]
+            else:
+                imgs = list(image.iter_imgs(item))
+            image.append_imgs(dst, name, imgs, layout, compression)
+        elif isinstance(item, h5py.Group) and any(
+            k.startswith(key + "/") for k in image_keys
+        ):
+            _copy_group(
+                item, dst.create_group(name), key, image_keys, layout, compression
+            )
+        else:
+            src.copy(name, dst)
+
+
+def migrate_file(
+    src_filename: str,
+    dst_filename: str,
+    layout: str = image.ARRAY_LAYOUT,
+    compression: str = "gzip",
+    verbose: bool = False,
+):
+    """Write a copy of src_filename to dst_filename with every image stream in the given layout"""
+    if layout not in image.IMAGE_LAYOUTS:
+        raise ValueError(
+            f"unknown image layout {layout}; use one of {image.IMAGE_LAYOUTS}"
+        )
+    with h5py.File(src_filename, "r") as src, h5py.File(dst_filename, "w") as dst:
+        for trial_name, trial in src.items():
+            if verbose:
+                print("Migrating trial", trial_name)
+            dst_trial = dst.create_group(trial_name)
+            for k, v in trial.attrs.items():
+                dst_trial.attrs[k] = v
+            if base.IMAGE_KEYS in trial:
+                image_keys = _get_image_keys(trial)
+            else:
+                image_keys = []
+            _copy_group(trial, dst_trial, "", image_keys, layout, compression)
+
+
+@click.command()
+@click.argument("src_filename")
+@click.argument("dst_filename")
+@click.option(
+    "--layout",
+    default=image.ARRAY_LAYOUT,
+    type=click.Choice(image.IMAGE_LAYOUTS),
+    help="Image layout to write",
+)
+@click.option(
+    "--compression",
+    default="gzip",
+    type=click.Choice(["gzip", "lzf"]),
+    help="HDF5 filter for the array layout",
+)
+def main(src_filename: str, dst_filename: str, layout: str, compression: str):
+    """Copy SRC_FILENAME to DST_FILENAME, rewriting image streams in another layout."""
+    migrate_file(src_filename, dst_filename, layout, compression, verbose=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -3,7 +3,9 @@
 # This source code is licensed under the MIT license found in the
 # LICENSE file in the root directory of this source tree.
 import os
-from typing import Any, Dict
+import queue
+import threading
+from typing import Any, Dict, List
 
 import h5py
 import numpy as np
@@ -19,12 +21,40 @@ class DataWriter(object):
 
     The idea is that each trial is listed as a top-level hdf5 "group," which contains state,
     observation, action spaces, among other things.
+
+    With streaming=True, frames are not kept in memory until write_trial. They go through a bounded queue to a background thread, which encodes images and appends frames to resizable, chunked datasets of a group named STREAM_GROUP as they arrive; write_trial only flushes the last partial chunk and renames the group. The file layout is the same as in the default mode, so files are readable by DatasetBase and Trial either way. Call close() when done to finish writing and close the file.
+
+    image_layout picks how each image stream is stored (see image.IMAGE_LAYOUTS). The default "png" keeps one dataset of png bytes per frame, which old readers expect. "array" stores each stream as one chunked, compressed (T, H, W[, C]) dataset of raw pixels, and "encoded" keeps png bytes but concatenated into one dataset with an offsets table. Both keep a few datasets per stream instead of one per frame, and "array" also skips png decoding on read, which is where most of the read time goes. Trial.get_img reads all of them.
     """
 
-    def __init__(self, filename="data.h5", dirname=None):
+    # Group that a streamed trial is written to until write_trial gives it its name
+    STREAM_GROUP = "streaming_trial_in_progress"
+
+    def __init__(
+        self,
+        filename="data.h5",
+        dirname=None,
+        streaming: bool = False,
+        queue_size: int = 64,
+        chunk_size: int = 32,
+        image_layout: str = image.PNG_LAYOUT,
+        image_compression: str = "gzip",
+    ):
         """
         Optionally initialize with a directory.
+
+        streaming: write frames from a background thread as they are added
+        queue_size: frames that can be waiting for the background thread before add_frame blocks
+        chunk_size: frames per HDF5 chunk of streamed temporal data
+        image_layout: one of image.IMAGE_LAYOUTS
+        image_compression: HDF5 filter for the array image layout, "gzip" or "lzf"
         """
+        if image_layout not in image.IMAGE_LAYOUTS:
+            raise ValueError(
+                f"unknown image layout {image_layout}; use one of {image.IMAGE_LAYOUTS}"
+            )
+        self.image_layout = image_layout
+        self.image_compression = image_compression
         self.filename = filename
         self.dirname = dirname
         if dirname is not None:
@@ -36,13 +66,23 @@ class DataWriter(object):
         else:
             self.filename = self.filename
         self.num_trials = 0
+        self.streaming = streaming
+        self.chunk_size = chunk_size
+        if streaming:
+            self._queue = queue.Queue(maxsize=queue_size)
+            self._stream_error = None
+            self._thread = threading.Thread(target=self._stream_loop, daemon=True)
+            self._thread.start()
         self.reset()
 
     def reset(self):
-        """Reset all information about the trial here"""
+        """Reset all information about the trial here. In streaming mode, this drops what was already written for the current trial."""
+        # In streaming mode these only track which keys were added; data goes straight to the file
         self.temporal_data = {}
         self.config_data = {}
         self.img_data = {}
+        if self.streaming:
+            self._put("discard")
 
     def add_img_frame(self, **data):
         data = self.fix_data(data)
@@ -57,8 +97,17 @@ class DataWriter(object):
                 )
             if k not in self.img_data:
                 self.img_data[k] = []
-            data = image.img_to_bytes(v)
-            self.img_data[k].append(data)
+            if self.streaming:
+                continue
+            if self.image_layout == image.ARRAY_LAYOUT:
+                self.img_data[k].append(np.array(v))
+            elif isinstance(v, bytes):
+                # Already encoded, e.g. by AsyncFrameWriter
+                self.img_data[k].append(v)
+            else:
+                self.img_data[k].append(image.img_to_bytes(v))
+        if self.streaming:
+            self._put("image", self._copy_arrays(data))
 
     def add_frame(self, **data):
         """Add data fields to tracked temporal data"""
@@ -74,8 +123,13 @@ class DataWriter(object):
                     "duplicate key: " + str(k) + " was in image data already."
                 )
             if k not in self.temporal_data:
+                if self.streaming:
+                    self._check_key_name(k)
                 self.temporal_data[k] = []
-            self.temporal_data[k].append(v)
+            if not self.streaming:
+                self.temporal_data[k].append(v)
+        if self.streaming:
+            self._put("frame", self._copy_arrays(data))
         return True
 
     def fix_data(self, data: Dict[str, Any]) -> Dict[str, Any]:
@@ -123,7 +177,13 @@ class DataWriter(object):
                 raise RuntimeError(
                     "duplicate key: " + str(k) + " was in image data already."
                 )
-            self.config_data[k] = v
+            if self.streaming:
+                self._check_key_name(k)
+                self.config_data[k] = None
+            else:
+                self.config_data[k] = v
+        if self.streaming:
+            self._put("config", data)
         return True
 
     def write_trial(self, trial_id=None):
@@ -135,6 +195,16 @@ class DataWriter(object):
         else:
             trial_id = str(trial_id)
         self.num_trials += 1
+        if self.streaming:
+            self._put(
+                "finish",
+                trial_id,
+                list(self.temporal_data.keys()),
+                list(self.config_data.keys()),
+                list(self.img_data.keys()),
+            )
+            self.reset()
+            return True
         with h5py.File(self.filename, "a") as h5_file:
             trial = h5_file.create_group(trial_id)
 
@@ -161,9 +231,9 @@ class DataWriter(object):
 
                     pdb.set_trace()
             for k, v in self.img_data.items():
-                for i, bindata in enumerate(v):
-                    ki = os.path.join(k, str(i))
-                    trial[ki] = np.void(bindata)
+                image.append_imgs(
+                    trial, k, v, self.image_layout, self.image_compression
+                )
             trial[base.TEMPORAL_KEYS] = temporal_keys
             trial[base.CONFIG_KEYS] = config_keys
             trial[base.IMAGE_KEYS] = img_keys
@@ -171,3 +241,120 @@ class DataWriter(object):
         # At the end, clear current stored data + configs
         self.reset()
         return True
+
+    def _check_key_name(self, k: str):
+        if k[-1] == "_":
+            raise RuntimeError(
+                "invalid name for dataset key: "
+                + str(k)
+                + " cannot end with _; this is reserved."
+            )
+
+    def _copy_arrays(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        """Copy arrays that are about to be queued, in case the caller reuses their buffers"""
+        return {
+            k: v.copy() if isinstance(v, np.ndarray) else v for k, v in data.items()
+        }
+
+    def _put(self, *item):
+        """Hand an item to the background thread, raising any error it ran into"""
+        if self._stream_error is not None:
+            raise RuntimeError(
+                f"streaming writer for {self.filename} failed"
+            ) from self._stream_error
+        self._queue.put(item)
+
+    def flush(self):
+        """Block until the background thread has written everything added so far"""
+        if self.streaming:
+            self._queue.join()
+            if self._stream_error is not None:
+                raise RuntimeError(
+                    f"streaming writer for {self.filename} failed"
+                ) from self._stream_error
+
+    def close(self):
+        """Finish writing and close the file. Frames of a trial that was never written with write_trial are dropped."""
+        if self.streaming and self._thread.is_alive():
+            # Not reset(), which would raise a stored error before the file is closed
+            self.temporal_data, self.config_data, self.img_data = {}, {}, {}
+            self._queue.put(("discard",))
+            self._queue.put(("close",))
+            self._thread.join()
+            if self._stream_error is not None:
+                raise RuntimeError(
+                    f"streaming writer for {self.filename} failed"
+                ) from self._stream_error
+
+    def _append_rows(self, group: h5py.Group, key: str, rows: List[Any]):
+        """Append frames to a resizable dataset, creating it on first use"""
+        arr = np.stack([np.asarray(row) for row in rows])
+        if key not in group:
+            # Keep chunks around a megabyte even for big frames
+            row_bytes = max(arr[0].nbytes, 1)
+            rows_per_chunk = int(np.clip(2**20 // row_bytes, 1, self.chunk_size))
+            group.create_dataset(
+                key,
+                shape=(0,) + arr.shape[1:],
+                maxshape=(None,) + arr.shape[1:],
+                chunks=(rows_per_chunk,) + arr.shape[1:],
+                dtype=arr.dtype,
+            )
+        dataset = group[key]
+        start = dataset.shape[0]
+        dataset.resize(start + arr.shape[0], axis=0)
+        dataset[start:] = arr
+
+    def _stream_loop(self):
+        """Background thread: owns the file and writes each queued item"""
+        h5_file = None
+        group = None
+        # Frames not yet written, per temporal key
+        rows = {}
+        while True:
+            item = self._queue.get()
+            kind = item[0]
+            try:
+                if kind == "close":
+                    break
+                if kind == "discard":
+                    if group is not None:
+                        del h5_file[self.STREAM_GROUP]
+                    group, rows = None, {}
+                    continue
+                if h5_file is None:
+                    h5_file = h5py.File(self.filename, "a")
+                if group is None:
+                    if self.STREAM_GROUP in h5_file:
+                        # Left over from an interrupted session
+                        del h5_file[self.STREAM_GROUP]
+                    group = h5_file.create_group(self.STREAM_GROUP)
+                if kind == "frame":
+                    for k, v in item[1].items():
+                        rows.setdefault(k, []).append(v)
+                        if len(rows[k]) >= self.chunk_size:
+                            self._append_rows(group, k, rows.pop(k))
+                elif kind == "image":
+                    for k, v in item[1].items():
+                        image.append_imgs(
+                            group, k, [v], self.image_layout, self.image_compression
+                        )
+                elif kind == "config":
+                    for k, v in item[1].items():
+                        group[k] = v
+                elif kind == "finish":
+                    trial_id, temporal_keys, config_keys, img_keys = item[1:]
+                    for k, v in rows.items():
+                        self._append_rows(group, k, v)
+                    group[base.TEMPORAL_KEYS] = ",".join(temporal_keys)
+                    group[base.CONFIG_KEYS] = ",".join(config_keys)
+                    group[base.IMAGE_KEYS] = ",".join(img_keys)
+                    h5_file.move(self.STREAM_GROUP, trial_id)
+                    h5_file.flush()
+                    group, rows = None, {}
+            except Exception as e:
+                self._stream_error = e
+            finally:
+                self._queue.task_done()
+        if h5_file is not None:
+            h5_file.close()
@@ -5,6 +5,7 @@
 import itertools
 import warnings
 from argparse import Namespace
+from typing import Iterable, Iterator, Optional
 
 import numpy as np
 import torch
@@ -24,6 +25,108 @@ def valid_depth_mask(depth: np.ndarray) -> np.ndarray:
     )
 
 
+class TemporalDepthFilter(object):
+    """Averages the last buffer_size depth images and zeroes pixels that vary too much between them.
+
+    Images are kept in a preallocated (buffer_size, H, W) ring buffer, along with a running per-pixel sum and sum of squares that are updated as images come in. Filtering then costs O(H * W) however long the buffer is, and neither add nor get allocates when get is given an output array. The running sums are recomputed exactly from the buffer every time it wraps around, so rounding errors do not accumulate over long streams.
+    """
+
+    def __init__(self, buffer_size: int, std_threshold: float = 0.005):
+        """
+        Args:
+            buffer_size: number of images to filter over
+            std_threshold: pixels whose depth has a larger standard deviation over the buffer are set to 0
+        """
+        assert buffer_size > 0, "buffer_size must be positive"
+        self.buffer_size = buffer_size
+        self.std_threshold = std_threshold
+        self._buffer = None
+        self.reset()
+
+    def reset(self):
+        """Forget all images; buffers are kept for reuse"""
+        self._count = 0
+        self._next = 0
+
+    def _allocate(self, shape):
+        self._buffer = np.zeros((self.buffer_size,) + shape, dtype=np.float64)
+        self._sum = np.zeros(shape, dtype=np.float64)
+        self._sum_sq = np.zeros(shape, dtype=np.float64)
+        self._scratch = np.empty(shape, dtype=np.float64)
+        self._scratch2 = np.empty(shape, dtype=np.float64)
+        self._mask = np.empty(shape, dtype=bool)
+
+    def __len__(self) -> int:
+        return self._count
+
+    @property
+    def shape(self) -> Optional[tuple]:
+        """Shape of the buffered images; None before the first one is added"""
+        return None if self._buffer is None else self._buffer.shape[1:]
+
+    def is_full(self) -> bool:
+        return self._count >= self.buffer_size
+
+    def add(self, depth: np.ndarray):
+        """Copy a depth image into the buffer, replacing the oldest one if it is full"""
+        if self._buffer is None or self._buffer.shape[1:] != depth.shape:
+            self._allocate(depth.shape)
+            self.reset()
+        slot = self._buffer[self._next]
+        if self._count >= self.buffer_size:
+            # Remove the image being replaced from the running sums
+            self._sum -= slot
+            np.multiply(slot, slot, out=self._scratch)
+            self._sum_sq -= self._scratch
+        else:
+            self._count += 1
+        slot[...] = depth
+        self._sum += slot
+        np.multiply(slot, slot, out=self._scratch)
+        self._sum_sq += self._scratch
+        self._next = (self._next + 1) % self.buffer_size
+        if self._next == 0:
+            self._recompute_sums()
+
+    def _recompute_sums(self):
+        np.sum(self._buffer[: self._count], axis=0, out=self._sum)
+        self._sum_sq[...] = 0
+        for img in self._buffer[: self._count]:
+            np.multiply(img, img, out=self._scratch)
+            self._sum_sq += self._scratch
+
+    def get(
+        self, std_threshold: Optional[float] = None, out: Optional[np.ndarray] = None
+    ) -> Optional[np.ndarray]:
+        """Mean of the buffered images, with high-variance pixels set to 0; None if the buffer is empty.
+
+        Args:
+            std_threshold: overrides the threshold given at construction
+            out: float64 array of the image shape to write the result into
+        """
+        if self._count == 0:
+            return None
+        if std_threshold is None:
+            std_threshold = self.std_threshold
+        mean = np.divide(self._sum, self._count, out=out)
+        # Population variance: E[x^2] - E[x]^2
+        var = np.divide(self._sum_sq, self._count, out=self._scratch)
+        var -= np.multiply(mean, mean, out=self._scratch2)
+        np.greater(var, std_threshold**2, out=self._mask)
+        np.copyto(mean, 0.0, where=self._mask)
+        return mean
+
+
+def filter_depth_stream(
+    depths: Iterable[np.ndarray], buffer_size: int, std_threshold: float = 0.005
+) -> Iterator[np.ndarray]:
+    """Temporally filter a sequence of depth images, such as a logged depth stream. Yields, for each image, the TemporalDepthFilter output over it and up to buffer_size - 1 images before it."""
+    depth_filter = TemporalDepthFilter(buffer_size, std_threshold)
+    for depth in depths:
+        depth_filter.add(depth)
+        yield depth_filter.get()
+
+
 def get_camera_matrix(width, height, fov):
     """Returns a camera matrix from image size and fov."""
     warnings.warn(
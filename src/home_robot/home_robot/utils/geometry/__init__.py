@@ -5,4 +5,4 @@
 
 
 from ._base import *
-from .angles import PI2, angle_difference, interpolate_angles
+from .angles import PI2, angle_difference, interpolate_angles, interpolate_angles_array
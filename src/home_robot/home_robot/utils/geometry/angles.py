@@ -34,3 +34,19 @@ def interpolate_angles(
     step = min(delta, step_size) * direction
     interpolated_angle = start_angle + step
     return interpolated_angle % PI2
+
+
+def interpolate_angles_array(
+    start_angle: float, end_angle: float, step_size: float = 0.1
+) -> np.ndarray:
+    """All the angles visited by calling interpolate_angles repeatedly from start_angle while more than step_size away from end_angle. Does not include start_angle."""
+    start_angle = start_angle % PI2
+    end_angle = end_angle % PI2
+    diff1 = (end_angle - start_angle) % PI2
+    diff2 = (start_angle - end_angle) % PI2
+    direction, delta = (1, diff1) if diff1 <= diff2 else (-1, diff2)
+    if delta <= step_size:
+        return np.zeros(0)
+    num_steps = int(np.ceil(delta / step_size)) - 1
+    steps = np.arange(1, num_steps + 1) * step_size * direction
+    return (start_angle + steps) % PI2
@@ -2,9 +2,18 @@
 #
 # This source code is licensed under the MIT license found in the
 # LICENSE file in the root directory of this source tree.
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+import scipy.ndimage
 import torch
 import torch.nn.functional as F
 
+# Above this radius, dilating with a distance transform is cheaper than a convolution
+EDT_MIN_RADIUS = 8
+
+_disk_kernels: Dict[Tuple[int, str], torch.Tensor] = {}
+
 
 def binary_dilation(binary_image, kernel):
     """
@@ -156,3 +165,127 @@ def find_closest_point_on_mask(mask: torch.Tensor, point: torch.Tensor):
     closest_point = nonzero_pixels[closest_index]
 
     return closest_point
+
+
+def get_bounds_of_mask(
+    mask: torch.Tensor, margin: int = 0
+) -> Optional[Tuple[int, int, int, int]]:
+    """Get the bounding box (x0, x1, y0, y1) of the nonzero entries of a 2d mask, grown by margin and clipped to the mask shape. Upper bounds are exclusive so the result can be used directly for slicing.
+
+    Returns None if the mask is empty."""
+    rows = torch.nonzero(mask.any(dim=1), as_tuple=False)
+    if rows.size(0) == 0:
+        return None
+    cols = torch.nonzero(mask.any(dim=0), as_tuple=False)
+    x0 = max(int(rows[0]) - margin, 0)
+    x1 = min(int(rows[-1]) + margin + 1, mask.shape[0])
+    y0 = max(int(cols[0]) - margin, 0)
+    y1 = min(int(cols[-1]) + margin + 1, mask.shape[1])
+    return x0, x1, y0, y1
+
+
+def pad_bounds(
+    bounds: Tuple[int, int, int, int], margin: int, shape: Tuple[int, int]
+) -> Tuple[int, int, int, int]:
+    """Grow (x0, x1, y0, y1) bounds by margin, clipped to a 2d shape."""
+    x0, x1, y0, y1 = bounds
+    return (
+        max(x0 - margin, 0),
+        min(x1 + margin, shape[0]),
+        max(y0 - margin, 0),
+        min(y1 + margin, shape[1]),
+    )
+
+
+def get_disk_kernel(radius: int, device: Optional[torch.device] = None) -> torch.Tensor:
+    """Get a (1, 1, 2r+1, 2r+1) float disk structuring element, identical to skimage.morphology.disk(radius). Kernels are cached per radius and device so they are only built once."""
+    device = torch.device("cpu") if device is None else torch.device(device)
+    key = (int(radius), str(device))
+    if key not in _disk_kernels:
+        x, y = torch.meshgrid(
+            torch.arange(-radius, radius + 1),
+            torch.arange(-radius, radius + 1),
+            indexing="ij",
+        )
+        selem = (x**2 + y**2 <= radius**2).float()
+        _disk_kernels[key] = selem.unsqueeze(0).unsqueeze(0).to(device)
+    return _disk_kernels[key]
+
+
+def _dilate_conv(mask: torch.Tensor, radius: int) -> torch.Tensor:
+    """Disk dilation of a [B, H, W] bool mask with a cached kernel"""
+    kernel = get_disk_kernel(radius, mask.device)
+    counts = F.conv2d(mask.unsqueeze(1).float(), kernel, padding=radius)
+    return counts[:, 0] > 0
+
+
+def _dilate_edt(mask: torch.Tensor, radius: int) -> torch.Tensor:
+    """Disk dilation of a [B, H, W] bool mask from a Euclidean distance transform. A cell is in the dilated mask iff its distance to the closest set cell is at most radius, which is exactly a disk dilation, at a cost that does not depend on radius."""
+    masks = mask.cpu().numpy()
+    result = np.zeros_like(masks)
+    for i, m in enumerate(masks):
+        if m.any():
+            result[i] = scipy.ndimage.distance_transform_edt(~m) <= radius
+    return torch.from_numpy(result).to(mask.device)
+
+
+def dilate_mask(
+    mask: torch.Tensor,
+    radius: int,
+    roi: Optional[Tuple[int, int, int, int]] = None,
+    method: str = "auto",
+) -> torch.Tensor:
+    """Dilate a bool or uint8 mask by a disk of the given radius. Gives the same result as binary_dilation with a skimage disk kernel, without float inputs and outputs.
+
+    Args:
+        mask(Tensor): [H, W] or [B, H, W] mask; nonzero entries are set
+        radius(int): radius of the disk in cells
+        roi: optional (x0, x1, y0, y1) region; only this region is computed and returned
+        method(str): "conv", "edt" or "auto", which uses the distance transform for large radii on cpu
+
+    Returns:
+        dilated(Tensor): bool mask, the shape of the input or of the roi
+    """
+    if radius <= 0:
+        mask = mask != 0
+        if roi is not None:
+            x0, x1, y0, y1 = roi
+            mask = mask[..., x0:x1, y0:y1]
+        return mask.clone()
+    squeeze = mask.dim() == 2
+    mask = mask != 0
+    if squeeze:
+        mask = mask.unsqueeze(0)
+    if roi is not None:
+        # Enough context that the roi is not affected by the crop boundary
+        x0, x1, y0, y1 = roi
+        cx0, cx1, cy0, cy1 = pad_bounds(roi, radius, mask.shape[-2:])
+        mask = mask[:, cx0:cx1, cy0:cy1]
+    if method == "auto":
+        method = (
+            "edt" if radius >= EDT_MIN_RADIUS and mask.device.type == "cpu" else "conv"
+        )
+    if method == "edt":
+        dilated = _dilate_edt(mask, radius)
+    elif method == "conv":
+        dilated = _dilate_conv(mask, radius)
+    else:
+        raise ValueError(f"unknown dilation method: {method}")
+    if roi is not None:
+        dilated = dilated[:, x0 - cx0 : x1 - cx0, y0 - cy0 : y1 - cy0]
+    return dilated[0] if squeeze else dilated
+
+
+def erode_mask(
+    mask: torch.Tensor,
+    radius: int,
+    roi: Optional[Tuple[int, int, int, int]] = None,
+    method: str = "auto",
+) -> torch.Tensor:
+    """Erode a bool or uint8 mask by a disk of the given radius. Like binary_erosion, cells outside the mask are not treated as unset, so nothing is eroded from the map borders. See dilate_mask for arguments."""
+    return ~dilate_mask(mask == 0, radius, roi=roi, method=method)
+
+
+def close_mask(mask: torch.Tensor, radius: int, method: str = "auto") -> torch.Tensor:
+    """Morphological closing (dilation then erosion) of a bool mask by a disk; fills small holes."""
+    return erode_mask(dilate_mask(mask, radius, method=method), radius, method=method)
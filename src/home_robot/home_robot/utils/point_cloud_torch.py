@@ -16,9 +16,9 @@ import cv2
 import numpy as np
 import torch
 from torch import Tensor
-from torch_geometric.nn.pool.voxel_grid import voxel_grid
 
 from home_robot.utils.image import Camera
+from home_robot.utils.voxel import VoxelDownsampler
 
 
 def depth_to_xyz(depth: torch.Tensor, camera: Camera):
@@ -200,15 +200,12 @@ def get_one_point_per_voxel_from_pointcloud(
 ) -> torch.Tensor:
     """
     Overlays a grid, and selects one point in each grid cell (if one exists). If use_random_centers is True,
-    the point selected is random within that cell. Otherwise it's whichever voxel_grid returns first.
+    the point selected is random within that cell. Otherwise it's the first point of the cell.
     """
-    # Voxel grid returns a list, same length as the original, with a mapping to unique grid identifiers
-    xyz_grid_indices = voxel_grid(unbatched_xyz, voxel_size, unbatched_batch_ids)
-
-    # We wish to take one of each grid identifier, to use as our point
+    # Map every point to its (sorted, consecutive) grid cell, and count the points in each cell
     # Based on: https://stackoverflow.com/questions/72001505/how-to-get-unique-elements-and-their-firstly-appeared-indices-of-a-pytorch-tenso
-    grid_ids, xyz_to_grid_id, grid_cell_counts = torch.unique(
-        xyz_grid_indices, sorted=True, return_inverse=True, return_counts=True
+    xyz_to_grid_id, grid_cell_counts = VoxelDownsampler(voxel_size).get_voxel_ids(
+        unbatched_xyz, unbatched_batch_ids
     )
 
     # The grid ids are sorted, and the counts match that sorting. So if we sort xyz_to_grid_id and get the mapping
@@ -7,16 +7,76 @@
     This file contains a torch implementation and helpers of a
     "voxelized pointcloud" that stores features, centroids, and counts in a sparse voxel grid
 """
+from dataclasses import dataclass
 from typing import List, Optional, Tuple, Union
 
 import cv2
 import numpy as np
 import torch
+from scipy.spatial import cKDTree
 from torch import Tensor
 from torch_geometric.nn.pool.consecutive import consecutive_cluster
 from torch_geometric.nn.pool.voxel_grid import voxel_grid
 from torch_geometric.utils import add_self_loops, scatter
 
+# Bits per axis in packed voxel keys; coordinates are offset so negative ones fit
+_KEY_BITS = 21
+_KEY_OFFSET = 1 << 20
+
+
+def _check_key_range(coord_min: int, coord_max: int, voxel_size: float):
+    """Raise if integer voxel coordinates do not fit the bits of a packed key, which would make distant voxels share keys"""
+    if coord_min < -_KEY_OFFSET or coord_max >= _KEY_OFFSET:
+        raise ValueError(
+            f"points span voxels {coord_min} to {coord_max}, outside of the {-_KEY_OFFSET} to {_KEY_OFFSET - 1} voxels along each axis that packed keys can hold at voxel size {voxel_size}"
+        )
+
+
+def get_voxel_keys(points: Tensor, voxel_size: float) -> Tensor:
+    """Packed integer key of the voxel containing each of [N, 3] points, on a grid aligned with the origin. Keys are packed like those of VoxelOccupancyIndex. Raises ValueError for points more than 2^20 voxels from the origin along any axis."""
+    coords = torch.floor(points / voxel_size).long()
+    if coords.numel() > 0:
+        _check_key_range(int(coords.min()), int(coords.max()), voxel_size)
+    coords = coords + _KEY_OFFSET
+    return (
+        (coords[:, 0] << (2 * _KEY_BITS)) | (coords[:, 1] << _KEY_BITS) | coords[:, 2]
+    )
+
+
+@dataclass
+class VoxelDelta:
+    """Voxels of a VoxelizedPointcloud that changed between two versions, as returned by get_delta"""
+
+    since: int
+    """version the delta starts from"""
+    version: int
+    """version the delta brings a replica to"""
+    reset: bool
+    """the pointcloud was cleared or replaced after since; drop all voxels before applying"""
+    keys: Tensor
+    """[K] keys of added or changed voxels"""
+    points: Tensor
+    """[K, 3]"""
+    features: Optional[Tensor]
+    """[K, D]"""
+    weights: Tensor
+    """[K]"""
+    rgb: Optional[Tensor]
+    """[K, 3]"""
+    removed_keys: Tensor
+    """keys of voxels removed since since"""
+
+    def __len__(self) -> int:
+        return len(self.keys) + len(self.removed_keys)
+
+
+def _rows_equal(a: Tensor, b: Tensor) -> Tensor:
+    """[N] whether each row of a equals the same row of b"""
+    equal = a == b
+    if equal.ndim == 1:
+        return equal
+    return equal.flatten(1).all(dim=-1)
+
 
 class VoxelizedPointcloud:
     _INTERNAL_TENSORS = [
@@ -28,6 +88,8 @@ class VoxelizedPointcloud:
         "dim_maxs",
         "_mins",
         "_maxs",
+        "_keys",
+        "_versions",
     ]
 
     _INIT_ARGS = ["voxel_size", "dim_mins", "dim_maxs", "feature_pool_method"]
@@ -59,6 +121,8 @@ class VoxelizedPointcloud:
             "sum",
         ], f"Unknown feature pool method {feature_pool_method}"
 
+        # Increases with every change. Voxels remember the version they last changed at, for get_delta. An owner with its own version counter can set this, so that both share one numbering.
+        self.version = 0
         self.reset()
 
     def reset(self):
@@ -66,6 +130,13 @@ class VoxelizedPointcloud:
         self._points, self._features, self._weights, self._rgb = None, None, None, None
         self._mins = self.dim_mins
         self._maxs = self.dim_maxs
+        # Key of each voxel, and the version it last changed at
+        self._keys, self._versions = None, None
+        # Keys of removed voxels, and the version they were removed at
+        self._removed_keys = torch.zeros(0, dtype=torch.long)
+        self._removed_versions = torch.zeros(0, dtype=torch.long)
+        self.version += 1
+        self._reset_version = self.version
 
     def add(
         self,
@@ -74,7 +145,7 @@ class VoxelizedPointcloud:
         rgb: Optional[Tensor],
         weights: Optional[Tensor] = None,
     ):
-        """Add a feature pointcloud to the voxel grid.
+        """Add a feature pointcloud to the voxel grid. Voxels are fixed cells of a grid aligned with the origin, so adding points never moves existing voxel boundaries.
 
         Args:
             points (Tensor): N x 3 points to add to the voxel grid
@@ -114,6 +185,7 @@ class VoxelizedPointcloud:
             self._mins = torch.min(self._mins, pos_mins)
             self._maxs = torch.max(self._maxs, pos_maxs)
 
+        keys = get_voxel_keys(points, self.voxel_size)
         if self._points is None:
             assert (
                 self._features is None
@@ -128,6 +200,7 @@ class VoxelizedPointcloud:
                 weights,
                 rgb,
             )
+            all_keys = keys
         else:
             assert (self._features is None) == (features is None)
             all_points = torch.cat([self._points, points], dim=0)
@@ -138,39 +211,51 @@ class VoxelizedPointcloud:
                 else None
             )
             all_rgb = torch.cat([self._rgb, rgb], dim=0) if (rgb is not None) else None
+            all_keys = torch.cat([self._keys, keys], dim=0)
         # Future optimization:
         # If there are no new voxels, then we could save a bit of compute time
         # by only recomputing the voxel/cluster for the new points
         # e.g. if recompute_voxels:
         #   raise NotImplementedError
-        cluster_voxel_idx, cluster_consecutive_idx, _ = voxelize(
-            all_points, voxel_size=self.voxel_size, start=self._mins, end=self._maxs
+        voxel_keys, cluster_idx = torch.unique(
+            all_keys, sorted=True, return_inverse=True
         )
+        self.version += 1
+        versions = torch.full_like(voxel_keys, self.version)
+        if self._points is not None:
+            # Existing voxels keep their version unless new points fell into them
+            num_old = len(self._keys)
+            versions[cluster_idx[:num_old]] = self._versions
+            versions[cluster_idx[num_old:]] = self.version
         self._points, self._features, self._weights, self._rgb = reduce_pointcloud(
-            cluster_consecutive_idx,
+            cluster_idx,
             pos=all_points,
             features=all_features,
             weights=all_weights,
             rgbs=all_rgb,
             feature_reduce=self.feature_pool_method,
         )
+        self._keys, self._versions = voxel_keys, versions
         return
 
-    def get_idxs(self, points: Tensor) -> Tensor:
-        """Returns voxel index (long tensor) for each point in points
+    def get_idxs(self, points: Tensor) -> Tuple[Tensor, Tensor]:
+        """Returns voxel index (long tensor) for each point in points, on the same origin-aligned grid the stored voxels use
 
         Args:
             points (Tensor): N x 3
 
         Returns:
-            cluster_voxel_idx (Tensor): The voxel grid index (long tensor) for each point in points
-            cluster_consecutive_idx (Tensor): Voxel grid reindexed to be consecutive (packed)
+            cluster_voxel_idx (Tensor): The packed voxel key (long tensor) of each point, as in get_voxel_keys
+            cluster_consecutive_idx (Tensor): Row of each point's voxel in get_pointcloud; -1 where that voxel is not stored
         """
-        (
-            cluster_voxel_idx,
-            cluster_consecutive_idx,
-            _,
-        ) = voxelize(points, self.voxel_size, start=self._mins, end=self._maxs)
+        cluster_voxel_idx = get_voxel_keys(points, self.voxel_size)
+        cluster_consecutive_idx = torch.full_like(cluster_voxel_idx, -1)
+        if self._keys is not None:
+            keys = self._keys.to(cluster_voxel_idx.device)
+            pos = torch.searchsorted(keys, cluster_voxel_idx)
+            pos = torch.clamp(pos, max=len(keys) - 1)
+            found = keys[pos] == cluster_voxel_idx
+            cluster_consecutive_idx[found] = pos[found]
         return cluster_voxel_idx, cluster_consecutive_idx
 
     def get_voxel_idx(self, points: Tensor) -> Tensor:
@@ -180,7 +265,7 @@ class VoxelizedPointcloud:
             points (Tensor): N x 3
 
         Returns:
-            Tensor: voxel index (long tensor) for each point in points
+            Tensor: packed voxel key (long tensor) for each point in points
         """
         (
             cluster_voxel_idx,
@@ -195,7 +280,7 @@ class VoxelizedPointcloud:
             points (Tensor): N x 3
 
         Returns:
-            Tensor: voxel index (long tensor) for each point in points
+            Tensor: row of each point's voxel in get_pointcloud, or -1
         """
         (
             _,
@@ -213,6 +298,158 @@ class VoxelizedPointcloud:
         """
         return self._points, self._features, self._weights, self._rgb
 
+    def set_pointcloud(
+        self,
+        points: Tensor,
+        features: Optional[Tensor],
+        weights: Tensor,
+        rgb: Optional[Tensor],
+        mins: Optional[Tensor] = None,
+        maxs: Optional[Tensor] = None,
+    ):
+        """Replace the contents with an already voxelized pointcloud, e.g. one returned by get_pointcloud. Points that share a voxel are merged. For get_delta, voxels that are identical to the ones they replace keep their version, and voxels that are not in the new pointcloud count as removed.
+
+        Args:
+            mins, maxs: bounds of the points; later adds extend them. Defaults to the bounds of points.
+        """
+        self.version += 1
+        old_keys, old_versions = self._keys, self._versions
+        old_values = (self._points, self._features, self._weights, self._rgb)
+        if points is None or len(points) == 0:
+            self._points, self._features, self._weights, self._rgb = (None,) * 4
+            self._keys, self._versions = None, None
+        else:
+            keys = get_voxel_keys(points, self.voxel_size)
+            voxel_keys, cluster_idx = torch.unique(
+                keys, sorted=True, return_inverse=True
+            )
+            if len(voxel_keys) < len(keys):
+                points, features, weights, rgb = reduce_pointcloud(
+                    cluster_idx,
+                    pos=points,
+                    features=features,
+                    weights=weights,
+                    rgbs=rgb,
+                    feature_reduce=self.feature_pool_method,
+                )
+            else:
+                order = torch.argsort(cluster_idx)
+                points, features, weights, rgb = [
+                    None if v is None else v[order]
+                    for v in (points, features, weights, rgb)
+                ]
+            self._points, self._features, self._weights, self._rgb = (
+                points,
+                features,
+                weights,
+                rgb,
+            )
+            self._keys = voxel_keys
+            self._versions = torch.full_like(voxel_keys, self.version)
+            if mins is None:
+                mins, _ = points.min(dim=0)
+                maxs, _ = points.max(dim=0)
+        self._mins, self._maxs = mins, maxs
+
+        if old_keys is None:
+            return
+        # Match old voxels to new ones by key
+        if self._keys is None:
+            removed = old_keys
+        else:
+            idx = torch.searchsorted(self._keys, old_keys).clamp(
+                max=len(self._keys) - 1
+            )
+            found = self._keys[idx] == old_keys
+            removed = old_keys[~found]
+            same = found.clone()
+            new_values = (self._points, self._features, self._weights, self._rgb)
+            for old, new in zip(old_values, new_values):
+                if old is None or new is None:
+                    same &= (old is None) and (new is None)
+                else:
+                    same[found] &= _rows_equal(old[found], new[idx[found]])
+            self._versions[idx[same]] = old_versions[same]
+        self._removed_keys = torch.cat([self._removed_keys, removed.cpu()])
+        self._removed_versions = torch.cat(
+            [
+                self._removed_versions,
+                torch.full((len(removed),), self.version, dtype=torch.long),
+            ]
+        )
+
+    def filter(self, mask: Tensor):
+        """Keep only the voxels where mask is set, e.g. to drop points outside a height range. Use this rather than indexing the internal tensors, so voxel keys stay aligned with the points and get_delta reports the dropped voxels as removed.
+
+        Args:
+            mask: [N] bool, one per voxel in the order of get_pointcloud
+        """
+        if self._points is None:
+            return
+        assert len(mask) == len(
+            self._points
+        ), f"mask has {len(mask)} entries for {len(self._points)} voxels"
+        if bool(mask.all()):
+            return
+        self.version += 1
+        removed = self._keys[~mask]
+        self._points = self._points[mask]
+        self._features = None if self._features is None else self._features[mask]
+        self._weights = self._weights[mask]
+        self._rgb = None if self._rgb is None else self._rgb[mask]
+        self._keys = self._keys[mask]
+        self._versions = self._versions[mask]
+        if len(self._points) == 0:
+            self._points, self._features, self._weights, self._rgb = (None,) * 4
+            self._keys, self._versions = None, None
+        self._removed_keys = torch.cat([self._removed_keys, removed.cpu()])
+        self._removed_versions = torch.cat(
+            [
+                self._removed_versions,
+                torch.full((len(removed),), self.version, dtype=torch.long),
+            ]
+        )
+
+    def get_delta(self, since: int = 0) -> VoxelDelta:
+        """Voxels added, changed or removed after version since, e.g. to bring a remote copy up to date with VoxelMapReplica. This costs bandwidth in proportion to how much changed rather than to the size of the map.
+
+        Args:
+            since: version of the last delta the receiver applied; 0 for everything
+
+        Returns:
+            delta: current values of the voxels that changed, and keys of the ones that were removed. If the pointcloud was reset after since, delta.reset is set and all voxels are included.
+        """
+        reset = since < self._reset_version
+        removed_keys = torch.zeros(0, dtype=torch.long)
+        if not reset:
+            removed_keys = self._removed_keys[self._removed_versions > since]
+        if self._points is None:
+            return VoxelDelta(
+                since,
+                self.version,
+                reset,
+                keys=torch.zeros(0, dtype=torch.long),
+                points=torch.zeros(0, 3),
+                features=None,
+                weights=torch.zeros(0),
+                rgb=None,
+                removed_keys=removed_keys,
+            )
+        mask = self._versions > since
+        if reset:
+            mask[:] = True
+        return VoxelDelta(
+            since,
+            self.version,
+            reset,
+            keys=self._keys[mask],
+            points=self._points[mask],
+            features=None if self._features is None else self._features[mask],
+            weights=self._weights[mask],
+            rgb=None if self._rgb is None else self._rgb[mask],
+            removed_keys=removed_keys,
+        )
+
     def clone(self):
         """
         Deep copy of object. All internal tensors are cloned individually.
@@ -418,26 +655,148 @@ def scatter3d(
     return voxel_weights.reshape(*grid_dimensions)
 
 
+class VoxelDownsampler:
+    """Voxel-downsamples point clouds without keeping any map state.
+
+    Points are binned into a hash grid (linear voxel keys, ordered like torch_geometric's voxel_grid) and reduced with index_add_, so one call costs a single sort over the points. Scratch buffers for the per-point keys and per-voxel sums are kept between calls and only reallocated when a larger cloud comes in, so calling this repeatedly on similarly sized clouds allocates little besides the outputs.
+    """
+
+    def __init__(self, voxel_size: Union[float, List[float], Tensor] = 0.01):
+        """
+        Args:
+            voxel_size: size of each voxel, either one value or one per dimension
+        """
+        self.voxel_size = voxel_size
+        self._buffers = {}
+
+    def _get_buffer(
+        self, name: str, shape: Tuple[int, ...], dtype: torch.dtype, device
+    ) -> Tensor:
+        """Scratch tensor of at least shape[0] rows, reused across calls"""
+        buf = self._buffers.get(name)
+        if (
+            buf is None
+            or buf.shape[0] < shape[0]
+            or buf.shape[1:] != shape[1:]
+            or buf.dtype != dtype
+            or buf.device != torch.device(device)
+        ):
+            buf = torch.empty((max(shape[0], 1),) + tuple(shape[1:]), dtype=dtype)
+            buf = buf.to(device)
+            self._buffers[name] = buf
+        return buf[: shape[0]]
+
+    def get_voxel_ids(
+        self, points: Tensor, batch: Optional[Tensor] = None
+    ) -> Tuple[Tensor, Tensor]:
+        """Consecutive voxel id of every point.
+
+        Args:
+            points (Tensor): [N, 3] locations
+            batch (Optional[Tensor]): [N] batch index of each point; points in different batches never share a voxel
+
+        Returns:
+            voxel_ids (LongTensor): [N] id of each point's voxel, in 0..M-1, sorted like the voxel keys
+            counts (LongTensor): [M] number of points in each voxel
+        """
+        voxel_size = torch.as_tensor(
+            self.voxel_size, dtype=points.dtype, device=points.device
+        ).expand(points.shape[-1])
+        mins = points.min(dim=0).values
+        coords = torch.div(points - mins, voxel_size, rounding_mode="floor").long()
+        extents = coords.max(dim=0).values + 1
+        keys = self._get_buffer("keys", (points.shape[0],), torch.long, points.device)
+        keys.zero_()
+        # x varies fastest, then y, z, and batch
+        stride = 1
+        for dim in range(points.shape[-1]):
+            keys.add_(coords[:, dim] * stride)
+            stride *= int(extents[dim])
+        if batch is not None:
+            keys.add_(batch.long() * stride)
+        _, voxel_ids, counts = torch.unique(
+            keys, sorted=True, return_inverse=True, return_counts=True
+        )
+        return voxel_ids, counts
+
+    def __call__(
+        self,
+        points: Tensor,
+        rgb: Optional[Tensor] = None,
+        weights: Optional[Tensor] = None,
+        camera_pose: Optional[Tensor] = None,
+    ) -> Tuple[Tensor, Optional[Tensor], Tensor]:
+        """Downsample a point cloud to one weighted-mean point per voxel.
+
+        Args:
+            points (Tensor): [N, 3] points
+            rgb (Optional[Tensor]): [N, 3] colors of each point
+            weights (Optional[Tensor]): [N] weights of each point, defaults to ones
+            camera_pose (Optional[Tensor]): [4, 4] cam_to_world matrix; if given, points are in camera coordinates and are transformed to world coordinates first
+
+        Returns:
+            points (Tensor): [M, 3] weighted average position within each voxel
+            rgb (Optional[Tensor]): [M, 3] weighted average color of each voxel
+            weights (Tensor): [M] summed weights of each voxel
+        """
+        if isinstance(points, np.ndarray):
+            points = torch.from_numpy(points)
+        if isinstance(rgb, np.ndarray):
+            rgb = torch.from_numpy(rgb)
+        if camera_pose is not None:
+            camera_pose = torch.as_tensor(camera_pose).to(points)
+            points = points @ camera_pose[:3, :3].T + camera_pose[:3, 3]
+        if weights is None:
+            weights = torch.ones_like(points[..., 0])
+        if points.shape[0] == 0:
+            return points, rgb, weights
+
+        voxel_ids, counts = self.get_voxel_ids(points)
+        num_voxels = counts.shape[0]
+        # Sum weights, weighted positions and weighted colors into one buffer
+        channels = 4 if rgb is None else 7
+        values = self._get_buffer(
+            "values", (points.shape[0], channels), points.dtype, points.device
+        )
+        values[:, 0] = weights
+        torch.mul(points, weights[:, None], out=values[:, 1:4])
+        if rgb is not None:
+            torch.mul(rgb.to(points.dtype), weights[:, None], out=values[:, 4:7])
+        sums = self._get_buffer(
+            "sums", (num_voxels, channels), points.dtype, points.device
+        )
+        sums.zero_()
+        sums.index_add_(0, voxel_ids, values)
+
+        weights_voxel = sums[:, 0].clone()
+        points_voxel = sums[:, 1:4] / weights_voxel[:, None]
+        rgb_voxel = None
+        if rgb is not None:
+            rgb_voxel = sums[:, 4:7] / weights_voxel[:, None]
+        return points_voxel, rgb_voxel, weights_voxel
+
+
+def voxel_downsample(
+    points: Tensor,
+    voxel_size: float = 0.01,
+    rgb: Optional[Tensor] = None,
+    weights: Optional[Tensor] = None,
+    camera_pose: Optional[Tensor] = None,
+) -> Tuple[Tensor, Optional[Tensor], Tensor]:
+    """One-off voxel downsampling; see VoxelDownsampler. Keep a VoxelDownsampler around instead to reuse its buffers."""
+    return VoxelDownsampler(voxel_size)(
+        points, rgb=rgb, weights=weights, camera_pose=camera_pose
+    )
+
+
 def drop_smallest_weight_points(
     points: Tensor,
     voxel_size: float = 0.01,
     drop_prop: float = 0.1,
     min_points_after_drop: int = 3,
 ):
-    voxel_pcd = VoxelizedPointcloud(
-        voxel_size=voxel_size,
-        dim_mins=None,
-        dim_maxs=None,
-        feature_pool_method="mean",
-    )
-    voxel_pcd.add(
-        points=points,
-        features=None,  # instance.point_cloud_features,
-        rgb=None,  # instance.point_cloud_rgb,
-    )
     orig_points = points
-    points = voxel_pcd._points
-    weights = voxel_pcd._weights
+    points, _, weights = voxel_downsample(points, voxel_size)
     assert len(points) > 0, points.shape
     weights_sorted, sort_idxs = torch.sort(weights, dim=0)
     points_sorted = points[sort_idxs]
@@ -448,3 +807,151 @@ def drop_smallest_weight_points(
         return orig_points
     # print(f"Reduced {len(orig_points)} -> {len(points)} -> {above_cutoff.sum()}")
     return points_sorted[cutoff_idx:]
+
+
+class VoxelOccupancyIndex:
+    """Persistent set of occupied voxels for collision queries against a growing point cloud.
+
+    Voxels are hashed to integer keys, so adding points only inserts the voxels that are not occupied yet. Queries go to two KD-trees over the voxel centers: a main tree, and a small tree over the voxels added since the main tree was built. Only the small tree is rebuilt after an add, and the two are merged once the small one grows past merge_fraction of the main one, so the cost of keeping the index current is proportional to what changed rather than to the whole map. Distances are measured to voxel centers, so they are accurate to half a voxel.
+    """
+
+    _KEY_BITS = _KEY_BITS
+    _KEY_OFFSET = _KEY_OFFSET
+
+    def __init__(self, resolution: float = 0.01, merge_fraction: float = 0.1):
+        """
+        Args:
+            resolution: size of an occupied voxel in meters
+            merge_fraction: rebuild the main tree once this many new voxels, relative to its size, have been added
+        """
+        self.resolution = resolution
+        self.merge_fraction = merge_fraction
+        self.reset()
+
+    def reset(self):
+        """Remove all occupied voxels"""
+        # Sorted keys of all occupied voxels
+        self._voxel_keys = np.zeros(0, dtype=np.int64)
+        self._main_points = np.zeros((0, 3))
+        self._main_tree = None
+        self._new_points = []
+        self._new_tree = None
+        self._new_tree_size = 0
+        # Number of times the main tree was built, for checking how often we rebuild
+        self.num_rebuilds = 0
+
+    def __len__(self) -> int:
+        return len(self._voxel_keys)
+
+    def _pack(self, coords: np.ndarray) -> np.ndarray:
+        """Integer keys for [..., 3] integer coordinates"""
+        coords = coords.astype(np.int64)
+        if coords.size > 0:
+            _check_key_range(int(coords.min()), int(coords.max()), self.resolution)
+        coords = coords + self._KEY_OFFSET
+        return (
+            (coords[..., 0] << (2 * self._KEY_BITS))
+            | (coords[..., 1] << self._KEY_BITS)
+            | coords[..., 2]
+        )
+
+    def _unpack(self, keys: np.ndarray) -> np.ndarray:
+        """[N, 3] integer coordinates of packed keys"""
+        mask = (1 << self._KEY_BITS) - 1
+        coords = np.stack(
+            [
+                keys >> (2 * self._KEY_BITS),
+                (keys >> self._KEY_BITS) & mask,
+                keys & mask,
+            ],
+            axis=-1,
+        )
+        return coords - self._KEY_OFFSET
+
+    def _to_numpy(self, xyz: Union[np.ndarray, Tensor]) -> np.ndarray:
+        if isinstance(xyz, Tensor):
+            xyz = xyz.detach().cpu().numpy()
+        return np.asarray(xyz, dtype=float).reshape(-1, 3)
+
+    def add(self, xyz: Union[np.ndarray, Tensor]) -> int:
+        """Mark the voxels containing [N, 3] points as occupied; returns the number of newly occupied voxels"""
+        xyz = self._to_numpy(xyz)
+        keys = np.unique(self._pack(np.floor(xyz / self.resolution)))
+        pos = np.searchsorted(self._voxel_keys, keys)
+        if len(self._voxel_keys) > 0:
+            found = self._voxel_keys[np.minimum(pos, len(self._voxel_keys) - 1)] == keys
+            keys, pos = keys[~found], pos[~found]
+        if len(keys) == 0:
+            return 0
+        self._voxel_keys = np.insert(self._voxel_keys, pos, keys)
+        self._new_points.append((self._unpack(keys) + 0.5) * self.resolution)
+        return len(keys)
+
+    def _sync(self):
+        """Fold voxels added since the last query into the trees"""
+        num_new = sum(len(points) for points in self._new_points)
+        if num_new == self._new_tree_size:
+            return
+        new_points = np.concatenate(self._new_points)
+        if num_new > self.merge_fraction * len(self._main_points):
+            self._main_points = np.concatenate([self._main_points, new_points])
+            self._main_tree = cKDTree(self._main_points)
+            self._new_points = []
+            self._new_tree = None
+            self._new_tree_size = 0
+            self.num_rebuilds += 1
+        else:
+            self._new_points = [new_points]
+            self._new_tree = cKDTree(new_points)
+            self._new_tree_size = num_new
+
+    def get_points(self) -> np.ndarray:
+        """[M, 3] centers of all occupied voxels"""
+        return np.concatenate([self._main_points] + self._new_points)
+
+    def get_keys(self) -> np.ndarray:
+        """Sorted packed keys of all occupied voxels, for saving the index"""
+        return self._voxel_keys.copy()
+
+    def set_keys(self, keys: np.ndarray):
+        """Replace the contents with keys from get_keys of an index with the same resolution"""
+        self.reset()
+        keys = np.asarray(keys, dtype=np.int64)
+        if len(keys) == 0:
+            return
+        self._voxel_keys = np.sort(keys)
+        self._new_points = [(self._unpack(self._voxel_keys) + 0.5) * self.resolution]
+
+    def _query(self, xyz: np.ndarray, max_distance: float) -> np.ndarray:
+        """Distance to the closest voxel center, or inf if it is farther than max_distance"""
+        self._sync()
+        distance = np.full(len(xyz), np.inf)
+        for tree in (self._main_tree, self._new_tree):
+            if tree is not None and len(xyz) > 0:
+                dist, _ = tree.query(xyz, distance_upper_bound=max_distance)
+                distance = np.minimum(distance, dist)
+        return distance
+
+    def points_in_collision(
+        self, xyz: Union[np.ndarray, Tensor], radius: Union[float, np.ndarray]
+    ) -> np.ndarray:
+        """Check which of [N, 3] query points have an occupied voxel within radius.
+
+        Args:
+            xyz: [N, 3] query points, e.g. centers of spheres covering the arm
+            radius: one radius for all points, or [N,] radii
+
+        Returns:
+            colliding: [N,] bool
+        """
+        xyz = self._to_numpy(xyz)
+        radius = np.broadcast_to(np.asarray(radius, dtype=float), (len(xyz),))
+        if len(xyz) == 0:
+            return np.zeros(0, dtype=bool)
+        return self._query(xyz, radius.max()) <= radius
+
+    def min_distance(
+        self, xyz: Union[np.ndarray, Tensor], max_distance: float = np.inf
+    ) -> np.ndarray:
+        """Distance from each of [N, 3] query points to the closest occupied voxel; inf where nothing is within max_distance"""
+        return self._query(self._to_numpy(xyz), max_distance)
@@ -0,0 +1,150 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+#
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+import collections
+import socket
+import struct
+import threading
+import timeit
+
+import click
+import cv2
+import numpy as np
+import skimage.data
+
+from home_robot_hw.ros.image_codecs import StreamCodec
+
+COLOR_CODECS = [("webp", {}), ("jpeg", {}), ("png", {})]
+DEPTH_CODECS = [
+    ("quantized_depth", {"codec": "png"}),
+    ("quantized_depth", {"codec": "zlib"}),
+    ("quantized_depth", {"codec": "lz4"}),
+    ("quantized_depth", {"codec": "zstd"}),
+    ("zlib", {}),
+]
+
+
+def make_images(width: int, height: int, rng: np.random.Generator):
+    """A natural color image and a depth image of a floor, a wall and a box, with sensor noise and holes"""
+    rgb = cv2.resize(skimage.data.astronaut(), (width, height))
+    ys, xs = np.mgrid[:height, :width].astype(np.float32)
+    depth = np.where(ys > height / 2, 1.0 + 3.0 * (height - ys) / height, 3.0)
+    box = (abs(xs - width / 2) < width / 8) & (abs(ys - height / 2) < height / 6)
+    depth[box] = 1.5
+    depth += rng.normal(0, 0.002, depth.shape)
+    depth[rng.random(depth.shape) < 0.02] = 0
+    return rgb, depth.astype(np.float32)
+
+
+def describe(name, kwargs):
+    return f"{name}/{kwargs['codec']}" if "codec" in kwargs else name
+
+
+def recv_exactly(conn: socket.socket, size: int) -> bytes:
+    buf = bytearray(size)
+    view = memoryview(buf)
+    while size > 0:
+        n = conn.recv_into(view, size)
+        if n == 0:
+            raise ConnectionError("sender closed the connection")
+        view = view[n:]
+        size -= n
+    return bytes(buf)
+
+
+def loopback(rgb, depth, color, depth_codec, num_frames: int, num_threads: int):
+    """Send frames through a localhost socket, encoding each stream on num_threads threads and decoding on the receiving side. Returns frames per second and mean milliseconds from capture to decoded."""
+    server = socket.create_server(("127.0.0.1", 0))
+    port = server.getsockname()[1]
+    latencies = []
+
+    def receive():
+        conn, _ = server.accept()
+        decoders = [StreamCodec("raw"), StreamCodec("raw")]
+        for _ in range(2 * num_frames):
+            stream, t_sent, size = struct.unpack("<Bdi", recv_exactly(conn, 13))
+            decoders[stream].decode(recv_exactly(conn, size))
+            latencies.append(timeit.default_timer() - t_sent)
+        conn.close()
+
+    receiver = threading.Thread(target=receive)
+    receiver.start()
+    codecs = [
+        StreamCodec(color[0], num_threads, **color[1]),
+        StreamCodec(depth_codec[0], num_threads, **depth_codec[1]),
+    ]
+    conn = socket.create_connection(("127.0.0.1", port))
+    pending = collections.deque()
+    t0 = timeit.default_timer()
+    for i in range(num_frames + num_threads):
+        if i < num_frames:
+            t_capture = timeit.default_timer()
+            futures = [
+                codec.encode_async(img) for codec, img in zip(codecs, [rgb, depth])
+            ]
+            pending.append((t_capture, futures))
+        # Keep num_threads frames of each stream encoding at once
+        if len(pending) > num_threads or (i >= num_frames and pending):
+            t_capture, futures = pending.popleft()
+            for stream, future in enumerate(futures):
+                data = future.result()
+                conn.sendall(struct.pack("<Bdi", stream, t_capture, len(data)) + data)
+    receiver.join()
+    elapsed = timeit.default_timer() - t0
+    conn.close()
+    server.close()
+    for codec in codecs:
+        codec.shutdown()
+    return num_frames / elapsed, 1000 * np.mean(latencies)
+
+
+@click.command()
+@click.option("--width", default=640)
+@click.option("--height", default=480)
+@click.option("--num-frames", default=50, help="Frames per measurement")
+def main(width: int, height: int, num_frames: int):
+    """Encode time, decode time and size of each image codec, then color and depth streamed together over a localhost socket with 1 and 2 encoding threads per stream. Runs without ROS."""
+    rng = np.random.default_rng(0)
+    rgb, depth = make_images(width, height, rng)
+    print(f"{width}x{height}, {num_frames} frames")
+    print(
+        f"{'stream':>6} {'codec':>22} {'encode ms':>10} {'decode ms':>10} {'KB':>8} {'ratio':>6} {'max err':>8}"
+    )
+    available = {}
+    for stream, img, options in [
+        ("color", rgb, COLOR_CODECS),
+        ("depth", depth, DEPTH_CODECS),
+    ]:
+        available[stream] = []
+        for name, kwargs in options:
+            try:
+                codec = StreamCodec(name, **kwargs)
+            except ImportError as e:
+                print(f"{stream:>6} {describe(name, kwargs):>22} not available: {e}")
+                continue
+            available[stream].append((name, kwargs))
+            for _ in range(num_frames):
+                out = codec.decode(codec.encode(img))
+            err = np.abs(out.astype(np.float64) - img).max()
+            info = codec.get_info()
+            print(
+                f"{stream:>6} {describe(name, kwargs):>22} {info['encode_ms']:10.2f} {info['decode_ms']:10.2f} {info['size_kb']:8.1f} {info['ratio']:6.1f} {err:8.4f}"
+            )
+            codec.shutdown()
+
+    print()
+    print(f"{'color':>6} {'depth':>22} {'threads':>8} {'fps':>7} {'latency ms':>11}")
+    for color in available["color"]:
+        for depth_codec in available["depth"]:
+            for num_threads in [1, 2]:
+                fps, latency = loopback(
+                    rgb, depth, color, depth_codec, num_frames, num_threads
+                )
+                print(
+                    f"{describe(*color):>6} {describe(*depth_codec):>22} {num_threads:8d} {fps:7.1f} {latency:11.1f}"
+                )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+#
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+import threading
+import timeit
+import tracemalloc
+
+import click
+import numpy as np
+from sensor_msgs.msg import CameraInfo, Image
+
+from home_robot_hw.ros.camera import RosCamera
+from home_robot_hw.ros.msg_numpy import name_to_dtypes, numpy_to_image
+
+RESOLUTIONS = [(640, 480), (1280, 720)]
+
+
+class OfflineCamera(RosCamera):
+    """RosCamera fed with messages directly instead of from a ROS topic"""
+
+    def __init__(self, cam_info: CameraInfo, rotations: int = 0):
+        self.name = "offline"
+        self.rotations = rotations
+        self._img = None
+        self._t = None
+        self._lock = threading.Lock()
+        self.buffer_size = None
+        self._set_camera_info(cam_info)
+
+
+def legacy_read(msg: Image, rotations: int) -> np.ndarray:
+    """Copies made per image before images were kept as views: decoding, the rotated image copied by get(), and again when building an observation"""
+    dtype_class, channels = name_to_dtypes[msg.encoding]
+    img = np.frombuffer(msg.data, dtype=dtype_class).copy()
+    img = img.reshape(msg.height, msg.width, channels)
+    if channels == 1:
+        img = img[..., 0]
+    if msg.encoding == "16UC1":
+        img = img / 1000.0
+    img = np.rot90(img, k=rotations).copy()
+    return img.copy()
+
+
+def measure(fn, num_frames: int):
+    """Mean seconds per call and peak bytes allocated during one call"""
+    fn()
+    t = timeit.timeit(fn, number=num_frames) / num_frames
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return t, peak
+
+
+@click.command()
+@click.option("--num-frames", default=200, help="Frames per measurement")
+@click.option("--rotations", default=3, help="Counterclockwise image rotations")
+def main(num_frames: int, rotations: int):
+    """Per-frame latency and allocations of RosCamera callbacks and reads for color and depth images, compared to copying at every step."""
+    rng = np.random.default_rng(0)
+    print(f"{'image':>18} {'path':>22} {'ms/frame':>9} {'peak MB':>8}")
+    for width, height in RESOLUTIONS:
+        cam_info = CameraInfo(width=width, height=height, K=[1, 0, 0, 0, 1, 0, 0, 0, 1])
+        images = {
+            "rgb8": rng.integers(0, 256, (height, width, 3), dtype=np.uint8),
+            "16UC1": rng.integers(0, 5000, (height, width), dtype=np.uint16),
+        }
+        for encoding, arr in images.items():
+            msg = numpy_to_image(arr, encoding)
+            camera = OfflineCamera(cam_info, rotations=rotations)
+            camera._cb(msg)
+            expected = legacy_read(msg, rotations)
+            assert np.array_equal(camera.get(), expected)
+
+            def copy_every_step():
+                legacy_read(msg, rotations)
+
+            def callback():
+                camera._cb(msg)
+
+            def callback_and_get():
+                camera._cb(msg)
+                camera.get()
+
+            def callback_and_view():
+                camera._cb(msg)
+                camera.get(copy=False)
+
+            for name, fn in [
+                ("copy every step", copy_every_step),
+                ("callback", callback),
+                ("callback + get", callback_and_get),
+                ("callback + get view", callback_and_view),
+            ]:
+                t, peak = measure(fn, num_frames)
+                print(
+                    f"{f'{width}x{height} {encoding}':>18} {name:>22} {t * 1000:9.3f} {peak / 2**20:8.2f}"
+                )
+
+
+if __name__ == "__main__":
+    main()
@@ -261,6 +261,12 @@ DATA_MODES = ["ros", "pkl", "dir"]
     default="output.pkl",
     help="Input path with default value 'output.npy'",
 )
+@click.option(
+    "--rebuild-stage",
+    type=click.Choice([""] + SparseVoxelMap.REBUILD_STAGES),
+    default="",
+    help="In pkl mode, rebuild the map only up to this stage instead of adding every frame",
+)
 def main(
     mode,
     rate,
@@ -276,6 +282,7 @@ def main(
     show_maps: bool = False,
     show_paths: bool = False,
     random_goals: bool = True,
+    rebuild_stage: str = "",
     **kwargs,
 ):
     """
@@ -286,6 +293,7 @@ def main(
         show_maps(bool): show 2d maps
         show_paths(bool): display paths after planning
         random_goals(bool): randomly sample frontier goals instead of looking for closest
+        rebuild_stage(str): in pkl mode, one of SparseVoxelMap.REBUILD_STAGES to rebuild the map with; by default every frame is added again
     """
     click.echo(f"Processing data in mode: {mode}")
     click.echo(f"Using input path: {input_path}")
@@ -313,7 +321,11 @@ def main(
         )
         input_path = Path(input_path)
         voxel_map = SparseVoxelMap(resolution=voxel_size)
-        voxel_map.read_from_pickle(input_path)
+        if rebuild_stage:
+            timings = voxel_map.read_from_pickle(input_path, stage=rebuild_stage)
+            click.echo(f"- Rebuild timings: {timings}")
+        else:
+            voxel_map.read_from_pickle(input_path)
         if show_maps:
             voxel_map.show(instances=True)
         voxel_map.get_2d_map(debug=show_maps)
@@ -254,10 +254,11 @@ class StretchClient(RobotClient):
         joint_positions, _, _ = self.get_joint_state()
 
         # Create the observation
+        # get_images already returns copies of the camera images, and xyz is computed
         obs = Observations(
-            rgb=rgb.copy(),
-            depth=depth.copy(),
-            xyz=xyz.copy(),
+            rgb=rgb,
+            depth=depth,
+            xyz=xyz,
             gps=gps,
             compass=np.array([theta]),
             camera_pose=self.head.get_pose(rotated=rotate_head_pts),
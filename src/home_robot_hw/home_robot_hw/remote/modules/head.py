@@ -98,13 +98,18 @@ class StretchHeadClient(AbstractControlModule):
         pan, tilt = self._robot_model.look_ahead
         self.set_pan_tilt(pan, tilt, blocking=blocking)
 
-    def get_images(self, compute_xyz=False):
-        """helper logic to get images from the robot's camera feed"""
-        rgb = self._ros_client.rgb_cam.get()
+    def get_images(self, compute_xyz=False, copy: bool = True):
+        """helper logic to get images from the robot's camera feed
+
+        Args:
+            compute_xyz: also return the point cloud computed from depth
+            copy: return copies of the camera images; otherwise views that are only valid until the next images arrive (see RosCamera.get)
+        """
+        rgb = self._ros_client.rgb_cam.get(copy=copy)
         if self._ros_client.filter_depth:
             dpt = self._ros_client.dpt_cam.get_filtered()
         else:
-            dpt = self._process_depth(self._ros_client.dpt_cam.get())
+            dpt = self._process_depth(self._ros_client.dpt_cam.get(copy=copy))
 
         # Compute point cloud from depth image
         if compute_xyz:
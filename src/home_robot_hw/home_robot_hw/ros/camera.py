@@ -3,18 +3,29 @@
 # This source code is licensed under the MIT license found in the
 # LICENSE file in the root directory of this source tree.
 import threading
-from collections import deque
 
+import cv2
 import numpy as np
 import rospy
 from sensor_msgs.msg import CameraInfo, Image
 
+from home_robot.utils.depth import TemporalDepthFilter
 from home_robot.utils.image import Camera
 from home_robot_hw.ros.msg_numpy import image_to_numpy
 
+# cv2 rotation codes for each number of counterclockwise rotations
+CV2_ROTATIONS = {
+    1: cv2.ROTATE_90_COUNTERCLOCKWISE,
+    2: cv2.ROTATE_180,
+    3: cv2.ROTATE_90_CLOCKWISE,
+}
+
 
 class RosCamera(Camera):
-    """compute camera parameters from ROS instead"""
+    """compute camera parameters from ROS instead
+
+    Images are kept as received: color images are views of the message data, and depth images are converted to meters into one of two preallocated buffers, so that a callback never writes into the image being read. Rotation is applied as a view when an image is read, and get() copies only if asked to.
+    """
 
     def __init__(
         self,
@@ -45,9 +56,27 @@ class RosCamera(Camera):
 
         # Buffer
         self.buffer_size = buffer_size
+        self._set_camera_info(cam_info)
+
+        if verbose:
+            print()
+            print("---------------")
+            print("Created camera with info:")
+            print(cam_info)
+            print("---------------")
+        self.topic_name = name + "/image_raw"
+        self._sub = rospy.Subscriber(self.topic_name, Image, self._cb, queue_size=1)
+
+    def _set_camera_info(self, cam_info: CameraInfo):
+        """Set up intrinsics and image buffers from a CameraInfo message"""
         if self.buffer_size is not None:
-            # create buffer
-            self._buffer = deque()
+            # create buffer; images are copied into it, so it does not hold on to depth buffers
+            self._buffer = TemporalDepthFilter(self.buffer_size)
+            # get_filtered writes the filtered image here before rotating it
+            self._filtered = None
+        # Depth conversion writes into the back buffer, then swaps it to the front
+        self._depth_buffers = [None, None]
+        self._back_buffer = 0
         self.height = cam_info.height
         self.width = cam_info.width
         self.pos, self.orn, self.pose_matrix = None, None, None
@@ -74,32 +103,34 @@ class RosCamera(Camera):
 
         self.near_val = 0.1
         self.far_val = 5.0
-        if verbose:
-            print()
-            print("---------------")
-            print("Created camera with info:")
-            print(cam_info)
-            print("---------------")
         self.frame_id = cam_info.header.frame_id
-        self.topic_name = name + "/image_raw"
-        self._sub = rospy.Subscriber(self.topic_name, Image, self._cb, queue_size=1)
+
+    def _get_depth_buffer(self, shape) -> np.ndarray:
+        """Back buffer to convert the next depth image into"""
+        buf = self._depth_buffers[self._back_buffer]
+        if buf is None or buf.shape != shape:
+            buf = np.empty(shape, dtype=np.float64)
+            self._depth_buffers[self._back_buffer] = buf
+        return buf
 
     def _cb(self, msg):
         """capture the latest image and save it"""
-        with self._lock:
-            img = image_to_numpy(msg)
+        # View of the message data; no copy
+        img = image_to_numpy(msg)
+
+        # Preprocess encoding
+        if msg.encoding == "16UC1":
+            # depth support goes here
+            # Convert the image to metric (meters), outside the lock since readers only use the front buffer
+            img = np.divide(img, 1000.0, out=self._get_depth_buffer(img.shape))
+            self._back_buffer = 1 - self._back_buffer
+        elif msg.encoding == "rgb8":
+            # color support - do nothing
+            pass
 
-            # Preprocess encoding
-            if msg.encoding == "16UC1":
-                # depth support goes here
-                # Convert the image to metric (meters)
-                img = img / 1000.0
-            elif msg.encoding == "rgb8":
-                # color support - do nothing
-                pass
-
-            # Image orientation
-            self._img = np.rot90(img, k=self.rotations)
+        with self._lock:
+            # Image orientation is applied in get()
+            self._img = img
 
             # Add to buffer
             self._t = msg.header.stamp
@@ -107,10 +138,8 @@ class RosCamera(Camera):
                 self._add_to_buffer(img)
 
     def _add_to_buffer(self, img):
-        """add to buffer and remove old image if buffer size exceeded"""
-        self._buffer.append(img)
-        if len(self._buffer) > self.buffer_size:
-            self._buffer.popleft()
+        """add to buffer, replacing the oldest image if buffer size exceeded"""
+        self._buffer.add(img)
 
     def valid_mask(self, depth):
         """return only valid pixels"""
@@ -139,47 +168,74 @@ class RosCamera(Camera):
                         break
                 else:
                     # Wait until we have a full buffer
-                    if len(self._buffer) >= self.buffer_size:
+                    if self._buffer.is_full():
                         break
             rate.sleep()
 
-    def get(self, device=None):
-        """return the current image associated with this camera"""
+    def _rotate_copy(self, img: np.ndarray) -> np.ndarray:
+        """Rotated copy of img. cv2 copies multi-channel images several times faster than a strided numpy copy."""
+        k = self.rotations % 4
+        if k == 0:
+            return img.copy()
+        if img.ndim == 3:
+            return cv2.rotate(img, CV2_ROTATIONS[k])
+        return np.rot90(img, k=k).copy()
+
+    def get(self, device=None, copy: bool = True):
+        """return the current image associated with this camera
+
+        Args:
+            device: if set, return a float tensor on this device instead of an array
+            copy: return a copy of the image; otherwise a rotated view of the latest image, which is read only for color images and, for depth images, is overwritten two images later
+        """
         with self._lock:
             if self._img is None:
                 return None
+            img = self._img
+            if device is not None:
+                # One copy, straight to the tensor's dtype
+                img = np.array(np.rot90(img, k=self.rotations), dtype=np.float32)
+            elif copy:
+                img = self._rotate_copy(img)
             else:
-                # Return a copy
-                img = self._img.copy()
+                img = np.rot90(img, k=self.rotations)
 
         if device is not None:
             # If a device is specified, assume we want to move to pytorch
             import torch
 
-            img = torch.FloatTensor(img).to(device)
+            img = torch.from_numpy(img).to(device)
 
         return img
 
     def get_filtered(self, std_threshold=0.005, device=None):
-        """get image from buffer; do some smoothing"""
+        """get image from buffer; do some smoothing
+
+        Pixels are averaged over the buffer, and set to 0 where their standard deviation is above std_threshold. The buffer is filtered into a preallocated image, so the only allocation is the rotated copy that is returned, which is rotated like get().
+        """
         if self.buffer_size is None:
             raise RuntimeError("no buffer")
         with self._lock:
-            imgs = [img[None] for img in self._buffer]
-        # median = np.median(np.concatenate(imgs, axis=0), axis=0)
-        stacked = np.concatenate(imgs, axis=0)
-        avg = np.mean(stacked, axis=0)
-        std = np.std(stacked, axis=0)
-        dims = avg.shape
-        avg = avg.reshape(-1)
-        avg[std.reshape(-1) > std_threshold] = 0
-        img = avg.reshape(*dims)
+            if len(self._buffer) == 0:
+                return None
+            shape = self._buffer.shape
+            if self._filtered is None or self._filtered.shape != shape:
+                self._filtered = np.empty(shape, dtype=np.float64)
+            self._buffer.get(std_threshold, out=self._filtered)
+            # Copy out under the lock; the next call overwrites the filtered image
+            if device is not None:
+                # One contiguous copy, straight to the tensor's dtype
+                img = np.ascontiguousarray(
+                    np.rot90(self._filtered, k=self.rotations), dtype=np.float32
+                )
+            else:
+                img = self._rotate_copy(self._filtered)
 
         if device is not None:
             # If a device is specified, assume we want to move to pytorch
             import torch
 
-            img = torch.FloatTensor(img).to(device)
+            img = torch.from_numpy(img).to(device)
 
         return img
 
@@ -0,0 +1,320 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+#
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+"""Image codecs for streaming camera images, e.g. between ImageClient and ImageServer.
+
+Codecs are looked up by name in CODECS. Each encoded frame starts with the name of the codec that produced it, followed by a payload that holds everything needed to decode it, so a receiver can decode frames from any sender with decode_frame. Nothing here depends on ROS.
+"""
+import struct
+import threading
+import timeit
+import zlib
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Dict, Tuple
+
+import cv2
+import numpy as np
+
+from home_robot.utils.data_tools.image import img_from_bytes, img_to_bytes
+
+
+def _pack_array(arr: np.ndarray, data: bytes) -> bytes:
+    """Prefix data with the dtype and shape of arr"""
+    header = struct.pack("<4sB", arr.dtype.str.encode(), arr.ndim)
+    return header + struct.pack(f"<{arr.ndim}I", *arr.shape) + data
+
+
+def _unpack_array(payload: bytes) -> Tuple[np.dtype, Tuple[int, ...], memoryview]:
+    """dtype, shape and remaining data written by _pack_array"""
+    dtype, ndim = struct.unpack_from("<4sB", payload)
+    shape = struct.unpack_from(f"<{ndim}I", payload, 5)
+    offset = 5 + 4 * ndim
+    return np.dtype(dtype.decode().strip("\x00")), shape, memoryview(payload)[offset:]
+
+
+class ImageCodec(object):
+    """Turns an image array into bytes and back"""
+
+    lossless = True
+
+    def encode(self, img: np.ndarray) -> bytes:
+        raise NotImplementedError()
+
+    def decode(self, payload: bytes) -> np.ndarray:
+        raise NotImplementedError()
+
+
+class JpegCodec(ImageCodec):
+    """JPEG through OpenCV, for rgb uint8 images"""
+
+    lossless = False
+
+    def __init__(self, quality: int = 90):
+        self.params = [int(cv2.IMWRITE_JPEG_QUALITY), quality]
+
+    def encode(self, img: np.ndarray) -> bytes:
+        _, data = cv2.imencode(
+            ".jpg", cv2.cvtColor(img, cv2.COLOR_RGB2BGR), self.params
+        )
+        return data.tobytes()
+
+    def decode(self, payload: bytes) -> np.ndarray:
+        img = cv2.imdecode(np.frombuffer(payload, dtype=np.uint8), cv2.IMREAD_COLOR)
+        return cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+
+
+class WebpCodec(ImageCodec):
+    """webp through PIL, as ImageClient used to send color images"""
+
+    lossless = False
+
+    def encode(self, img: np.ndarray) -> bytes:
+        return img_to_bytes(img, format="webp")
+
+    def decode(self, payload: bytes) -> np.ndarray:
+        return img_from_bytes(payload, format="webp")
+
+
+class PngCodec(ImageCodec):
+    """PNG through OpenCV, for uint8 or uint16 images with 1 or 3 channels. OpenCV at a low compression level encodes many times faster than PIL's default."""
+
+    def __init__(self, compression: int = 1):
+        self.params = [int(cv2.IMWRITE_PNG_COMPRESSION), compression]
+
+    def encode(self, img: np.ndarray) -> bytes:
+        if img.ndim == 3:
+            img = cv2.cvtColor(img, cv2.COLOR_RGB2BGR)
+        _, data = cv2.imencode(".png", img, self.params)
+        return data.tobytes()
+
+    def decode(self, payload: bytes) -> np.ndarray:
+        img = cv2.imdecode(np.frombuffer(payload, dtype=np.uint8), cv2.IMREAD_UNCHANGED)
+        if img.ndim == 3:
+            img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+        return img
+
+
+class RawCodec(ImageCodec):
+    """Uncompressed pixels of any dtype and shape; subclasses compress them"""
+
+    def compress(self, data: bytes) -> bytes:
+        return data
+
+    def decompress(self, data: memoryview) -> bytes:
+        return data
+
+    def encode(self, img: np.ndarray) -> bytes:
+        img = np.ascontiguousarray(img)
+        return _pack_array(img, self.compress(img.data))
+
+    def decode(self, payload: bytes) -> np.ndarray:
+        dtype, shape, data = _unpack_array(payload)
+        return np.frombuffer(self.decompress(data), dtype=dtype).reshape(shape)
+
+
+class ZlibCodec(RawCodec):
+    """Raw pixels compressed with zlib from the standard library"""
+
+    def __init__(self, level: int = 1):
+        self.level = level
+
+    def compress(self, data: bytes) -> bytes:
+        return zlib.compress(data, self.level)
+
+    def decompress(self, data: memoryview) -> bytes:
+        return zlib.decompress(data)
+
+
+class Lz4Codec(RawCodec):
+    """Raw pixels compressed with lz4; needs the lz4 package"""
+
+    def __init__(self, level: int = 0):
+        import lz4.frame
+
+        self._lz4 = lz4.frame
+        self.level = level
+
+    def compress(self, data: bytes) -> bytes:
+        return self._lz4.compress(data, compression_level=self.level)
+
+    def decompress(self, data: memoryview) -> bytes:
+        return self._lz4.decompress(data)
+
+
+class ZstdCodec(RawCodec):
+    """Raw pixels compressed with zstd; needs the zstandard package"""
+
+    def __init__(self, level: int = 1):
+        import zstandard
+
+        self._zstd = zstandard
+        self.level = level
+        # zstandard (de)compressors must not be shared between threads
+        self._local = threading.local()
+
+    def _get(self, name: str, make):
+        obj = getattr(self._local, name, None)
+        if obj is None:
+            obj = make()
+            setattr(self._local, name, obj)
+        return obj
+
+    def compress(self, data: bytes) -> bytes:
+        return self._get(
+            "compressor", lambda: self._zstd.ZstdCompressor(level=self.level)
+        ).compress(data)
+
+    def decompress(self, data: memoryview) -> bytes:
+        return self._get("decompressor", self._zstd.ZstdDecompressor).decompress(data)
+
+
+class QuantizedDepthCodec(ImageCodec):
+    """Float depth in meters, stored as uint16 in units of 1 / scale meters and encoded with a lossless codec. Depth beyond 65535 / scale meters is clipped, and NaN or infinite depth becomes 0, the value depth cameras use for no reading."""
+
+    lossless = False
+
+    def __init__(self, scale: float = 1000.0, codec: str = "png", **codec_kwargs):
+        self.scale = scale
+        self.codec_name = codec
+        self.codec = get_codec(codec, **codec_kwargs)
+
+    def encode(self, img: np.ndarray) -> bytes:
+        depth = np.where(np.isfinite(img), img * self.scale + 0.5, 0)
+        depth = np.clip(depth, 0, np.iinfo(np.uint16).max)
+        data = self.codec.encode(depth.astype(np.uint16))
+        name = self.codec_name.encode()
+        return struct.pack("<fB", self.scale, len(name)) + name + data
+
+    def decode(self, payload: bytes) -> np.ndarray:
+        scale, name_len = struct.unpack_from("<fB", payload)
+        name = bytes(payload[5 : 5 + name_len]).decode()
+        depth = _get_decoder(name).decode(memoryview(payload)[5 + name_len :])
+        return depth.astype(np.float32) / np.float32(scale)
+
+
+CODECS = {
+    "jpeg": JpegCodec,
+    "webp": WebpCodec,
+    "png": PngCodec,
+    "raw": RawCodec,
+    "zlib": ZlibCodec,
+    "lz4": Lz4Codec,
+    "zstd": ZstdCodec,
+    "quantized_depth": QuantizedDepthCodec,
+}
+
+# Decoding never needs codec options, so one default instance per codec is enough
+_decoders: Dict[str, ImageCodec] = {}
+
+
+def register_codec(name: str, codec_type: type):
+    """Make a codec available to get_codec and decode_frame under name"""
+    CODECS[name] = codec_type
+
+
+def get_codec(name: str, **kwargs) -> ImageCodec:
+    """Codec registered as name, created with kwargs. Raises ImportError if the codec needs a package that is not installed."""
+    if name not in CODECS:
+        raise ValueError(f"Unknown image codec {name}; options are {list(CODECS)}")
+    return CODECS[name](**kwargs)
+
+
+def encode_frame(name: str, codec: ImageCodec, img: np.ndarray) -> bytes:
+    """Encode img with codec, prefixed with the codec's name"""
+    name = name.encode()
+    return struct.pack("<B", len(name)) + name + codec.encode(img)
+
+
+def _get_decoder(name: str) -> ImageCodec:
+    if name not in _decoders:
+        _decoders[name] = get_codec(name)
+    return _decoders[name]
+
+
+def decode_frame(data: bytes) -> Tuple[str, np.ndarray]:
+    """Name of the codec a frame from encode_frame was encoded with, and the image"""
+    name_len = data[0]
+    name = bytes(data[1 : 1 + name_len]).decode()
+    return name, _get_decoder(name).decode(memoryview(data)[1 + name_len :])
+
+
+class CodecStats(object):
+    """Running encode and decode times and sizes of one stream"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.num_encoded = 0
+        self.num_decoded = 0
+        self.encode_time = 0.0
+        self.decode_time = 0.0
+        self.raw_bytes = 0
+        self.encoded_bytes = 0
+
+    def add_encode(self, seconds: float, raw_bytes: int, encoded_bytes: int):
+        with self._lock:
+            self.num_encoded += 1
+            self.encode_time += seconds
+            self.raw_bytes += raw_bytes
+            self.encoded_bytes += encoded_bytes
+
+    def add_decode(self, seconds: float):
+        with self._lock:
+            self.num_decoded += 1
+            self.decode_time += seconds
+
+    def summary(self) -> Dict[str, float]:
+        """Mean encode and decode milliseconds, mean encoded kilobytes, and compression ratio"""
+        with self._lock:
+            return {
+                "frames": self.num_encoded,
+                "encode_ms": 1000 * self.encode_time / max(self.num_encoded, 1),
+                "decode_ms": 1000 * self.decode_time / max(self.num_decoded, 1),
+                "size_kb": self.encoded_bytes / 1024 / max(self.num_encoded, 1),
+                "ratio": self.raw_bytes / max(self.encoded_bytes, 1),
+            }
+
+
+class StreamCodec(object):
+    """Encodes and decodes the frames of one image stream on its own thread pool, and keeps stats. OpenCV, PIL and the compression libraries release the GIL, so streams, and frames within a stream, are encoded in parallel."""
+
+    def __init__(self, name: str, num_threads: int = 1, **kwargs):
+        """
+        Args:
+            name: codec name in CODECS
+            num_threads: frames of this stream encoded at once
+            kwargs: codec options
+        """
+        self.name = name
+        self.codec = get_codec(name, **kwargs)
+        self.stats = CodecStats()
+        self.pool = ThreadPoolExecutor(num_threads)
+
+    def encode(self, img: np.ndarray) -> bytes:
+        """Encode a frame on the calling thread"""
+        t0 = timeit.default_timer()
+        data = encode_frame(self.name, self.codec, img)
+        self.stats.add_encode(timeit.default_timer() - t0, img.nbytes, len(data))
+        return data
+
+    def decode(self, data: bytes) -> np.ndarray:
+        """Decode a frame from encode_frame on the calling thread, whichever codec it was encoded with"""
+        t0 = timeit.default_timer()
+        _, img = decode_frame(data)
+        self.stats.add_decode(timeit.default_timer() - t0)
+        return img
+
+    def encode_async(self, img: np.ndarray) -> Future:
+        """Encode a frame on the pool; img must not change until the future is done"""
+        return self.pool.submit(self.encode, img)
+
+    def decode_async(self, data: bytes) -> Future:
+        return self.pool.submit(self.decode, data)
+
+    def shutdown(self):
+        self.pool.shutdown(wait=True)
+
+    def get_info(self) -> Dict[str, Any]:
+        info = {"codec": self.name}
+        info.update(self.stats.summary())
+        return info
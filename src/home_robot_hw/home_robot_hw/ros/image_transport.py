@@ -2,26 +2,32 @@
 #
 # This source code is licensed under the MIT license found in the
 # LICENSE file in the root directory of this source tree.
-import threading
-
 import cv2
 import imagiz
 import numpy as np
 import rospy
 from sensor_msgs.msg import CameraInfo, Image
 
-from home_robot.hw.ros.camera import RosCamera
-from home_robot.hw.ros.msg_numpy import image_to_numpy, numpy_to_image
-from home_robot.utils.data_tools.image import img_from_bytes, img_to_bytes
+from home_robot_hw.ros.camera import RosCamera
+from home_robot_hw.ros.image_codecs import StreamCodec
+from home_robot_hw.ros.msg_numpy import numpy_to_image
+
+COLOR_PORT = 9990
+DEPTH_PORT = 9991
 
 
 class ImageServer(object):
-    """Receives compressed images from remote - faster than ROS"""
+    """Receives compressed images from remote - faster than ROS
+
+    Frames are decoded with whichever codec the client encoded them with (see image_codecs), color and depth in parallel.
+    """
 
     def __init__(self, show_images=False):
         self.show_images = show_images
-        self.color_server = imagiz.TCP_Server(port=9990)
-        self.depth_server = imagiz.TCP_Server(port=9991)
+        self.color_server = imagiz.TCP_Server(port=COLOR_PORT)
+        self.depth_server = imagiz.TCP_Server(port=DEPTH_PORT)
+        # Decoding threads and stats per stream; each frame names the codec it needs
+        self.codecs = [StreamCodec("raw"), StreamCodec("raw")]
 
         self.pub_color = rospy.Publisher("/server/color/image_raw", Image, queue_size=2)
         self.pub_depth = rospy.Publisher("/server/depth/image_raw", Image, queue_size=2)
@@ -67,27 +73,26 @@ class ImageServer(object):
             server.start()
         rate = rospy.Rate(rate)
         while not rospy.is_shutdown():
-            for server, name in zip(servers, ["color", "depth"]):
-                message = server.receive()
-                if name == "color":
-                    frame = img_from_bytes(message.image, format="webp")
-                    # frame = cv2.imdecode(message.image, 1)
-                    msg = numpy_to_image(frame, "8UC3")
-                    msg.header.stamp = rospy.Time.now()
-                    msg.header.frame_id = self.reference_frame
-                    msg.header.seq = self.sequence_id
-                    self.pub_color.publish(msg)
-                elif name == "depth":
-                    # frame = cv2.imdecode(message.image, 0)
-                    frame = (
-                        img_from_bytes(message.image, format="png") / 1000.0
-                    ).astype(np.float32)
-                    # Publish images to the new topic
-                    msg = numpy_to_image((frame / 1000.0).astype(np.float32), "32FC1")
-                    msg.header.stamp = rospy.Time.now()
-                    msg.header.frame_id = self.reference_frame
-                    msg.header.seq = self.sequence_id
-                    self.pub_depth.publish(msg)
+            # Color is decoded while depth is received
+            frames = [
+                codec.decode_async(server.receive().image)
+                for server, codec in zip(servers, self.codecs)
+            ]
+            for name, frame, encoding, publisher in zip(
+                ["color", "depth"],
+                frames,
+                ["8UC3", "32FC1"],
+                [self.pub_color, self.pub_depth],
+            ):
+                frame = frame.result()
+                if name == "depth":
+                    # Depth arrives in meters
+                    frame = frame.astype(np.float32)
+                msg = numpy_to_image(frame, encoding)
+                msg.header.stamp = rospy.Time.now()
+                msg.header.frame_id = self.reference_frame
+                msg.header.seq = self.sequence_id
+                publisher.publish(msg)
                 if self.show_images:
                     cv2.imshow(name, frame)
                     cv2.waitKey(1)
@@ -97,14 +102,34 @@ class ImageServer(object):
 
 
 class ImageClient(object):
-    """sends images to the server"""
-
-    def __init__(self, show_sizes=False):
+    """sends images to the server
+
+    Color and depth frames are encoded in parallel, each stream on its own thread, with codecs from image_codecs. Depth is sent in meters; a depth codec that only takes integer images, like png, has to be wrapped in quantized_depth.
+    """
+
+    def __init__(
+        self,
+        show_sizes=False,
+        server_ip: str = "192.168.0.79",
+        color_codec: str = "webp",
+        depth_codec: str = "quantized_depth",
+        color_codec_kwargs: dict = None,
+        depth_codec_kwargs: dict = None,
+    ):
+        """
+        Args:
+            show_sizes: print encoded sizes and encode times of each stream
+            server_ip: address of the machine running ImageServer
+            color_codec: codec name for color images
+            depth_codec: codec name for depth images
+            color_codec_kwargs: options for the color codec
+            depth_codec_kwargs: options for the depth codec
+        """
         self.color_client = imagiz.TCP_Client(
-            client_name="color", server_ip="192.168.0.79", server_port=9990
+            client_name="color", server_ip=server_ip, server_port=COLOR_PORT
         )
         self.depth_client = imagiz.TCP_Client(
-            client_name="depth", server_ip="192.168.0.79", server_port=9991
+            client_name="depth", server_ip=server_ip, server_port=DEPTH_PORT
         )
         self.clients = [self.color_client, self.depth_client]
 
@@ -112,38 +137,26 @@ class ImageClient(object):
         self.depth_camera = RosCamera("/camera/aligned_depth_to_color")
         self.cameras = [self.color_camera, self.depth_camera]
 
-        # Encode everything
-        # JPEG compression
-        # TODO currently unused - example code
-        self.encode_param = [int(cv2.IMWRITE_JPEG_QUALITY), 90]
+        # Encode everything; each frame is sent before the next one is taken, so one thread per stream is all that can be used
         self.show_sizes = show_sizes
-        self.encoders = [self.encode_color, self.encode_depth]
-
-    def encode_color(self, frame):
-        # r, image = cv2.imencode(".jpg", frame, encode_param)
-        image = img_to_bytes(frame, format="webp")
-        # image = img_to_bytes(frame)
-        if self.show_sizes:
-            print("color len =", len(image))
-        return image
-
-    def encode_depth(self, frame):
-        frame = (frame * 1000).astype(np.uint16)
-        # r, image = cv2.imencode(".png", frame)
-        image = img_to_bytes(frame, format="png")
-        if self.show_sizes:
-            print("depth len =", len(image))
-        return image
+        self.codecs = [
+            StreamCodec(color_codec, **(color_codec_kwargs or {})),
+            StreamCodec(depth_codec, **(depth_codec_kwargs or {})),
+        ]
 
     def spin(self, rate=15):
         print("Waiting for images from ROS...")
         rate = rospy.Rate(rate)
         while not rospy.is_shutdown():
-            for camera, client, encode in zip(
-                self.cameras, self.clients, self.encoders
-            ):
-                frame = camera.get().copy()
+            # Start all encodes before waiting for any of them
+            pending = []
+            for camera, client, codec in zip(self.cameras, self.clients, self.codecs):
+                frame = camera.get()
                 if frame is not None:
-                    client.send(encode(frame))
+                    pending.append((client, codec.encode_async(frame)))
+            for client, future in pending:
+                client.send(future.result())
+            if self.show_sizes:
+                print([codec.get_info() for codec in self.codecs])
             rate.sleep()
         print("Done.")
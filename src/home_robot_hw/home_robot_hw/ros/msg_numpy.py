@@ -31,7 +31,6 @@ SOFTWARE.
 import sys
 
 import numpy as np
-from numpy.lib.stride_tricks import as_strided
 
 # from .registry import converts_from_numpy, converts_to_numpy
 from sensor_msgs.msg import Image
@@ -90,6 +89,7 @@ name_to_dtypes = {
 
 # @converts_to_numpy(Image)
 def image_to_numpy(msg):
+    """Array view of the image in msg, without copying the pixel data. The array is read only if msg.data is immutable (bytes, as received from rospy); copy it before modifying it in place."""
     if msg.encoding not in name_to_dtypes:
         raise TypeError("Unrecognized encoding {}".format(msg.encoding))
 
@@ -98,8 +98,13 @@ def image_to_numpy(msg):
     dtype = dtype.newbyteorder(">" if msg.is_bigendian else "<")
     shape = (msg.height, msg.width, channels)
 
-    data = np.fromstring(msg.data, dtype=dtype).reshape(shape)
-    data.strides = (msg.step, dtype.itemsize * channels, dtype.itemsize)
+    # Rows are msg.step bytes apart, which may include padding
+    data = np.ndarray(
+        shape=shape,
+        dtype=dtype,
+        buffer=msg.data,
+        strides=(msg.step, dtype.itemsize * channels, dtype.itemsize),
+    )
 
     if channels == 1:
         data = data[..., 0]
@@ -136,7 +141,7 @@ def numpy_to_image(arr, encoding):
 
     # make the array contiguous in memory, as mostly required by the format
     contig = np.ascontiguousarray(arr)
-    im.data = contig.tostring()
+    im.data = contig.tobytes()
     im.step = contig.strides[0]
     im.is_bigendian = (
         arr.dtype.byteorder == ">"
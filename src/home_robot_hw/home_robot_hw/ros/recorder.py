@@ -12,7 +12,8 @@ import rospy
 from tqdm import tqdm
 
 from home_robot.motion.stretch import STRETCH_CAMERA_FRAME
-from home_robot.utils.data_tools.image import img_from_bytes
+from home_robot.utils.data_tools.async_writer import DROP_OLDEST, AsyncFrameWriter
+from home_robot.utils.data_tools.image import get_num_imgs, iter_imgs
 from home_robot.utils.data_tools.writer import DataWriter
 from home_robot.utils.pose import to_pos_quat
 from home_robot_hw.env.stretch_manipulation_env import StretchManipulationEnv
@@ -20,16 +21,43 @@ from home_robot_hw.remote import StretchClient
 
 
 class Recorder(object):
-    """ROS object that subscribes from information from the robot and publishes it out."""
+    """ROS object that subscribes from information from the robot and publishes it out.
 
-    def __init__(self, filename, start_recording=False, model=None, robot=None):
-        """Collect information"""
+    save_frame only collects the frame; images are encoded and frames written by background threads, so recording does not hold up the thread it is called from. See AsyncFrameWriter for what happens when they fall behind.
+    """
+
+    def __init__(
+        self,
+        filename,
+        start_recording=False,
+        model=None,
+        robot=None,
+        num_encode_threads: int = 2,
+        queue_size: int = 16,
+        backpressure: str = DROP_OLDEST,
+        max_latency: float = 0.5,
+    ):
+        """Collect information
+
+        Args:
+            num_encode_threads: threads encoding images
+            queue_size: frames that can wait to be encoded
+            backpressure: drop the oldest waiting frame or block save_frame when queue_size frames are waiting
+            max_latency: seconds after which a frame that is still being written counts as late
+        """
         print("Connecting to robot environment...")
         # self.robot = StretchManipulationEnv(init_cameras=True)
         self.robot = StretchClient()
         self.robot.switch_to_manipulation_mode()
         print("... done connecting to robot environment")
         self.writer = DataWriter(filename)
+        self.frame_writer = AsyncFrameWriter(
+            self.writer,
+            num_workers=num_encode_threads,
+            queue_size=queue_size,
+            backpressure=backpressure,
+            max_latency=max_latency,
+        )
         self.idx = 0
         self._recording_started = start_recording
         self._filename = filename
@@ -39,18 +67,22 @@ class Recorder(object):
         self.robot.switch_to_manipulation_mode()
         self.robot.move_to_pre_demo_posture()
         self._recording_started = True
-        self.writer.add_config(task_name=task_name)
+        self.frame_writer.add_config(task_name=task_name)
         print(
             f"Ready to record demonstration to file: {self._filename}. Press BACK to tag a keyframe"
         )
 
     def finish_recording(self) -> int:
         demo_status = int(input("Was this trial a success (1) or a failure (0)?"))
-        self.writer.add_config(demo_status=demo_status)
+        self.frame_writer.add_config(demo_status=demo_status)
         date_time = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
         filename = f"{date_time}_index{self.idx}"
-        self.writer.write_trial(filename)
+        self.frame_writer.write_trial(filename)
         print(f"... done recording trial named: {filename}.")
+        stats = self.frame_writer.get_stats()
+        print(
+            f"Frames written: {stats['written']}, dropped: {stats['dropped']}, late: {stats['late']}, max latency: {stats['max_latency_ms']:.0f} ms"
+        )
         self.idx += 1
         print("Ready for next episode...Press START to begin ")
         self.robot.switch_to_navigation_mode()
@@ -76,7 +108,7 @@ class Recorder(object):
         7. camera info
         8. end-effector pose
         """
-        # record rgb and depth
+        # record rgb and depth; these are copies, so they can be queued
         rgb, depth, xyz = self.robot.head.get_images(compute_xyz=True)
         q = self.robot.manip.get_joint_positions()
         # TODO get the following from TF lookup
@@ -92,18 +124,18 @@ class Recorder(object):
             user_keyframe = np.array([1])
         else:
             user_keyframe = np.array([0])
-        self.writer.add_img_frame(
-            head_rgb=rgb, head_depth=(depth * 10000).astype(np.uint16)
-        )
-        self.writer.add_frame(
-            q=q,
-            # dq=dq,
-            ee_pose=ee_pose,
-            gripper_state=gripper_state,
-            base_pose=base_pose,
-            camera_pose=camera_pose,
-            user_keyframe=user_keyframe,
-            head_xyz=xyz,
+        self.frame_writer.add_frame(
+            images=dict(head_rgb=rgb, head_depth=(depth * 10000).astype(np.uint16)),
+            data=dict(
+                q=q,
+                # dq=dq,
+                ee_pose=ee_pose,
+                gripper_state=gripper_state,
+                base_pose=base_pose,
+                camera_pose=camera_pose,
+                user_keyframe=user_keyframe,
+                head_xyz=xyz,
+            ),
         )
 
         return rgb, depth, q
@@ -120,7 +152,8 @@ class Recorder(object):
         self.finish_recording()
 
     def close(self):
-        """clean-up: delete self"""
+        """clean-up: finish writing queued frames and delete self"""
+        self.frame_writer.close()
         del self
 
 
@@ -132,13 +165,7 @@ def png_to_mp4(group: h5py.Group, key: str, name: str, fps=10):
     img_stream = group[key]
     writer = None
 
-    # for i,aimg in enumerate(tqdm(group[key], ncols=50)):
-    for ki, k in tqdm(
-        sorted([(int(j), j) for j in img_stream.keys()], key=lambda pair: pair[0]),
-        ncols=50,
-    ):
-        bindata = img_stream[k][()]
-        _img = img_from_bytes(bindata)
+    for _img in tqdm(iter_imgs(img_stream), total=get_num_imgs(img_stream), ncols=50):
         w, h = _img.shape[:2]
         img = np.zeros_like(_img)
         img[:, :, 0] = _img[:, :, 2]
@@ -4,7 +4,7 @@
 # LICENSE file in the root directory of this source tree.
 import rospy
 
-from home_robot.hw.ros.image_transport import ImageClient
+from home_robot_hw.ros.image_transport import ImageClient
 
 if __name__ == "__main__":
     rospy.init_node("image_client")
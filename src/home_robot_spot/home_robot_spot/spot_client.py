@@ -5,7 +5,7 @@
 
 import time
 import timeit
-from threading import Event, Thread
+from threading import Event, Lock, Thread
 from typing import Dict, List, Optional, Sequence, Tuple, Union
 
 import bosdyn.client.frame_helpers as frame_helpers
@@ -29,6 +29,7 @@ from spot_wrapper.basic_streaming_visualizer_numpy import obstacle_grid_points
 from spot_wrapper.spot import Spot, build_image_request, image_response_to_cv2
 
 from home_robot.core.interfaces import Action, Observations
+from home_robot.mapping.voxel import VoxelMapDelta, VoxelMapReplica
 from home_robot.motion import PlanResult
 from home_robot.perception.midas import Midas
 from home_robot.utils.bboxes_3d_plotly import plot_scene_with_bboxes
@@ -892,7 +893,8 @@ class SpotClient:
 
 class VoxelMapSubscriber:
     """
-    This class is used to update the voxel map with spot observations, runs on a separate thread
+    This class is used to update the voxel map with spot observations, runs on a separate thread.
+    Other threads can follow the map with get_delta or sync, which never see a half-added observation.
     """
 
     def __init__(self, spot, voxel_map, semantic_sensor):
@@ -900,6 +902,18 @@ class VoxelMapSubscriber:
         self.voxel_map = voxel_map
         self.semantic_sensor = semantic_sensor
         self.current_obs = 0
+        # Held while an observation is added to the map
+        self._lock = Lock()
+
+    def get_delta(self, since: int = 0) -> VoxelMapDelta:
+        """Changes to the voxel map after version since; see SparseVoxelMap.get_delta"""
+        with self._lock:
+            return self.voxel_map.get_delta(since)
+
+    def sync(self, replica: VoxelMapReplica) -> VoxelMapReplica:
+        """Bring a replica of the voxel map up to date, sending only what changed since it was last synced"""
+        replica.apply(self.get_delta(replica.version))
+        return replica
 
     def start(self):
         self.thread = Thread(target=self.update)
@@ -912,7 +926,8 @@ class VoxelMapSubscriber:
             if self.current_obs < self.spot.publishers.observation_index:
                 obs = self.spot.get_rgbd_obs()
                 obs = self.semantic_sensor.predict(obs)
-                self.voxel_map.add_obs(obs, xyz_frame="world")
+                with self._lock:
+                    self.voxel_map.add_obs(obs, xyz_frame="world")
 
                 # FPS ( tested at ~.8)
                 if verbose:
@@ -0,0 +1,113 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+#
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+import numpy as np
+import pytest
+
+from home_robot.manipulation.voxel_grasps import (
+    GRASP_INNER_RAD,
+    GRASP_OUTER_RAD,
+    GRASP_THRESHOLD,
+    MIN_INNER_POINTS,
+    VOXEL_RES,
+    _compute_grasp_scores,
+    _extract_grasps,
+    _filter_grasps,
+    _generate_grasps,
+)
+
+
+def reference_grasp_scores(occ_map: np.ndarray):
+    """Per-cell slice sums, as voxel grasp scoring used to be done"""
+    outer_area = 2 * (GRASP_OUTER_RAD - GRASP_INNER_RAD) ** 2
+    xmax, ymax = occ_map.shape
+    x_score_map = np.zeros_like(occ_map)
+    y_score_map = np.zeros_like(occ_map)
+    for i, j in zip(*np.nonzero(occ_map)):
+        x_outer_lo = max(i - GRASP_OUTER_RAD, 0)
+        x_inner_lo = max(i - GRASP_INNER_RAD, 0)
+        x_inner_hi = min(i + GRASP_INNER_RAD + 1, xmax)
+        x_outer_hi = min(i + GRASP_OUTER_RAD + 1, xmax)
+        y_outer_lo = max(j - GRASP_OUTER_RAD, 0)
+        y_inner_lo = max(j - GRASP_INNER_RAD, 0)
+        y_inner_hi = min(j + GRASP_INNER_RAD + 1, ymax)
+        y_outer_hi = min(j + GRASP_OUTER_RAD + 1, ymax)
+        area_mid = np.sum(occ_map[x_inner_lo:x_inner_hi, y_inner_lo:y_inner_hi])
+        area_x = np.sum(occ_map[x_outer_lo:x_inner_lo, y_inner_lo:y_inner_hi]) + np.sum(
+            occ_map[x_inner_hi:x_outer_hi, y_inner_lo:y_inner_hi]
+        )
+        area_y = np.sum(occ_map[x_inner_lo:x_inner_hi, y_outer_lo:y_inner_lo]) + np.sum(
+            occ_map[x_inner_lo:x_inner_hi, y_inner_hi:y_outer_hi]
+        )
+        mid_pop_score = max(1.0, area_mid / MIN_INNER_POINTS)
+        x_score_map[i, j] = mid_pop_score - area_x / outer_area
+        y_score_map[i, j] = mid_pop_score - area_y / outer_area
+    return x_score_map, y_score_map
+
+
+def reference_extract_grasps(x_score_map, y_score_map, orig, z):
+    """Grasps one cell at a time, as they used to be extracted"""
+    grasps, scores = [], []
+    for i in range(x_score_map.shape[0]):
+        for j in range(x_score_map.shape[1]):
+            x, y = np.array((i, j)) * VOXEL_RES + orig
+            grasp_pos = np.array([x, y, z])
+            for score, rz in [(x_score_map[i, j], np.pi / 2), (y_score_map[i, j], 0)]:
+                if score > 0.0:
+                    grasps.append(_generate_grasps(grasp_pos, np.array([rz]))[0])
+                    scores.append(score)
+    return np.array(grasps).reshape(-1, 4, 4), np.array(scores)
+
+
+def _occupancy_maps():
+    rng = np.random.default_rng(0)
+    # Sparse and dense noise, touching every edge of the map
+    for shape, density in [((7, 9), 0.5), ((31, 23), 0.1), ((40, 41), 0.8)]:
+        yield (rng.random(shape) < density).astype(float)
+    # A long narrow box top next to a small square one; both give grasps that pass
+    # filtering, the square one in both directions at the same cells
+    yield _box_tops()
+
+
+def _box_tops() -> np.ndarray:
+    occ_map = np.zeros((30, 30))
+    occ_map[8:22, 4:7] = 1
+    occ_map[12:15, 20:23] = 1
+    return occ_map
+
+
+@pytest.mark.parametrize("occ_map", list(_occupancy_maps()))
+def test_grasp_scores_match_per_cell_sums(occ_map):
+    expected_x, expected_y = reference_grasp_scores(occ_map)
+    x_score_map, y_score_map = _compute_grasp_scores(occ_map)
+    assert np.allclose(x_score_map, expected_x)
+    assert np.allclose(y_score_map, expected_y)
+
+    x_filtered = _filter_grasps(x_score_map, grasp_direction=0)
+    y_filtered = _filter_grasps(y_score_map, grasp_direction=1)
+    orig = np.array([0.3, -0.2])
+    grasps, scores = _extract_grasps(x_filtered, y_filtered, orig, 0.75)
+    expected_grasps, expected_scores = reference_extract_grasps(
+        x_filtered, y_filtered, orig, 0.75
+    )
+    assert np.allclose(grasps, expected_grasps)
+    assert np.allclose(scores, expected_scores)
+
+
+def test_box_tops_give_grasps_across_their_narrow_sides():
+    x_score_map, y_score_map = _compute_grasp_scores(_box_tops())
+    grasps, scores = _extract_grasps(
+        _filter_grasps(x_score_map, 0), _filter_grasps(y_score_map, 1), np.zeros(2), 0
+    )
+    assert np.all(scores >= GRASP_THRESHOLD)
+    y_grasp = _generate_grasps(np.zeros(3), np.zeros(1))[0]
+    closes_along_y = np.all(np.isclose(grasps[:, :3, :3], y_grasp[:3, :3]), axis=(1, 2))
+    on_long_box = grasps[:, 1, 3] < 10 * VOXEL_RES
+    # The long box is 3 cells wide along y, so it is only grasped across y
+    assert np.any(on_long_box)
+    assert np.all(closes_along_y[on_long_box])
+    # The square box is grasped both ways at its center, x before y
+    (on_square,) = np.nonzero(~on_long_box)
+    assert np.array_equal(closes_along_y[on_square], [False, True])
+    assert np.allclose(grasps[on_square[0], :3, 3], grasps[on_square[1], :3, 3])
@@ -0,0 +1,111 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+#
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+import numpy as np
+import pytest
+import torch
+
+from home_robot.mapping.instance import Instance
+from home_robot.mapping.voxel import SparseVoxelMap
+from home_robot.mapping.voxel.delta import VoxelMapReplica
+from home_robot.utils.voxel import VoxelizedPointcloud
+
+
+def _add_frame(voxel_map: SparseVoxelMap, rng: np.random.Generator, x: float):
+    """Add a random depth image taken from x along the x axis"""
+    height, width = 30, 40
+    K = torch.tensor([[25.0, 0, width / 2], [0, 25.0, height / 2], [0, 0, 1]])
+    pose = torch.eye(4)
+    pose[0, 3] = x
+    depth = torch.from_numpy(rng.uniform(0.5, 3.0, (height, width))).float()
+    rgb = torch.from_numpy(rng.uniform(0, 255, (height, width, 3))).float()
+    voxel_map.add(camera_pose=pose, rgb=rgb, depth=depth, camera_K=K)
+
+
+def _assert_same_voxels(replica: VoxelMapReplica, voxel_map: SparseVoxelMap):
+    order = torch.argsort(replica.get_keys())
+    assert torch.equal(replica.get_keys()[order], voxel_map.voxel_pcd._keys)
+    for got, expected in zip(
+        replica.get_pointcloud(), voxel_map.voxel_pcd.get_pointcloud()
+    ):
+        if expected is None:
+            assert got is None
+        else:
+            assert torch.allclose(got[order], expected)
+
+
+def test_replica_follows_voxel_map():
+    rng = np.random.default_rng(0)
+    voxel_map = SparseVoxelMap(resolution=0.05, use_instance_memory=False)
+    replica = VoxelMapReplica()
+    for i in range(4):
+        _add_frame(voxel_map, rng, 0.2 * i)
+        delta = voxel_map.get_delta(replica.version)
+        assert delta.reset == (i == 0)
+        replica.apply(delta)
+    _assert_same_voxels(replica, voxel_map)
+    assert len(voxel_map.get_delta(replica.version).voxels) == 0
+
+    # Instances are sent when they appear, change or go away
+    instance = Instance(category_id=3, score=0.5, bounds=torch.zeros(3, 2))
+    voxel_map.instances.instances[0][7] = instance
+    _add_frame(voxel_map, rng, 1.0)
+    delta = voxel_map.get_delta(replica.version)
+    assert [summary.id for summary in delta.instances] == [7]
+    replica.apply(delta)
+    assert replica.get_instances()[0].category_id == 3
+    assert voxel_map.get_delta(replica.version).instances == []
+    del voxel_map.instances.instances[0][7]
+    _add_frame(voxel_map, rng, 1.2)
+    delta = voxel_map.get_delta(replica.version)
+    assert delta.removed_instance_ids == [7]
+    replica.apply(delta)
+    assert replica.get_instances() == []
+    _assert_same_voxels(replica, voxel_map)
+
+    # Filtering the voxels directly, as the dash app does, moves the map to a new version
+    version = voxel_map.version
+    points = voxel_map.voxel_pcd.get_pointcloud()[0]
+    voxel_map.voxel_pcd.filter(points[:, 2] > 1.0)
+    delta = voxel_map.get_delta(replica.version)
+    assert delta.version > version and len(delta.voxels.removed_keys) > 0
+    replica.apply(delta)
+    _assert_same_voxels(replica, voxel_map)
+    _add_frame(voxel_map, rng, 1.3)
+    replica.apply(voxel_map.get_delta(replica.version))
+    _assert_same_voxels(replica, voxel_map)
+
+    # A replica that missed a delta cannot apply a later one
+    _add_frame(voxel_map, rng, 1.4)
+    with pytest.raises(ValueError):
+        VoxelMapReplica().apply(voxel_map.get_delta(replica.version))
+
+    voxel_map.reset()
+    delta = voxel_map.get_delta(replica.version)
+    assert delta.reset
+    replica.apply(delta)
+    assert len(replica) == 0
+
+
+def test_replica_keeps_features_for_removals_only():
+    rng = np.random.default_rng(0)
+    pcd = VoxelizedPointcloud(voxel_size=0.1)
+    points = torch.from_numpy(rng.random((300, 3))).float()
+    pcd.add(points, features=torch.rand(300, 4), rgb=torch.rand(300, 3))
+    replica = VoxelMapReplica()
+    replica.apply(pcd.get_delta(0))
+
+    # Removing voxels sends no features, but the remaining ones keep theirs
+    pcd.filter(pcd.get_pointcloud()[0][:, 0] > 0.5)
+    replica.apply(pcd.get_delta(replica.version))
+    assert replica.get_pointcloud()[1] is not None
+    order = torch.argsort(replica.get_keys())
+    assert torch.allclose(replica.get_pointcloud()[1][order], pcd.get_pointcloud()[1])
+
+    # Changed voxels without features cannot be merged with ones that have them
+    points, _, weights, rgb = pcd.get_pointcloud()
+    pcd.set_pointcloud(points + 0.01, None, weights, rgb)
+    with pytest.raises(ValueError):
+        replica.apply(pcd.get_delta(replica.version))
+    assert replica.get_pointcloud()[1] is not None
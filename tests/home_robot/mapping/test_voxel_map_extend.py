@@ -0,0 +1,111 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+#
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+import math
+import os
+
+import numpy as np
+import pytest
+import torch
+
+from home_robot.mapping.voxel import SparseVoxelMap, SparseVoxelMapNavigationSpace
+from home_robot.motion.rrt_connect import RRTConnect
+from home_robot.motion.shortcut import Shortcut
+from home_robot.motion.stretch import HelloStretchKinematics
+from home_robot.utils.geometry import angle_difference, interpolate_angles
+from home_robot.utils.path import REPO_ROOT_PATH
+
+URDF_ABS_PATH = os.path.join(REPO_ROOT_PATH, "assets/hab_stretch/urdf/")
+
+
+def reference_extend_separate(space, q0, q1):
+    """Separate mode extend one state at a time, as it used to be done"""
+    dxy = q1[:2] - q0[:2]
+    step = dxy / np.linalg.norm(dxy + space.tolerance) * space.step_size
+    xy = q0[:2]
+    if np.linalg.norm(q1[:2] - q0[:2]) > space.step_size:
+        new_theta = math.atan2(dxy[1], dxy[0])
+        if new_theta < 0:
+            new_theta += 2 * np.pi
+        cur_theta = q0[-1]
+        while angle_difference(new_theta, cur_theta) > space.rotation_step_size:
+            cur_theta = interpolate_angles(
+                cur_theta, new_theta, space.rotation_step_size
+            )
+            yield np.array([xy[0], xy[1], cur_theta])
+        xy = q0[:2] + step
+        yield np.array([xy[0], xy[1], new_theta])
+        while np.linalg.norm(xy - q1[:2]) > space.step_size:
+            xy = xy + step
+            yield np.array([xy[0], xy[1], new_theta])
+        cur_theta = new_theta
+    else:
+        cur_theta = q0[-1]
+    while angle_difference(q1[-1], cur_theta) > space.rotation_step_size:
+        cur_theta = interpolate_angles(cur_theta, q1[-1], space.rotation_step_size)
+        yield np.array([xy[0], xy[1], cur_theta])
+    yield q1
+
+
+@pytest.fixture(scope="module")
+def space():
+    xs = np.arange(0.0, 4.0, 0.02)
+    floor = np.stack(np.meshgrid(xs, xs, [0.0], indexing="ij"), axis=-1)
+    xyz = torch.from_numpy(floor.reshape(-1, 3)).float()
+    voxel_map = SparseVoxelMap(
+        resolution=0.05, grid_resolution=0.05, use_instance_memory=False
+    )
+    voxel_map.add(
+        camera_pose=torch.eye(4),
+        rgb=torch.rand(len(xyz), 3),
+        xyz=xyz,
+        xyz_frame="world",
+    )
+    robot = HelloStretchKinematics(urdf_path=URDF_ABS_PATH)
+    return SparseVoxelMapNavigationSpace(voxel_map, robot)
+
+
+def test_extend_matches_reference_for_3d_goals(space):
+    rng = np.random.default_rng(0)
+    for i in range(200):
+        q0 = np.r_[rng.uniform(0, 4, 2), rng.uniform(0, 2 * np.pi)]
+        q1 = np.r_[rng.uniform(0, 4, 2), rng.uniform(0, 2 * np.pi)]
+        if i % 4 == 0:
+            # Close enough to only turn in place
+            q1[:2] = q0[:2] + rng.uniform(-0.07, 0.07, 2)
+        expected = np.stack(list(reference_extend_separate(space, q0, q1)))
+        states = np.stack(list(space.extend(q0, q1)))
+        assert states.shape == expected.shape
+        assert np.allclose(states, expected)
+        assert np.array_equal(space.extend_array(q0, q1), states)
+
+
+def test_extend_keeps_heading_for_2d_goals(space):
+    q0 = np.array([1.0, 1.0, 0.0])
+    q1 = np.array([1.0, 3.0])
+    states = space.extend_array(q0, q1)
+    # Turn to face +y, drive there and keep facing +y
+    assert np.allclose(states[-1], [1.0, 3.0, np.pi / 2])
+    assert np.allclose(states[-5:, 2], np.pi / 2)
+    # The old generator took the goal's y coordinate as its heading, turning to
+    # 3 radians after arriving, and ended on the 2d goal itself
+    expected = list(reference_extend_separate(space, q0, q1))
+    num_same = len(states) - 1
+    assert np.allclose(states[:num_same], expected[:num_same])
+    assert np.allclose([q[2] for q in expected[num_same:-1]], [2.0707963, 2.5707963])
+    assert len(expected[-1]) == 2
+
+
+def test_navigation_plan_uses_extend(space):
+    np.random.seed(0)
+    start = np.array([0.5, 0.5, 0.0])
+    goal = np.array([3.0, 3.0, np.pi])
+    planner = Shortcut(RRTConnect(space, space.is_valid))
+    res = planner.plan(start, goal)
+    assert res.success
+    path = [node.state for node in res.trajectory]
+    assert np.allclose(path[0], start) and np.allclose(path[-1], goal)
+    for a, b in zip(path[:-1], path[1:]):
+        states = torch.from_numpy(space.extend_array(a, b))
+        assert torch.all(space.is_valid_batch(states))
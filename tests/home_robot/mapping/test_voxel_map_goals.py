@@ -0,0 +1,85 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+#
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+import os
+
+import numpy as np
+import pytest
+import torch
+
+from home_robot.mapping.voxel import SparseVoxelMap, SparseVoxelMapNavigationSpace
+from home_robot.motion.stretch import HelloStretchKinematics
+from home_robot.utils.path import REPO_ROOT_PATH
+
+URDF_ABS_PATH = os.path.join(REPO_ROOT_PATH, "assets/hab_stretch/urdf/")
+
+# A box standing on the floor of a 4m room
+BOX_BOUNDS = np.array([[1.8, 2.3], [1.8, 2.3], [0.2, 0.8]])
+
+
+def _grid(mins, maxs, step: float = 0.02) -> np.ndarray:
+    axes = [np.arange(lo, hi, step) for lo, hi in zip(mins, maxs)]
+    return np.stack(np.meshgrid(*axes, indexing="ij"), axis=-1).reshape(-1, 3)
+
+
+@pytest.fixture(scope="module")
+def space():
+    floor = _grid([0.0, 0.0, 0.0], [4.0, 4.0, 0.02])
+    box = _grid(BOX_BOUNDS[:, 0], BOX_BOUNDS[:, 1], 0.05)
+    xyz = torch.from_numpy(np.concatenate([floor, box])).float()
+    voxel_map = SparseVoxelMap(
+        resolution=0.05, grid_resolution=0.05, use_instance_memory=False
+    )
+    voxel_map.add(
+        camera_pose=torch.eye(4),
+        rgb=torch.rand(len(xyz), 3),
+        xyz=xyz,
+        xyz_frame="world",
+    )
+    robot = HelloStretchKinematics(urdf_path=URDF_ABS_PATH)
+    return SparseVoxelMapNavigationSpace(voxel_map, robot)
+
+
+def test_is_valid_batch_matches_is_valid(space):
+    rng = np.random.default_rng(0)
+    states = np.zeros((300, 3))
+    states[:, :2] = rng.uniform(-0.5, 4.5, (300, 2))
+    states[:, 2] = rng.uniform(0, 2 * np.pi, 300)
+    valid = space.is_valid_batch(torch.from_numpy(states))
+    expected = [space.is_valid(torch.from_numpy(state).float()) for state in states]
+    assert valid.tolist() == expected
+    assert 0 < valid.sum() < len(states)
+
+
+def test_ranked_goals_near_mask_are_valid(space):
+    mask = space.voxel_map.mask_from_bounds(BOX_BOUNDS)
+    goals = space.get_ranked_goals_near_mask(mask, radius_m=0.7)
+    assert goals is not None and len(goals) > 0
+    assert all(space.is_valid(goal) for goal in goals)
+    # Every goal faces the box
+    center = torch.from_numpy(BOX_BOUNDS[:2].mean(axis=1)).float()
+    to_center = center - goals[:, :2]
+    heading = torch.stack([torch.cos(goals[:, 2]), torch.sin(goals[:, 2])], dim=-1)
+    assert torch.all((heading * to_center).sum(dim=-1) > 0)
+
+
+def test_ranked_goals_spread_around_mask(space):
+    mask = space.voxel_map.mask_from_bounds(BOX_BOUNDS)
+    center = torch.from_numpy(BOX_BOUNDS[:2].mean(axis=1)).float()
+
+    def sectors(goals):
+        around = goals[:, :2] - center
+        angle = torch.remainder(torch.atan2(around[:, 1], around[:, 0]), 2 * np.pi)
+        return set((angle / (2 * np.pi) * 8).long().tolist())
+
+    # The best scoring goals all sit off one corner of the box; if that side is
+    # blocked, none of the first 20 goals can be reached
+    ranked = space.get_ranked_goals_near_mask(mask, radius_m=0.7)
+    off_corner = torch.all(ranked[:20, :2] > center, dim=-1)
+    assert torch.all(off_corner)
+    spread = space.get_ranked_goals_near_mask(mask, radius_m=0.7, num_sectors=8)
+    assert len(spread) == len(ranked)
+    assert torch.equal(spread[0], ranked[0])
+    assert len(sectors(spread[:8])) == 8
+    assert torch.sum(torch.all(spread[:20, :2] > center, dim=-1)) <= 6
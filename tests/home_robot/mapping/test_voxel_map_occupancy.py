@@ -0,0 +1,56 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+#
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+import os
+
+import numpy as np
+import torch
+
+from home_robot.mapping.voxel import SparseVoxelMap
+from home_robot.motion.stretch import STRETCH_HOME_Q, HelloStretchKinematics
+from home_robot.motion.stretch_arm_space import StretchArmSpace
+from home_robot.utils.path import REPO_ROOT_PATH
+
+URDF_ABS_PATH = os.path.join(REPO_ROOT_PATH, "assets/hab_stretch/urdf/")
+
+
+def _voxel_centers(xs, ys, zs, resolution: float) -> np.ndarray:
+    """Centers of the voxels spanned by ranges of voxel coordinates"""
+    grid = np.stack(np.meshgrid(xs, ys, zs, indexing="ij"), axis=-1).reshape(-1, 3)
+    return (grid + 0.5) * resolution
+
+
+def test_occupancy_index_matches_voxel_map_obstacles():
+    resolution = 0.02
+    # A wall in front of the arm, and the floor below it
+    wall = _voxel_centers(
+        np.arange(-20, 15), np.arange(-35, -30), np.arange(0, 70), resolution
+    )
+    floor = _voxel_centers(
+        np.arange(-20, 15), np.arange(-30, 10), np.arange(0, 1), resolution
+    )
+    xyz = torch.from_numpy(np.concatenate([wall, floor])).float()
+    voxel_map = SparseVoxelMap(resolution=resolution, use_instance_memory=False)
+    voxel_map.add(
+        camera_pose=torch.eye(4),
+        rgb=torch.rand(len(xyz), 3),
+        xyz=xyz,
+        xyz_frame="world",
+    )
+
+    # The floor is not an obstacle; the wall above obs_min_height is
+    assert not voxel_map.points_in_collision(floor, 0.005).any()
+    above = wall[:, 2] > voxel_map.obs_min_height
+    assert np.array_equal(voxel_map.points_in_collision(wall, 0.005), above)
+
+    robot = HelloStretchKinematics(urdf_path=URDF_ABS_PATH, ik_type="pinocchio")
+    from_points = StretchArmSpace(robot, STRETCH_HOME_Q)
+    from_points.set_obstacles_from_voxel_map(voxel_map)
+    from_index = StretchArmSpace(robot, STRETCH_HOME_Q)
+    from_index.set_occupancy(voxel_map.occupancy)
+    np.random.seed(0)
+    qs = np.stack([from_points.sample() for _ in range(100)])
+    valid = from_points.is_valid_batch(qs)
+    assert np.array_equal(from_index.is_valid_batch(qs), valid)
+    assert 0 < valid.sum() < len(qs)
@@ -0,0 +1,89 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+#
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+import numpy as np
+import torch
+
+from home_robot.mapping.voxel import PlanCache, SparseVoxelMap
+from home_robot.motion.base import PlanResult
+from home_robot.motion.rrt import TreeNode
+
+
+def _grid(mins, maxs, step: float = 0.02) -> torch.Tensor:
+    axes = [np.arange(lo, hi, step) for lo, hi in zip(mins, maxs)]
+    xyz = np.stack(np.meshgrid(*axes, indexing="ij"), axis=-1).reshape(-1, 3)
+    return torch.from_numpy(xyz).float()
+
+
+def _add(voxel_map: SparseVoxelMap, xyz: torch.Tensor):
+    voxel_map.add(
+        camera_pose=torch.eye(4),
+        rgb=torch.rand(len(xyz), 3),
+        xyz=xyz,
+        xyz_frame="world",
+    )
+
+
+def _make_map() -> SparseVoxelMap:
+    voxel_map = SparseVoxelMap(
+        resolution=0.05, grid_resolution=0.05, use_instance_memory=False
+    )
+    _add(voxel_map, _grid([0.0, 0.0, 0.0], [4.0, 4.0, 0.02]))
+    return voxel_map
+
+
+def _straight_plan(y: float) -> PlanResult:
+    """Plan driving along x from 0.5 to 3.5 at height y of the room"""
+    return PlanResult(True, [TreeNode(np.array([x, y, 0.0])) for x in [0.5, 2.0, 3.5]])
+
+
+def test_plan_cache_evicts_plans_near_new_obstacles():
+    voxel_map = _make_map()
+    cache = PlanCache(voxel_map, margin_m=0.3)
+    start = np.array([0.5, 1.0, 0.0])
+    near, far = _straight_plan(1.0), _straight_plan(3.0)
+    cache.put("near", start, near)
+    cache.put("far", start, far)
+    assert cache.get("near", start) is near
+
+    # A small box 0.15m beside the first path and 1.85m from the second
+    _add(voxel_map, _grid([1.9, 1.15, 0.2], [2.1, 1.25, 0.8]))
+    assert cache.get("near", start) is None
+    assert cache.get("far", start) is far
+    assert len(cache) == 1
+
+
+def test_plan_cache_evicts_plans_through_lost_explored_space():
+    voxel_map = _make_map()
+    cache = PlanCache(voxel_map)
+    start = np.array([0.5, 1.0, 0.0])
+    lost, kept = _straight_plan(1.0), _straight_plan(3.0)
+    cache.put("lost", start, lost)
+    cache.put("kept", start, kept)
+
+    # After a reset only the half of the room with the second path is seen again
+    voxel_map.reset()
+    _add(voxel_map, _grid([0.0, 2.0, 0.0], [4.0, 4.0, 0.02]))
+    assert cache.get("lost", start) is None
+    assert cache.get("kept", start) is kept
+
+
+def test_plan_cache_drops_least_recently_used():
+    voxel_map = _make_map()
+    cache = PlanCache(voxel_map, max_size=2)
+    start = np.array([0.5, 1.0, 0.0])
+    plans = {name: _straight_plan(y) for name, y in [("a", 1.0), ("b", 2.0)]}
+    for name, plan in plans.items():
+        cache.put(name, start, plan)
+    # Using a makes b the least recently used
+    assert cache.get("a", start) is plans["a"]
+    cache.put("c", start, _straight_plan(3.0))
+    assert len(cache) == 2
+    assert cache.get("b", start) is None
+    assert cache.get("a", start) is plans["a"]
+    assert cache.get("c", start) is not None
+    # Failed plans are never stored
+    cache.put("d", start, PlanResult(False, reason="max iterations"))
+    assert cache.get("d", start) is None
+    assert len(cache) == 2
@@ -0,0 +1,58 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+#
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+import numpy as np
+import torch
+
+from home_robot.mapping.voxel import GeodesicReachability, SparseVoxelMap
+from home_robot.navigation_planner.frontier import FrontierTracker
+
+
+def _grid(mins, maxs, step: float = 0.02) -> torch.Tensor:
+    axes = [np.arange(lo, hi, step) for lo, hi in zip(mins, maxs)]
+    xyz = np.stack(np.meshgrid(*axes, indexing="ij"), axis=-1).reshape(-1, 3)
+    return torch.from_numpy(xyz).float()
+
+
+def _add(voxel_map: SparseVoxelMap, xyz: torch.Tensor):
+    voxel_map.add(
+        camera_pose=torch.eye(4),
+        rgb=torch.rand(len(xyz), 3),
+        xyz=xyz,
+        xyz_frame="world",
+    )
+
+
+def test_reachability_reuses_field_within_map_version():
+    voxel_map = SparseVoxelMap(
+        resolution=0.05, grid_resolution=0.05, use_instance_memory=False
+    )
+    _add(voxel_map, _grid([0.0, 0.0, 0.0], [4.0, 4.0, 0.02]))
+    reachability = GeodesicReachability(
+        voxel_map, FrontierTracker(dilate_frontier_size=2, dilate_obstacle_size=1)
+    )
+    start = np.array([0.5, 2.0, 0.0])
+    box = torch.tensor([[3.0, 3.2], [1.9, 2.1], [0.2, 0.8]])
+
+    field = reachability.get_distance_field(start)
+    free_distance = reachability.distance_to_bounds(box, start, radius_m=0.2)
+    assert np.isfinite(free_distance)
+    # Queries and small moves within the same cell share the cached field
+    reachability.get_reachable([box, box + 0.5], start)
+    reachability.is_reachable(box, start + np.array([0.01, 0.01, 1.0]))
+    assert reachability.get_distance_field(start) is field
+    assert reachability.num_solves == 1
+
+    # A wall across the room, with a gap at one end, makes the detour longer
+    version = voxel_map.version
+    _add(voxel_map, _grid([2.0, 0.5, 0.2], [2.2, 4.0, 1.0], 0.05))
+    assert voxel_map.version != version
+    wall_distance = reachability.distance_to_bounds(box, start, radius_m=0.2)
+    assert reachability.num_solves == 2
+    assert reachability.get_distance_field(start) is not field
+    assert wall_distance > free_distance + 1.0
+
+    # Moving to another cell also needs a new solve
+    reachability.get_distance_field(start + np.array([0.5, 0.0, 0.0]))
+    assert reachability.num_solves == 3
@@ -0,0 +1,147 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+#
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+import numpy as np
+import pytest
+import torch
+
+from home_robot.core.interfaces import Observations
+from home_robot.mapping.voxel import SparseVoxelMap
+
+# Few points fall in each voxel of these small images
+MAP_KWARGS = dict(resolution=0.05, use_instance_memory=False, obs_min_density=1)
+
+
+def _make_map(num_frames: int = 7) -> SparseVoxelMap:
+    """Random depth images taken while driving along the x axis"""
+    rng = np.random.default_rng(0)
+    voxel_map = SparseVoxelMap(**MAP_KWARGS)
+    height, width = 30, 40
+    K = torch.tensor([[25.0, 0, width / 2], [0, 25.0, height / 2], [0, 0, 1]])
+    for i in range(num_frames):
+        # Looking along y, so that points fall between obs_min_height and obs_max_height
+        pose = torch.eye(4)
+        pose[:3, :3] = torch.tensor([[1.0, 0, 0], [0, 0, 1], [0, -1, 0]])
+        pose[:3, 3] = torch.tensor([0.3 * i, 0.0, 1.0])
+        depth = torch.from_numpy(rng.uniform(0.5, 3.0, (height, width))).float()
+        rgb = torch.from_numpy(rng.uniform(0, 255, (height, width, 3))).float()
+        obs = Observations(
+            gps=np.array([0.3 * i, 0.0]),
+            compass=np.zeros(1),
+            rgb=rgb.numpy(),
+            depth=depth.numpy(),
+        )
+        voxel_map.add(
+            camera_pose=pose,
+            rgb=rgb,
+            depth=depth,
+            camera_K=K,
+            base_pose=torch.tensor([0.3 * i, 0.0, 0.0]),
+            obs=obs,
+        )
+    return voxel_map
+
+
+def _get_state(voxel_map: SparseVoxelMap, maps: bool = True):
+    points, _, weights, rgb = voxel_map.voxel_pcd.get_pointcloud()
+    state = dict(
+        keys=voxel_map.voxel_pcd._keys.clone(),
+        points=points.clone(),
+        weights=weights.clone(),
+        rgb=rgb.clone(),
+        occupancy=voxel_map.occupancy.get_keys(),
+    )
+    if maps:
+        obstacles, explored = voxel_map.get_2d_map()
+        state.update(
+            obstacles=obstacles.clone(),
+            explored=explored.clone(),
+            visited=voxel_map._visited.clone(),
+        )
+    return state
+
+
+def _assert_same_state(state, expected):
+    assert state.keys() == expected.keys()
+    # The same voxels, with the same points in them
+    assert torch.equal(state["keys"], expected["keys"])
+    assert torch.equal(state["weights"], expected["weights"])
+    # Points are only summed in a different order
+    assert torch.allclose(state["points"], expected["points"], atol=1e-5)
+    assert torch.allclose(state["rgb"], expected["rgb"], atol=1e-3)
+    assert np.array_equal(state["occupancy"], expected["occupancy"])
+    for key in ["obstacles", "explored", "visited"]:
+        if key in expected:
+            assert torch.equal(state[key], expected[key]), key
+
+
+@pytest.mark.parametrize("stage", ["geometry", "maps"])
+@pytest.mark.parametrize("batch_size", [1, 3])
+def test_rebuild_matches_incremental(stage, batch_size):
+    voxel_map = _make_map()
+    expected = _get_state(voxel_map, maps=stage == "maps")
+    version = voxel_map.version
+    timings = voxel_map.rebuild(stage, batch_size=batch_size)
+    assert (
+        list(timings.keys())[:-1]
+        == SparseVoxelMap.REBUILD_STAGES[
+            : SparseVoxelMap.REBUILD_STAGES.index(stage) + 1
+        ]
+    )
+    assert voxel_map.version > version
+    assert len(voxel_map.observations) == 7
+    _assert_same_state(_get_state(voxel_map, maps=stage == "maps"), expected)
+
+
+def test_rebuild_geometry_keeps_visited():
+    voxel_map = _make_map()
+    visited = voxel_map._visited.clone()
+    assert visited.any()
+    voxel_map.rebuild("geometry")
+    assert torch.equal(voxel_map._visited, visited)
+
+
+@pytest.mark.skipif(not torch.cuda.is_available(), reason="needs a GPU")
+def test_rebuild_on_device_keeps_map_on_cpu():
+    voxel_map = _make_map(4)
+    expected = _get_state(voxel_map)
+    voxel_map.rebuild("maps", device="cuda")
+    for name in voxel_map.voxel_pcd._INTERNAL_TENSORS:
+        value = getattr(voxel_map.voxel_pcd, name)
+        assert not torch.is_tensor(value) or value.device.type == "cpu", name
+    _assert_same_state(_get_state(voxel_map), expected)
+    # Frames can still be added on the CPU afterwards
+    voxel_map.add(
+        camera_pose=torch.eye(4),
+        rgb=torch.rand(10, 3),
+        xyz=torch.rand(10, 3) + torch.tensor([0.0, 1.0, 0.5]),
+        xyz_frame="world",
+    )
+
+
+def test_rebuild_rejects_instances_without_memory():
+    voxel_map = _make_map(1)
+    with pytest.raises(ValueError):
+        voxel_map.rebuild("instances")
+    with pytest.raises(ValueError):
+        voxel_map.rebuild("everything")
+
+
+def test_read_from_pickle_stage(tmp_path):
+    filename = str(tmp_path / "map.pkl")
+    _make_map().write_to_pickle(filename)
+    per_frame = SparseVoxelMap(**MAP_KWARGS)
+    assert per_frame.read_from_pickle(filename) is None
+    expected = _get_state(per_frame)
+    assert expected["obstacles"].any() and expected["explored"].any()
+    for stage in ["geometry", "maps"]:
+        staged = SparseVoxelMap(**MAP_KWARGS)
+        timings = staged.read_from_pickle(filename, stage=stage, batch_size=4)
+        assert stage in timings
+        assert len(staged.observations) == len(per_frame.observations)
+        if stage == "maps":
+            _assert_same_state(_get_state(staged), expected)
+        else:
+            state = _get_state(staged, maps=False)
+            _assert_same_state(state, {k: v for k, v in expected.items() if k in state})
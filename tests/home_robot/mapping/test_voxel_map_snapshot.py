@@ -0,0 +1,189 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+#
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+import json
+import os
+
+import numpy as np
+import pytest
+import torch
+
+from home_robot.mapping.voxel import SparseVoxelMap
+from home_robot.mapping.voxel.snapshot import (
+    SNAPSHOT_VERSION,
+    LazyFrameList,
+    VoxelMapSnapshot,
+)
+
+
+def _make_map(num_frames: int = 4, feature_dim: int = 0) -> SparseVoxelMap:
+    """Map of random depth images along the x axis; every other frame has a base pose. Points get random features if feature_dim is set."""
+    rng = np.random.default_rng(0)
+    voxel_map = SparseVoxelMap(
+        resolution=0.05, feature_dim=max(feature_dim, 3), use_instance_memory=False
+    )
+    height, width = 30, 40
+    K = torch.tensor([[25.0, 0, width / 2], [0, 25.0, height / 2], [0, 0, 1]])
+    for i in range(num_frames):
+        pose = torch.eye(4)
+        pose[0, 3] = 0.2 * i
+        depth = torch.from_numpy(rng.uniform(0.5, 3.0, (height, width))).float()
+        rgb = torch.from_numpy(rng.uniform(0, 255, (height, width, 3))).float()
+        base_pose = torch.tensor([0.2 * i, 0.0, 0.0]) if i % 2 == 1 else None
+        feats = None
+        if feature_dim > 0:
+            feats = torch.rand(height, width, feature_dim)
+        voxel_map.add(
+            camera_pose=pose,
+            rgb=rgb,
+            depth=depth,
+            camera_K=K,
+            feats=feats,
+            base_pose=base_pose,
+        )
+    return voxel_map
+
+
+def _assert_same_map(voxel_map: SparseVoxelMap, expected: SparseVoxelMap):
+    for got, want in zip(
+        voxel_map.voxel_pcd.get_pointcloud(), expected.voxel_pcd.get_pointcloud()
+    ):
+        if want is None:
+            assert got is None
+        else:
+            assert torch.allclose(got, want)
+    assert np.array_equal(voxel_map.occupancy.get_keys(), expected.occupancy.get_keys())
+    assert torch.equal(voxel_map._visited, expected._visited)
+
+
+def test_snapshot_round_trip(tmp_path):
+    voxel_map = _make_map()
+    path = str(tmp_path / "snapshot")
+    voxel_map.write_snapshot(path)
+
+    # The stored voxel map is loaded without replaying frames
+    loaded = SparseVoxelMap(resolution=0.05, use_instance_memory=False)
+    loaded.read_snapshot(path)
+    _assert_same_map(loaded, voxel_map)
+    assert isinstance(loaded.observations, LazyFrameList)
+    assert len(loaded.observations) == len(voxel_map.observations)
+    for frame, expected in zip(loaded.observations, voxel_map.observations):
+        for field in ["camera_pose", "camera_K", "rgb", "depth", "full_world_xyz"]:
+            assert torch.equal(getattr(frame, field), getattr(expected, field))
+        assert frame.xyz_frame == expected.xyz_frame
+
+    # Replaying every frame gives the same map
+    replayed = SparseVoxelMap(resolution=0.05, use_instance_memory=False)
+    replayed.read_snapshot(path, replay=True)
+    _assert_same_map(replayed, voxel_map)
+
+    # Or part of it
+    replayed.read_snapshot(path, replay=True, start=1, end=3)
+    assert len(replayed.observations) == 2
+    assert torch.equal(
+        replayed.observations[0].camera_pose, voxel_map.observations[1].camera_pose
+    )
+
+
+def test_snapshot_overwrite(tmp_path):
+    path = str(tmp_path / "snapshot")
+    _make_map(4, feature_dim=4).write_snapshot(path)
+    assert VoxelMapSnapshot(path).get_map_state()["features"] is not None
+    assert VoxelMapSnapshot(path).get_frame(0)["feats"] is not None
+
+    # A smaller map without features replaces it completely
+    voxel_map = _make_map(1)
+    voxel_map.write_snapshot(path)
+    snapshot = VoxelMapSnapshot(path)
+    assert len(snapshot) == 1
+    assert snapshot.get_map_state()["features"] is None
+    assert snapshot.get_frame(0)["feats"] is None
+    assert snapshot.get_frame(0)["base_pose"] is None
+    assert sorted(os.listdir(os.path.join(path, "map"))) == sorted(
+        name + ".npy" for name in snapshot.meta["map_fields"]
+    )
+    loaded = SparseVoxelMap(resolution=0.05, use_instance_memory=False)
+    loaded.read_snapshot(path)
+    _assert_same_map(loaded, voxel_map)
+
+
+def test_snapshot_frames_with_missing_fields(tmp_path):
+    voxel_map = _make_map()
+    path = str(tmp_path / "snapshot")
+    voxel_map.write_snapshot(path)
+    snapshot = VoxelMapSnapshot(path)
+    assert len(snapshot) == 4
+    for i, expected in enumerate(voxel_map.observations):
+        frame = snapshot.get_frame(i)
+        if expected.base_pose is None:
+            assert frame["base_pose"] is None
+        else:
+            assert torch.equal(frame["base_pose"], expected.base_pose)
+        # Never given, so never stored
+        assert frame["feats"] is None and frame["instance"] is None
+    assert snapshot.get_frame(-1)["camera_pose"][0, 3] == pytest.approx(0.6)
+    with pytest.raises(IndexError):
+        snapshot.get_frame(4)
+
+
+def test_lazy_frame_list(tmp_path):
+    voxel_map = _make_map(3)
+    path = str(tmp_path / "snapshot")
+    voxel_map.write_snapshot(path)
+    loaded = SparseVoxelMap(resolution=0.05, use_instance_memory=False)
+    loaded.read_snapshot(path)
+    frames = loaded.observations
+    assert len(frames) == 3
+    assert torch.equal(frames[-1].camera_pose, voxel_map.observations[2].camera_pose)
+    assert [frame.camera_pose[0, 3].item() for frame in frames[1:]] == pytest.approx(
+        [0.2, 0.4]
+    )
+    with pytest.raises(IndexError):
+        frames[3]
+
+    # Frames added after loading are kept in memory after the stored ones
+    frame = voxel_map.observations[0]
+    loaded.add(
+        camera_pose=frame.camera_pose,
+        rgb=frame.rgb,
+        depth=frame.depth,
+        camera_K=frame.camera_K,
+    )
+    assert len(frames) == 4 and len(frames.appended) == 1
+    assert frames[3] is frames.appended[0]
+    assert frames[-1] is frames.appended[0]
+
+    # Writing the loaded map again includes both
+    loaded.write_snapshot(str(tmp_path / "again"))
+    assert len(VoxelMapSnapshot(str(tmp_path / "again"))) == 4
+
+
+def test_snapshot_refuses_newer_version(tmp_path):
+    path = str(tmp_path / "snapshot")
+    _make_map(1).write_snapshot(path)
+    meta_filename = os.path.join(path, "meta.json")
+    with open(meta_filename) as f:
+        meta = json.load(f)
+    meta["version"] = SNAPSHOT_VERSION + 1
+    with open(meta_filename, "w") as f:
+        json.dump(meta, f)
+    with pytest.raises(ValueError):
+        VoxelMapSnapshot(path)
+    with pytest.raises(FileNotFoundError):
+        VoxelMapSnapshot(str(tmp_path / "missing"))
+
+
+def test_read_snapshot_range_needs_replay(tmp_path):
+    path = str(tmp_path / "snapshot")
+    _make_map(2).write_snapshot(path)
+    voxel_map = SparseVoxelMap(resolution=0.05, use_instance_memory=False)
+    with pytest.raises(ValueError):
+        voxel_map.read_snapshot(path, start=1)
+    with pytest.raises(ValueError):
+        voxel_map.read_snapshot(path, end=1)
+    with pytest.raises(ValueError):
+        voxel_map.read_snapshot(path, stage="geometry")
+    # A map with other parameters has to replay
+    with pytest.raises(ValueError):
+        SparseVoxelMap(resolution=0.1).read_snapshot(path)
@@ -0,0 +1,182 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+#
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+import os
+import random
+
+import numpy as np
+import pytest
+
+from home_robot.motion.batched_rrt_connect import ArrayTree, BatchedRRTConnect
+from home_robot.motion.linear import StretchLinearIKPlanner
+from home_robot.motion.stretch import STRETCH_HOME_Q, HelloStretchKinematics
+from home_robot.motion.stretch_arm_space import (
+    STRETCH_ARM_COLLISION_LINKS,
+    StretchArmSpace,
+)
+from home_robot.utils.path import REPO_ROOT_PATH
+from home_robot.utils.simple_env import SimpleEnv
+from home_robot.utils.voxel import VoxelOccupancyIndex
+
+URDF_ABS_PATH = os.path.join(REPO_ROOT_PATH, "assets/hab_stretch/urdf/")
+
+
+def _check_path(space, validate_batch, trajectory, start, goal):
+    """Path goes from start to goal and every interpolated state is valid"""
+    path = np.stack([node.state for node in trajectory])
+    assert np.allclose(path[0], start)
+    assert np.allclose(path[-1], goal)
+    dense = np.concatenate(
+        [space.extend_array(a, b) for a, b in zip(path[:-1], path[1:])]
+    )
+    assert np.all(validate_batch(dense))
+
+
+def test_array_tree():
+    tree = ArrayTree(np.zeros(2), capacity=2)
+    idx = 0
+    for i in range(1, 6):
+        idx = tree.add(np.array([i, 0.0]), idx)
+    assert len(tree) == 6
+    env = SimpleEnv(np.array([20.0, 20.0]))
+    assert tree.nearest(np.array([2.2, 1.0]), env.get_space()) == 2
+    assert np.allclose(tree.backup(3)[:, 0], [0, 1, 2, 3])
+
+
+@pytest.mark.parametrize(
+    "start, goal, obs",
+    [
+        (np.array([1.0, 1.0]), np.array([9.0, 9.0]), np.array([0.0, 9.0])),
+        (np.array([1.0, 4.0]), np.array([9.0, 9.0]), np.array([1.0, 5.0])),
+        (np.array([1.0, 1.0]), np.array([9.0, 9.0]), np.array([2.0, 2.0])),
+    ],
+)
+def test_batched_rrt_connect_simple_env(start, goal, obs):
+    random.seed(0)
+    np.random.seed(0)
+    env = SimpleEnv(obs)
+    space = env.get_space()
+
+    def validate_batch(qs):
+        return np.array([env.validate(q) for q in qs])
+
+    planner = BatchedRRTConnect(space, validate_batch)
+    res = planner.plan(start, goal)
+    assert res.success
+    _check_path(space, validate_batch, res.trajectory, start, goal)
+
+
+def _make_wall() -> np.ndarray:
+    """Wall in front of the arm with an opening at around lift = 0.6, sampled at the centers of 2cm voxels"""
+    xs = np.arange(-0.4, 0.3, 0.02) + 0.01
+    ys = np.arange(-0.7, -0.6, 0.02) + 0.01
+    zs = np.arange(0.0, 1.4, 0.02) + 0.01
+    wall = np.stack(np.meshgrid(xs, ys, zs, indexing="ij"), axis=-1).reshape(-1, 3)
+    return wall[(wall[:, 2] < 0.68) | (wall[:, 2] > 0.92)]
+
+
+@pytest.fixture(scope="module")
+def robot():
+    return HelloStretchKinematics(urdf_path=URDF_ABS_PATH, ik_type="pinocchio")
+
+
+@pytest.fixture(scope="module")
+def arm_space(robot):
+    return StretchArmSpace(robot, STRETCH_HOME_Q, obstacles=_make_wall())
+
+
+def _reference_is_valid(robot, space, q_full, obstacles) -> bool:
+    """Collision spheres from bullet link poses, checked against every obstacle point"""
+    if np.any(q_full[space.joints] < space.mins) or np.any(
+        q_full[space.joints] > space.maxs
+    ):
+        return False
+    for frame_a, frame_b, radius, num_spheres in STRETCH_ARM_COLLISION_LINKS:
+        pos_a = robot.get_link_pose(frame_a, q_full)[0]
+        pos_b = robot.get_link_pose(frame_b, q_full)[0]
+        for t in np.linspace(0, 1, num_spheres):
+            center = pos_a + t * (pos_b - pos_a)
+            if np.min(np.linalg.norm(obstacles - center, axis=-1)) <= radius:
+                return False
+    return True
+
+
+def test_stretch_arm_space_matches_reference(robot, arm_space):
+    np.random.seed(0)
+    qs = np.stack([arm_space.sample() for _ in range(50)])
+    # Some configurations outside the joint limits
+    qs[:3, 0] = arm_space.maxs[0] + 0.1
+    valid = arm_space.is_valid_batch(qs)
+    wall = _make_wall()
+    expected = [
+        _reference_is_valid(robot, arm_space, q_full, wall)
+        for q_full in arm_space.to_full_config(qs)
+    ]
+    assert valid.tolist() == expected
+    assert 0 < valid.sum() < len(qs) - 3
+
+    # Same answers when checking against an occupancy index of the wall
+    occupancy = VoxelOccupancyIndex(resolution=0.02)
+    occupancy.add(wall)
+    space = StretchArmSpace(robot, STRETCH_HOME_Q)
+    space.set_occupancy(occupancy)
+    assert np.array_equal(space.is_valid_batch(qs), valid)
+
+
+def test_stretch_arm_space_single_obstacle(robot):
+    q = np.array([0.6, 0.3, 0.0, 0.0, 0.0])
+    space = StretchArmSpace(robot, STRETCH_HOME_Q)
+    assert space.is_valid(q)
+    q_full = space.to_full_config(q)[0]
+    # A point at a fingertip, and one just out of reach of its sphere
+    fingertip = robot.get_link_pose("link_gripper_fingertip_left", q_full)[0]
+    space.set_obstacles(fingertip[None])
+    assert not space.is_valid(q)
+    space.set_obstacles(fingertip[None] + np.array([0.0, 0.0, 0.2]))
+    assert space.is_valid(q)
+    # Obstacle points near the object being grasped can be ignored
+    space.set_obstacles(fingertip[None], ignore_near=fingertip)
+    assert space.is_valid(q)
+
+
+def test_stretch_arm_rrt_through_opening(arm_space):
+    random.seed(0)
+    np.random.seed(0)
+    start = np.array([0.2, 0.0, 0.0, 0.0, 1.5])
+    goal = np.array([0.6, 0.6, 0.0, 0.0, 0.0])
+    # The straight line hits the wall
+    assert not np.all(arm_space.is_valid_batch(arm_space.extend_array(start, goal)))
+    planner = BatchedRRTConnect(arm_space)
+    res = planner.plan(start, goal)
+    assert res.success
+    _check_path(arm_space, arm_space.is_valid_batch, res.trajectory, start, goal)
+    q_full = arm_space.to_full_config([node.state for node in res.trajectory])
+    assert np.allclose(q_full[:, :3], STRETCH_HOME_Q[:3])
+
+
+def test_linear_ik_planner_arm_fallback(robot, arm_space):
+    random.seed(0)
+    np.random.seed(0)
+    q_standoff = STRETCH_HOME_Q.copy()
+    q_standoff[arm_space.joints] = [0.2, 0.0, 0.0, 0.0, 1.5]
+    q_grasp = STRETCH_HOME_Q.copy()
+    q_grasp[arm_space.joints] = [0.6, 0.6, 0.0, 0.0, 0.0]
+    start, goal = arm_space.from_config(q_standoff), arm_space.from_config(q_grasp)
+    assert not np.all(arm_space.is_valid_batch(arm_space.extend_array(start, goal)))
+
+    # Without an arm space there is no fallback
+    planner = StretchLinearIKPlanner(robot, validate_fn=robot.validate)
+    assert planner._plan_arm(q_standoff, q_grasp) is None
+    planner = StretchLinearIKPlanner(
+        robot, arm_space=arm_space, validate_fn=robot.validate
+    )
+    traj, ts = planner._plan_arm(q_standoff, q_grasp)
+    assert len(traj) == len(ts)
+    assert np.all(np.diff(ts) > 0)
+    assert np.allclose(traj[0], q_standoff) and np.allclose(traj[-1], q_grasp)
+    traj = np.stack(traj)
+    assert np.all(arm_space.is_valid_batch(arm_space.from_config(traj)))
+    # Only the arm joints move
+    others = np.setdiff1d(np.arange(robot.dof), arm_space.joints)
+    assert np.allclose(traj[:, others], q_standoff[others])
@@ -342,6 +342,94 @@ def test_pybullet_ik_optimization(pb_robot, pb_ik_optimizer, test_pose):
     assert success
 
 
+def test_pinocchio_batch_ik_matches_single(pin_robot):
+    np.random.seed(0)
+    solver = pin_robot.manip_ik_solver
+    q_targets = solver._sample_seeds(8)
+    poses = [solver.compute_fk(q) for q in q_targets]
+    pos = np.stack([p for p, _ in poses])
+    quat = np.stack([q for _, q in poses])
+
+    q_batch, success_batch, debug_info = solver.compute_ik_batch(pos, quat)
+    for i in range(len(poses)):
+        q, success, single_debug_info = solver.compute_ik(pos[i], quat[i])
+        assert success == success_batch[i]
+        assert single_debug_info["iter"] == debug_info["iter"][i]
+        assert np.allclose(q, q_batch[i])
+        pos_out, _ = solver.compute_fk(q_batch[i])
+        assert np.allclose(pos_out, debug_info["ee_pos"][i])
+
+
+def test_pinocchio_ik_random_restarts(pin_robot):
+    np.random.seed(0)
+    solver = pin_robot.manip_ik_solver
+    poses = [solver.compute_fk(q) for q in solver._sample_seeds(32)]
+    pos = np.stack([p for p, _ in poses])
+    quat = np.stack([q for _, q in poses])
+
+    # Random starts reach targets that the neutral start alone does not
+    _, success_batch, _ = solver.compute_ik_batch(pos, quat)
+    (failed,) = np.nonzero(~success_batch)
+    assert len(failed) > 0
+    for i in failed:
+        q, success, _ = solver.compute_ik(pos[i], quat[i], num_attempts=8)
+        assert success
+        pos_out, _ = solver.compute_fk(q)
+        assert np.linalg.norm(pos_out - pos[i]) < 1e-3
+
+
+def test_manip_ik_cache(pin_robot, pin_optimize_robot):
+    pos, quat = TEST_DATA[0]
+    pos, quat = np.array(pos), np.array(quat)
+    q, success, info = pin_robot.manip_ik((pos, quat), use_cache=True)
+    assert success
+    assert pin_robot.ik_cache.get_stats()["hits"] == 0
+
+    # The same pose is a hit, reporting the same debug info keys as a solve
+    q_hit, success, hit_info = pin_robot.manip_ik((pos, quat), use_cache=True)
+    assert success
+    assert np.allclose(q_hit, q)
+    assert hit_info["cache_hit"] and hit_info["iter"] == 0
+    assert set(info) <= set(hit_info)
+    assert np.allclose(hit_info["final_error"], info["final_error"])
+
+    # A nearby pose is warm-started from the stored solution
+    nearby = pos + np.array([0.02, 0.0, 0.0])
+    _, success, _ = pin_robot.manip_ik((nearby, quat), use_cache=True)
+    assert success
+    stats = pin_robot.ik_cache.get_stats()
+    assert stats["hits"] == 1 and stats["warm_starts"] == 1 and stats["size"] == 2
+
+    # CEM solvers ignore q_init, so they are never warm-started
+    _, success, _ = pin_optimize_robot.manip_ik((pos, quat), use_cache=True)
+    assert success
+    pin_optimize_robot.manip_ik((nearby, quat), use_cache=True)
+    assert pin_optimize_robot.ik_cache.get_stats()["warm_starts"] == 0
+
+
+def test_parallel_cem_matches_in_process(pin_robot):
+    pos, quat = TEST_DATA[0]
+    results = []
+    for num_workers in [0, 2]:
+        optimizer = PositionIKOptimizer(
+            pin_robot.manip_ik_solver,
+            CEM_POS_ERROR_TOL,
+            np.array([0.0, 0.0, CEM_YAW_ERROR_TOL]),
+            cem_params={
+                "seed": 0,
+                "num_workers": num_workers,
+                "num_samples": 20,
+                "start_method": "fork",
+            },
+        )
+        results.append(optimizer.compute_ik(np.array(pos), np.array(quat)))
+        optimizer.close()
+    (q0, success0, info0), (q1, success1, info1) = results
+    assert success0 == success1
+    assert np.allclose(q0, q1)
+    assert info0["best_cost"] == pytest.approx(info1["best_cost"])
+
+
 def test_ros_to_pin(pin_robot, test_joints):
     pin_pose = pin_robot._ros_pose_to_pinocchio(test_joints[0])
     assert len(pin_pose) == len(test_joints[1])
@@ -0,0 +1,68 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+#
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+import numpy as np
+
+from home_robot.motion.ik_cache import IKCache
+
+
+def test_ik_cache_hits_warm_starts_and_eviction():
+    cache = IKCache(max_size=2, warm_start_radius=0.1)
+    quat = np.array([0.0, 0.0, 0.0, 1.0])
+    pos = np.array([0.1, -0.5, 0.7])
+    q = np.arange(9, dtype=float)
+
+    assert cache.lookup(pos, quat) is None
+    assert cache.get_warm_start(pos, quat) is None
+
+
+def test_ik_cache_bounds_stored_solutions():
+    cache = IKCache(max_size=3)
+    quat = np.array([0.0, 0.0, 0.0, 1.0])
+    pos = np.array([0.1, -0.5, 0.7])
+    # Different joint solutions for the same pose all count towards the bound
+    for i in range(5):
+        cache.insert(pos, quat, np.full(9, float(i)))
+    assert len(cache) == 3
+    cache.insert(pos + 1.0, quat, np.zeros(9))
+    assert len(cache) == 1
+    assert cache.get_stats()["size"] == 1
+    assert cache.lookup(pos, quat) is None
+    cache.insert(
+        pos, quat, q, iterations=50, debug_info={"iter": 50, "final_error": 1e-4}
+    )
+
+    # Exact pose is a hit, with the debug info of the solve; a nearby pose is only a warm start
+    q_hit, info = cache.lookup(pos, quat)
+    assert np.allclose(q_hit, q)
+    assert info == {"iter": 0, "final_error": 1e-4, "cache_hit": True}
+    nearby = pos + np.array([0.03, 0.0, 0.0])
+    assert cache.lookup(nearby, quat) is None
+    assert np.allclose(cache.get_warm_start(nearby, quat), q)
+    assert cache.get_warm_start(pos + 0.5, quat) is None
+
+    stats = cache.get_stats()
+    assert stats["hits"] == 1 and stats["queries"] == 3
+    assert stats["iterations_saved"] == 50
+
+    # Least recently used entries are dropped
+    cache.insert(pos + 1.0, quat, q + 1)
+    cache.insert(pos + 2.0, quat, q + 2)
+    assert len(cache) == 2
+    assert cache.lookup(pos, quat) is None
+    assert cache.get_warm_start(pos, quat) is None
+
+
+def test_ik_cache_bounds_stored_solutions():
+    cache = IKCache(max_size=3)
+    quat = np.array([0.0, 0.0, 0.0, 1.0])
+    pos = np.array([0.1, -0.5, 0.7])
+    # Different joint solutions for the same pose all count towards the bound
+    for i in range(5):
+        cache.insert(pos, quat, np.full(9, float(i)))
+    assert len(cache) == 3
+    cache.insert(pos + 1.0, quat, np.zeros(9))
+    assert len(cache) == 1
+    assert cache.get_stats()["size"] == 1
+    assert cache.lookup(pos, quat) is None
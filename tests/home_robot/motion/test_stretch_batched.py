@@ -0,0 +1,70 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+#
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+import os
+
+import numpy as np
+import pytest
+
+from home_robot.motion.stretch import (
+    STRETCH_HOME_Q,
+    HelloStretchIdx,
+    HelloStretchKinematics,
+)
+from home_robot.utils.path import REPO_ROOT_PATH
+
+URDF_ABS_PATH = os.path.join(REPO_ROOT_PATH, "assets/hab_stretch/urdf/")
+
+
+@pytest.fixture(scope="module")
+def robot():
+    return HelloStretchKinematics(urdf_path=URDF_ABS_PATH)
+
+
+def test_batched_fk_and_validate_match_single(robot):
+    rng = np.random.default_rng(0)
+    qs = STRETCH_HOME_Q + rng.uniform(-0.3, 0.3, (20, robot.dof))
+    qs[:, HelloStretchIdx.LIFT] = rng.uniform(0.2, 1.1, 20)
+
+    pos, quat = robot.manip_fk_batch(qs)
+    for q, p, o in zip(qs, pos, quat):
+        expected_pos, expected_quat = robot.manip_fk(q)
+        assert np.allclose(p, expected_pos)
+        assert np.isclose(np.abs(np.dot(o, expected_quat)), 1.0)
+
+    link_name = robot.default_ee_link_name
+    pos, _ = robot.fk_batch(qs, link_name)
+    for q, p in zip(qs, pos):
+        assert np.allclose(p, robot.get_link_pose(link_name, q)[0], atol=1e-6)
+
+    valid = robot.validate_batch(qs)
+    assert valid.tolist() == [robot.validate(q) for q in qs]
+
+
+def test_validate_batch_with_obstacle():
+    robot = HelloStretchKinematics(urdf_path=URDF_ABS_PATH)
+    # A small block where the gripper is with the arm half raised and extended
+    q = STRETCH_HOME_Q.copy()
+    q[HelloStretchIdx.LIFT], q[HelloStretchIdx.ARM] = 0.6, 0.3
+    block = robot.backend.add_object(
+        "block", os.path.join(REPO_ROOT_PATH, "assets/red_block.urdf")
+    )
+    block.set_pose(robot.get_link_pose(robot.default_ee_link_name, q)[0], [0, 0, 0, 1])
+
+    # Sweep lift and arm extension past the block, plus one too-high lift
+    lifts, arms = np.meshgrid(
+        np.linspace(0.3, 0.9, 7), np.linspace(0.0, 0.5, 6), indexing="ij"
+    )
+    qs = np.tile(STRETCH_HOME_Q, (lifts.size + 1, 1))
+    qs[:-1, HelloStretchIdx.LIFT] = lifts.ravel()
+    qs[:-1, HelloStretchIdx.ARM] = arms.ravel()
+    qs[-1, HelloStretchIdx.LIFT] = 1.05
+
+    valid = robot.validate_batch(qs)
+    assert valid.tolist() == [robot.validate(q) for q in qs]
+    assert not valid[-1]
+    assert 0 < np.sum(~valid[:-1]) < len(qs) - 1
+    # Ignoring the block leaves only the height limit
+    ignored = robot.validate_batch(qs, ignored=[block.id])
+    assert ignored.tolist() == [True] * (len(qs) - 1) + [False]
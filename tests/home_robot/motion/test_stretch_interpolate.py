@@ -0,0 +1,41 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+#
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+import os
+
+import numpy as np
+import pytest
+
+from home_robot.motion.stretch import (
+    STRETCH_HOME_Q,
+    HelloStretchIdx,
+    HelloStretchKinematics,
+)
+from home_robot.utils.path import REPO_ROOT_PATH
+
+URDF_ABS_PATH = os.path.join(REPO_ROOT_PATH, "assets/hab_stretch/urdf/")
+
+
+@pytest.fixture(scope="module")
+def robot():
+    return HelloStretchKinematics(urdf_path=URDF_ABS_PATH)
+
+
+@pytest.mark.parametrize("seed", [0, 1, 2, 3])
+def test_interpolate_array_matches_generator(robot, seed):
+    rng = np.random.default_rng(seed)
+    q0 = STRETCH_HOME_Q + rng.normal(size=robot.dof) * 0.3
+    qg = STRETCH_HOME_Q + rng.normal(size=robot.dof) * 0.3
+    if seed == 0:
+        # No base motion, only the arm stage
+        qg[:3] = q0[:3]
+
+    expected = list(robot.interpolate(q0, qg))
+    qs, actions = robot.interpolate_array(q0, qg)
+    assert qs.shape == actions.shape == (len(expected), robot.dof)
+    assert np.allclose(qs, [q for q, _ in expected])
+    assert np.allclose(actions, [a for _, a in expected])
+    # Ends up at the goal, up to tolerance
+    arm = [HelloStretchIdx.LIFT, HelloStretchIdx.ARM]
+    assert np.allclose(qs[-1, arm], qg[arm], atol=0.01)
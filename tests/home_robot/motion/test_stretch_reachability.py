@@ -0,0 +1,59 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+#
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+import numpy as np
+
+from home_robot.motion.stretch_reachability import StretchReachabilityMap
+
+
+def _make_map() -> StretchReachabilityMap:
+    # 2 x 4 x 5 grid of 10cm cells, reachable only at x=0, y in [1, 2], z in [1, 3]
+    reachable = np.zeros((2, 4, 5), dtype=bool)
+    reachable[0, 1:3, 1:4] = True
+    configs = np.full((2, 4, 5, 3), np.nan, dtype=np.float32)
+    configs[reachable] = [0.5, 0.2, 0.0]
+    return StretchReachabilityMap(
+        reachable, configs, np.zeros(3), 0.1, pitch=-np.pi / 2, roll=0.0
+    )
+
+
+def test_is_reachable():
+    reachability = _make_map()
+    points = np.array(
+        [
+            [0.05, 0.15, 0.25],  # inside
+            [0.15, 0.15, 0.25],  # x outside the reachable slice
+            [0.05, 0.35, 0.25],  # y out of reach
+            [0.05, 0.15, 0.45],  # too high
+            [-1.0, -1.0, -1.0],  # outside the grid
+        ]
+    )
+    assert reachability.is_reachable(points, allow_base_motion=False).tolist() == [
+        True,
+        False,
+        False,
+        False,
+        False,
+    ]
+    # Base can drive along x, so only y and z matter
+    assert reachability.is_reachable(points).tolist() == [
+        True,
+        True,
+        False,
+        False,
+        False,
+    ]
+    assert np.allclose(reachability.get_height_range(), (0.1, 0.4))
+
+
+def test_save_load_and_seed(tmp_path):
+    reachability = _make_map()
+    path = str(tmp_path / "reachability.npz")
+    reachability.save(path)
+    loaded = StretchReachabilityMap.load(path)
+    assert np.array_equal(loaded.reachable, reachability.reachable)
+    assert loaded.resolution == reachability.resolution
+    assert np.allclose(loaded.get_seed([0.05, 0.15, 0.25]), [0.5, 0.2, 0.0])
+    assert loaded.get_seed([0.05, 0.35, 0.25]) is None
+    assert loaded.get_seed([5.0, 5.0, 5.0]) is None
@@ -0,0 +1,74 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+#
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+import numpy as np
+import torch
+
+from home_robot.navigation_planner.frontier import FrontierTracker
+
+
+def _random_maps(steps: int, size: int = 200, seed: int = 0):
+    """Generate a sequence of growing explored/obstacle maps"""
+    rng = np.random.default_rng(seed)
+    explored = torch.zeros(size, size, dtype=torch.bool)
+    obstacles = torch.zeros(size, size, dtype=torch.bool)
+    explored[90:110, 90:110] = True
+    for i in range(steps):
+        x, y = rng.integers(10, size - 10, 2)
+        r = rng.integers(3, 12)
+        explored[x - r : x + r, y - r : y + r] = True
+        if i % 3 == 0:
+            obstacles[x : x + 3, y : y + 3] = True
+        yield obstacles.clone(), explored.clone()
+
+
+def test_incremental_frontier_matches_full_recompute():
+    tracker = FrontierTracker(dilate_frontier_size=6, dilate_obstacle_size=2)
+    for obstacles, explored in _random_maps(20):
+        tracker.update(obstacles, explored)
+        reference = FrontierTracker(dilate_frontier_size=6, dilate_obstacle_size=2)
+        reference.update(obstacles, explored)
+        assert torch.equal(tracker.frontier, reference.frontier)
+        assert torch.equal(tracker.outside_frontier, reference.outside_frontier)
+        assert torch.equal(tracker.traversible, reference.traversible)
+
+
+def test_frontier_unchanged_map_keeps_version():
+    tracker = FrontierTracker(dilate_frontier_size=6, dilate_obstacle_size=2)
+    obstacles, explored = next(_random_maps(1))
+    tracker.update(obstacles, explored)
+    version = tracker.version
+    segments = tracker.get_segments()
+    tracker.update(obstacles, explored)
+    assert tracker.version == version
+    assert tracker.get_segments() is segments
+
+
+def test_frontier_viewpoints_ranked_by_geodesic_distance():
+    # A corridor explored from the left with two dead ends at different distances
+    explored = torch.zeros(100, 100, dtype=torch.bool)
+    obstacles = torch.zeros(100, 100, dtype=torch.bool)
+    explored[45:55, 10:80] = True
+    explored[20:55, 30:40] = True
+    tracker = FrontierTracker(dilate_frontier_size=2, dilate_obstacle_size=1)
+    tracker.update(obstacles, explored)
+    start = (50, 12)
+
+    segments = tracker.rank_segments(start)
+    assert len(segments) > 0
+    distances = [s.distance for s in segments]
+    assert distances == sorted(distances)
+
+    grid_xyt, dists, segment_ids = tracker.get_viewpoints(
+        start, candidates_per_segment=2, min_dist=5.0
+    )
+    assert grid_xyt.shape == (len(dists), 3)
+    assert torch.all(dists >= 5.0)
+    # Every viewpoint lies on the frontier
+    xs, ys = grid_xyt[:, 0].long(), grid_xyt[:, 1].long()
+    assert tracker.frontier[xs, ys].all()
+    # No more than two candidates per segment
+    _, counts = torch.unique(segment_ids, return_counts=True)
+    assert torch.all(counts <= 2)
+    assert torch.all((grid_xyt[:, 2] >= 0) & (grid_xyt[:, 2] < 2 * np.pi))
@@ -0,0 +1,53 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+#
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+import numpy as np
+import pytest
+import torch
+
+from home_robot.mapping.semantic.constants import MapConstants as MC
+from home_robot.navigation_policy.object_navigation.objectnav_frontier_exploration_policy import (
+    ObjectNavFrontierExplorationPolicy,
+)
+
+
+def _map_features(steps: int, batch_size: int = 2, size: int = 120, seed: int = 0):
+    """Maps where explored and been-close areas grow by random boxes, one env at a time"""
+    rng = np.random.default_rng(seed)
+    map_features = torch.zeros(batch_size, 2 * MC.NON_SEM_CHANNELS + 1, size, size)
+    map_features[:, [MC.EXPLORED_MAP, MC.BEEN_CLOSE_MAP], 50:70, 50:70] = 1
+    yield map_features.clone()
+    for i in range(steps):
+        e = rng.integers(batch_size)
+        x, y = rng.integers(0, size, 2)
+        r = rng.integers(2, 10)
+        channel = MC.EXPLORED_MAP if i % 2 == 0 else MC.BEEN_CLOSE_MAP
+        # Mostly growing, sometimes (e.g. after a reset) shrinking
+        value = 0 if i % 7 == 6 else 1
+        map_features[e, channel, max(x - r, 0) : x + r, max(y - r, 0) : y + r] = value
+        yield map_features.clone()
+        if i % 5 == 0:
+            # Nothing changed since the last step
+            yield map_features.clone()
+
+
+def _make_policy(strategy: str) -> ObjectNavFrontierExplorationPolicy:
+    return ObjectNavFrontierExplorationPolicy(
+        strategy, num_sem_categories=1, explored_area_dilation_radius=4
+    )
+
+
+@pytest.mark.parametrize("strategy", ["seen_frontier", "been_close_to_frontier"])
+def test_incremental_frontier_matches_full_recompute(strategy):
+    policy = _make_policy(strategy)
+    for map_features in _map_features(30):
+        frontier_map = policy.get_frontier_map(map_features)
+        reference = _make_policy(strategy).get_frontier_map(map_features)
+        assert torch.equal(frontier_map, reference)
+    assert frontier_map.any()
+
+    # A map of another size starts from scratch
+    smaller = map_features[:, :, :80, :80].contiguous()
+    reference = _make_policy(strategy).get_frontier_map(smaller)
+    assert torch.equal(policy.get_frontier_map(smaller), reference)
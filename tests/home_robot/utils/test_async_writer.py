@@ -0,0 +1,155 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+#
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+import threading
+
+import h5py
+import numpy as np
+import pytest
+
+from home_robot.utils.data_tools.async_writer import (
+    BLOCK,
+    DROP_OLDEST,
+    AsyncFrameWriter,
+)
+from home_robot.utils.data_tools.image import ImageStream, img_to_bytes
+from home_robot.utils.data_tools.writer import DataWriter
+
+
+def _frames(num_frames: int):
+    rng = np.random.default_rng(0)
+    for i in range(num_frames):
+        rgb = rng.integers(0, 256, (12, 16, 3), dtype=np.uint8)
+        depth = rng.integers(0, 5000, (12, 16), dtype=np.uint16)
+        yield {"rgb": rgb, "depth": depth}, {"idx": np.array([i])}
+
+
+def _gated_encode(gate: threading.Event, started: threading.Event):
+    """Encoder that signals started, then waits for the gate to open"""
+
+    def encode(img):
+        started.set()
+        gate.wait()
+        return img_to_bytes(img)
+
+    return encode
+
+
+def _run(fn) -> threading.Thread:
+    thread = threading.Thread(target=fn, daemon=True)
+    thread.start()
+    return thread
+
+
+@pytest.mark.parametrize("streaming", [False, True])
+def test_block_writes_every_frame_in_order(tmp_path, streaming):
+    filename = str(tmp_path / "data.h5")
+    writer = DataWriter(filename, streaming=streaming)
+    async_writer = AsyncFrameWriter(
+        writer, num_workers=3, queue_size=2, backpressure=BLOCK
+    )
+    frames = list(_frames(20))
+    for images, data in frames:
+        assert not async_writer.add_frame(images, data)
+    async_writer.add_config(task_name="test")
+    async_writer.write_trial("trial")
+    async_writer.close()
+    writer.close()
+    stats = async_writer.get_stats()
+    assert stats["written"] == 20 and stats["dropped"] == 0
+
+    with h5py.File(filename, "r") as h5:
+        trial = h5["trial"]
+        assert trial["idx"][()].ravel().tolist() == list(range(20))
+        rgb, depth = ImageStream(trial["rgb"]), ImageStream(trial["depth"])
+        for i, (images, _) in enumerate(frames):
+            assert np.array_equal(rgb[i], images["rgb"])
+            assert np.array_equal(depth[i], images["depth"])
+
+
+def test_drop_oldest_never_blocks(tmp_path):
+    writer = DataWriter(str(tmp_path / "data.h5"))
+    gate, started = threading.Event(), threading.Event()
+    async_writer = AsyncFrameWriter(
+        writer,
+        num_workers=1,
+        queue_size=2,
+        backpressure=DROP_OLDEST,
+        max_latency=0.0,
+        encode_fn=_gated_encode(gate, started),
+    )
+    dropped = []
+    frames = list(_frames(30))
+    async_writer.add_frame(*frames[0])
+    assert started.wait(timeout=10)
+    # The only worker is stuck encoding, but adding frames does not wait for it
+    adder = _run(lambda: dropped.extend(async_writer.add_frame(*f) for f in frames[1:]))
+    adder.join(timeout=10)
+    assert not adder.is_alive()
+    gate.set()
+    async_writer.flush()
+    stats = async_writer.get_stats()
+    # All but the frame being encoded and the two newest were dropped
+    assert stats["dropped"] == sum(dropped) == 27
+    assert stats["written"] == 3
+    assert stats["late"] == 3
+    written = [int(i[0]) for i in writer.temporal_data["idx"]]
+    assert written == [0, 28, 29]
+    async_writer.close()
+
+
+def test_block_waits_for_a_free_slot(tmp_path):
+    writer = DataWriter(str(tmp_path / "data.h5"))
+    gate, started = threading.Event(), threading.Event()
+    async_writer = AsyncFrameWriter(
+        writer,
+        num_workers=1,
+        queue_size=1,
+        backpressure=BLOCK,
+        encode_fn=_gated_encode(gate, started),
+    )
+    frames = list(_frames(4))
+    async_writer.add_frame(*frames[0])
+    assert started.wait(timeout=10)
+    added = []
+
+    def add_rest():
+        for frame in frames[1:]:
+            async_writer.add_frame(*frame)
+            added.append(frame)
+
+    # The worker is stuck on the first frame, so the second fills the only slot
+    # and the third has to wait
+    adder = _run(add_rest)
+    adder.join(timeout=0.2)
+    assert adder.is_alive() and len(added) == 1
+    gate.set()
+    adder.join(timeout=10)
+    assert not adder.is_alive()
+    async_writer.close()
+    assert async_writer.get_stats()["written"] == 4
+    assert async_writer.get_stats()["dropped"] == 0
+
+
+def test_add_frame_after_close_raises(tmp_path):
+    async_writer = AsyncFrameWriter(DataWriter(str(tmp_path / "data.h5")))
+    async_writer.add_frame(*next(_frames(1)))
+    async_writer.close()
+    with pytest.raises(RuntimeError):
+        async_writer.add_frame(*next(_frames(1)))
+    # Nothing was queued, so flushing does not hang
+    async_writer.flush()
+    assert async_writer.get_stats()["written"] == 1
+
+
+def test_errors_are_raised_on_the_calling_thread(tmp_path):
+    def fail(img):
+        raise ValueError("cannot encode")
+
+    async_writer = AsyncFrameWriter(
+        DataWriter(str(tmp_path / "data.h5")), encode_fn=fail
+    )
+    async_writer.add_frame(*next(_frames(1)))
+    with pytest.raises(RuntimeError):
+        async_writer.flush()
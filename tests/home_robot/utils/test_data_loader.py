@@ -0,0 +1,193 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+#
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+import json
+import os
+import pickle
+
+import numpy as np
+import torch
+
+from home_robot.utils.data_tools.loader import DatasetBase, ImagePrefetcher, Trial
+from home_robot.utils.data_tools.writer import DataWriter
+
+
+class ImageDataset(DatasetBase):
+    """Returns the frame index and rgb image of each datum"""
+
+    def get_datum(self, trial, idx):
+        return trial["idx"][idx], trial.get_img("rgb", idx)
+
+
+class FrameCountTrial(Trial):
+    """Keeps a per-trial value from the file in the index"""
+
+    @staticmethod
+    def read_info(group):
+        info = Trial.read_info(group)
+        info["num_frames"] = len(group["idx"])
+        return info
+
+
+class ProcessDataset(ImageDataset):
+    """Also returns which process read the datum, and whether it used a file handle opened by another process"""
+
+    def get_datum(self, trial, idx):
+        idx, rgb = super().get_datum(trial, idx)
+        h5 = self.h5s[trial.h5_filename]
+        return idx, rgb, os.getpid(), id(h5) in self.parent_h5_ids
+
+
+def _write_trials(filename: str, names, num_frames: int = 5, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    writer = DataWriter(filename)
+    for name in names:
+        for i in range(num_frames):
+            writer.add_img_frame(rgb=rng.integers(0, 256, (8, 10, 3), dtype=np.uint8))
+            writer.add_frame(idx=i)
+        writer.add_config(task="test")
+        writer.write_trial(name)
+
+
+def _count_file_reads(monkeypatch):
+    """Files whose trials were read from hdf5 instead of from the index"""
+    reads = []
+    read_file_info = DatasetBase.read_file_info
+
+    def counting_read_file_info(self, filename):
+        reads.append(os.path.basename(filename))
+        return read_file_info(self, filename)
+
+    monkeypatch.setattr(DatasetBase, "read_file_info", counting_read_file_info)
+    return reads
+
+
+def test_dataset_index(tmp_path, monkeypatch):
+    _write_trials(str(tmp_path / "a.h5"), ["a0", "a1"])
+    _write_trials(str(tmp_path / "b.h5"), ["b0"])
+    reads = _count_file_reads(monkeypatch)
+    dataset = ImageDataset(str(tmp_path))
+    assert sorted(reads) == ["a.h5", "b.h5"]
+    assert len(dataset) == 15
+    assert os.path.exists(tmp_path / DatasetBase.INDEX_FILENAME)
+
+    # Reloading reads the index instead of the files
+    reads.clear()
+    dataset = ImageDataset(str(tmp_path))
+    assert reads == []
+    assert [trial.name for trial in dataset.trials] == ["a0", "a1", "b0"]
+    assert [trial.length for trial in dataset.trials] == [5, 5, 5]
+
+    # A file that changed is read again
+    _write_trials(str(tmp_path / "b.h5"), ["b1"], num_frames=3)
+    dataset = ImageDataset(str(tmp_path))
+    assert reads == ["b.h5"]
+    assert [trial.name for trial in dataset.trials] == ["a0", "a1", "b0", "b1"]
+    assert len(dataset) == 18
+
+    # A deleted file is dropped from the index
+    reads.clear()
+    os.remove(tmp_path / "a.h5")
+    dataset = ImageDataset(str(tmp_path))
+    assert reads == []
+    assert [trial.name for trial in dataset.trials] == ["b0", "b1"]
+    with open(tmp_path / DatasetBase.INDEX_FILENAME) as f:
+        assert list(json.load(f)["files"].keys()) == ["b.h5"]
+
+    # Without the index every file is read
+    dataset = ImageDataset(str(tmp_path), use_index=False)
+    assert reads == ["b.h5"]
+
+
+def test_dataset_pickle(tmp_path):
+    _write_trials(str(tmp_path / "a.h5"), ["a0", "a1"])
+    dataset = ImageDataset(str(tmp_path))
+    expected = [dataset[i] for i in range(len(dataset))]
+    # Open files are not pickled; the copy opens its own
+    copy = pickle.loads(pickle.dumps(dataset))
+    assert copy.h5s == {}
+    for i, (idx, rgb) in enumerate(expected):
+        copy_idx, copy_rgb = copy[i]
+        assert copy_idx == idx and np.array_equal(copy_rgb, rgb)
+    copy.close()
+    dataset.close()
+
+
+def test_dataset_decode_threads(tmp_path):
+    _write_trials(str(tmp_path / "a.h5"), ["a0", "a1"], num_frames=8)
+    serial = ImageDataset(str(tmp_path))
+    threaded = ImageDataset(str(tmp_path), num_decode_threads=2, decode_ahead=3)
+    assert serial.get_prefetcher() is None
+    for i in range(len(serial)):
+        idx, rgb = serial[i]
+        threaded_idx, threaded_rgb = threaded[i]
+        assert idx == threaded_idx and np.array_equal(rgb, threaded_rgb)
+    # Frames after the first of each trial were decoded ahead
+    prefetcher = threaded.get_prefetcher()
+    assert prefetcher.misses == 2 and prefetcher.hits == len(threaded) - 2
+
+    trial = threaded.trials[1]
+    trial.prefetch_imgs(["rgb"], [5, 6])
+    assert np.array_equal(trial.get_img("rgb", 6), serial.trials[1].get_img("rgb", 6))
+    assert prefetcher.misses == 2
+    serial.close()
+    threaded.close()
+
+
+def test_image_prefetcher(tmp_path):
+    _write_trials(str(tmp_path / "a.h5"), ["a0"], num_frames=6)
+    dataset = ImageDataset(str(tmp_path))
+    trial = dataset.trials[0]
+    expected = [trial.get_img("rgb", i) for i in range(6)]
+    prefetcher = ImagePrefetcher(num_threads=2, max_size=3)
+    for i in range(6):
+        prefetcher.submit(trial, "rgb", i)
+        # Submitting a frame again does not decode it twice
+        prefetcher.submit(trial, "rgb", i)
+    # Only the newest max_size frames are kept
+    assert len(prefetcher.pending) == 3
+    for i in range(6):
+        assert np.array_equal(prefetcher.get(trial, "rgb", i), expected[i])
+    assert prefetcher.hits == 3 and prefetcher.misses == 3
+    assert len(prefetcher.pending) == 0
+    prefetcher.shutdown()
+    dataset.close()
+
+
+def test_dataset_index_trial_type(tmp_path, monkeypatch):
+    _write_trials(str(tmp_path / "a.h5"), ["a0", "a1"], num_frames=4)
+    reads = _count_file_reads(monkeypatch)
+    ImageDataset(str(tmp_path))
+    dataset = ImageDataset(str(tmp_path), TrialType=FrameCountTrial)
+    # An index built by another Trial type lacks its extra info, so files are read again
+    assert reads == ["a.h5", "a.h5"]
+    assert [trial.info["num_frames"] for trial in dataset.trials] == [4, 4]
+    reads.clear()
+    dataset = ImageDataset(str(tmp_path), TrialType=FrameCountTrial)
+    assert reads == []
+    assert [trial.info["num_frames"] for trial in dataset.trials] == [4, 4]
+
+
+def test_dataset_forked_workers(tmp_path):
+    _write_trials(str(tmp_path / "a.h5"), ["a0", "a1"])
+    dataset = ProcessDataset(str(tmp_path))
+    dataset.parent_h5_ids = set()
+    # Read in the parent first, so that workers inherit its open file
+    expected = [dataset[i][:2] for i in range(len(dataset))]
+    dataset.parent_h5_ids = {id(h5) for h5 in dataset.h5s.values()}
+    loader = torch.utils.data.DataLoader(
+        dataset,
+        batch_size=None,
+        num_workers=2,
+        multiprocessing_context="fork",
+    )
+    pids = set()
+    for (idx, rgb), (worker_idx, worker_rgb, pid, shared) in zip(expected, loader):
+        assert worker_idx == idx and np.array_equal(worker_rgb.numpy(), rgb)
+        assert pid != os.getpid() and not shared
+        pids.add(pid)
+    assert len(pids) == 2
+    # The parent's file is still usable
+    assert np.array_equal(dataset[0][1], expected[0][1])
+    dataset.close()
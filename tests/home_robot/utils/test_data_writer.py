@@ -0,0 +1,108 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+#
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+import h5py
+import numpy as np
+import pytest
+
+from home_robot.utils.data_tools.loader import DatasetBase
+from home_robot.utils.data_tools.writer import DataWriter
+
+
+class FrameDataset(DatasetBase):
+    """Returns everything stored for each frame"""
+
+    def get_datum(self, trial, idx):
+        datum = {k: trial[k][idx] for k in trial.temporal_keys}
+        datum.update({k: trial.get_img(k, idx) for k in trial.image_keys})
+        return datum
+
+
+def _write(writer: DataWriter, seed: int = 0):
+    """Two trials with temporal, config and image data; lengths that are not multiples of the chunk size"""
+    rng = np.random.default_rng(seed)
+    for name, num_frames in [("first", 7), ("second", 4)]:
+        writer.add_config(task=name, camera={"K": rng.random((3, 3))})
+        for i in range(num_frames):
+            writer.add_img_frame(
+                rgb=rng.integers(0, 256, (6, 8, 3), dtype=np.uint8),
+                depth=rng.integers(0, 10000, (6, 8), dtype=np.uint16),
+            )
+            writer.add_frame(idx=i, q=rng.random(5), pose={"xyz": rng.random(3)})
+        writer.write_trial(name)
+
+
+def test_streaming_matches_default(tmp_path):
+    (tmp_path / "default").mkdir()
+    (tmp_path / "streaming").mkdir()
+    writer = DataWriter(str(tmp_path / "default" / "data.h5"))
+    _write(writer)
+    writer = DataWriter(
+        str(tmp_path / "streaming" / "data.h5"), streaming=True, chunk_size=3
+    )
+    _write(writer)
+    writer.close()
+
+    default = FrameDataset(str(tmp_path / "default"))
+    streamed = FrameDataset(str(tmp_path / "streaming"))
+    assert len(streamed) == len(default) == 11
+    for trial, expected_trial in zip(streamed.trials, default.trials):
+        assert trial.name == expected_trial.name
+        assert trial.length == expected_trial.length
+        for keys in ["temporal_keys", "config_keys", "image_keys"]:
+            assert sorted(getattr(trial, keys)) == sorted(getattr(expected_trial, keys))
+        assert trial.get_conf("task") == expected_trial.get_conf("task")
+        assert np.array_equal(
+            trial.get_conf("camera/K"), expected_trial.get_conf("camera/K")
+        )
+    for i in range(len(default)):
+        datum, expected = streamed[i], default[i]
+        assert datum.keys() == expected.keys()
+        for k, v in expected.items():
+            assert np.array_equal(datum[k], v), k
+    with h5py.File(tmp_path / "streaming" / "data.h5", "r") as h5:
+        assert DataWriter.STREAM_GROUP not in h5
+
+
+def test_streaming_reset_discards_partial_trial(tmp_path):
+    filename = str(tmp_path / "data.h5")
+    writer = DataWriter(filename, streaming=True, chunk_size=2)
+    for i in range(5):
+        writer.add_frame(idx=i)
+        writer.add_img_frame(rgb=np.full((4, 4, 3), i, dtype=np.uint8))
+    # Make sure the partial trial is on disk before dropping it
+    writer.flush()
+    writer.reset()
+    for i in range(3):
+        writer.add_frame(idx=10 + i)
+    writer.write_trial("kept")
+    writer.close()
+    with h5py.File(filename, "r") as h5:
+        assert list(h5.keys()) == ["kept"]
+        assert h5["kept"]["idx"][()].tolist() == [10, 11, 12]
+        assert "rgb" not in h5["kept"]
+
+
+def test_streaming_error_surfaces(tmp_path):
+    # Frames that cannot be stacked fail in the writer thread once a chunk is full
+    writer = DataWriter(str(tmp_path / "frames.h5"), streaming=True, chunk_size=2)
+    writer.add_frame(q=np.zeros(3))
+    writer.add_frame(q=np.zeros(4))
+    with pytest.raises(RuntimeError) as error:
+        writer.flush()
+    assert isinstance(error.value.__cause__, ValueError)
+    with pytest.raises(RuntimeError):
+        writer.write_trial("trial")
+    with pytest.raises(RuntimeError):
+        writer.close()
+    assert not writer._thread.is_alive()
+
+    # Here they fail when write_trial flushes the last partial chunk, after write_trial returned
+    writer = DataWriter(str(tmp_path / "finish.h5"), streaming=True, chunk_size=8)
+    writer.add_frame(q=np.zeros(3))
+    writer.add_frame(q=np.zeros(4))
+    writer.write_trial("trial")
+    with pytest.raises(RuntimeError):
+        writer.close()
+    assert not writer._thread.is_alive()
@@ -0,0 +1,57 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+#
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+import numpy as np
+import pytest
+
+from home_robot.utils.depth import TemporalDepthFilter, filter_depth_stream
+
+
+def reference_filter(imgs, std_threshold):
+    """Mean and std over a full stack, as RosCamera.get_filtered used to compute them"""
+    stacked = np.stack(imgs)
+    avg = np.mean(stacked, axis=0)
+    avg[np.std(stacked, axis=0) > std_threshold] = 0
+    return avg
+
+
+@pytest.mark.parametrize("buffer_size", [1, 3, 8])
+def test_filter_matches_reference(buffer_size):
+    rng = np.random.default_rng(buffer_size)
+    base = rng.uniform(0.5, 4.0, (24, 32))
+    # Half the pixels are stable, the other half are noisy
+    noise = np.zeros_like(base)
+    noise[:, 16:] = 0.5
+    depths = [base + noise * rng.standard_normal(base.shape) for _ in range(25)]
+
+    depth_filter = TemporalDepthFilter(buffer_size, std_threshold=0.01)
+    assert depth_filter.get() is None
+    out = np.empty_like(base)
+    for i, depth in enumerate(depths):
+        depth_filter.add(depth)
+        assert len(depth_filter) == min(i + 1, buffer_size)
+        expected = reference_filter(depths[max(0, i + 1 - buffer_size) : i + 1], 0.01)
+        assert np.allclose(depth_filter.get(), expected, atol=1e-9)
+        # Writing into a given array returns that array
+        assert depth_filter.get(out=out) is out
+        assert np.allclose(out, expected, atol=1e-9)
+    assert depth_filter.is_full()
+    if buffer_size > 1:
+        assert np.all(out[:, 16:] == 0)
+        assert np.all(out[:, :16] > 0)
+
+    filtered = list(filter_depth_stream(depths, buffer_size, std_threshold=0.01))
+    assert len(filtered) == len(depths)
+    assert np.allclose(filtered[-1], out)
+
+
+def test_filter_resets_on_new_shape():
+    depth_filter = TemporalDepthFilter(4)
+    assert depth_filter.shape is None
+    for _ in range(3):
+        depth_filter.add(np.ones((10, 12)))
+    depth_filter.add(np.full((6, 8), 2.0))
+    assert len(depth_filter) == 1
+    assert depth_filter.shape == (6, 8)
+    assert np.array_equal(depth_filter.get(), np.full((6, 8), 2.0))
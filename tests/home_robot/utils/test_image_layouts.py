@@ -0,0 +1,81 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+#
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+import h5py
+import numpy as np
+import pytest
+
+import home_robot.utils.data_tools.base as base
+import home_robot.utils.data_tools.image as image
+from home_robot.utils.data_tools.migrate_images import migrate_file
+from home_robot.utils.data_tools.writer import DataWriter
+
+
+def _frames(num_frames: int = 5):
+    rng = np.random.default_rng(0)
+    return [
+        {
+            "rgb": rng.integers(0, 256, (6, 8, 3), dtype=np.uint8),
+            # Values that need all 16 bits
+            "depth": rng.integers(0, 65536, (6, 8), dtype=np.uint16),
+        }
+        for _ in range(num_frames)
+    ]
+
+
+@pytest.mark.parametrize("streaming", [False, True])
+@pytest.mark.parametrize("layout", image.IMAGE_LAYOUTS)
+def test_image_layout_round_trip(tmp_path, layout, streaming):
+    filename = str(tmp_path / "data.h5")
+    writer = DataWriter(filename, streaming=streaming, image_layout=layout)
+    frames = _frames()
+    for i, frame in enumerate(frames):
+        writer.add_img_frame(**frame)
+        writer.add_frame(idx=i)
+    writer.write_trial("trial")
+    writer.close()
+
+    with h5py.File(filename, "r") as h5:
+        for key in ["rgb", "depth"]:
+            stream = image.ImageStream(h5["trial"][key])
+            assert stream.layout == layout
+            assert len(stream) == len(frames)
+            for i, img in enumerate(stream):
+                expected = frames[i][key]
+                assert img.dtype == expected.dtype
+                assert np.array_equal(img, expected)
+            assert np.array_equal(stream.read(3), frames[3][key])
+
+
+@pytest.mark.parametrize("layout", [image.ARRAY_LAYOUT, image.ENCODED_LAYOUT])
+def test_migrate_png_layout(tmp_path, layout):
+    src = str(tmp_path / "png.h5")
+    writer = DataWriter(src)
+    frames = _frames()
+    for trial_name in ["a", "b"]:
+        writer.add_config(task=trial_name)
+        for i, frame in enumerate(frames):
+            # Nested keys are flattened to head/rgb and head/depth
+            writer.add_img_frame(head=frame)
+            writer.add_frame(idx=i)
+        writer.write_trial(trial_name)
+
+    dst = str(tmp_path / "migrated.h5")
+    migrate_file(src, dst, layout)
+    with h5py.File(src, "r") as old, h5py.File(dst, "r") as new:
+        assert list(new.keys()) == ["a", "b"]
+        for trial_name in ["a", "b"]:
+            old_trial, new_trial = old[trial_name], new[trial_name]
+            assert new_trial["task"][()] == old_trial["task"][()]
+            assert np.array_equal(new_trial["idx"][()], old_trial["idx"][()])
+            assert new_trial[base.IMAGE_KEYS][()] == old_trial[base.IMAGE_KEYS][()]
+            for key in ["head/rgb", "head/depth"]:
+                old_stream = image.ImageStream(old_trial[key])
+                new_stream = image.ImageStream(new_trial[key])
+                assert old_stream.layout == image.PNG_LAYOUT
+                assert new_stream.layout == layout
+                assert len(new_stream) == len(old_stream) == len(frames)
+                for old_img, new_img in zip(old_stream, new_stream):
+                    assert new_img.dtype == old_img.dtype
+                    assert np.array_equal(new_img, old_img)
@@ -0,0 +1,42 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+#
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+import numpy as np
+import pytest
+import skimage.morphology
+import torch
+
+from home_robot.utils.morphology import (
+    binary_dilation,
+    binary_erosion,
+    dilate_mask,
+    erode_mask,
+    get_disk_kernel,
+)
+
+
+@pytest.mark.parametrize("radius", [1, 2, 5, 12])
+@pytest.mark.parametrize("method", ["conv", "edt"])
+def test_dilate_and_erode_match_conv_reference(radius, method):
+    rng = np.random.default_rng(radius)
+    mask = torch.from_numpy(rng.random((120, 90)) < 0.02)
+    kernel = get_disk_kernel(radius)
+    assert torch.equal(
+        kernel[0, 0], torch.from_numpy(skimage.morphology.disk(radius)).float()
+    )
+
+    image = mask.float().unsqueeze(0).unsqueeze(0)
+    dilated = binary_dilation(image, kernel)[0, 0].bool()
+    eroded = binary_erosion(1 - image, kernel)[0, 0].bool()
+    assert torch.equal(dilate_mask(mask, radius, method=method), dilated)
+    assert torch.equal(erode_mask(~mask, radius, method=method), eroded)
+
+    # Processing only a region of interest gives the same cells
+    roi = (10, 60, 30, 90)
+    assert torch.equal(
+        dilate_mask(mask, radius, roi=roi, method=method), dilated[10:60, 30:90]
+    )
+    assert torch.equal(
+        erode_mask(~mask, radius, roi=roi, method=method), eroded[10:60, 30:90]
+    )
@@ -0,0 +1,261 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+#
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+import numpy as np
+import pytest
+import torch
+
+from home_robot.utils.point_cloud_torch import get_one_point_per_voxel_from_pointcloud
+from home_robot.utils.voxel import (
+    VoxelDownsampler,
+    VoxelizedPointcloud,
+    VoxelOccupancyIndex,
+    get_voxel_keys,
+    reduce_pointcloud,
+    voxel_downsample,
+)
+
+
+def _reference_downsample(points: np.ndarray, rgb: np.ndarray, voxel_size: float):
+    """Mean position and color per voxel, keyed by voxel coordinates"""
+    coords = np.floor((points - points.min(axis=0)) / voxel_size).astype(int)
+    result = {}
+    for key in set(map(tuple, coords)):
+        mask = np.all(coords == key, axis=1)
+        result[key] = (points[mask].mean(axis=0), rgb[mask].mean(axis=0), mask.sum())
+    return result
+
+
+def test_voxel_downsample_matches_reference():
+    rng = np.random.default_rng(0)
+    points = rng.random((500, 3)) * 0.3
+    rgb = rng.random((500, 3))
+    expected = _reference_downsample(points, rgb, 0.05)
+
+    downsampler = VoxelDownsampler(0.05)
+    for _ in range(2):
+        # Second call reuses the scratch buffers
+        xyz, colors, weights = downsampler(
+            torch.from_numpy(points), torch.from_numpy(rgb)
+        )
+        assert xyz.shape[0] == len(expected)
+        assert torch.allclose(weights.sum(), torch.tensor(500.0, dtype=weights.dtype))
+        for p, c, w in zip(xyz.numpy(), colors.numpy(), weights.numpy()):
+            key = tuple(np.floor((p - points.min(axis=0)) / 0.05).astype(int))
+            exp_p, exp_c, exp_w = expected[key]
+            assert np.allclose(p, exp_p) and np.allclose(c, exp_c) and w == exp_w
+
+    # A smaller cloud after a larger one still gives correct results
+    xyz, _, weights = downsampler(torch.from_numpy(points[:10]))
+    assert weights.sum() == 10
+
+
+def test_voxel_downsample_camera_pose():
+    points = torch.tensor([[0.0, 0.0, 0.0], [0.001, 0.0, 0.0], [1.0, 0.0, 0.0]])
+    camera_pose = torch.eye(4)
+    camera_pose[:3, :3] = torch.tensor([[0.0, -1.0, 0.0], [1.0, 0.0, 0.0], [0, 0, 1]])
+    camera_pose[:3, 3] = torch.tensor([1.0, 2.0, 3.0])
+    xyz, rgb, weights = voxel_downsample(points, 0.1, camera_pose=camera_pose)
+    assert rgb is None
+    assert weights.tolist() == [2.0, 1.0]
+    assert torch.allclose(xyz[0], torch.tensor([1.0, 2.0005, 3.0]))
+    assert torch.allclose(xyz[1], torch.tensor([1.0, 3.0, 3.0]))
+
+
+def test_one_point_per_voxel():
+    points = torch.tensor(
+        [[0.0, 0.0, 0.0], [0.01, 0.0, 0.0], [0.5, 0.5, 0.5], [0.0, 0.0, 0.0]]
+    )
+    batch = torch.tensor([0, 0, 0, 1])
+    idx = get_one_point_per_voxel_from_pointcloud(
+        points, batch, 0.1, use_random_centers=False
+    )
+    assert sorted(idx.tolist()) == [0, 2, 3]
+
+
+def test_voxel_occupancy_index_matches_brute_force():
+    rng = np.random.default_rng(0)
+    index = VoxelOccupancyIndex(resolution=0.02, merge_fraction=0.5)
+    clouds = [rng.normal(size=(300, 3)) * 0.3 + rng.normal(size=3) for _ in range(4)]
+    for cloud in clouds:
+        index.add(torch.from_numpy(cloud))
+    # Adding the same points again changes nothing
+    assert index.add(clouds[0]) == 0
+    # Small adds were kept out of the main tree
+    assert index.num_rebuilds < len(clouds)
+
+    points = np.concatenate(clouds)
+    centers = (np.unique(np.floor(points / 0.02), axis=0) + 0.5) * 0.02
+    assert len(index) == len(centers)
+    assert np.allclose(np.sort(index.get_points(), axis=0), np.sort(centers, axis=0))
+
+    queries = rng.normal(size=(200, 3))
+    expected = np.linalg.norm(queries[:, None] - centers[None], axis=-1).min(axis=1)
+    assert np.allclose(index.min_distance(queries), expected)
+    bounded = index.min_distance(queries, max_distance=0.2)
+    assert np.allclose(bounded[expected <= 0.2], expected[expected <= 0.2])
+    assert np.all(np.isinf(bounded[expected > 0.2]))
+
+    radius = rng.random(200) * 0.2
+    colliding = index.points_in_collision(queries, radius)
+    assert np.array_equal(colliding, expected <= radius)
+    assert 0 < colliding.sum() < len(queries)
+
+    index.reset()
+    assert len(index) == 0
+    assert not index.points_in_collision(queries, 1.0).any()
+
+
+def test_voxelized_pointcloud_delta():
+    rng = np.random.default_rng(0)
+    pcd = VoxelizedPointcloud(voxel_size=0.1)
+    room = torch.from_numpy(rng.random((2000, 3))).float()
+    pcd.add(room, features=None, rgb=torch.rand(2000, 3))
+    delta = pcd.get_delta(0)
+    assert delta.reset and len(delta.keys) == len(
+        torch.unique(get_voxel_keys(room, 0.1))
+    )
+    assert len(pcd.get_delta(delta.version)) == 0
+
+    # Only voxels that new points fall into are sent, even though the bounds grow
+    version = delta.version
+    corner = torch.tensor([[0.05, 0.05, 0.05], [-0.55, -0.55, -0.55]])
+    pcd.add(corner, features=None, rgb=torch.rand(2, 3))
+    delta = pcd.get_delta(version)
+    assert not delta.reset and len(delta.removed_keys) == 0
+    assert set(delta.keys.tolist()) == set(get_voxel_keys(corner, 0.1).tolist())
+
+    # Replacing the contents only sends what differs
+    version = delta.version
+    points, features, weights, rgb = pcd.get_pointcloud()
+    keep = points[:, 0] > 0.5
+    pcd.set_pointcloud(points[keep], features, weights[keep], rgb[keep])
+    delta = pcd.get_delta(version)
+    assert len(delta.keys) == 0
+    assert set(delta.removed_keys.tolist()) == set(
+        get_voxel_keys(points[~keep], 0.1).tolist()
+    )
+
+    pcd.reset()
+    delta = pcd.get_delta(delta.version)
+    assert delta.reset and len(delta) == 0
+
+
+def test_voxelized_pointcloud_idxs_match_stored_voxels():
+    rng = np.random.default_rng(0)
+    pcd = VoxelizedPointcloud(voxel_size=0.1)
+    points = torch.from_numpy(rng.random((500, 3))).float()
+    pcd.add(points, features=None, rgb=None)
+    # Added far from the first points, so the bounds change
+    pcd.add(points[:10] + 3.0, features=None, rgb=None)
+
+    queries = torch.cat([points, torch.tensor([[-5.0, 0.0, 0.0]])])
+    voxel_idx, row = pcd.get_idxs(queries)
+    assert torch.equal(voxel_idx, get_voxel_keys(queries, 0.1))
+    assert torch.equal(pcd.get_voxel_idx(queries), voxel_idx)
+    assert torch.equal(pcd.get_consecutive_cluster_idx(queries), row)
+    # Every added point is in the stored voxel with its key; the far query in none
+    assert torch.equal(pcd._keys[row[:-1]], voxel_idx[:-1])
+    assert row[-1] == -1
+
+
+def test_voxel_keys_out_of_range():
+    limit = (1 << 20) * 0.1
+    inside = torch.tensor([[limit - 0.05, -limit, 0.0]])
+    assert len(get_voxel_keys(inside, 0.1)) == 1
+    for outside in [[limit + 0.05, 0.0, 0.0], [0.0, 0.0, -limit - 0.05]]:
+        with pytest.raises(ValueError):
+            get_voxel_keys(torch.tensor([outside]), 0.1)
+        with pytest.raises(ValueError):
+            VoxelOccupancyIndex(resolution=0.1).add(np.array([outside]))
+        with pytest.raises(ValueError):
+            VoxelizedPointcloud(voxel_size=0.1).add(
+                torch.tensor([outside]), features=None, rgb=None
+            )
+
+
+def test_voxelized_pointcloud_filter():
+    rng = np.random.default_rng(0)
+    pcd = VoxelizedPointcloud(voxel_size=0.1)
+    pcd.add(torch.from_numpy(rng.random((1000, 3))).float(), None, torch.rand(1000, 3))
+    version = pcd.version
+    points = pcd.get_pointcloud()[0]
+    keep = points[:, 2] > 0.3
+    pcd.filter(keep)
+    assert len(pcd.get_pointcloud()[0]) == keep.sum()
+    delta = pcd.get_delta(version)
+    assert len(delta.keys) == 0
+    assert set(delta.removed_keys.tolist()) == set(
+        get_voxel_keys(points[~keep], 0.1).tolist()
+    )
+
+    # Keys stay aligned with the points, so adding after a filter works
+    new_points = torch.from_numpy(rng.random((500, 3))).float()
+    pcd.add(new_points, None, torch.rand(500, 3))
+    points = pcd.get_pointcloud()[0]
+    assert torch.equal(pcd._keys, get_voxel_keys(points, 0.1))
+    assert len(pcd._versions) == len(points)
+
+    pcd.filter(torch.zeros(len(points), dtype=torch.bool))
+    assert pcd.get_pointcloud()[0] is None
+    pcd.add(new_points, None, torch.rand(500, 3))
+    assert len(pcd.get_pointcloud()[0]) == len(torch.unique(pcd._keys))
+
+
+def _add_with_bounds_grid(batches, voxel_size: float):
+    """What VoxelizedPointcloud.add did before voxels were keyed on an origin-aligned grid: all points, old voxel centroids included, re-voxelized on a grid starting at the bounds of everything added so far"""
+    points, weights, mins = None, None, None
+    for batch in batches:
+        batch_weights = torch.ones(len(batch))
+        if points is None:
+            all_points, all_weights = batch, batch_weights
+        else:
+            all_points = torch.cat([points, batch])
+            all_weights = torch.cat([weights, batch_weights])
+        batch_mins = batch.min(dim=0)[0]
+        mins = batch_mins if mins is None else torch.min(mins, batch_mins)
+        coords = torch.floor((all_points - mins) / voxel_size).long()
+        _, cluster = torch.unique(coords, dim=0, return_inverse=True)
+        points, _, weights, _ = reduce_pointcloud(
+            cluster, pos=all_points, features=None, weights=all_weights
+        )
+    return points, weights
+
+
+def test_voxelized_pointcloud_add_matches_bounds_grid():
+    rng = np.random.default_rng(0)
+    voxel_size = 0.1
+    batches = [
+        torch.from_numpy(rng.random((400, 3)) * 0.9 + 0.05).float() for _ in range(3)
+    ]
+    # Points at the origin put the bounds of the old grid on the origin too, so both grids have the same cells and give the same voxels
+    aligned = [torch.cat([torch.zeros(1, 3), batch]) for batch in batches]
+    pcd = VoxelizedPointcloud(voxel_size=voxel_size)
+    for batch in aligned:
+        pcd.add(batch, None, None)
+    points, _, weights, _ = pcd.get_pointcloud()
+    expected_points, expected_weights = _add_with_bounds_grid(aligned, voxel_size)
+    assert len(points) == len(expected_points)
+    order = torch.argsort(get_voxel_keys(expected_points, voxel_size))
+    assert torch.allclose(points, expected_points[order], atol=1e-6)
+    assert torch.equal(weights, expected_weights[order])
+
+    # Otherwise the cells differ: voxel boundaries no longer follow the bounds of the points, and old voxels are never re-clustered when the bounds grow. Every point is still counted once, and each voxel holds the mean of the points in its cell.
+    shifted = [batch + 0.03 for batch in batches]
+    pcd = VoxelizedPointcloud(voxel_size=voxel_size)
+    for batch in shifted:
+        pcd.add(batch, None, None)
+    points, _, weights, _ = pcd.get_pointcloud()
+    expected_points, expected_weights = _add_with_bounds_grid(shifted, voxel_size)
+    assert weights.sum() == expected_weights.sum() == 1200
+    all_points = torch.cat(shifted)
+    assert torch.allclose(
+        (points * weights[:, None]).sum(dim=0), all_points.sum(dim=0), rtol=1e-5
+    )
+    keys = get_voxel_keys(all_points, voxel_size)
+    assert torch.equal(pcd._keys, torch.unique(keys))
+    for i in rng.choice(len(points), 20, replace=False):
+        in_cell = keys == pcd._keys[i]
+        assert weights[i] == in_cell.sum()
+        assert torch.allclose(points[i], all_points[in_cell].mean(dim=0), atol=1e-6)
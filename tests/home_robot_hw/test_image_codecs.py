@@ -0,0 +1,94 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+#
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+import numpy as np
+import pytest
+
+from home_robot_hw.ros.image_codecs import (
+    StreamCodec,
+    decode_frame,
+    encode_frame,
+    get_codec,
+)
+
+
+def _images():
+    rng = np.random.default_rng(0)
+    rgb = rng.integers(0, 256, (48, 64, 3), dtype=np.uint8)
+    # Smooth, so that compression has something to find
+    rgb[:, :32] = 128
+    depth = rng.integers(0, 65536, (48, 64), dtype=np.uint16)
+    depth[:24] = 1000
+    return rgb, depth
+
+
+@pytest.mark.parametrize("name", ["png", "raw", "zlib", "lz4", "zstd"])
+def test_lossless_round_trip(name):
+    try:
+        codec = get_codec(name)
+    except ImportError:
+        pytest.skip(f"{name} codec needs a package that is not installed")
+    assert codec.lossless
+    for img in _images():
+        decoded_name, decoded = decode_frame(encode_frame(name, codec, img))
+        assert decoded_name == name
+        assert decoded.dtype == img.dtype and decoded.shape == img.shape
+        assert np.array_equal(decoded, img)
+
+
+@pytest.mark.parametrize("scale", [1000.0, 256.0])
+def test_quantized_depth(scale):
+    rng = np.random.default_rng(0)
+    depth = rng.uniform(0.1, 10.0, (48, 64)).astype(np.float32)
+    depth[0, :4] = [np.nan, np.inf, -np.inf, 0.0]
+    # Beyond what uint16 holds at this scale
+    depth[1, 0] = 70000 / scale
+    codec = get_codec("quantized_depth", scale=scale)
+    _, decoded = decode_frame(encode_frame("quantized_depth", codec, depth))
+    assert decoded.dtype == np.float32
+    assert np.array_equal(decoded[0, :4], np.zeros(4))
+    assert decoded[1, 0] == pytest.approx(65535 / scale)
+    valid = np.ones(depth.shape, dtype=bool)
+    valid[0, :4] = valid[1, 0] = False
+    error = np.abs(decoded[valid] - depth[valid])
+    assert error.max() <= 0.5 / scale + 1e-6
+
+
+def test_decode_frame_picks_codec_from_header():
+    rgb, depth = _images()
+    frames = {
+        "png": encode_frame("png", get_codec("png"), rgb),
+        "zlib": encode_frame("zlib", get_codec("zlib", level=6), depth),
+        "jpeg": encode_frame("jpeg", get_codec("jpeg", quality=95), rgb),
+    }
+    # The receiver's own codec does not matter
+    receiver = StreamCodec("raw")
+    for name, data in frames.items():
+        assert decode_frame(data)[0] == name
+        img = receiver.decode(data)
+        if name == "jpeg":
+            assert img.shape == rgb.shape
+            # Lossy, but the flat half stays flat
+            assert np.abs(img[:, :28].astype(int) - 128).max() <= 2
+        else:
+            assert np.array_equal(img, rgb if name == "png" else depth)
+    receiver.shutdown()
+
+
+def test_stream_codec_stats():
+    rgb, _ = _images()
+    codec = StreamCodec("zlib", num_threads=2)
+    futures = [codec.encode_async(rgb) for _ in range(4)]
+    frames = [future.result() for future in futures]
+    frames.append(codec.encode(rgb))
+    for data in frames:
+        assert np.array_equal(codec.decode_async(data).result(), rgb)
+    info = codec.get_info()
+    assert info["codec"] == "zlib" and info["frames"] == 5
+    assert info["size_kb"] == pytest.approx(len(frames[0]) / 1024)
+    assert info["ratio"] == pytest.approx(rgb.nbytes / len(frames[0]))
+    assert info["ratio"] > 1
+    assert info["encode_ms"] > 0 and info["decode_ms"] > 0
+    assert codec.stats.num_decoded == 5
+    codec.shutdown()